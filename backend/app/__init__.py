@@ -2,6 +2,7 @@ import os
 from flask import Flask, jsonify
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
+from werkzeug.exceptions import HTTPException
 
 # Only load .env in development (Vercel sets env vars directly)
 if os.getenv('VERCEL') != '1':
@@ -14,9 +15,13 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
     
-    # Enable debug mode to see errors
-    app.config['DEBUG'] = True
-    app.config['PROPAGATE_EXCEPTIONS'] = True
+    # Debug mode (tracebacks in error responses) only when asked for;
+    # `python run.py` turns it on for local development
+    app.config['DEBUG'] = os.getenv('FLASK_DEBUG') == '1'
+    
+    # async def views run on one shared event loop instead of a new loop per request
+    from app.services import aio
+    app.ensure_sync = aio.ensure_sync
     
     # CORS - Allow all origins for development
     CORS(app, 
@@ -24,18 +29,21 @@ def create_app():
              "origins": "*",
              "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
              "allow_headers": ["Content-Type", "Authorization"],
-             "expose_headers": ["Content-Type"],
+             "expose_headers": ["Content-Type", "Server-Timing"],
          }})
     
-    # Add error handler for better debugging
+    # Uncaught errors become JSON 500s; the traceback is logged, and only
+    # returned to the client in debug mode
     @app.errorhandler(Exception)
     def handle_exception(e):
         import traceback
-        return jsonify({
-            'error': str(e),
-            'type': type(e).__name__,
-            'traceback': traceback.format_exc()
-        }), 500
+        if isinstance(e, HTTPException):
+            return e
+        traceback.print_exc()
+        body = {'error': str(e), 'type': type(e).__name__}
+        if app.debug:
+            body['traceback'] = traceback.format_exc()
+        return jsonify(body), 500
     
     # Register blueprints
     from app.routes import profile, auth
@@ -43,6 +51,12 @@ def create_app():
     from app.routes.notifications import notifications_bp
     from app.routes.messages import messages_bp
     from app.routes.insights import insights_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.embeddings import embeddings_bp
+    from app.routes.batch import batch_bp
+    from app.middleware.deadline import register_deadline
+    from app.middleware.metrics import register_metrics
+    from app.middleware.query_audit import register_query_audit
     
     app.register_blueprint(profile.bp, url_prefix='/api/profile')
     app.register_blueprint(auth.bp, url_prefix='/api/auth')
@@ -50,6 +64,22 @@ def create_app():
     app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
     app.register_blueprint(messages_bp, url_prefix='/api/messages')
     app.register_blueprint(insights_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(embeddings_bp, url_prefix='/api/embeddings')
+    app.register_blueprint(batch_bp, url_prefix='/api')
+    
+    # Time budget for upstream calls so a slow provider can't hang requests (REQUEST_DEADLINE)
+    register_deadline(app)
+    
+    # Per-request Server-Timing and upstream call metrics (METRICS_ENABLED=1)
+    register_metrics(app)
+    
+    # N+1 detection and per-route query budgets for development (QUERY_AUDIT=1)
+    register_query_audit(app)
+    
+    # flask recommendations precompute, ...
+    from app.cli import register_cli
+    register_cli(app)
     
     @app.route('/api/health')
     def health():
@@ -0,0 +1,130 @@
+"""
+Maintenance commands, run with the Flask CLI from backend/:
+
+    flask --app run recommendations precompute --workers 8
+    flask --app run embeddings reindex --table profiles --workers 4
+    flask --app run embeddings prune-fields
+    flask --app run notifications purge
+    flask --app run messages partitions
+"""
+import click
+from flask.cli import AppGroup
+
+from app.services import embedding_jobs, field_embeddings, message_partitions, notifications, recommendations
+
+recommendations_cli = AppGroup('recommendations', help='Precomputed profile recommendations.')
+
+
+@recommendations_cli.command('precompute')
+@click.option('--user', 'user_ids', multiple=True, help='Only this user id (repeatable).')
+@click.option('--limit', type=int, default=recommendations.RECOMMENDATION_CACHE_SIZE, show_default=True,
+              help='Recommendations to compute per user.')
+@click.option('--workers', type=int, default=4, show_default=True,
+              help='Users computed at the same time.')
+@click.option('--stale-only', is_flag=True, help='Skip users whose cached recommendations are fresh.')
+def precompute_recommendations(user_ids, limit, workers, stale_only):
+    """Compute and cache recommendations for every user."""
+    stats = recommendations.precompute(
+        list(user_ids) or None, limit=limit, workers=workers, stale_only=stale_only
+    )
+    click.echo(f"Computed {stats['computed']}, skipped {stats['skipped']}, failed {stats['failed']}")
+
+
+embeddings_cli = AppGroup('embeddings', help='Resumable re-embedding jobs.')
+
+
+def _echo_job(job):
+    status = embedding_jobs.describe(job)
+    rate = f", {status['rows_per_second']} rows/s" if status['rows_per_second'] else ''
+    click.echo(f"{status['table']} job {status['id']} ({status['mode']}): {status['status']}, "
+               f"{status['processed']}/{status['total']} processed, {status['failed']} failed{rate}")
+
+
+@embeddings_cli.command('reindex')
+@click.option('--table', 'tables', type=click.Choice(embedding_jobs.JOB_TABLES + ('all',)),
+              default='all', show_default=True, help='Table to re-embed.')
+@click.option('--missing-only', is_flag=True, help='Only rows without an embedding.')
+@click.option('--workers', type=int, default=4, show_default=True,
+              help='Chunks embedded at the same time.')
+@click.option('--chunk-size', type=int, default=embedding_jobs.EMBEDDING_JOB_CHUNK_SIZE, show_default=True,
+              help='Rows per chunk (new jobs only).')
+def reindex_embeddings(tables, missing_only, workers, chunk_size):
+    """Re-embed rows, resuming the table's unfinished job if there is one."""
+    for table in embedding_jobs.JOB_TABLES if tables == 'all' else (tables,):
+        job, resumed = embedding_jobs.start_job(table, 'missing' if missing_only else 'all', chunk_size)
+        if resumed:
+            click.echo(f"Resuming {table} job {job['id']} ({job['mode']})")
+        _echo_job(embedding_jobs.run_job(job['id'], workers=workers) or job)
+
+
+@embeddings_cli.command('status')
+@click.argument('job_id', required=False)
+def embedding_job_status(job_id):
+    """Show a job, or the most recent jobs."""
+    jobs = [embedding_jobs.get_job(job_id)] if job_id else embedding_jobs.list_jobs(limit=10)
+    for job in jobs:
+        if job:
+            _echo_job(job)
+
+
+@embeddings_cli.command('cancel')
+@click.argument('job_id')
+def cancel_embedding_job(job_id):
+    """Stop a job; the next reindex starts a new one from the beginning."""
+    job = embedding_jobs.cancel_job(job_id)
+    if not job:
+        raise click.ClickException(f'No embedding job {job_id}')
+    _echo_job(job)
+
+
+@embeddings_cli.command('prune-fields')
+@click.option('--older-than-hours', type=int, default=field_embeddings.FIELD_EMBEDDING_PRUNE_AGE_HOURS,
+              show_default=True, help='Keep unreferenced vectors cached more recently than this.')
+@click.option('--batch-size', type=int, default=field_embeddings.FIELD_EMBEDDING_PRUNE_BATCH_SIZE,
+              show_default=True, help='Rows removed per transaction.')
+def prune_field_embeddings(older_than_hours, batch_size):
+    """Remove cached field vectors no profile uses any more."""
+    stats = field_embeddings.prune_cache(older_than_hours, batch_size)
+    click.echo(f"Pruned {stats['pruned']} field embeddings in {stats['batches']} batches")
+
+
+notifications_cli = AppGroup('notifications', help='Notification retention.')
+
+
+@notifications_cli.command('purge')
+@click.option('--read-days', type=int, default=notifications.NOTIFICATION_RETENTION_READ_DAYS,
+              show_default=True, help='Remove read notifications older than this.')
+@click.option('--unread-days', type=int, default=notifications.NOTIFICATION_RETENTION_UNREAD_DAYS,
+              show_default=True, help='Remove any notification older than this (0 keeps unread ones).')
+@click.option('--batch-size', type=int, default=notifications.NOTIFICATION_PURGE_BATCH_SIZE,
+              show_default=True, help='Rows removed per transaction.')
+@click.option('--archive', is_flag=True, help='Move rows to notifications_archive instead of deleting them.')
+def purge_notifications(read_days, unread_days, batch_size, archive):
+    """Remove notifications past their retention period."""
+    stats = notifications.purge(read_days, unread_days, batch_size, archive)
+    click.echo(f"{'Archived' if archive else 'Purged'} {stats['purged']} notifications "
+               f"in {stats['batches']} batches")
+
+
+messages_cli = AppGroup('messages', help='Messages partition maintenance.')
+
+
+@messages_cli.command('partitions')
+@click.option('--months-ahead', type=int, default=message_partitions.MESSAGE_PARTITIONS_AHEAD,
+              show_default=True, help='Months of partitions to keep created ahead of now.')
+@click.option('--retention-months', type=int, default=message_partitions.MESSAGE_RETENTION_MONTHS,
+              show_default=True, help='Detach months older than this (0 keeps everything).')
+@click.option('--archive-schema', default=message_partitions.MESSAGE_ARCHIVE_SCHEMA,
+              show_default=True, help='Schema detached partitions move to; empty drops them.')
+def maintain_message_partitions(months_ahead, retention_months, archive_schema):
+    """Create upcoming messages partitions and detach those past retention."""
+    stats = message_partitions.maintain(months_ahead, retention_months, archive_schema)
+    click.echo(f"Created {stats['created']} partitions, detached {len(stats['detached'])}"
+               + (f": {', '.join(stats['detached'])}" if stats['detached'] else ''))
+
+
+def register_cli(app):
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(embeddings_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(messages_cli)
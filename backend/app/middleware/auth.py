@@ -1,12 +1,26 @@
 from functools import wraps
 from flask import request, jsonify
+import inspect
 import jwt
 import traceback
 from app.supabase_client import supabase
+from app.services import aio
+
+# WSGI environ key for a user already verified by the enclosing request
+# (set by /api/batch for its sub-requests; not settable through headers)
+AUTHENTICATED_USER_KEY = 'app.authenticated_user'
 
 def require_auth(f):
+    if inspect.iscoroutinefunction(f):
+        return _require_auth_async(f)
+    
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        verified_user = request.environ.get(AUTHENTICATED_USER_KEY)
+        if verified_user is not None:
+            request.user = verified_user
+            return f(*args, **kwargs)
+        
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
@@ -35,3 +49,40 @@ def require_auth(f):
             return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
     
     return decorated_function
+
+def _require_auth_async(f):
+    """require_auth for async views: the token is checked with the async
+    Supabase client so the event loop isn't blocked"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        verified_user = request.environ.get(AUTHENTICATED_USER_KEY)
+        if verified_user is not None:
+            request.user = verified_user
+            return await f(*args, **kwargs)
+        
+        auth_header = request.headers.get('Authorization')
+        
+        if not auth_header:
+            print("Authentication failed: No authorization header")
+            return jsonify({'error': 'No authorization header'}), 401
+        
+        try:
+            token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
+            
+            client = await aio.supabase()
+            user = await client.auth.get_user(token)
+            
+            if not user:
+                print("Authentication failed: Invalid token")
+                return jsonify({'error': 'Invalid token'}), 401
+            
+            request.user = user
+            
+            return await f(*args, **kwargs)
+            
+        except Exception as e:
+            print(f"Authentication error: {str(e)}")
+            traceback.print_exc()
+            return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
+    
+    return decorated_function
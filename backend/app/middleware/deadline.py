@@ -0,0 +1,14 @@
+from flask import g
+from app.services import deadline
+
+
+def register_deadline(app):
+    """Give every request a REQUEST_DEADLINE budget (0 disables it)."""
+
+    @app.before_request
+    def _start_deadline():
+        g.deadline_token = deadline.start()
+
+    @app.teardown_request
+    def _clear_deadline(exc=None):
+        deadline.end(g.pop('deadline_token', None))
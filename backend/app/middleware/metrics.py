@@ -0,0 +1,55 @@
+import time
+from flask import request
+from app.services.metrics import (
+    METRICS_ENABLED,
+    REQUEST_DURATION,
+    start_flusher,
+    start_trace,
+    end_trace,
+    current_trace,
+)
+
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _server_timing(trace, total: float) -> str:
+    """Build a Server-Timing header value (durations in milliseconds)."""
+    entries = []
+    upstream_total = 0.0
+    for service, (count, duration) in sorted(trace.totals().items()):
+        upstream_total += duration
+        entries.append(f'{service};dur={duration * 1000:.1f};desc="{count} calls"')
+    # Upstream calls can overlap when fanned out, so app time is a lower bound
+    app_time = max(total - upstream_total, 0.0)
+    entries.append(f'app;dur={app_time * 1000:.1f}')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def register_metrics(app):
+    """Attach per-request timing hooks. No-op unless METRICS_ENABLED=1."""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_trace():
+        # Started from a request so it runs in each worker, not the master
+        start_flusher()
+        start_trace(_route_label())
+
+    @app.after_request
+    def _finish_request_trace(response):
+        trace = current_trace()
+        if trace is None:
+            return response
+        total = time.perf_counter() - trace.started
+        REQUEST_DURATION.observe((request.method, trace.route, str(response.status_code)), total)
+        response.headers['Server-Timing'] = _server_timing(trace, total)
+        response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    @app.teardown_request
+    def _clear_request_trace(exc=None):
+        end_trace()
@@ -0,0 +1,41 @@
+from flask import request, jsonify
+from app.services.metrics import start_trace, end_trace, current_trace
+from app.services.query_audit import (
+    QUERY_AUDIT_ENABLED,
+    QUERY_AUDIT_STRICT,
+    audit,
+    log_violation,
+)
+
+
+def register_query_audit(app):
+    """Attach N+1 / query budget checks. No-op unless QUERY_AUDIT=1."""
+    if not QUERY_AUDIT_ENABLED:
+        return
+
+    @app.before_request
+    def _start_query_audit():
+        start_trace(request.url_rule.rule if request.url_rule else 'unmatched')
+
+    @app.after_request
+    def _check_query_audit(response):
+        trace = current_trace()
+        if trace is None:
+            return response
+
+        response.headers['X-Query-Count'] = str(len(trace.queries))
+        report = audit(trace, request.endpoint)
+        if report is None:
+            return response
+
+        log_violation(report)
+        if QUERY_AUDIT_STRICT and report['over_budget']:
+            failure = jsonify({'error': 'Query budget exceeded', 'query_audit': report})
+            failure.status_code = 500
+            failure.headers['X-Query-Count'] = str(len(trace.queries))
+            return failure
+        return response
+
+    @app.teardown_request
+    def _clear_query_audit(exc=None):
+        end_trace()
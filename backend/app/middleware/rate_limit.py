@@ -0,0 +1,73 @@
+import asyncio
+import inspect
+import math
+import uuid
+from functools import wraps
+from flask import request, jsonify, make_response
+from app.services import rate_limit
+
+
+def _too_many_requests(decision):
+    retry_after = max(1, math.ceil(decision.retry_after))
+    response = jsonify({
+        'error': 'Too many requests',
+        'limit': decision.scope,
+        'retry_after': retry_after,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(route_class):
+    """Admit the request under the route class's limits or answer 429 with
+    Retry-After. Apply below @require_auth so the user is known. The
+    concurrency slot is held until the response, including a streamed
+    one, has been sent."""
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            return _rate_limited_async(route_class, f)
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not rate_limit.RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+
+            holder = str(uuid.uuid4())
+            decision = rate_limit.admit(route_class, request.user.user.id, holder)
+            if not decision.allowed:
+                return _too_many_requests(decision)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except BaseException:
+                rate_limit.release(route_class, holder)
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: rate_limit.release(route_class, holder))
+            else:
+                rate_limit.release(route_class, holder)
+            return response
+
+        return decorated_function
+    return decorator
+
+
+def _rate_limited_async(route_class, f):
+    # The limiter's calls are blocking, so they run off the event loop
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if not rate_limit.RATE_LIMIT_ENABLED:
+            return await f(*args, **kwargs)
+
+        holder = str(uuid.uuid4())
+        decision = await asyncio.to_thread(rate_limit.admit, route_class, request.user.user.id, holder)
+        if not decision.allowed:
+            return _too_many_requests(decision)
+
+        try:
+            return make_response(await f(*args, **kwargs))
+        finally:
+            await asyncio.to_thread(rate_limit.release, route_class, holder)
+
+    return decorated_function
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Optional
+from urllib.parse import urlencode
+from flask import Blueprint, current_app, request, jsonify
+from werkzeug.test import EnvironBuilder
+from app.middleware.auth import require_auth, AUTHENTICATED_USER_KEY
+from app.services import deadline
+from app.services.concurrency import UPSTREAM_FANOUT_TIMEOUT
+import traceback
+
+batch_bp = Blueprint('batch', __name__)
+
+# Upper bound on sub-requests in one batch
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '10'))
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+# Threads running sub-requests, shared by concurrent batches
+BATCH_POOL_SIZE = int(os.getenv('BATCH_POOL_SIZE', str(BATCH_MAX_REQUESTS * 2)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Sub-requests get their own pool rather than the shared upstream one:
+    on an upstream worker thread the routes' own fan-out and background
+    refreshes would run inline, and batches would hold the slots every
+    other request fans out on"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BATCH_POOL_SIZE, thread_name_prefix='batch')
+    return _executor
+
+def _validate(item):
+    """Error message for an invalid sub-request, or None"""
+    if not isinstance(item, dict):
+        return 'Each request must be an object'
+    method = str(item.get('method', 'GET')).upper()
+    if method not in BATCH_METHODS:
+        return f"Unsupported method '{method}'"
+    path = item.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/') or '?' in path:
+        return 'path must be an /api/ path; pass query parameters in query'
+    if path.rstrip('/') == '/api/batch':
+        return 'Batches cannot be nested'
+    if item.get('query') is not None and not isinstance(item['query'], dict):
+        return 'query must be an object'
+    return None
+
+def _dispatch(app, item, environ_base):
+    """Run one sub-request through the app's own routing, hooks and error
+    handlers; returns its status, body and duration"""
+    started = time.perf_counter()
+    builder = EnvironBuilder(
+        path=item['path'],
+        method=str(item.get('method', 'GET')).upper(),
+        query_string=urlencode(item.get('query') or {}, doseq=True),
+        json=item.get('body'),
+        environ_base=environ_base,
+    )
+    try:
+        with app.request_context(builder.get_environ()):
+            response = None if request.routing_exception else app.full_dispatch_request()
+            if response is None:
+                # Unknown path or method, reported as JSON rather than
+                # werkzeug's HTML error page
+                status = request.routing_exception.code
+                body = {'error': request.routing_exception.description}
+            elif response.is_streamed:
+                # Streams (e.g. server-sent events) never finish inside a batch
+                response.close()
+                status, body = 400, {'error': 'Streaming responses cannot be batched'}
+            else:
+                status = response.status_code
+                body = response.get_json(silent=True)
+                if body is None:
+                    body = response.get_data(as_text=True)
+    finally:
+        builder.close()
+    return {
+        'status': status,
+        'body': body,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+@batch_bp.route('/batch', methods=['POST'])
+@require_auth
+def batch():
+    """Run several API requests in one round trip:
+    {"requests": [{"id", "method", "path", "query", "body"}, ...]}.
+    The caller is authenticated once; the sub-requests run concurrently and
+    come back in order as {"id", "status", "body", "duration_ms"}"""
+    try:
+        started = time.perf_counter()
+        data = request.get_json(silent=True) or {}
+        items = data.get('requests')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'requests must be a non-empty list'}), 400
+        if len(items) > BATCH_MAX_REQUESTS:
+            return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests per batch'}), 400
+        for index, item in enumerate(items):
+            error = _validate(item)
+            if error:
+                return jsonify({'error': f'requests[{index}]: {error}'}), 400
+
+        # Sub-requests reuse this request's verified user (require_auth
+        # trusts it from the WSGI environ, which clients can't set) and its
+        # headers, so routes reading Authorization keep working
+        environ_base = {
+            AUTHENTICATED_USER_KEY: request.user,
+            'HTTP_AUTHORIZATION': request.headers.get('Authorization', ''),
+            'REMOTE_ADDR': request.remote_addr,
+        }
+        app = current_app._get_current_object()
+        # Each sub-request carries this request's context (deadline, trace)
+        futures = [
+            _get_executor().submit(copy_context().run, _dispatch, app, item, environ_base)
+            for item in items
+        ]
+        done, _ = wait(futures, timeout=deadline.remaining(UPSTREAM_FANOUT_TIMEOUT))
+
+        responses = []
+        for item, future in zip(items, futures):
+            if future not in done:
+                future.cancel()
+                result = {'status': 504, 'body': {'error': 'Request timed out'}, 'duration_ms': None}
+            elif future.exception() is not None:
+                result = {'status': 500, 'body': {'error': str(future.exception())}, 'duration_ms': None}
+            else:
+                result = future.result()
+            responses.append({'id': item.get('id'), **result})
+
+        return jsonify({
+            'responses': responses,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }), 200
+
+    except Exception as e:
+        print(f"Error in batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,38 @@
+from flask import Blueprint, request, jsonify
+from app.middleware.auth import require_auth
+from app.services import embedding_jobs
+import traceback
+
+embeddings_bp = Blueprint('embeddings', __name__)
+
+@embeddings_bp.route('/jobs', methods=['GET'])
+@require_auth
+def list_embedding_jobs():
+    """List recent re-embedding jobs, newest first (optionally ?table=profiles|insights)"""
+    try:
+        table = request.args.get('table')
+        if table and table not in embedding_jobs.JOB_TABLES:
+            return jsonify({'error': f"Unknown table '{table}'"}), 400
+        limit = min(max(request.args.get('limit', 20, type=int) or 20, 1), 100)
+        
+        jobs = embedding_jobs.list_jobs(table, limit)
+        return jsonify([embedding_jobs.describe(job) for job in jobs]), 200
+    except Exception as e:
+        print(f"Error listing embedding jobs: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@embeddings_bp.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_embedding_job(job_id):
+    """Progress of a re-embedding job: processed/failed counts, rate and ETA"""
+    try:
+        job = embedding_jobs.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(embedding_jobs.describe(job)), 200
+    except Exception as e:
+        print(f"Error fetching embedding job: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
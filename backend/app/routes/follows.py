@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from app.middleware.auth import require_auth
 from app.supabase_client import supabase
+from app.services import recommendations
+from app.services.concurrency import gather
 from datetime import datetime
 
 follows_bp = Blueprint('follows', __name__)
@@ -16,37 +18,25 @@ def follow_user(user_id):
         if current_user_id == user_id:
             return jsonify({'error': 'Cannot follow yourself'}), 400
         
-        # Check if already following
-        existing = supabase.table('follows').select('*').eq('follower_id', current_user_id).eq('following_id', user_id).execute()
-        
-        if existing.data:
+        # Follow, notify and count in one call; the followed user drops out
+        # of the follower's cached recommendations
+        result, _ = gather(
+            lambda: supabase.rpc('follow_user', {
+                'p_follower_id': current_user_id,
+                'p_following_id': user_id,
+            }).execute(),
+            lambda: recommendations.invalidate([current_user_id]),
+        )
+        state = result.data or {}
+        
+        if not state.get('followed'):
             return jsonify({'error': 'Already following this user'}), 400
         
-        # Create follow relationship
-        follow_data = {
-            'follower_id': current_user_id,
-            'following_id': user_id
-        }
-        
-        result = supabase.table('follows').insert(follow_data).execute()
-        
-        # Get follower's profile info for notification
-        follower_profile = supabase.table('profiles').select('full_name').eq('id', current_user_id).single().execute()
-        follower_name = follower_profile.data.get('full_name', 'Someone') if follower_profile.data else 'Someone'
-        
-        # Create notification for the followed user
-        notification_data = {
-            'user_id': user_id,
-            'type': 'follow',
-            'message': f'{follower_name} started following you',
-            'related_user_id': current_user_id
-        }
-        
-        supabase.table('notifications').insert(notification_data).execute()
-        
         return jsonify({
             'message': 'Successfully followed user',
-            'follow': result.data[0]
+            'follow': state['follow'],
+            'follower_count': state.get('follower_count'),
+            'following_count': state.get('following_count')
         }), 201
         
     except Exception as e:
@@ -59,8 +49,11 @@ def unfollow_user(user_id):
     try:
         current_user_id = request.user.user.id
         
-        # Delete follow relationship
-        result = supabase.table('follows').delete().eq('follower_id', current_user_id).eq('following_id', user_id).execute()
+        # Delete follow relationship; the unfollowed user can be recommended again
+        result, _ = gather(
+            lambda: supabase.table('follows').delete().eq('follower_id', current_user_id).eq('following_id', user_id).execute(),
+            lambda: recommendations.invalidate([current_user_id]),
+        )
         
         if not result.data:
             return jsonify({'error': 'Not following this user'}), 404
@@ -147,12 +140,12 @@ def check_is_following(user_id):
 def get_follow_stats(user_id):
     """Get follower and following counts for a user"""
     try:
-        # Count followers
-        followers_result = supabase.table('follows').select('id', count='exact').eq('following_id', user_id).execute()
+        # Count followers and following in parallel
+        followers_result, following_result = gather(
+            lambda: supabase.table('follows').select('id', count='exact').eq('following_id', user_id).execute(),
+            lambda: supabase.table('follows').select('id', count='exact').eq('follower_id', user_id).execute(),
+        )
         followers_count = followers_result.count or 0
-        
-        # Count following
-        following_result = supabase.table('follows').select('id', count='exact').eq('follower_id', user_id).execute()
         following_count = following_result.count or 0
         
         return jsonify({
@@ -1,21 +1,36 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from app.supabase_client import supabase
 from app.middleware.auth import require_auth
-from app.services.embedding_service import generate_embedding
+from app.middleware.rate_limit import rate_limited
+from app.services import aio, embedding_jobs
+from app.services.embedding_service import agenerate_embedding, embedding_columns
+from app.services.search import ahybrid_search, semantic_weight
+from app.services.projections import (
+    ProjectionError,
+    requested_fields,
+    select_columns,
+    strip_private,
+    trim_fields,
+)
 import traceback
 
 insights_bp = Blueprint('insights', __name__)
 
+# Insights per in.(...) lookup when enriching a list, keeping URLs short
+ENRICH_CHUNK = 100
+
 @insights_bp.route('/insights/feed', methods=['GET'])
 @require_auth
-def get_insights_feed():
+async def get_insights_feed():
     """Get insights from users that the current user follows"""
     try:
         user_id = request.user.user.id
+        fields = requested_fields('insight')
         print(f"Fetching insights feed for user: {user_id}")
+        client = await aio.supabase()
         
         # Get list of users that current user follows
-        follows_response = supabase.table('follows').select('following_id').eq(
+        follows_response = await client.table('follows').select('following_id').eq(
             'follower_id', user_id
         ).execute()
         
@@ -27,39 +42,57 @@ def get_insights_feed():
         print(f"Following {len(following_ids)} users")
         
         # Get insights from followed users
-        insights_response = supabase.table('insights').select(
-            '*'
+        insights_response = await client.table('insights').select(
+            select_columns('insight_card', fields, keep_projection=True)
         ).in_('user_id', following_ids).order('created_at', desc=True).limit(50).execute()
         
         insights = insights_response.data
         print(f"Found {len(insights)} insights")
         
-        # Get profile info and like counts for each insight
-        for insight in insights:
-            # Get profile info
-            profile_response = supabase.table('profiles').select(
-                'full_name, profile_picture_url'
-            ).eq('id', insight['user_id']).execute()
-            if profile_response.data:
-                insight['profiles'] = profile_response.data[0]
-            
-            # Get like count
-            likes_response = supabase.table('insight_likes').select(
-                'id', count='exact'
-            ).eq('insight_id', insight['id']).execute()
-            insight['likes_count'] = likes_response.count or 0
-            
-            # Check if current user liked it
-            user_like = supabase.table('insight_likes').select('id').eq(
-                'insight_id', insight['id']
-            ).eq('user_id', user_id).execute()
-            insight['liked_by_user'] = len(user_like.data) > 0
+        # Profile info and like counts for all of them in a few calls
+        await _enrich(client, insights, user_id)
         
-        return jsonify(insights), 200
+        return jsonify(trim_fields(insights, 'insight', fields)), 200
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error fetching insights feed: {str(e)}")
         traceback.print_exc()
-        return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
+        body = {'error': str(e)}
+        if current_app.debug:
+            body['details'] = traceback.format_exc()
+        return jsonify(body), 500
+
+async def _enrich(client, insights, user_id):
+    """Add each insight's author profile, like count and whether user_id
+    liked it, with one request per kind for each ENRICH_CHUNK insights"""
+    chunks = [insights[i:i + ENRICH_CHUNK] for i in range(0, len(insights), ENRICH_CHUNK)]
+    responses = await aio.gather(*(
+        call
+        for chunk in chunks
+        for call in (
+            client.table('profiles').select(
+                'id,' + select_columns('profile_author')
+            ).in_('id', list({i['user_id'] for i in chunk})).execute(),
+            # Counted in Postgres; the like rows could exceed PostgREST's max-rows
+            client.rpc('insight_like_counts', {'p_insight_ids': [i['id'] for i in chunk]}).execute(),
+            client.table('insight_likes').select('insight_id').eq(
+                'user_id', user_id
+            ).in_('insight_id', [i['id'] for i in chunk]).execute(),
+        )
+    ))
+    profiles, likes_counts, liked = {}, {}, set()
+    for profile_response, counts_response, user_likes in zip(*[iter(responses)] * 3):
+        for profile in profile_response.data or []:
+            profiles[profile.pop('id')] = profile
+        for row in counts_response.data or []:
+            likes_counts[row['insight_id']] = row['likes_count']
+        liked.update(row['insight_id'] for row in user_likes.data or [])
+    for insight in insights:
+        if insight['user_id'] in profiles:
+            insight['profiles'] = dict(profiles[insight['user_id']])
+        insight['likes_count'] = likes_counts.get(insight['id'], 0)
+        insight['liked_by_user'] = insight['id'] in liked
 
 @insights_bp.route('/insights', methods=['POST'])
 @require_auth
@@ -82,13 +115,11 @@ def create_insight():
         
         # Generate embedding for the insight
         text_to_embed = f"{data['title']} {data['content']}"
-        embedding = generate_embedding(text_to_embed)
-        if embedding:
-            insight_data['embedding'] = embedding
+        insight_data.update(embedding_columns(text_to_embed))
         
         response = supabase.table('insights').insert(insight_data).execute()
         
-        return jsonify(response.data[0]), 201
+        return jsonify(strip_private(response.data[0])), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -96,9 +127,10 @@ def create_insight():
 def get_insight(insight_id):
     """Get a specific insight with like count and whether current user liked it"""
     try:
+        fields = requested_fields('insight')
         # Get insight with user profile
         insight_response = supabase.table('insights').select(
-            '*'
+            select_columns('insight_card', fields, keep_projection=True)
         ).eq('id', insight_id).execute()
         
         if not insight_response.data:
@@ -108,7 +140,7 @@ def get_insight(insight_id):
         
         # Get profile info
         profile_response = supabase.table('profiles').select(
-            'full_name, profile_picture_url'
+            select_columns('profile_author')
         ).eq('id', insight['user_id']).execute()
         if profile_response.data:
             insight['profiles'] = profile_response.data[0]
@@ -135,7 +167,9 @@ def get_insight(insight_id):
         else:
             insight['liked_by_user'] = False
         
-        return jsonify(insight), 200
+        return jsonify(trim_fields(insight, 'insight', fields)), 200
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -167,7 +201,7 @@ def update_insight(insight_id):
         
         response = supabase.table('insights').update(update_data).eq('id', insight_id).execute()
         
-        return jsonify(response.data[0]), 200
+        return jsonify(strip_private(response.data[0])), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -196,14 +230,15 @@ def delete_insight(insight_id):
 def get_user_insights(user_id):
     """Get all insights for a specific user"""
     try:
+        fields = requested_fields('insight')
         # Get insights
         insights_response = supabase.table('insights').select(
-            '*'
+            select_columns('insight_card', fields, keep_projection=True)
         ).eq('user_id', user_id).order('created_at', desc=True).execute()
         
         # Get profile info
         profile_response = supabase.table('profiles').select(
-            'full_name, profile_picture_url'
+            select_columns('profile_author')
         ).eq('id', user_id).execute()
         profile_data = profile_response.data[0] if profile_response.data else None
         
@@ -233,7 +268,9 @@ def get_user_insights(user_id):
             else:
                 insight['liked_by_user'] = False
         
-        return jsonify(insights), 200
+        return jsonify(trim_fields(insights, 'insight', fields)), 200
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -244,30 +281,19 @@ def like_insight(insight_id):
     try:
         user_id = request.user.user.id
         
-        # Check if already liked
-        existing_like = supabase.table('insight_likes').select('id').eq(
-            'insight_id', insight_id
-        ).eq('user_id', user_id).execute()
+        # Insert the like and count in one call; a repeat like inserts nothing
+        result = supabase.rpc('like_insight', {
+            'p_insight_id': insight_id,
+            'p_user_id': user_id
+        }).execute()
+        state = result.data or {}
         
-        if existing_like.data:
+        if not state.get('liked'):
             return jsonify({'error': 'Already liked'}), 400
         
-        # Add like
-        like_data = {
-            'insight_id': insight_id,
-            'user_id': user_id
-        }
-        
-        supabase.table('insight_likes').insert(like_data).execute()
-        
-        # Get updated like count
-        likes_response = supabase.table('insight_likes').select(
-            'id', count='exact'
-        ).eq('insight_id', insight_id).execute()
-        
         return jsonify({
             'message': 'Insight liked successfully',
-            'likes_count': likes_response.count or 0
+            'likes_count': state.get('likes_count', 0)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -279,119 +305,86 @@ def unlike_insight(insight_id):
     try:
         user_id = request.user.user.id
         
-        # Remove like
-        supabase.table('insight_likes').delete().eq(
-            'insight_id', insight_id
-        ).eq('user_id', user_id).execute()
-        
-        # Get updated like count
-        likes_response = supabase.table('insight_likes').select(
-            'id', count='exact'
-        ).eq('insight_id', insight_id).execute()
+        # Remove like and get the updated count in one call
+        result = supabase.rpc('unlike_insight', {
+            'p_insight_id': insight_id,
+            'p_user_id': user_id
+        }).execute()
         
         return jsonify({
             'message': 'Insight unliked successfully',
-            'likes_count': likes_response.count or 0
+            'likes_count': (result.data or {}).get('likes_count', 0)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @insights_bp.route('/insights/search', methods=['GET'])
 @require_auth
-def search_insights():
+@rate_limited('search')
+async def search_insights():
     """Search insights by query with semantic search support"""
     try:
         user_id = request.user.user.id
         search_query = request.args.get('q', '').strip()
-        
-        # Get all insights first (excluding current user's insights)
-        insights_response = supabase.table('insights').select(
-            '*'
-        ).neq('user_id', user_id).order('created_at', desc=True).execute()
-        
-        insights = insights_response.data or []
-        
-        # Add profile data to each insight
-        for insight in insights:
-            profile_response = supabase.table('profiles').select(
-                'full_name, profile_picture_url'
-            ).eq('id', insight['user_id']).execute()
-            if profile_response.data:
-                insight['profiles'] = profile_response.data[0]
-            
-            # Get like count
-            likes_response = supabase.table('insight_likes').select(
-                'id', count='exact'
-            ).eq('insight_id', insight['id']).execute()
-            insight['likes_count'] = likes_response.count or 0
-            
-            # Check if current user liked it
-            user_like = supabase.table('insight_likes').select('id').eq(
-                'insight_id', insight['id']
-            ).eq('user_id', user_id).execute()
-            insight['liked_by_user'] = len(user_like.data) > 0
-        
-        # Apply search filter if query exists
-        if search_query:
-            # Try semantic search first
-            query_embedding = generate_embedding(search_query)
-            
-            if query_embedding:
-                try:
-                    # Use Supabase RPC to call the semantic search function
-                    result = supabase.rpc(
-                        'search_insights_semantic',
-                        {
-                            'query_embedding': query_embedding,
-                            'match_threshold': 0.2,
-                            'match_count': 100
-                        }
-                    ).execute()
+        fields = requested_fields('insight')
+        columns = select_columns('insight_card', fields, keep_projection=True)
+        client = await aio.supabase()
+        
+        if not search_query:
+            # No query: every insight (excluding current user's insights)
+            insights_response = await client.table('insights').select(columns).neq(
+                'user_id', user_id
+            ).order('created_at', desc=True).execute()
+            insights = insights_response.data or []
+        else:
+            try:
+                # Rank by hybrid full-text + semantic search first, then load
+                # only the ranked insights. Without an embedding the RPC
+                # still ranks lexically in Postgres.
+                query_embedding = await agenerate_embedding(search_query)
+                ranking = await ahybrid_search(
+                    'insights',
+                    search_query,
+                    query_embedding,
+                    match_count=100,
+                    weight=semantic_weight(request.args.get('semantic_weight')),
+                )
+                
+                insights = []
+                if ranking:
+                    insights_response = await client.table('insights').select(columns).in_(
+                        'id', list(ranking)
+                    ).neq('user_id', user_id).order('created_at', desc=True).execute()
+                    insights = insights_response.data or []
+                insights.sort(
+                    key=lambda i: ranking[i['id']]['score'],
+                    reverse=True
+                )
+                
+                # Add scores for debugging
+                for i in insights:
+                    i['_similarity'] = ranking[i['id']]['similarity']
+                    i['_score'] = ranking[i['id']]['score']
                     
-                    if result.data:
-                        # Create a map of insight IDs with their similarity scores
-                        similarity_map = {i['id']: i['similarity'] for i in result.data}
-                        semantic_insight_ids = set(similarity_map.keys())
-                        
-                        # Filter to only include insights from semantic search
-                        filtered_insights = [
-                            i for i in insights
-                            if i.get('id') in semantic_insight_ids
-                        ]
-                        
-                        # Sort by similarity score
-                        filtered_insights.sort(
-                            key=lambda i: similarity_map.get(i.get('id'), 0),
-                            reverse=True
-                        )
-                        
-                        # Add similarity score for debugging
-                        for i in filtered_insights:
-                            i['_similarity'] = similarity_map.get(i.get('id'), 0)
-                        
-                        insights = filtered_insights
-                    else:
-                        insights = []
-                        
-                except Exception as semantic_error:
-                    print(f"Semantic search error: {str(semantic_error)}")
-                    # Fall back to basic text search
-                    search_lower = search_query.lower()
-                    insights = [
-                        i for i in insights
-                        if (search_lower in (i.get('title') or '').lower() or
-                            search_lower in (i.get('content') or '').lower())
-                    ]
-            else:
-                # Fall back to basic text search if embedding generation fails
+            except Exception as search_error:
+                print(f"Hybrid search error: {str(search_error)}")
+                # Fall back to basic text search
+                insights_response = await client.table('insights').select(columns).neq(
+                    'user_id', user_id
+                ).order('created_at', desc=True).execute()
                 search_lower = search_query.lower()
                 insights = [
-                    i for i in insights
+                    i for i in insights_response.data or []
                     if (search_lower in (i.get('title') or '').lower() or
                         search_lower in (i.get('content') or '').lower())
                 ]
         
-        return jsonify(insights), 200
+        # Profile data and like counts for the insights returned
+        await _enrich(client, insights, user_id)
+        
+        return jsonify(trim_fields(insights, 'insight', fields)), 200
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Insight search error: {str(e)}")
         import traceback
@@ -400,48 +393,28 @@ def search_insights():
 
 @insights_bp.route('/insights/embeddings/generate', methods=['POST'])
 @require_auth
+@rate_limited('reindex')
 def generate_insight_embeddings():
-    """Regenerate embeddings for all insights"""
+    """Regenerate embeddings for all insights (or only missing ones if force=false).
+    Runs a resumable job for a bounded time; responds 202 while it isn't
+    finished, and calling again continues it"""
     try:
         force_regenerate = request.args.get('force', 'true').lower() == 'true'
         
-        if force_regenerate:
-            # Get all insights
-            response = supabase.table('insights').select('*').execute()
-            insights_to_update = response.data or []
-        else:
-            # Only get insights without embeddings
-            response = supabase.table('insights').select('*').is_('embedding', 'null').execute()
-            insights_to_update = response.data or []
-        
-        total = len(insights_to_update)
-        updated = 0
-        failed = 0
-        
-        for insight in insights_to_update:
-            try:
-                # Generate embedding from title and content
-                text_to_embed = f"{insight.get('title', '')} {insight.get('content', '')}"
-                embedding = generate_embedding(text_to_embed)
-                
-                if embedding:
-                    # Update the insight with the new embedding
-                    supabase.table('insights').update({
-                        'embedding': embedding
-                    }).eq('id', insight['id']).execute()
-                    updated += 1
-                else:
-                    failed += 1
-            except Exception as e:
-                print(f"Failed to generate embedding for insight {insight['id']}: {str(e)}")
-                failed += 1
+        job, resumed = embedding_jobs.run_for_request('insights', force_regenerate, request.user.user.id)
+        status = embedding_jobs.describe(job)
+        finished = status['status'] == 'completed'
+        total, updated = status['total'], status['processed']
         
         return jsonify({
             'total': total,
             'updated': updated,
-            'failed': failed,
-            'message': f'Successfully updated {updated} out of {total} insights'
-        }), 200
+            'failed': status['failed'],
+            'message': (f'Successfully updated {updated} out of {total} insights' if finished
+                        else f'Updated {updated} out of {total} insights so far; call again to continue'),
+            'resumed': resumed,
+            'job': status,
+        }), 200 if finished else 202
     except Exception as e:
         print(f"Error generating insight embeddings: {str(e)}")
         import traceback
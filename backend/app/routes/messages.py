@@ -1,54 +1,83 @@
+import asyncio
 from flask import Blueprint, request, jsonify
 from app.middleware.auth import require_auth
 from app.supabase_client import supabase
+from app.services import aio, conversations as conversation_members
+from app.services.concurrency import gather
 from datetime import datetime
 
 messages_bp = Blueprint('messages', __name__)
 
+def _check_participant(conversation_id, user_id):
+    """Error response unless the user is in the conversation; participants
+    come from the in-process membership cache when possible"""
+    members = conversation_members.participants(conversation_id)
+    if members is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+    if user_id not in members:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return None
+
 @messages_bp.route('/conversations', methods=['GET'])
 @require_auth
-def get_conversations():
+async def get_conversations():
     """Get all conversations for the current user"""
     try:
         user_id = request.user.user.id
+        client = await aio.supabase()
         
         # Get all conversations where user is either user1 or user2
-        result = supabase.table('conversations').select('*').or_(f'user1_id.eq.{user_id},user2_id.eq.{user_id}').order('updated_at', desc=True).execute()
-        
-        conversations = []
-        for conv in result.data:
-            # Determine the other user
-            other_user_id = conv['user2_id'] if conv['user1_id'] == user_id else conv['user1_id']
-            
-            # Get other user's profile
-            profile_result = supabase.table('profiles').select('id, full_name, profile_picture_url').eq('id', other_user_id).single().execute()
-            
-            # Get last message
-            last_message_result = supabase.table('messages').select('*').eq('conversation_id', conv['id']).order('created_at', desc=True).limit(1).execute()
-            
-            # Count unread messages
-            unread_result = supabase.table('messages').select('id', count='exact').eq('conversation_id', conv['id']).eq('is_read', False).neq('sender_id', user_id).execute()
-            
-            conversation_data = {
-                'id': conv['id'],
-                'other_user': {
-                    'id': profile_result.data['id'],
-                    'name': profile_result.data['full_name'],
-                    'profile_picture_url': profile_result.data.get('profile_picture_url')
-                },
-                'last_message': last_message_result.data[0] if last_message_result.data else None,
-                'unread_count': unread_result.count if unread_result.count else 0,
-                'created_at': conv['created_at'],
-                'updated_at': conv['updated_at']
-            }
-            
-            conversations.append(conversation_data)
+        result = await client.table('conversations').select('*').or_(f'user1_id.eq.{user_id},user2_id.eq.{user_id}').order('updated_at', desc=True).execute()
+        conversation_members.remember(result.data)
+        
+        # Unread counts for every conversation in one call, alongside the
+        # per-conversation lookups
+        if not result.data:
+            return jsonify({'conversations': []}), 200
+        unread_counts, *conversations = await aio.gather(
+            conversation_members.aunread_counts(user_id),
+            *(_conversation_summary(client, conv, user_id) for conv in result.data),
+        )
+        for conversation_data in conversations:
+            conversation_data['unread_count'] = unread_counts.get(conversation_data['id'], 0)
         
         return jsonify({'conversations': conversations}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+async def _conversation_summary(client, conv, user_id):
+    """A conversation list entry with the other user's profile and the last message"""
+    # Determine the other user
+    other_user_id = conv['user2_id'] if conv['user1_id'] == user_id else conv['user1_id']
+    
+    # Get other user's profile
+    profile_query = client.table('profiles').select('id, full_name, profile_picture_url').eq('id', other_user_id).single().execute()
+    
+    # Get last message; bounding created_at by the conversation's
+    # last_message_at reads only that month's messages partition
+    if conv.get('last_message_at'):
+        profile_result, last_message_result = await asyncio.gather(
+            profile_query,
+            client.table('messages').select('*').eq('conversation_id', conv['id']).gte('created_at', conv['last_message_at']).order('created_at', desc=True).limit(1).execute(),
+        )
+        last_message = last_message_result.data[0] if last_message_result.data else None
+    else:
+        profile_result, last_message = await profile_query, None
+    
+    return {
+        'id': conv['id'],
+        'other_user': {
+            'id': profile_result.data['id'],
+            'name': profile_result.data['full_name'],
+            'profile_picture_url': profile_result.data.get('profile_picture_url')
+        },
+        'last_message': last_message,
+        'unread_count': 0,
+        'created_at': conv['created_at'],
+        'updated_at': conv['updated_at']
+    }
+
 @messages_bp.route('/conversations/<other_user_id>', methods=['GET'])
 @require_auth
 def get_or_create_conversation(other_user_id):
@@ -59,33 +88,27 @@ def get_or_create_conversation(other_user_id):
         if user_id == other_user_id:
             return jsonify({'error': 'Cannot create conversation with yourself'}), 400
         
-        # Ensure user1_id < user2_id for consistency
-        user1_id = min(user_id, other_user_id)
-        user2_id = max(user_id, other_user_id)
-        
-        # Try to find existing conversation
-        result = supabase.table('conversations').select('*').eq('user1_id', user1_id).eq('user2_id', user2_id).execute()
+        # Find or create the conversation and fetch the other user's profile
+        # in one call; the unique (user1_id, user2_id) pair settles races
+        result = supabase.rpc('get_or_create_conversation', {
+            'p_user_id': user_id,
+            'p_other_id': other_user_id
+        }).execute()
         
-        if result.data:
-            conversation = result.data[0]
-        else:
-            # Create new conversation
-            create_result = supabase.table('conversations').insert({
-                'user1_id': user1_id,
-                'user2_id': user2_id
-            }).execute()
-            conversation = create_result.data[0]
+        if not result.data:
+            return jsonify({'error': 'User not found'}), 404
         
-        # Get other user's profile
-        profile_result = supabase.table('profiles').select('id, full_name, profile_picture_url').eq('id', other_user_id).single().execute()
+        conversation = result.data['conversation']
+        other_user = result.data['other_user']
+        conversation_members.remember([conversation])
         
         return jsonify({
             'conversation': {
                 'id': conversation['id'],
                 'other_user': {
-                    'id': profile_result.data['id'],
-                    'name': profile_result.data['full_name'],
-                    'profile_picture_url': profile_result.data.get('profile_picture_url')
+                    'id': other_user['id'],
+                    'name': other_user['full_name'],
+                    'profile_picture_url': other_user.get('profile_picture_url')
                 },
                 'created_at': conversation['created_at'],
                 'updated_at': conversation['updated_at']
@@ -103,28 +126,32 @@ def get_messages(conversation_id):
         user_id = request.user.user.id
         
         # Verify user is part of this conversation
-        conv_result = supabase.table('conversations').select('*').eq('id', conversation_id).single().execute()
-        
-        if not conv_result.data:
-            return jsonify({'error': 'Conversation not found'}), 404
-        
-        conversation = conv_result.data
-        if conversation['user1_id'] != user_id and conversation['user2_id'] != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
+        denied = _check_participant(conversation_id, user_id)
+        if denied:
+            return denied
         
         # Get pagination parameters
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
         
-        # Get messages
-        result = supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at', desc=False).range(offset, offset + limit - 1).execute()
-        
-        # Mark messages as read
-        supabase.table('messages').update({'is_read': True}).eq('conversation_id', conversation_id).neq('sender_id', user_id).eq('is_read', False).execute()
+        # Messages can't predate their conversation, so bounding created_at
+        # skips the messages partitions from before it
+        query = supabase.table('messages').select('*').eq('conversation_id', conversation_id)
+        started_at = conversation_members.started_at(conversation_id)
+        if started_at:
+            query = query.gte('created_at', started_at)
+        
+        # Get messages and move the user's read cursor past them (a single-row
+        # upsert, skipped when nothing new arrived)
+        result, cursors = gather(
+            lambda: query.order('created_at', desc=False).range(offset, offset + limit - 1).execute(),
+            lambda: conversation_members.mark_read(conversation_id, user_id),
+        )
+        messages = conversation_members.apply_read_state(result.data, user_id, cursors)
         
         return jsonify({
-            'messages': result.data,
-            'count': len(result.data)
+            'messages': messages,
+            'count': len(messages)
         }), 200
         
     except Exception as e:
@@ -143,14 +170,9 @@ def send_message(conversation_id):
             return jsonify({'error': 'Message content is required'}), 400
         
         # Verify user is part of this conversation
-        conv_result = supabase.table('conversations').select('*').eq('id', conversation_id).single().execute()
-        
-        if not conv_result.data:
-            return jsonify({'error': 'Conversation not found'}), 404
-        
-        conversation = conv_result.data
-        if conversation['user1_id'] != user_id and conversation['user2_id'] != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
+        denied = _check_participant(conversation_id, user_id)
+        if denied:
+            return denied
         
         # Create message
         result = supabase.table('messages').insert({
@@ -172,17 +194,12 @@ def mark_conversation_read(conversation_id):
         user_id = request.user.user.id
         
         # Verify user is part of this conversation
-        conv_result = supabase.table('conversations').select('*').eq('id', conversation_id).single().execute()
-        
-        if not conv_result.data:
-            return jsonify({'error': 'Conversation not found'}), 404
+        denied = _check_participant(conversation_id, user_id)
+        if denied:
+            return denied
         
-        conversation = conv_result.data
-        if conversation['user1_id'] != user_id and conversation['user2_id'] != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
-        
-        # Mark all messages from other user as read
-        supabase.table('messages').update({'is_read': True}).eq('conversation_id', conversation_id).neq('sender_id', user_id).execute()
+        # Move the read cursor to the newest message from the other user
+        conversation_members.mark_read(conversation_id, user_id)
         
         return jsonify({'message': 'Messages marked as read'}), 200
         
@@ -196,19 +213,8 @@ def get_unread_count():
     try:
         user_id = request.user.user.id
         
-        # Get all conversations for user
-        conv_result = supabase.table('conversations').select('id').or_(f'user1_id.eq.{user_id},user2_id.eq.{user_id}').execute()
-        
-        conversation_ids = [conv['id'] for conv in conv_result.data]
-        
-        if not conversation_ids:
-            return jsonify({'unread_count': 0}), 200
-        
-        # Count unread messages across all conversations
-        total_unread = 0
-        for conv_id in conversation_ids:
-            unread_result = supabase.table('messages').select('id', count='exact').eq('conversation_id', conv_id).eq('is_read', False).neq('sender_id', user_id).execute()
-            total_unread += unread_result.count if unread_result.count else 0
+        # Messages after the user's read cursor, across all conversations
+        total_unread = sum(conversation_members.unread_counts(user_id).values())
         
         return jsonify({'unread_count': total_unread}), 200
         
@@ -0,0 +1,24 @@
+import hmac
+import os
+from flask import Blueprint, Response, current_app, request, jsonify
+from app.services.metrics import METRICS_ENABLED, render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request and upstream metrics in Prometheus text format"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+
+    # Shared secret; only a debug (development) server serves metrics without one
+    token = os.getenv('METRICS_TOKEN')
+    if not token and not current_app.debug:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    if token:
+        auth_header = request.headers.get('Authorization', '')
+        provided = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
+        if not hmac.compare_digest(provided.encode(), token.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -1,52 +1,53 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from app.middleware.auth import require_auth
+from app.services import aio
 from app.supabase_client import supabase
+from datetime import datetime
 import traceback
 
 notifications_bp = Blueprint('notifications', __name__)
 
+# Upper bound on ids in one mark-read request
+MARK_READ_MAX_IDS = 500
+
 @notifications_bp.route('/', methods=['GET'])
 @require_auth
-def get_notifications():
+async def get_notifications():
     """Get all notifications for the current user"""
     try:
         user_id = request.user.user.id
+        client = await aio.supabase()
         
         # Get query parameters
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
         
         # Build query - simplified to avoid complex joins
-        query = supabase.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True)
+        query = client.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True)
         
         # Execute query with pagination
-        result = query.range(offset, offset + limit - 1).execute()
+        result = await query.range(offset, offset + limit - 1).execute()
         
         # Format notifications and fetch related profile data
         notifications = []
         for notif in result.data:
-            notification_data = {
+            notifications.append({
                 'id': notif['id'],
                 'type': notif['type'],
                 'message': notif['message'],
-                'created_at': notif['created_at']
-            }
-            
-            # Fetch related user profile if available
-            if notif.get('related_user_id'):
-                try:
-                    profile_result = supabase.table('profiles').select('id, full_name, profile_picture_url').eq('id', notif['related_user_id']).single().execute()
-                    if profile_result.data:
-                        notification_data['related_user'] = {
-                            'id': profile_result.data['id'],
-                            'name': profile_result.data['full_name'],
-                            'profile_picture_url': profile_result.data['profile_picture_url']
-                        }
-                except Exception:
-                    # If profile fetch fails, continue without related user info
-                    pass
-            
-            notifications.append(notification_data)
+                'read': notif.get('read', False),
+                'created_at': notif['created_at'],
+                # Events folded into this notification, and by how many people
+                'event_count': notif.get('event_count') or 1,
+                'actor_count': len(notif.get('actor_ids') or []) or 1
+            })
+        
+        # Related user profiles, fetched concurrently
+        await aio.gather(*(
+            _add_related_user(client, notification_data, notif['related_user_id'])
+            for notif, notification_data in zip(result.data, notifications)
+            if notif.get('related_user_id')
+        ))
         
         return jsonify({
             'notifications': notifications,
@@ -56,7 +57,78 @@ def get_notifications():
     except Exception as e:
         print(f"Error in get_notifications: {str(e)}")
         traceback.print_exc()
-        return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
+        body = {'error': str(e)}
+        if current_app.debug:
+            body['details'] = traceback.format_exc()
+        return jsonify(body), 500
+
+async def _add_related_user(client, notification_data, related_user_id):
+    try:
+        profile_result = await client.table('profiles').select('id, full_name, profile_picture_url').eq('id', related_user_id).single().execute()
+        if profile_result.data:
+            notification_data['related_user'] = {
+                'id': profile_result.data['id'],
+                'name': profile_result.data['full_name'],
+                'profile_picture_url': profile_result.data['profile_picture_url']
+            }
+    except Exception:
+        # If profile fetch fails, continue without related user info
+        pass
+
+@notifications_bp.route('/unread-count', methods=['GET'])
+@require_auth
+def get_unread_count():
+    """Number of unread notifications, from the counter the notifications triggers maintain"""
+    try:
+        user_id = request.user.user.id
+        
+        result = supabase.rpc('notification_unread_count', {'p_user_id': user_id}).execute()
+        
+        return jsonify({'unread_count': result.data or 0}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@notifications_bp.route('/mark-read', methods=['POST'])
+@require_auth
+def mark_notifications_read():
+    """Mark notifications read in one statement: {"ids": [...]}, {"up_to": timestamp}
+    for everything created up to then, or {"all": true}"""
+    try:
+        user_id = request.user.user.id
+        data = request.get_json(silent=True) or {}
+        
+        ids = data.get('ids')
+        up_to = data.get('up_to')
+        if ids is None and up_to is None and data.get('all') is not True:
+            return jsonify({'error': 'Provide ids, up_to or all'}), 400
+        
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+                return jsonify({'error': 'ids must be a list of notification ids'}), 400
+            if len(ids) > MARK_READ_MAX_IDS:
+                return jsonify({'error': f'At most {MARK_READ_MAX_IDS} ids per request'}), 400
+        
+        if up_to is not None:
+            try:
+                datetime.fromisoformat(str(up_to).replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'error': 'up_to must be an ISO 8601 timestamp'}), 400
+        
+        result = supabase.rpc('mark_notifications_read', {
+            'p_user_id': user_id,
+            'p_ids': ids,
+            'p_up_to': up_to
+        }).execute()
+        state = result.data or {}
+        
+        return jsonify({
+            'updated': state.get('updated', 0),
+            'unread_count': state.get('unread_count', 0)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @notifications_bp.route('/<notification_id>', methods=['DELETE'])
 @require_auth
@@ -1,11 +1,30 @@
 import traceback
-import os
-import random
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app.middleware.auth import require_auth
+from app.middleware.rate_limit import rate_limited
 from app.supabase_client import supabase
 from app.services.openrouter_nlp import recommend_profile_ids
-from app.services.embedding_service import generate_embedding, generate_profile_embedding
+from app.services.embedding_service import generate_embedding
+from app.services.field_embeddings import parse_field_weights, profile_embedding_columns, save_profile_fields
+from app.services import embedding_jobs, recommendations
+from app.services.concurrency import gather
+from app.services.vector_index import get_index as get_vector_index
+from app.services.search import (
+    SEARCH_CANDIDATE_COUNT,
+    array_literal,
+    fuzzy_school_profiles,
+    hybrid_search,
+    like_pattern,
+    semantic_weight,
+    similarity_threshold,
+)
+from app.services.projections import (
+    ProjectionError,
+    requested_fields,
+    select_columns,
+    strip_private,
+    trim_fields,
+)
 
 bp = Blueprint('profile', __name__)
 
@@ -15,14 +34,17 @@ def get_profile():
     """Get user profile"""
     try:
         user_id = request.user.user.id
+        fields = requested_fields('profile')
         
-        response = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
+        response = supabase.table('profiles').select(select_columns('profile_full', fields)).eq('id', user_id).single().execute()
         
         if not response.data:
             return jsonify({'error': 'Profile not found'}), 404
         
         return jsonify(response.data), 200
         
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -38,13 +60,16 @@ def create_profile():
         data['id'] = user_id
         
         # Generate embedding for the new profile
-        embedding = generate_profile_embedding(data)
-        if embedding:
-            data['embedding'] = embedding
+        data.update(profile_embedding_columns(data))
         
         response = supabase.table('profiles').insert(data).execute()
+        # Users in the newcomer's industry may now have a better match
+        gather(
+            lambda: save_profile_fields(user_id, data, previous={}),
+            lambda: recommendations.invalidate(segment=recommendations.segment_of(data)),
+        )
         
-        return jsonify(response.data[0]), 201
+        return jsonify(strip_private(response.data[0])), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -59,19 +84,34 @@ def update_profile():
         
         # Generate new embedding for the updated profile
         # First get the existing profile to merge with updates
-        existing_response = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
+        existing_response = supabase.table('profiles').select(select_columns('profile_full')).eq('id', user_id).single().execute()
+        merged_profile = None
         if existing_response.data:
             merged_profile = {**existing_response.data, **data}
-            embedding = generate_profile_embedding(merged_profile)
-            if embedding:
-                data['embedding'] = embedding
-        
-        response = supabase.table('profiles').update(data).eq('id', user_id).execute()
+            # Only fields whose text changed are embedded again
+            data.update(profile_embedding_columns(merged_profile))
+        
+        def write_profile():
+            return supabase.table('profiles').update(data).eq('id', user_id).execute()
+        
+        if merged_profile:
+            # The profile exists, so its field rows can be written alongside it
+            segment = recommendations.segment_of(merged_profile)
+            joined_segment = segment != recommendations.segment_of(existing_response.data)
+            response, _, _ = gather(
+                write_profile,
+                lambda: save_profile_fields(user_id, merged_profile, previous=existing_response.data),
+                lambda: recommendations.invalidate(
+                    [user_id], segment=segment if joined_segment else None
+                ),
+            )
+        else:
+            response = write_profile()
         
         if not response.data:
             return jsonify({'error': 'Profile not found'}), 404
         
-        return jsonify(response.data[0]), 200
+        return jsonify(strip_private(response.data[0])), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -85,6 +125,10 @@ def delete_profile():
         
         response = supabase.table('profiles').delete().eq('id', user_id).execute()
         
+        index = get_vector_index()
+        if index:
+            index.discard(user_id)
+        
         return jsonify({'message': 'Profile deleted successfully'}), 200
         
     except Exception as e:
@@ -92,6 +136,7 @@ def delete_profile():
 
 @bp.route('/search', methods=['GET'])
 @require_auth
+@rate_limited('search')
 def search_profiles():
     """Search and filter profiles by multiple criteria"""
     try:
@@ -102,125 +147,119 @@ def search_profiles():
         school = request.args.get('school', '').strip()
         career_status = request.args.get('career_status', '').strip()
         skills = request.args.getlist('skills')  # Can pass multiple skills
+        try:
+            fields = requested_fields('profile')
+            field_weights = parse_field_weights(request.args.get('field_weights'))
+        except (ProjectionError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        # Filtering below needs the card columns even if the client asked for fewer
+        columns = select_columns('profile_card', fields, keep_projection=True)
         
         print(f"Search params - q:{search_query}, industry:{industry}, location:{location}, school:{school}, career_status:{career_status}, skills:{skills}")
         
-        # Fetch all profiles first to avoid Supabase query issues
-        # Then filter in Python
-        try:
-            response = supabase.table('profiles').select('*').execute()
-            print(f"Fetched {len(response.data) if response.data else 0} profiles from database")
-            profiles = response.data or []
-        except Exception as db_error:
-            print(f"Database query error: {type(db_error).__name__}: {str(db_error)}")
-            # Try a simpler query with limit if full query fails
+        fuzzy_school = request.args.get('fuzzy_school', '').lower() == 'true'
+        
+        def apply_filters(query):
+            # Filters run in Postgres; ILIKE '%x%' uses the trigram indexes
+            if industry:
+                query = query.ilike('industry', like_pattern(industry, partial=False))
+            if location:
+                query = query.ilike('location', like_pattern(location))
+            if school:
+                query = query.ilike('current_school', like_pattern(school))
+            if career_status:
+                query = query.eq('career_status', career_status)
+            if skills:
+                # Contains any of the requested skills
+                query = query.overlaps('skills', array_literal(skills))
+            return query
+        
+        def fetch_profiles():
+            if school and fuzzy_school:
+                # The other filters are applied inside the fuzzy-match RPC
+                try:
+                    profiles = fuzzy_school_profiles(
+                        school, columns,
+                        similarity_threshold(request.args.get('school_similarity')),
+                        industry=industry, location=location,
+                        career_status=career_status, skills=skills,
+                    )
+                except Exception as db_error:
+                    print(f"Fuzzy school query error: {type(db_error).__name__}: {str(db_error)}")
+                    return None, db_error, None
+                school_matches = {p['id']: p.pop('similarity') or 0 for p in profiles}
+                return profiles, None, school_matches
             try:
-                response = supabase.table('profiles').select('*').limit(100).execute()
-                profiles = response.data or []
-                print(f"Fallback query returned {len(profiles)} profiles")
-            except Exception as fallback_error:
-                print(f"Fallback query also failed: {str(fallback_error)}")
-                return jsonify({'error': 'Database query failed', 'details': str(db_error)}), 500
-        
-        # Apply filters in Python
+                query = apply_filters(supabase.table('profiles').select(columns))
+                response = query.execute()
+                print(f"Fetched {len(response.data) if response.data else 0} profiles from database")
+                return response.data or [], None, None
+            except Exception as db_error:
+                print(f"Database query error: {type(db_error).__name__}: {str(db_error)}")
+                # Try a simpler query with limit if full query fails
+                try:
+                    query = apply_filters(supabase.table('profiles').select(columns))
+                    response = query.limit(100).execute()
+                    profiles = response.data or []
+                    print(f"Fallback query returned {len(profiles)} profiles")
+                    return profiles, None, None
+                except Exception as fallback_error:
+                    print(f"Fallback query also failed: {str(fallback_error)}")
+                    return None, db_error, None
+        
+        # The profile fetch and the query embedding are independent, so run them together
+        query_embedding = None
+        if search_query:
+            (profiles, db_error, school_matches), query_embedding = gather(
+                fetch_profiles,
+                lambda: generate_embedding(search_query),
+            )
+        else:
+            profiles, db_error, school_matches = fetch_profiles()
+        
+        if profiles is None:
+            return jsonify({'error': 'Database query failed', 'details': str(db_error)}), 500
+        
         filtered_profiles = profiles
         
-        # Filter by industry (case-insensitive)
-        if industry:
-            industry_lower = industry.lower()
-            filtered_profiles = [
-                p for p in filtered_profiles
-                if (p.get('industry') or '').lower() == industry_lower
-            ]
-        
-        # Filter by location (case-insensitive, partial match)
-        if location:
-            location_lower = location.lower()
-            filtered_profiles = [
-                p for p in filtered_profiles
-                if location_lower in (p.get('location') or '').lower()
-            ]
-        
-        # Filter by school (case-insensitive, partial match)
-        if school:
-            school_lower = school.lower()
-            filtered_profiles = [
-                p for p in filtered_profiles
-                if school_lower in (p.get('current_school') or '').lower()
-            ]
-        
-        # Filter by career status (exact match)
-        if career_status:
-            filtered_profiles = [
-                p for p in filtered_profiles
-                if p.get('career_status') == career_status
-            ]
-        
-        # Filter by skills (contains any)
-        if skills:
-            filtered_profiles = [
-                p for p in filtered_profiles
-                if any(skill in (p.get('skills') or []) for skill in skills)
-            ]
-        
-        # Apply semantic search if query exists - do this first for best relevance ordering
+        # Closest school spellings first unless a search query ranks them below
+        if school_matches:
+            for p in filtered_profiles:
+                p['_school_similarity'] = school_matches.get(p['id'], 0)
+            filtered_profiles.sort(key=lambda p: p['_school_similarity'], reverse=True)
+        
+        # Rank by hybrid full-text + semantic search. Without an embedding the
+        # RPC still ranks lexically in Postgres.
         if search_query:
-            # Generate embedding for the search query
-            query_embedding = generate_embedding(search_query)
-            
-            if query_embedding:
-                try:
-                    # Use Supabase RPC to call the semantic search function
-                    result = supabase.rpc(
-                        'search_profiles_semantic',
-                        {
-                            'query_embedding': query_embedding,
-                            'match_threshold': 0.2,  # Lower threshold for more results
-                            'match_count': 200  # Get more results to have enough after filtering
-                        }
-                    ).execute()
+            try:
+                ranking = hybrid_search(
+                    'profiles',
+                    search_query,
+                    query_embedding,
+                    match_count=200,  # Get more results to have enough after filtering
+                    weight=semantic_weight(request.args.get('semantic_weight')),
+                    field_weights=field_weights,
+                )
+                
+                # Keep profiles that match both the search and the sidebar filters
+                filtered_profiles = [
+                    p for p in filtered_profiles
+                    if p.get('id') in ranking
+                ]
+                filtered_profiles.sort(
+                    key=lambda p: ranking[p['id']]['score'],
+                    reverse=True
+                )
+                
+                # Add scores to each profile for debugging/display
+                for p in filtered_profiles:
+                    p['_similarity'] = ranking[p['id']]['similarity']
+                    p['_score'] = ranking[p['id']]['score']
                     
-                    if result.data:
-                        # Create a map of profile IDs with their similarity scores
-                        similarity_map = {p['id']: p['similarity'] for p in result.data}
-                        semantic_profile_ids = set(similarity_map.keys())
-                        
-                        # Filter to only include profiles that match both:
-                        # 1. Semantic search results (for relevance)
-                        # 2. Sidebar filters (for precision)
-                        filtered_profiles = [
-                            p for p in filtered_profiles
-                            if p.get('id') in semantic_profile_ids
-                        ]
-                        
-                        # Sort by similarity score (highest first) - this ensures relevance ordering
-                        filtered_profiles.sort(
-                            key=lambda p: similarity_map.get(p.get('id'), 0),
-                            reverse=True
-                        )
-                        
-                        # Add similarity score to each profile for debugging/display
-                        for p in filtered_profiles:
-                            p['_similarity'] = similarity_map.get(p.get('id'), 0)
-                    else:
-                        # No semantic matches found
-                        filtered_profiles = []
-                        
-                except Exception as semantic_error:
-                    print(f"Semantic search error: {str(semantic_error)}")
-                    import traceback
-                    traceback.print_exc()
-                    # Fall back to basic text search if semantic search fails
-                    search_lower = search_query.lower()
-                    filtered_profiles = [
-                        p for p in filtered_profiles
-                        if (search_lower in (p.get('full_name') or '').lower() or
-                            search_lower in (p.get('bio') or '').lower() or
-                            search_lower in (p.get('custom_industry') or '').lower() or
-                            search_lower in (p.get('industry') or '').lower())
-                    ]
-            else:
-                # Fall back to basic text search if embedding generation fails
+            except Exception as search_error:
+                print(f"Hybrid search error: {str(search_error)}")
+                traceback.print_exc()
+                # Fall back to basic text search if the search RPC fails
                 search_lower = search_query.lower()
                 filtered_profiles = [
                     p for p in filtered_profiles
@@ -231,7 +270,7 @@ def search_profiles():
                 ]
         
         print(f"Returning {len(filtered_profiles)} filtered profiles")
-        return jsonify(filtered_profiles), 200
+        return jsonify(trim_fields(filtered_profiles, 'profile', fields)), 200
         
     except Exception as e:
         print(f"Search error: {type(e).__name__}: {str(e)}")
@@ -240,50 +279,30 @@ def search_profiles():
 
 @bp.route('/embeddings/generate', methods=['POST'])
 @require_auth
+@rate_limited('reindex')
 def generate_embeddings():
-    """Regenerate embeddings for all profiles (or only missing ones if force=false)"""
+    """Regenerate embeddings for all profiles (or only missing ones if force=false).
+    Runs a resumable job for a bounded time; responds 202 while it isn't
+    finished, and calling again continues it"""
     try:
         # Check if we should regenerate all or only missing embeddings
         force_regenerate = request.args.get('force', 'true').lower() == 'true'
         
-        if force_regenerate:
-            # Get all profiles to regenerate embeddings
-            response = supabase.table('profiles').select('*').execute()
-            profiles_to_update = response.data or []
-            print(f"Regenerating embeddings for all {len(profiles_to_update)} profiles")
-        else:
-            # Only get profiles without embeddings
-            response = supabase.table('profiles').select('*').is_('embedding', 'null').execute()
-            profiles_to_update = response.data or []
-            print(f"Found {len(profiles_to_update)} profiles without embeddings")
-        
-        updated_count = 0
-        failed_count = 0
-        
-        for profile in profiles_to_update:
-            try:
-                embedding = generate_profile_embedding(profile)
-                if embedding:
-                    # Update the profile with the embedding
-                    supabase.table('profiles').update(
-                        {'embedding': embedding}
-                    ).eq('id', profile['id']).execute()
-                    updated_count += 1
-                    print(f"Generated embedding for profile {profile['id']}")
-                else:
-                    failed_count += 1
-                    print(f"Failed to generate embedding for profile {profile['id']}")
-            except Exception as e:
-                failed_count += 1
-                print(f"Error updating profile {profile['id']}: {str(e)}")
+        job, resumed = embedding_jobs.run_for_request('profiles', force_regenerate, request.user.user.id)
+        status = embedding_jobs.describe(job)
+        finished = status['status'] == 'completed'
+        print(f"Embedding job {status['id']}: {status['processed']}/{status['total']} profiles "
+              f"({status['failed']} failed, {status['status']})")
         
         return jsonify({
-            'message': 'Embeddings generated',
-            'updated': updated_count,
-            'failed': failed_count,
-            'total': len(profiles_to_update),
-            'regenerated_all': force_regenerate
-        }), 200
+            'message': 'Embeddings generated' if finished else 'Embedding job in progress; call again to continue',
+            'updated': status['processed'],
+            'failed': status['failed'],
+            'total': status['total'],
+            'regenerated_all': status['mode'] == 'all',
+            'resumed': resumed,
+            'job': status,
+        }), 200 if finished else 202
         
     except Exception as e:
         print(f"Error generating embeddings: {str(e)}")
@@ -292,8 +311,10 @@ def generate_embeddings():
 
 @bp.route('/recommendations', methods=['GET'])
 @require_auth
+@rate_limited('recommendations')
 def get_recommendations():
-    """Recommend profiles based on the current user's profile with AI-generated reasons"""
+    """Recommend profiles based on the current user's profile with AI-generated reasons,
+    served from the precomputed cache when possible"""
     try:
         limit = request.args.get('limit', '5')
         try:
@@ -303,84 +324,131 @@ def get_recommendations():
         limit = max(1, min(limit, 20))
 
         user_id = request.user.user.id
-        user_resp = (
-            supabase.table('profiles')
-            .select('id,full_name,email,location,industry,custom_industry,current_school,career_status,skills,bio,profile_picture_url')
-            .eq('id', user_id)
-            .single()
-            .execute()
-        )
-        if not user_resp.data:
+        result = recommendations.get_recommendations(user_id, limit)
+        if result is None:
             return jsonify({'error': 'Profile not found'}), 404
 
-        # Get list of users the current user is already following
-        follows_resp = (
-            supabase.table('follows')
-            .select('following_id')
-            .eq('follower_id', user_id)
-            .execute()
-        )
-        following_ids = {f['following_id'] for f in (follows_resp.data or [])}
+        return jsonify(result), 200
+    except Exception as e:
+        print(f"Recommendation error: {str(e)}")
+        traceback.print_exc()
+        body = {'error': str(e)}
+        if current_app.debug:
+            body['details'] = traceback.format_exc()
+        return jsonify(body), 500
 
-        candidates_resp = (
-            supabase.table('profiles')
-            .select('id,full_name,email,location,industry,custom_industry,current_school,career_status,skills,bio,profile_picture_url')
-            .neq('id', user_id)
-            .execute()
+@bp.route('/recommendations/stream', methods=['GET'])
+@require_auth
+@rate_limited('recommendations')
+def stream_recommendations():
+    """Recommendations as server-sent events: profiles first, then each
+    AI-generated reason as soon as it is written"""
+    try:
+        limit = request.args.get('limit', '5')
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 5
+        limit = max(1, min(limit, 20))
+
+        user_id = request.user.user.id
+        events = recommendations.stream_events(user_id, limit)
+        if events is None:
+            return jsonify({'error': 'Profile not found'}), 404
+
+        return Response(
+            stream_with_context(events),
+            mimetype='text/event-stream',
+            # Keep proxies from buffering the stream
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
         )
-        candidates = candidates_resp.data or []
-        
-        # Filter out profiles the user is already following
-        candidates = [c for c in candidates if c['id'] not in following_ids]
+    except Exception as e:
+        print(f"Recommendation stream error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<user_id>/similar', methods=['GET'])
+@require_auth
+def get_similar_profiles(user_id):
+    """Profiles whose embeddings are closest to the given profile's"""
+    try:
+        limit = request.args.get('limit', '10')
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, 50))
+        industry = request.args.get('industry', '').strip()
+        career_status = request.args.get('career_status', '').strip()
         
-        if not candidates:
+        index = get_vector_index()
+        profile_vector = index.vector(user_id) if index else None
+        if profile_vector is not None:
+            nearest = index.search(
+                profile_vector,
+                k=limit,
+                industry=industry or None,
+                career_status=career_status or None,
+                exclude={user_id},
+            )[0]
+        else:
+            # Fall back to the semantic search RPC with the stored embedding
+            profile_resp = supabase.table('profiles').select('embedding').eq('id', user_id).execute()
+            if not profile_resp.data:
+                return jsonify({'error': 'Profile not found'}), 404
+            embedding = profile_resp.data[0].get('embedding')
+            if not embedding:
+                return jsonify([]), 200
+            result = supabase.rpc(
+                'search_profiles_semantic_reranked',
+                {
+                    'query_embedding': embedding,
+                    'match_threshold': 0.0,
+                    # Filters are applied afterwards, so fetch extra rows when filtering
+                    'match_count': 200 if (industry or career_status) else limit + 1,
+                    'candidate_count': SEARCH_CANDIDATE_COUNT
+                }
+            ).execute()
+            nearest = [
+                (row['id'], row['similarity'])
+                for row in (result.data or [])
+                if row['id'] != user_id
+                and (not industry or row.get('industry') == industry)
+                and (not career_status or row.get('career_status') == career_status)
+            ][:limit]
+        
+        if not nearest:
             return jsonify([]), 200
-
-        # Use LLM to get recommendations with reasons
-        # If OpenRouter API key is missing, return simple random recommendations
-        api_key = os.environ.get('OPENROUTER_API_KEY')
-        if not api_key:
-            print("Warning: OPENROUTER_API_KEY not set, returning random recommendations")
-            import random
-            result = random.sample(candidates, min(limit, len(candidates)))
-            for profile in result:
-                profile['recommendation_reason'] = "Recommended based on your profile"
-            return jsonify(result), 200
-        
-        from app.services.openrouter_nlp import recommend_profiles_with_reasons
-        recommendations_with_reasons = recommend_profiles_with_reasons(
-            user_resp.data, 
-            candidates, 
-            limit
-        )
         
-        # Map recommendations back to full profile data
-        candidate_map = {c['id']: c for c in candidates}
-        result = []
-        for rec in recommendations_with_reasons:
-            profile_id = rec['id']
-            if profile_id in candidate_map:
-                profile_data = candidate_map[profile_id]
-                profile_data['recommendation_reason'] = rec['reason']
-                result.append(profile_data)
-
-        return jsonify(result), 200
+        similarity_map = dict(nearest)
+        rows = supabase.table('profiles').select(select_columns('profile_card')).in_(
+            'id', list(similarity_map)
+        ).execute().data or []
+        for row in rows:
+            row['_similarity'] = similarity_map[row['id']]
+        rows.sort(key=lambda row: row['_similarity'], reverse=True)
+        
+        return jsonify(rows), 200
+        
     except Exception as e:
-        print(f"Recommendation error: {str(e)}")
+        print(f"Similar profiles error: {str(e)}")
         traceback.print_exc()
-        return jsonify({'error': str(e), 'details': traceback.format_exc()}), 500
+        return jsonify({'error': str(e)}), 500
 
 @bp.route('/<user_id>', methods=['GET'])
 @require_auth
 def get_profile_by_id(user_id):
     """Get a specific user's profile by ID"""
     try:
-        response = supabase.table('profiles').select('*').eq('id', user_id).single().execute()
+        fields = requested_fields('profile')
+        response = supabase.table('profiles').select(select_columns('profile_full', fields)).eq('id', user_id).single().execute()
         
         if not response.data:
             return jsonify({'error': 'Profile not found'}), 404
         
         return jsonify(response.data), 200
         
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
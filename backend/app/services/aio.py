@@ -0,0 +1,166 @@
+"""
+Async views on one persistent event loop per process.
+
+Flask runs `async def` views through ensure_sync, which by default spins up
+a fresh event loop for every request, so no async client could keep its
+connection pool. Here every async view runs instead on a single event loop
+in a background thread, created on first use (after gunicorn forks) and
+shared by all request threads. The async Supabase client and the httpx
+client for OpenRouter live on that loop, and a view fans out with
+asyncio.gather: its upstream calls are multiplexed on the loop rather than
+each holding a pool thread.
+
+Coroutines run in a copy of the request thread's context, so the Flask
+request, the deadline and the metrics trace are visible inside them.
+"""
+import asyncio
+import inspect
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextvars import copy_context
+from functools import wraps
+from typing import Any, Awaitable, Optional
+
+import httpx
+from supabase import AsyncClient, acreate_client
+
+from app.services import deadline
+from app.services.metrics import METRICS_ENABLED, instrument_async_client
+from app.services.query_audit import QUERY_AUDIT_ENABLED
+
+# Connections kept open to OpenRouter from the shared loop
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+# Extra wait past the request deadline, for views to handle their own
+# upstream timeouts before the view itself is cancelled
+ASYNC_VIEW_GRACE = float(os.getenv('ASYNC_VIEW_GRACE', '1'))
+# Awaitables one gather() runs at once, like the sync pool's size
+ASYNC_FANOUT_LIMIT = int(os.getenv('ASYNC_FANOUT_LIMIT', os.getenv('UPSTREAM_POOL_SIZE', '16')))
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+# Created on the loop the first time they're needed
+_supabase: Optional[AsyncClient] = None
+_supabase_lock: Optional[asyncio.Lock] = None
+_http: Optional[httpx.AsyncClient] = None
+
+
+def _reset_after_fork():
+    # The loop thread doesn't survive a fork; the child starts its own
+    global _loop, _loop_thread, _supabase, _supabase_lock, _http
+    _loop = _loop_thread = _supabase = _supabase_lock = _http = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='async-views', daemon=True)
+                thread.start()
+                _loop_thread, _loop = thread, loop
+    return _loop
+
+
+def run(awaitable: Awaitable) -> Any:
+    """Run a coroutine on the shared loop from a request (or any non-loop)
+    thread and return its result, carrying over the caller's context.
+
+    Waits no longer than the request's remaining budget (REQUEST_DEADLINE
+    outside a request) plus ASYNC_VIEW_GRACE; past that the task is
+    cancelled and DeadlineExceeded raised, so a stalled coroutine can't
+    hold the request thread."""
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError('aio.run() called from the event loop; await instead')
+    try:
+        timeout = deadline.remaining(deadline.REQUEST_DEADLINE) + ASYNC_VIEW_GRACE
+    except deadline.DeadlineExceeded:
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    future: Future = Future()
+    context = copy_context()
+    tasks = []
+
+    def start():
+        # Tasks take the context current when they're created
+        task = context.run(loop.create_task, awaitable)
+        tasks.append(task)
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        task.add_done_callback(done)
+
+    def cancel():
+        for task in tasks:
+            task.cancel()
+
+    loop.call_soon_threadsafe(start)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        loop.call_soon_threadsafe(cancel)
+        raise deadline.DeadlineExceeded(f'async view did not finish within {timeout:.1f}s')
+
+
+def ensure_sync(func):
+    """Flask.ensure_sync replacement running async views on the shared loop."""
+    if not inspect.iscoroutinefunction(func):
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return run(func(*args, **kwargs))
+    return wrapper
+
+
+async def gather(*aws: Awaitable, limit: Optional[int] = None) -> list:
+    """asyncio.gather running at most `limit` (ASYNC_FANOUT_LIMIT) of the
+    awaitables at a time, so a long list doesn't open a connection per item."""
+    semaphore = asyncio.Semaphore(limit or ASYNC_FANOUT_LIMIT)
+
+    async def bounded(aw):
+        async with semaphore:
+            return await aw
+    return await asyncio.gather(*(bounded(aw) for aw in aws))
+
+
+async def supabase() -> AsyncClient:
+    """The process's async Supabase client (service key, like the sync one)."""
+    global _supabase, _supabase_lock
+    if _supabase is None:
+        if _supabase_lock is None:
+            _supabase_lock = asyncio.Lock()
+        async with _supabase_lock:
+            if _supabase is None:
+                from app.supabase_client import SUPABASE_KEY, SUPABASE_URL
+                client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+                if METRICS_ENABLED or QUERY_AUDIT_ENABLED:
+                    # Same call recording as the sync client (Server-Timing,
+                    # /api/metrics, the query audit)
+                    client = instrument_async_client(client)
+                _supabase = client
+    return _supabase
+
+
+def http() -> httpx.AsyncClient:
+    """Shared httpx client for OpenRouter calls made from async views."""
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+        ))
+    return _http
@@ -0,0 +1,96 @@
+"""
+Circuit breakers for upstream providers.
+
+A breaker opens after `failure_threshold` consecutive failed or slow calls
+(slower than `slow_call_seconds`). While open, calls are refused at once
+with CircuitOpen so callers go straight to their fallback. After
+`reset_timeout` seconds a single trial call is let through: success closes
+the breaker, failure opens it again. State is per process.
+"""
+import os
+import threading
+import time
+
+from app.services.metrics import BREAKER_REJECTIONS, BREAKER_STATE, BREAKER_TRANSITIONS
+
+_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5,
+                 slow_call_seconds: float = 10.0, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set((name,), 0)
+
+    def _transition(self, state: str):
+        # Caller holds the lock
+        if state == self.state:
+            return
+        self.state = state
+        if state == 'open':
+            self._opened_at = time.monotonic()
+        BREAKER_STATE.set((self.name,), _STATE_VALUES[state])
+        BREAKER_TRANSITIONS.inc((self.name, state))
+        print(f"Circuit breaker {self.name} is now {state}")
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition('half_open')
+            if self.state == 'closed':
+                return
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return
+        BREAKER_REJECTIONS.inc((self.name,))
+        raise CircuitOpen(f'{self.name} circuit is open')
+
+    def record_success(self, duration: float):
+        if duration >= self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self._transition('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self._transition('open')
+            self._trial_running = False
+
+    def call(self, fn, *args, **kwargs):
+        self.before_call()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+
+def breaker_from_env(name: str, prefix: str) -> CircuitBreaker:
+    """Breaker configured by <prefix>_BREAKER_FAILURES / _SLOW_SECONDS / _RESET_SECONDS."""
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv(f'{prefix}_BREAKER_FAILURES', '5')),
+        slow_call_seconds=float(os.getenv(f'{prefix}_BREAKER_SLOW_SECONDS', '10')),
+        reset_timeout=float(os.getenv(f'{prefix}_BREAKER_RESET_SECONDS', '30')),
+    )
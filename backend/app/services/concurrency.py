@@ -0,0 +1,89 @@
+"""
+Shared bounded thread pool for issuing independent upstream calls
+(Supabase, OpenRouter) in parallel from request handlers.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Callable, List, Optional
+
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '16'))
+UPSTREAM_FANOUT_TIMEOUT = float(os.getenv('UPSTREAM_FANOUT_TIMEOUT', '25'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_worker_state = threading.local()
+
+
+class FanoutTimeout(TimeoutError):
+    """Raised when parallel upstream calls miss their deadline."""
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Created lazily so pre-forking servers don't inherit dead worker threads
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=UPSTREAM_POOL_SIZE,
+                    thread_name_prefix='upstream',
+                )
+    return _executor
+
+
+def _run_in_worker(ctx, fn, args, kwargs):
+    _worker_state.active = True
+    try:
+        return ctx.run(fn, *args, **kwargs)
+    finally:
+        _worker_state.active = False
+
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """Run fn on the shared pool, carrying over the caller's context vars
+    (request trace, deadline) so instrumentation keeps working."""
+    if getattr(_worker_state, 'active', False):
+        # Nested fan-out from inside the pool would risk exhausting it; run inline
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+    return get_executor().submit(_run_in_worker, copy_context(), fn, args, kwargs)
+
+
+def gather(*calls: Callable[[], Any], timeout: Optional[float] = None) -> List[Any]:
+    """Run zero-argument callables in parallel and return their results in order.
+
+    The first exception raised by any call is re-raised once it happens and
+    the remaining calls are cancelled if they haven't started. If the
+    deadline passes first, FanoutTimeout is raised.
+    """
+    if not calls:
+        return []
+    if len(calls) == 1:
+        return [calls[0]()]
+
+    timeout = UPSTREAM_FANOUT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    futures = [submit(call) for call in calls]
+
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            for future in pending:
+                future.cancel()
+            raise FanoutTimeout(f'{len(pending)} upstream call(s) exceeded {timeout:.1f}s')
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                raise future.exception()
+
+    return [future.result() for future in futures]
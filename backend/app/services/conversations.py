@@ -0,0 +1,137 @@
+"""
+In-process cache of conversation participants and start times.
+
+The message routes only need a conversation's two participants to
+authorise the caller, and those never change once the conversation
+exists, so they are remembered here (up to CONVERSATION_CACHE_SIZE
+conversations, least recently used dropped first) instead of fetching the
+row on every poll and send. Entries are added lazily on a miss and from
+the conversation list and get-or-create routes. Only conversations that
+exist are cached; a miss always asks the database. The start time bounds
+message queries so they skip the monthly messages partitions from before
+the conversation (see migrations/020_partition_messages.sql).
+
+Read state lives in per-participant cursors (see
+migrations/019_add_conversation_reads.sql); messages' is_read is derived
+from them for the API.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services import aio
+from app.supabase_client import supabase
+
+CONVERSATION_CACHE_SIZE = int(os.getenv('CONVERSATION_CACHE_SIZE', '10000'))
+
+
+class MembershipCache:
+    """conversation id -> (user1_id, user2_id, created_at), bounded LRU."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, Tuple[str, str, Optional[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Optional[Tuple[str, str, Optional[str]]]:
+        with self._lock:
+            members = self._entries.get(conversation_id)
+            if members is not None:
+                self._entries.move_to_end(conversation_id)
+            return members
+
+    def put(self, conversation_id: str, members: Tuple[str, str, Optional[str]]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[conversation_id] = members
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_members = MembershipCache(CONVERSATION_CACHE_SIZE)
+
+
+def remember(conversations: Iterable[dict]):
+    """Cache the participants of conversation rows already fetched."""
+    for conversation in conversations:
+        if conversation.get('user1_id') and conversation.get('user2_id'):
+            _members.put(conversation['id'], (conversation['user1_id'], conversation['user2_id'],
+                                              conversation.get('created_at')))
+
+
+def _entry(conversation_id: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    entry = _members.get(conversation_id)
+    if entry is not None:
+        return entry
+    result = (
+        supabase.table('conversations')
+        .select('id, user1_id, user2_id, created_at')
+        .eq('id', conversation_id)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return None
+    remember(result.data)
+    row = result.data[0]
+    return row['user1_id'], row['user2_id'], row.get('created_at')
+
+
+def participants(conversation_id: str) -> Optional[Tuple[str, str]]:
+    """(user1_id, user2_id) of a conversation, or None if it doesn't exist."""
+    entry = _entry(conversation_id)
+    return entry[:2] if entry else None
+
+
+def started_at(conversation_id: str) -> Optional[str]:
+    """When the conversation was created; none of its messages are older."""
+    entry = _entry(conversation_id)
+    return entry[2] if entry else None
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def mark_read(conversation_id: str, user_id: str) -> dict:
+    """Move the user's read cursor to the newest message they received.
+    Returns the cursors: {last_read_at, previous_read_at, other_last_read_at}."""
+    return supabase.rpc('mark_conversation_read', {
+        'p_conversation_id': conversation_id,
+        'p_user_id': user_id,
+    }).execute().data or {}
+
+
+def apply_read_state(messages: List[dict], user_id: str, cursors: dict) -> List[dict]:
+    """Set is_read on messages from the read cursors: the user's own messages
+    are read once the other participant's cursor reaches them, the others'
+    messages if the user had read them before this request."""
+    own_cursor = _parse_time(cursors.get('other_last_read_at'))
+    their_cursor = _parse_time(cursors.get('previous_read_at'))
+    for message in messages:
+        cursor = own_cursor if message.get('sender_id') == user_id else their_cursor
+        created_at = _parse_time(message.get('created_at'))
+        message['is_read'] = bool(cursor and created_at and created_at <= cursor)
+    return messages
+
+
+def unread_counts(user_id: str) -> Dict[str, int]:
+    """{conversation id: unread messages} for conversations with any."""
+    rows = supabase.rpc('conversation_unread_counts', {'p_user_id': user_id}).execute().data or []
+    return {row['conversation_id']: row['unread_count'] for row in rows}
+
+
+async def aunread_counts(user_id: str) -> Dict[str, int]:
+    """unread_counts on the async client."""
+    client = await aio.supabase()
+    rows = (await client.rpc('conversation_unread_counts', {'p_user_id': user_id}).execute()).data or []
+    return {row['conversation_id']: row['unread_count'] for row in rows}
@@ -0,0 +1,65 @@
+"""
+Per-request time budget for upstream calls.
+
+Each request gets REQUEST_DEADLINE seconds (below Vercel's 30s function
+limit) from app/middleware/deadline.py. Upstream clients size their
+timeouts with remaining(), so a slow provider fails the call in time for
+the route to fall back instead of the whole request being killed. The
+budget lives in a context var, so calls fanned out through
+concurrency.submit share their request's deadline.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '25'))
+# Calls aren't started with less time than this left
+MIN_CALL_BUDGET = float(os.getenv('MIN_CALL_BUDGET', '0.25'))
+
+_deadline: ContextVar = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when too little of the request's budget is left for a call."""
+
+
+def start(seconds: Optional[float] = None):
+    """Start a budget for the current request."""
+    seconds = REQUEST_DEADLINE if seconds is None else seconds
+    return _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+
+def end(token=None):
+    try:
+        if token is not None:
+            _deadline.reset(token)
+            return
+    except ValueError:
+        # Token from another context (e.g. the end of a streamed response)
+        pass
+    _deadline.set(None)
+
+
+@contextmanager
+def budget(seconds: Optional[float]):
+    """Run a block with its own budget; None removes the caller's, e.g. for
+    background work that outlives its request."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(cap: float) -> float:
+    """Seconds a call may take: `cap`, or less if the budget runs out
+    first. Raises DeadlineExceeded when the budget is all but spent."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return cap
+    left = deadline - time.monotonic()
+    if left < MIN_CALL_BUDGET:
+        raise DeadlineExceeded(f'request deadline reached ({max(left, 0):.2f}s left)')
+    return min(cap, left)
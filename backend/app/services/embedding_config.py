@@ -0,0 +1,81 @@
+"""
+Which embedding model/dimensions the stored vectors were built with.
+
+The active config lives in the embedding_configs table (see
+migrations/011_add_embedding_configs.sql) so every worker switches model at
+the same moment a re-index cuts over. It is cached for EMBEDDING_CONFIG_TTL
+seconds. EMBEDDING_MODEL / EMBEDDING_DIMENSIONS are the target for the next
+re-index and the fallback when the table is unavailable.
+"""
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from app.supabase_client import supabase
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'openai/text-embedding-3-small')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '1536'))
+EMBEDDING_CONFIG_TTL = float(os.getenv('EMBEDDING_CONFIG_TTL', '30'))
+
+
+class EmbeddingConfig(NamedTuple):
+    id: Optional[int]
+    model: str
+    dimensions: int
+    status: str = 'active'
+
+
+DEFAULT_CONFIG = EmbeddingConfig(None, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+
+_cache = {'loaded_at': None, 'active': DEFAULT_CONFIG, 'shadow': None}
+_cache_lock = threading.Lock()
+
+
+def _load():
+    try:
+        rows = (
+            supabase.table('embedding_configs')
+            .select('id, model, dimensions, status')
+            .in_('status', ['active', 'backfilling'])
+            .execute()
+        ).data or []
+    except Exception as e:
+        print(f"Could not load embedding config, using defaults: {str(e)}")
+        rows = []
+
+    active, shadow = DEFAULT_CONFIG, None
+    for row in rows:
+        config = EmbeddingConfig(row['id'], row['model'], row['dimensions'], row['status'])
+        if config.status == 'active':
+            active = config
+        else:
+            shadow = config
+    _cache.update(loaded_at=time.monotonic(), active=active, shadow=shadow)
+
+
+def _refresh_if_stale():
+    loaded_at = _cache['loaded_at']
+    if loaded_at is not None and time.monotonic() - loaded_at < EMBEDDING_CONFIG_TTL:
+        return
+    with _cache_lock:
+        loaded_at = _cache['loaded_at']
+        if loaded_at is None or time.monotonic() - loaded_at >= EMBEDDING_CONFIG_TTL:
+            _load()
+
+
+def get_active_config() -> EmbeddingConfig:
+    """Config of the vectors currently searched; queries must match it."""
+    _refresh_if_stale()
+    return _cache['active']
+
+
+def get_shadow_config() -> Optional[EmbeddingConfig]:
+    """Config being backfilled into the shadow columns, if a re-index is running."""
+    _refresh_if_stale()
+    return _cache['shadow']
+
+
+def invalidate():
+    """Force the next lookup to read the table (e.g. right after a cutover)."""
+    _cache['loaded_at'] = None
@@ -0,0 +1,307 @@
+"""
+Resumable re-embedding jobs (see migrations/015_add_embedding_jobs.sql).
+
+A job re-embeds one table, all rows or only those without an embedding,
+in chunks of EMBEDDING_JOB_CHUNK_SIZE rows handed out in id order by the
+claim_embedding_job_chunk RPC. Progress is checkpointed per chunk, so a job
+interrupted by a timeout, a deploy or an embeddings outage picks up where it
+stopped the next time anyone runs it, and any number of workers (CLI
+threads, other processes, HTTP requests) can work on it at once. Each table
+has at most one unfinished job; starting another resumes it.
+
+    flask --app run embeddings reindex --table profiles --workers 4
+
+The /embeddings/generate routes run a job for up to
+EMBEDDING_JOB_REQUEST_BUDGET seconds and report its progress; calling them
+again continues it.
+"""
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.concurrency import gather
+from app.services.embedding_config import EmbeddingConfig, get_active_config, get_shadow_config
+from app.services.embedding_reindex import SOURCE_COLUMNS, embed_rows
+from app.services.field_embeddings import save_profiles_fields
+from app.supabase_client import supabase
+
+EMBEDDING_JOB_CHUNK_SIZE = int(os.getenv('EMBEDDING_JOB_CHUNK_SIZE', '100'))
+# A chunk not completed this long after it was claimed is handed out again
+EMBEDDING_JOB_LEASE_SECONDS = int(os.getenv('EMBEDDING_JOB_LEASE_SECONDS', '120'))
+# How long an /embeddings/generate request works on its job, and with how
+# many workers; chunks aren't started after the budget runs out
+EMBEDDING_JOB_REQUEST_BUDGET = float(os.getenv('EMBEDDING_JOB_REQUEST_BUDGET', '15'))
+EMBEDDING_JOB_REQUEST_WORKERS = int(os.getenv('EMBEDDING_JOB_REQUEST_WORKERS', '2'))
+
+JOB_TABLES = tuple(SOURCE_COLUMNS)
+JOB_MODES = ('all', 'missing')
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+class Chunk(NamedTuple):
+    id: int
+    after_id: Optional[str]
+    through_id: str
+
+
+class ChunkFailed(RuntimeError):
+    """Raised when nothing in a chunk could be embedded, e.g. because the
+    embeddings provider is down; the chunk is handed back unfinished."""
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    response = supabase.table('embedding_jobs').select('*').eq('id', job_id).limit(1).execute()
+    return response.data[0] if response.data else None
+
+
+def list_jobs(table: Optional[str] = None, limit: int = 20) -> List[dict]:
+    query = supabase.table('embedding_jobs').select('*')
+    if table:
+        query = query.eq('table_name', table)
+    return query.order('created_at', desc=True).limit(limit).execute().data or []
+
+
+def active_job(table: str) -> Optional[dict]:
+    response = (
+        supabase.table('embedding_jobs').select('*')
+        .eq('table_name', table)
+        .in_('status', list(ACTIVE_STATUSES))
+        .limit(1)
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+def _count_rows(table: str, mode: str) -> int:
+    query = supabase.table(table).select('id', count='exact')
+    if mode == 'missing':
+        query = query.is_('embedding', 'null')
+    return query.limit(1).execute().count or 0
+
+
+def start_job(table: str, mode: str = 'all', chunk_size: int = EMBEDDING_JOB_CHUNK_SIZE,
+              created_by: Optional[str] = None) -> Tuple[dict, bool]:
+    """(job, resumed): the table's unfinished job if it has one, otherwise a
+    new one."""
+    if table not in JOB_TABLES:
+        raise ValueError(f"Unknown embedding table '{table}'")
+    if mode not in JOB_MODES:
+        raise ValueError(f"Unknown embedding job mode '{mode}'")
+    existing = active_job(table)
+    if existing:
+        return existing, True
+    try:
+        job = supabase.table('embedding_jobs').insert({
+            'table_name': table,
+            'mode': mode,
+            'chunk_size': max(1, chunk_size),
+            'total': _count_rows(table, mode),
+            'created_by': created_by,
+        }).execute().data[0]
+    except Exception:
+        # Lost a race with another start for the same table
+        existing = active_job(table)
+        if existing:
+            return existing, True
+        raise
+    print(f"Started {mode} embedding job {job['id']} for {job['total']} {table} rows")
+    return job, False
+
+
+def cancel_job(job_id: str) -> Optional[dict]:
+    response = (
+        supabase.table('embedding_jobs')
+        .update({'status': 'cancelled', 'finished_at': datetime.now(timezone.utc).isoformat()})
+        .eq('id', job_id)
+        .in_('status', list(ACTIVE_STATUSES))
+        .execute()
+    )
+    return response.data[0] if response.data else get_job(job_id)
+
+
+def claim_chunk(job_id: str, worker: str) -> Optional[Chunk]:
+    rows = supabase.rpc('claim_embedding_job_chunk', {
+        'p_job_id': job_id,
+        'p_worker': worker,
+        'p_lease_seconds': EMBEDDING_JOB_LEASE_SECONDS,
+    }).execute().data or []
+    if not rows:
+        return None
+    return Chunk(rows[0]['chunk_id'], rows[0]['after_id'], rows[0]['through_id'])
+
+
+def complete_chunk(chunk: Chunk, worker: str, processed: int, failed: int):
+    supabase.rpc('complete_embedding_job_chunk', {
+        'p_chunk_id': chunk.id,
+        'p_worker': worker,
+        'p_processed': processed,
+        'p_failed': failed,
+    }).execute()
+
+
+def release_chunk(chunk: Chunk, worker: str):
+    supabase.rpc('release_embedding_job_chunk', {
+        'p_chunk_id': chunk.id,
+        'p_worker': worker,
+    }).execute()
+
+
+def _chunk_rows(job: dict, chunk: Chunk) -> List[dict]:
+    table = job['table_name']
+    query = supabase.table(table).select(SOURCE_COLUMNS[table]).lte('id', chunk.through_id)
+    if chunk.after_id:
+        query = query.gt('id', chunk.after_id)
+    if job['mode'] == 'missing':
+        query = query.is_('embedding', 'null')
+    return query.order('id').execute().data or []
+
+
+def _write_shadow(table: str, rows: List[dict], results: List[tuple], config: EmbeddingConfig):
+    # Keep a backfilling re-index current, like embedding_columns does for app writes
+    batch = [
+        {'id': row['id'], 'embedding': json.dumps(vector) if vector else None}
+        for row, (vector, has_text) in zip(rows, results)
+        if vector is not None or not has_text
+    ]
+    if batch:
+        supabase.rpc('write_embedding_next', {
+            'p_table': table,
+            'p_config_id': config.id,
+            'p_rows': batch,
+        }).execute()
+
+
+def process_chunk(job: dict, chunk: Chunk) -> Tuple[int, int]:
+    """Embed and write the chunk's rows. Returns (processed, failed); rows
+    with nothing to embed count as processed."""
+    table = job['table_name']
+    rows = _chunk_rows(job, chunk)
+    if not rows:
+        return 0, 0
+
+    active = get_active_config()
+    shadow = get_shadow_config()
+    if shadow:
+        results, shadow_results = gather(
+            lambda: embed_rows(table, rows, active),
+            lambda: embed_rows(table, rows, shadow),
+        )
+    else:
+        results, shadow_results = embed_rows(table, rows, active), None
+
+    batch = []
+    failed = 0
+    for row, (vector, has_text) in zip(rows, results):
+        if vector is not None:
+            batch.append({'id': row['id'], 'embedding': json.dumps(vector)})
+        elif has_text:
+            failed += 1
+    if failed and not batch:
+        raise ChunkFailed(f'none of {failed} {table} rows could be embedded')
+
+    calls = []
+    if batch:
+        calls.append(lambda: supabase.rpc('write_embeddings', {
+            'p_table': table,
+            'p_config_id': active.id,
+            'p_rows': batch,
+        }).execute())
+    if table == 'profiles':
+        calls.append(lambda: save_profiles_fields(rows))
+    if shadow:
+        calls.append(lambda: _write_shadow(table, rows, shadow_results, shadow))
+    gather(*calls)
+    return len(rows) - failed, failed
+
+
+def _work(job: dict, stop_at: Optional[float]) -> int:
+    """Claim and process chunks until none are left or time runs out.
+    Returns the number of chunks completed."""
+    worker = str(uuid.uuid4())
+    completed = 0
+    while stop_at is None or time.monotonic() < stop_at:
+        chunk = claim_chunk(job['id'], worker)
+        if chunk is None:
+            break
+        try:
+            processed, failed = process_chunk(job, chunk)
+        except Exception as e:
+            # Leave the chunk for a later run rather than skipping its rows
+            print(f"Embedding job {job['id']} chunk {chunk.id} failed: {str(e)}")
+            release_chunk(chunk, worker)
+            break
+        complete_chunk(chunk, worker, processed, failed)
+        completed += 1
+    return completed
+
+
+def run_job(job_id: str, workers: int = 1, time_budget: Optional[float] = None) -> Optional[dict]:
+    """Work on a job with `workers` threads until it is finished or, with a
+    time budget, until no new chunk should be started. Returns the job."""
+    job = get_job(job_id)
+    if job is None or job['status'] not in ACTIVE_STATUSES:
+        return job
+    stop_at = time.monotonic() + time_budget if time_budget else None
+    workers = max(1, workers)
+    if workers == 1:
+        _work(job, stop_at)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='embedding-job') as pool:
+            # Each worker gets its own copy of the caller's context (deadline, trace)
+            futures = [pool.submit(copy_context().run, _work, job, stop_at) for _ in range(workers)]
+            for future in futures:
+                future.result()
+    return get_job(job_id)
+
+
+def describe(job: dict) -> Dict:
+    """Job progress for API responses: counts, rate and time remaining."""
+    processed = job.get('processed') or 0
+    failed = job.get('failed') or 0
+    total = job.get('total')
+    started_at = _parse_time(job.get('started_at'))
+    ended_at = _parse_time(job.get('finished_at') or job.get('updated_at'))
+
+    rate = None
+    if started_at and ended_at and ended_at > started_at:
+        rate = (processed + failed) / (ended_at - started_at).total_seconds()
+    remaining = max(total - processed - failed, 0) if total is not None else None
+    eta = None
+    if job.get('status') in ACTIVE_STATUSES and rate and remaining is not None:
+        eta = round(remaining / rate, 1)
+
+    return {
+        'id': job['id'],
+        'table': job['table_name'],
+        'mode': job['mode'],
+        'status': job['status'],
+        'total': total,
+        'processed': processed,
+        'failed': failed,
+        'remaining': remaining,
+        'rows_per_second': round(rate, 2) if rate else None,
+        'eta_seconds': eta,
+        'created_at': job.get('created_at'),
+        'started_at': job.get('started_at'),
+        'updated_at': job.get('updated_at'),
+        'finished_at': job.get('finished_at'),
+    }
+
+
+def run_for_request(table: str, force: bool, user_id: Optional[str]) -> Tuple[dict, bool]:
+    """Start or resume the table's job and work on it for the request
+    budget. Returns (job, resumed)."""
+    job, resumed = start_job(table, 'all' if force else 'missing', created_by=user_id)
+    job = run_job(job['id'], EMBEDDING_JOB_REQUEST_WORKERS, EMBEDDING_JOB_REQUEST_BUDGET) or job
+    return job, resumed
@@ -0,0 +1,154 @@
+"""
+Online re-indexing of profile and insight embeddings with a new model or
+dimension count.
+
+The new vectors are written to shadow columns while the live ones keep
+serving searches; writes made by the app during the backfill go to both
+(see embedding_service.embedding_columns). Once every row is tagged with the
+new config, activate_embedding_config swaps the columns in one transaction.
+
+    cd backend
+    EMBEDDING_MODEL=openai/text-embedding-3-large EMBEDDING_DIMENSIONS=1024 \\
+        python -m app.services.embedding_reindex
+
+Re-running the command resumes an interrupted backfill.
+"""
+import argparse
+import json
+from typing import Dict, List, Optional
+
+from app.services.embedding_config import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    EmbeddingConfig,
+    get_active_config,
+    get_shadow_config,
+    invalidate,
+)
+from app.services.embedding_service import generate_embeddings
+from app.services.field_embeddings import field_texts, profile_embeddings
+from app.services.projections import select_columns
+from app.supabase_client import supabase
+
+# Columns each table's embedding text is built from
+SOURCE_COLUMNS = {
+    'profiles': select_columns('profile_card'),
+    'insights': 'id, title, content',
+}
+
+
+def embed_rows(table: str, rows: List[dict], config: EmbeddingConfig) -> List[tuple]:
+    """(vector, has_text) per row. Profiles are combined from their cached
+    field embeddings; insights embed title and content."""
+    if table == 'profiles':
+        vectors = profile_embeddings(rows, config)
+        return [(vector, bool(field_texts(row))) for row, vector in zip(rows, vectors)]
+    texts = [f"{row.get('title', '')} {row.get('content', '')}" for row in rows]
+    vectors = generate_embeddings(texts, config)
+    return [(vector, bool(text.strip())) for text, vector in zip(texts, vectors)]
+
+
+def start_reindex(model: str, dimensions: int) -> EmbeddingConfig:
+    """Register a backfilling config and add its shadow columns."""
+    config_id = supabase.rpc('start_embedding_reindex', {
+        'p_model': model,
+        'p_dimensions': dimensions,
+    }).execute().data
+    invalidate()
+    return EmbeddingConfig(config_id, model, dimensions, 'backfilling')
+
+
+def backfill(config: EmbeddingConfig, table: str, batch_size: int = 100) -> Dict[str, int]:
+    """
+    Embed every row of `table` not yet tagged with `config` into the shadow
+    columns. Rows are walked in id order so rows that fail are skipped
+    rather than retried forever; a later run picks them up again. Each batch
+    is written by one RPC, which leaves updated_at untouched.
+    """
+    written = failed = 0
+    cursor = None
+    while True:
+        query = (
+            supabase.table(table).select(SOURCE_COLUMNS[table])
+            .is_('embedding_next_config_id', 'null')
+            .order('id')
+            .limit(batch_size)
+        )
+        if cursor:
+            query = query.gt('id', cursor)
+        rows = query.execute().data or []
+        if not rows:
+            break
+        cursor = rows[-1]['id']
+
+        batch = []
+        for row, (vector, has_text) in zip(rows, embed_rows(table, rows, config)):
+            if vector is None and has_text:
+                failed += 1
+                continue
+            # Rows with nothing to embed are tagged with a null vector
+            batch.append({'id': row['id'], 'embedding': json.dumps(vector) if vector else None})
+        if batch:
+            written += supabase.rpc('write_embedding_next', {
+                'p_table': table,
+                'p_config_id': config.id,
+                'p_rows': batch,
+            }).execute().data or 0
+        print(f"Re-indexed {written} {table} rows ({failed} failed)")
+    return {'written': written, 'failed': failed}
+
+
+def progress(config: EmbeddingConfig) -> List[dict]:
+    """Per-table total and remaining row counts for a backfilling config."""
+    return supabase.rpc('embedding_reindex_progress', {'p_config_id': config.id}).execute().data or []
+
+
+def cutover(config: EmbeddingConfig):
+    """Swap the shadow columns in; fails if any row is still untagged."""
+    supabase.rpc('activate_embedding_config', {'p_config_id': config.id}).execute()
+    invalidate()
+
+
+def run(model: str, dimensions: int, batch_size: int = 100,
+        activate: bool = True) -> Optional[EmbeddingConfig]:
+    active = get_active_config()
+    if (active.model, active.dimensions) == (model, dimensions):
+        print(f"Embeddings already use {model} ({dimensions} dimensions)")
+        return None
+
+    config = get_shadow_config()
+    if config and (config.model, config.dimensions) != (model, dimensions):
+        raise RuntimeError(
+            f"A re-index to {config.model} ({config.dimensions} dimensions) is already in progress"
+        )
+    if config:
+        print(f"Resuming re-index to {model} ({dimensions} dimensions)")
+    else:
+        config = start_reindex(model, dimensions)
+        print(f"Started re-index to {model} ({dimensions} dimensions)")
+
+    for table in SOURCE_COLUMNS:
+        backfill(config, table, batch_size)
+
+    remaining = sum(row['remaining'] for row in progress(config))
+    if remaining:
+        print(f"{remaining} rows still need embeddings; re-run to retry them")
+    elif activate:
+        cutover(config)
+        print(f"Switched embeddings to {model} ({dimensions} dimensions)")
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--dimensions', type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--no-cutover', action='store_true',
+                        help='backfill only; leave the current embeddings active')
+    args = parser.parse_args(argv)
+    run(args.model, args.dimensions, args.batch_size, activate=not args.no_cutover)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,76 @@
 """
 Embedding service for generating text embeddings using OpenRouter API
 """
+import asyncio
 import os
+import time
 import requests
 from typing import List, Optional
+from app.services import aio, deadline
+from app.services.circuit_breaker import breaker_from_env
+from app.services.concurrency import gather
+from app.services.embedding_config import EmbeddingConfig, get_active_config, get_shadow_config
+from app.services.metrics import timed_upstream
 
 OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
-OPENROUTER_BASE_URL = 'https://openrouter.ai/api/v1'
+OPENROUTER_BASE_URL = os.environ.get('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1').rstrip('/')
+EMBEDDING_TIMEOUT = float(os.environ.get('EMBEDDING_TIMEOUT', '10'))
 
-def generate_embedding(text: str) -> Optional[List[float]]:
+# While open, embeddings fail fast and searches run on keywords alone
+embeddings_breaker = breaker_from_env('openrouter_embeddings', 'EMBEDDING')
+
+def _request_embeddings(inputs, config: EmbeddingConfig) -> list:
+    return embeddings_breaker.call(_post_embeddings, inputs, config, deadline.remaining(EMBEDDING_TIMEOUT))
+
+
+def _embeddings_request(inputs, config: EmbeddingConfig) -> dict:
+    # text-embedding-3 models return shortened vectors when asked for fewer
+    # dimensions, so the configured size is always sent
+    return {
+        'url': f'{OPENROUTER_BASE_URL}/embeddings',
+        'headers': {
+            'Authorization': f'Bearer {OPENROUTER_API_KEY}',
+            'Content-Type': 'application/json',
+            'HTTP-Referer': os.environ.get('APP_URL', 'http://localhost:3000'),
+            'X-Title': 'HackViolet Profile Search'
+        },
+        'json': {
+            'model': config.model,
+            'input': inputs,
+            'dimensions': config.dimensions
+        },
+    }
+
+
+def _post_embeddings(inputs, config: EmbeddingConfig, timeout: float) -> list:
+    response = requests.post(**_embeddings_request(inputs, config), timeout=timeout)
+    response.raise_for_status()
+    return response.json().get('data') or []
+
+
+async def _apost_embeddings(inputs, config: EmbeddingConfig) -> list:
+    # Same request through the breaker, on the shared async httpx client
+    embeddings_breaker.before_call()
+    started = time.monotonic()
+    try:
+        response = await aio.http().post(
+            **_embeddings_request(inputs, config), timeout=deadline.remaining(EMBEDDING_TIMEOUT))
+        response.raise_for_status()
+    except Exception:
+        embeddings_breaker.record_failure()
+        raise
+    embeddings_breaker.record_success(time.monotonic() - started)
+    return response.json().get('data') or []
+
+
+@timed_upstream('openrouter', 'embeddings')
+def generate_embedding(text: str, config: Optional[EmbeddingConfig] = None) -> Optional[List[float]]:
     """
     Generate an embedding vector for the given text using OpenRouter.
     
     Args:
         text: The text to generate an embedding for
+        config: Model and dimensions to use; defaults to the active config
         
     Returns:
         A list of floats representing the embedding vector, or None if failed
@@ -26,28 +83,10 @@ def generate_embedding(text: str) -> Optional[List[float]]:
         return None
     
     try:
-        # Use text-embedding-3-small model (1536 dimensions)
-        # OpenRouter routes to OpenAI's embedding models
-        response = requests.post(
-            f'{OPENROUTER_BASE_URL}/embeddings',
-            headers={
-                'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-                'Content-Type': 'application/json',
-                'HTTP-Referer': os.environ.get('APP_URL', 'http://localhost:3000'),
-                'X-Title': 'HackViolet Profile Search'
-            },
-            json={
-                'model': 'openai/text-embedding-3-small',
-                'input': text.strip()
-            },
-            timeout=10
-        )
+        data = _request_embeddings(text.strip(), config or get_active_config())
         
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'data' in data and len(data['data']) > 0:
-            return data['data'][0]['embedding']
+        if len(data) > 0:
+            return data[0]['embedding']
         
         return None
         
@@ -59,101 +98,76 @@ def generate_embedding(text: str) -> Optional[List[float]]:
         return None
 
 
-def generate_profile_text(profile: dict) -> str:
-    """
-    Generate a text representation of a profile for embedding generation.
-    Important fields (location, industry, school, career status) are repeated 
-    multiple times to give them more weight in semantic matching.
-    
-    Args:
-        profile: Profile dictionary with user information
-        
-    Returns:
-        A concatenated string representation of the profile
-    """
-    parts = []
-    
-    # Add full name
-    if profile.get('full_name'):
-        parts.append(f"Name: {profile['full_name']}")
-    
-    # Add location multiple times for better matching (HIGH WEIGHT)
-    if profile.get('location'):
-        location = profile['location']
-        parts.append(f"Location: {location}")
-        parts.append(f"Based in {location}")
-        parts.append(f"From {location}")
-        parts.append(f"Lives in {location}")
-        parts.append(f"{location} resident")
-    
-    # Add industry multiple times (HIGH WEIGHT)
-    industry = profile.get('custom_industry') or profile.get('industry')
-    if industry:
-        parts.append(f"Industry: {industry}")
-        parts.append(f"Works in {industry}")
-        parts.append(f"{industry} professional")
-        parts.append(f"Career in {industry}")
-        parts.append(f"Job: {industry}")
+@timed_upstream('openrouter', 'embeddings')
+async def agenerate_embedding(text: str, config: Optional[EmbeddingConfig] = None) -> Optional[List[float]]:
+    """generate_embedding for async views, without blocking the event loop."""
+    if not OPENROUTER_API_KEY:
+        print("Warning: OPENROUTER_API_KEY not set")
+        return None
     
-    # Add school multiple times (HIGH WEIGHT)
-    if profile.get('current_school'):
-        school = profile['current_school']
-        parts.append(f"School: {school}")
-        parts.append(f"Studies at {school}")
-        parts.append(f"Attends {school}")
-        parts.append(f"{school} student")
-        parts.append(f"College: {school}")
+    if not text or not text.strip():
+        return None
     
-    # Add career status multiple times (HIGH WEIGHT)
-    if profile.get('career_status'):
-        status_map = {
-            'in_industry': 'Currently in Industry',
-            'seeking_opportunities': 'Seeking Opportunities',
-            'student': 'Student',
-            'career_break': 'Career Break'
-        }
-        status_text = status_map.get(profile['career_status'], profile['career_status'])
-        parts.append(f"Career Status: {status_text}")
-        parts.append(f"Status: {status_text}")
-        
-        # Add contextual variations
-        if profile['career_status'] == 'in_industry':
-            parts.append("Currently employed in industry")
-            parts.append("Working professional")
-        elif profile['career_status'] == 'seeking_opportunities':
-            parts.append("Looking for job opportunities")
-            parts.append("Open to new opportunities")
-        elif profile['career_status'] == 'student':
-            parts.append("Currently studying")
-            parts.append("Full-time student")
-        elif profile['career_status'] == 'career_break':
-            parts.append("On career break")
-            parts.append("Taking time off")
+    try:
+        # The config lookup can hit the database when its cache is stale
+        config = config or await asyncio.to_thread(get_active_config)
+        data = await _apost_embeddings(text.strip(), config)
+        return data[0]['embedding'] if data else None
+    except Exception as e:
+        print(f"Error generating embedding: {str(e)}")
+        return None
+
+
+@timed_upstream('openrouter', 'embeddings')
+def generate_embeddings(texts: List[str], config: Optional[EmbeddingConfig] = None) -> List[Optional[List[float]]]:
+    """
+    Generate embeddings for several texts in one request.
     
-    # Add bio (single mention, lower weight)
-    if profile.get('bio'):
-        parts.append(f"Bio: {profile['bio']}")
+    Returns one entry per input text, None for blank texts or on failure.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    if not OPENROUTER_API_KEY:
+        print("Warning: OPENROUTER_API_KEY not set")
+        return results
     
-    # Add skills (single mention, lower weight)
-    if profile.get('skills') and isinstance(profile['skills'], list):
-        skills_text = ', '.join(profile['skills'])
-        parts.append(f"Skills: {skills_text}")
+    positions = [i for i, text in enumerate(texts) if text and text.strip()]
+    if not positions:
+        return results
     
-    return '. '.join(parts)
+    try:
+        data = _request_embeddings([texts[i].strip() for i in positions], config or get_active_config())
+        for item in data:
+            results[positions[item['index']]] = item['embedding']
+    except requests.exceptions.RequestException as e:
+        print(f"Error generating embeddings: {str(e)}")
+    except Exception as e:
+        print(f"Unexpected error generating embeddings: {str(e)}")
+    return results
 
 
-def generate_profile_embedding(profile: dict) -> Optional[List[float]]:
+def embedding_columns(text: str) -> dict:
     """
-    Generate an embedding for a profile.
+    Embedding columns to write for a row whose embedding source is `text`.
     
-    Args:
-        profile: Profile dictionary
-        
-    Returns:
-        Embedding vector or None if failed
+    Includes the config tag, and while a re-index is backfilling also the
+    shadow-column embedding so rows written mid-backfill aren't missed.
     """
-    profile_text = generate_profile_text(profile)
-    if not profile_text:
-        return None
+    active = get_active_config()
+    shadow = get_shadow_config()
+    if shadow:
+        embedding, shadow_embedding = gather(
+            lambda: generate_embedding(text, active),
+            lambda: generate_embedding(text, shadow),
+        )
+    else:
+        embedding, shadow_embedding = generate_embedding(text, active), None
     
-    return generate_embedding(profile_text)
+    columns = {}
+    if embedding:
+        columns['embedding'] = embedding
+        if active.id is not None:
+            columns['embedding_config_id'] = active.id
+    if shadow and (shadow_embedding or not (text or '').strip()):
+        columns['embedding_next'] = shadow_embedding
+        columns['embedding_next_config_id'] = shadow.id
+    return columns
@@ -0,0 +1,298 @@
+"""
+Field-level profile embeddings (see migrations/012_add_profile_field_embeddings.sql).
+
+Each of PROFILE_FIELDS is embedded on its own and cached in
+field_embeddings by a hash of the field text, so unchanged fields and
+values shared between profiles are never re-embedded. A profile's combined
+`embedding` is the weighted mean of its field vectors, computed here.
+
+Cached vectors no profile uses any more (and those of retired embedding
+configs) are removed by prune_cache (migrations/021_prune_field_embeddings.sql).
+Run it daily:
+
+    flask --app run embeddings prune-fields
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from app.services.concurrency import gather, submit
+from app.services.embedding_config import EmbeddingConfig, get_active_config, get_shadow_config
+from app.services.embedding_service import generate_embeddings
+from app.supabase_client import supabase
+
+PROFILE_FIELDS = ('location', 'industry', 'school', 'skills', 'bio')
+# Hashes per cache lookup, keeping the in.(...) query string short
+HASH_LOOKUP_CHUNK = 50
+# Unreferenced vectors are kept this long, since a new vector is cached
+# before the profile row pointing at it is written
+FIELD_EMBEDDING_PRUNE_AGE_HOURS = int(os.getenv('FIELD_EMBEDDING_PRUNE_AGE_HOURS', '24'))
+FIELD_EMBEDDING_PRUNE_BATCH_SIZE = int(os.getenv('FIELD_EMBEDDING_PRUNE_BATCH_SIZE', '5000'))
+
+
+def parse_field_weights(raw: Optional[str]) -> Optional[Dict[str, float]]:
+    """Parse 'location:2,bio:0.5' into {field: weight}.
+
+    Fields left out weigh 1 and a weight of 0 ignores the field. Raises
+    ValueError for unknown fields or bad numbers.
+    """
+    if not raw or not raw.strip():
+        return None
+    weights = {}
+    for part in raw.split(','):
+        if not part.strip():
+            continue
+        field, _, value = part.partition(':')
+        field = field.strip()
+        if field not in PROFILE_FIELDS:
+            raise ValueError(f"Unknown profile field '{field}'")
+        try:
+            weight = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid weight for '{field}'")
+        if weight < 0:
+            raise ValueError(f"Invalid weight for '{field}'")
+        weights[field] = weight
+    return weights
+
+
+# Weights of the stored combined embedding. The defaults keep the emphasis
+# the repeated-phrase profile text used to give location, industry and school.
+PROFILE_FIELD_WEIGHTS = {field: 1.0 for field in PROFILE_FIELDS}
+PROFILE_FIELD_WEIGHTS.update(parse_field_weights(
+    os.getenv('PROFILE_FIELD_WEIGHTS', 'location:2,industry:2,school:2,skills:1,bio:1')
+) or {})
+
+
+def field_texts(profile: dict) -> Dict[str, str]:
+    """The text embedded for each non-empty field of a profile."""
+    texts = {}
+    if profile.get('location'):
+        texts['location'] = f"Location: {profile['location']}"
+    industry = profile.get('custom_industry') or profile.get('industry')
+    if industry:
+        texts['industry'] = f"Industry: {industry}"
+    if profile.get('current_school'):
+        texts['school'] = f"School: {profile['current_school']}"
+    if profile.get('skills') and isinstance(profile['skills'], list):
+        texts['skills'] = f"Skills: {', '.join(profile['skills'])}"
+    if profile.get('bio'):
+        texts['bio'] = f"Bio: {profile['bio']}"
+    return {field: text for field, text in texts.items() if text.strip()}
+
+
+def text_hash(field: str, text: str) -> str:
+    return hashlib.sha256(f'{field}\n{text.strip()}'.encode('utf-8')).hexdigest()
+
+
+def _cached_vectors(hashes: List[str], config: EmbeddingConfig) -> Dict[str, List[float]]:
+    if config.id is None or not hashes:
+        return {}
+    chunks = [hashes[i:i + HASH_LOOKUP_CHUNK] for i in range(0, len(hashes), HASH_LOOKUP_CHUNK)]
+    responses = gather(*[
+        (lambda chunk=chunk: supabase.table('field_embeddings')
+            .select('text_hash, embedding')
+            .eq('embedding_config_id', config.id)
+            .in_('text_hash', chunk)
+            .execute())
+        for chunk in chunks
+    ])
+    cached = {}
+    for response in responses:
+        for row in response.data or []:
+            embedding = row['embedding']
+            cached[row['text_hash']] = json.loads(embedding) if isinstance(embedding, str) else embedding
+    return cached
+
+
+def _field_vectors(texts_by_hash: Dict[str, tuple], config: EmbeddingConfig) -> Dict[str, List[float]]:
+    """Vectors for {hash: (field, text)}, embedding only the cache misses."""
+    try:
+        vectors = _cached_vectors(list(texts_by_hash), config)
+    except Exception as e:
+        print(f"Field embedding cache lookup failed: {str(e)}")
+        vectors = {}
+
+    missing = [h for h in texts_by_hash if h not in vectors]
+    if not missing:
+        return vectors
+    embedded = generate_embeddings([texts_by_hash[h][1] for h in missing], config)
+    new_rows = []
+    for h, vector in zip(missing, embedded):
+        if vector is None:
+            continue
+        vectors[h] = vector
+        if config.id is not None:
+            new_rows.append({
+                'text_hash': h,
+                'embedding_config_id': config.id,
+                'field': texts_by_hash[h][0],
+                'embedding': vector,
+            })
+    if new_rows:
+        # Only the cache depends on this write, so it doesn't hold up the caller
+        submit(_store_field_vectors, new_rows)
+    return vectors
+
+
+def _store_field_vectors(rows: List[dict]):
+    try:
+        supabase.table('field_embeddings').upsert(
+            rows, on_conflict='text_hash,embedding_config_id'
+        ).execute()
+    except Exception as e:
+        print(f"Error caching field embeddings: {str(e)}")
+
+
+def combine(vectors: Dict[str, List[float]],
+            weights: Optional[Dict[str, float]] = None) -> Optional[List[float]]:
+    """Weighted mean of unit field vectors, normalised to unit length."""
+    weights = weights or PROFILE_FIELD_WEIGHTS
+    combined = None
+    for field, vector in vectors.items():
+        weight = weights.get(field, 1.0)
+        norm = sum(v * v for v in vector) ** 0.5
+        if not weight or not norm:
+            continue
+        scale = weight / norm
+        if combined is None:
+            combined = [v * scale for v in vector]
+        else:
+            combined = [c + v * scale for c, v in zip(combined, vector)]
+    if combined is None:
+        return None
+    norm = sum(v * v for v in combined) ** 0.5
+    return [v / norm for v in combined] if norm else None
+
+
+def profile_embeddings(profiles: List[dict], config: Optional[EmbeddingConfig] = None) -> List[Optional[List[float]]]:
+    """Combined embeddings for several profiles with one cache lookup and at
+    most one embedding request. None for profiles with no embeddable fields
+    or whose fields failed to embed."""
+    config = config or get_active_config()
+    per_profile = [field_texts(profile) for profile in profiles]
+    texts_by_hash = {
+        text_hash(field, text): (field, text)
+        for texts in per_profile for field, text in texts.items()
+    }
+    vectors = _field_vectors(texts_by_hash, config) if texts_by_hash else {}
+
+    results = []
+    for texts in per_profile:
+        field_vectors = {}
+        for field, text in texts.items():
+            vector = vectors.get(text_hash(field, text))
+            if vector is None:
+                field_vectors = {}
+                break
+            field_vectors[field] = vector
+        results.append(combine(field_vectors) if field_vectors else None)
+    return results
+
+
+def profile_embedding_columns(profile: dict) -> dict:
+    """Embedding columns to write for a profile, including the shadow
+    columns while a re-index is backfilling (see embedding_columns)."""
+    active = get_active_config()
+    shadow = get_shadow_config()
+    if shadow:
+        (embedding,), (shadow_embedding,) = gather(
+            lambda: profile_embeddings([profile], active),
+            lambda: profile_embeddings([profile], shadow),
+        )
+    else:
+        embedding, shadow_embedding = profile_embeddings([profile], active)[0], None
+
+    columns = {}
+    if embedding:
+        columns['embedding'] = embedding
+        if active.id is not None:
+            columns['embedding_config_id'] = active.id
+    if shadow and (shadow_embedding or not field_texts(profile)):
+        columns['embedding_next'] = shadow_embedding
+        columns['embedding_next_config_id'] = shadow.id
+    return columns
+
+
+def save_profile_fields(profile_id: str, profile: dict, previous: Optional[dict] = None):
+    """Point the profile's field rows at its current field texts. Call after
+    the profile row is written. With the previous profile, only fields that
+    changed are written."""
+    texts = field_texts(profile)
+    before = field_texts(previous) if previous is not None else {}
+    rows = [
+        {'profile_id': profile_id, 'field': field, 'text_hash': text_hash(field, text)}
+        for field, text in texts.items()
+        if previous is None or before.get(field) != text
+    ]
+    cleared = [
+        field for field in PROFILE_FIELDS
+        if field not in texts and (previous is None or field in before)
+    ]
+    calls = []
+    if rows:
+        calls.append(lambda: supabase.table('profile_field_embeddings').upsert(
+            rows, on_conflict='profile_id,field'
+        ).execute())
+    if cleared:
+        calls.append(lambda: supabase.table('profile_field_embeddings').delete()
+                     .eq('profile_id', profile_id).in_('field', cleared).execute())
+    gather(*calls)
+
+
+def save_profiles_fields(profiles: List[dict]):
+    """save_profile_fields for a batch of profiles: one upsert, plus one
+    delete per field some of them no longer have."""
+    rows = []
+    cleared: Dict[str, List[str]] = {}
+    for profile in profiles:
+        texts = field_texts(profile)
+        rows.extend(
+            {'profile_id': profile['id'], 'field': field, 'text_hash': text_hash(field, text)}
+            for field, text in texts.items()
+        )
+        for field in PROFILE_FIELDS:
+            if field not in texts:
+                cleared.setdefault(field, []).append(profile['id'])
+    calls = []
+    if rows:
+        calls.append(lambda: supabase.table('profile_field_embeddings').upsert(
+            rows, on_conflict='profile_id,field'
+        ).execute())
+    for field, profile_ids in cleared.items():
+        calls.append(lambda field=field, profile_ids=profile_ids: supabase.table('profile_field_embeddings')
+                     .delete().eq('field', field).in_('profile_id', profile_ids).execute())
+    gather(*calls)
+
+
+def weighted_profile_matches(query_embedding: List[float], weights: Dict[str, float],
+                             match_count: int, match_threshold: float) -> List[tuple]:
+    """[(profile id, similarity)] ranked by per-field similarity under
+    `weights`, best first."""
+    result = supabase.rpc('search_profiles_weighted', {
+        'query_embedding': query_embedding,
+        'field_weights': weights,
+        'match_threshold': match_threshold,
+        'match_count': match_count,
+    }).execute()
+    return [(row['id'], row.get('similarity') or 0) for row in result.data or []]
+
+
+def prune_cache(older_than_hours: int = FIELD_EMBEDDING_PRUNE_AGE_HOURS,
+                batch_size: int = FIELD_EMBEDDING_PRUNE_BATCH_SIZE,
+                max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Remove unreferenced cached field vectors one batch (one short
+    transaction) at a time until none are left, or after max_batches."""
+    pruned = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = supabase.rpc('prune_field_embeddings', {
+            'p_older_than': f'{older_than_hours} hours',
+            'p_batch_size': batch_size,
+        }).execute().data or 0
+        pruned += count
+        batches += 1
+        print(f"Pruned {pruned} cached field embeddings")
+        if count < batch_size:
+            break
+    return {'pruned': pruned, 'batches': batches}
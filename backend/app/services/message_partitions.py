@@ -0,0 +1,37 @@
+"""
+Monthly messages partitions (see migrations/020_partition_messages.sql).
+
+Partitions for the next MESSAGE_PARTITIONS_AHEAD months are created ahead
+of time, so inserts never land in messages_default, and months older than
+MESSAGE_RETENTION_MONTHS (0 keeps everything) are detached: moved to the
+MESSAGE_ARCHIVE_SCHEMA schema, or dropped if that is empty. Run it daily:
+
+    flask --app run messages partitions
+"""
+import os
+from typing import Dict, Optional
+
+from app.supabase_client import supabase
+
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv('MESSAGE_PARTITIONS_AHEAD', '3'))
+MESSAGE_RETENTION_MONTHS = int(os.getenv('MESSAGE_RETENTION_MONTHS', '24'))
+MESSAGE_ARCHIVE_SCHEMA = os.getenv('MESSAGE_ARCHIVE_SCHEMA', 'archive')
+
+
+def maintain(months_ahead: int = MESSAGE_PARTITIONS_AHEAD,
+             retention_months: int = MESSAGE_RETENTION_MONTHS,
+             archive_schema: Optional[str] = MESSAGE_ARCHIVE_SCHEMA) -> Dict[str, object]:
+    """Create the coming months' partitions and detach those past retention."""
+    created = supabase.rpc('create_message_partitions', {
+        'p_months_ahead': months_ahead,
+    }).execute().data or 0
+    print(f"Created {created} messages partitions")
+
+    detached = []
+    if retention_months > 0:
+        detached = supabase.rpc('detach_message_partitions', {
+            'p_older_than': f'{retention_months} months',
+            'p_archive_schema': archive_schema or None,
+        }).execute().data or []
+        print(f"Detached {len(detached)} messages partitions")
+    return {'created': created, 'detached': detached}
@@ -0,0 +1,535 @@
+"""
+Request-scoped instrumentation for upstream calls (Supabase, OpenRouter)
+and a small in-process Prometheus metrics registry.
+
+Enable with METRICS_ENABLED=1. When disabled, nothing is wrapped and the
+decorators return the original functions unchanged.
+
+Each worker process keeps its own registry. With METRICS_MULTIPROC_DIR set
+(gunicorn.conf.py sets it), every process writes its values there each
+METRICS_FLUSH_SECONDS and /api/metrics serves them merged: counters and
+histograms summed over all processes, including exited ones, gauges the
+highest among live ones.
+"""
+import atexit
+import inspect
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '').strip() == '1'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace: ContextVar = ContextVar('request_trace', default=None)
+
+# Callables invoked as hook(trace, operation, builder) before each Supabase call
+_call_hooks = []
+
+
+class Histogram:
+    """Cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._series[labels] = series
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    @staticmethod
+    def merge(into: dict, labels: tuple, series: list):
+        current = into.get(labels)
+        into[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values: Optional[dict] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        items = (self.snapshot() if values is None else values).items()
+        for labels, series in sorted(items):
+            base = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_with_label(base, "le", repr(bound))} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_with_label(base, "le", "+Inf")} {cumulative}')
+            lines.append(f'{self.name}_sum{base} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into: dict, labels: tuple, value: float):
+        into[labels] = into.get(labels, 0) + value
+
+    def render(self, values: Optional[dict] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        items = sorted((self.snapshot() if values is None else values).items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {value:g}')
+        return lines
+
+
+class Gauge:
+    """Last-set value keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into: dict, labels: tuple, value: float):
+        into[labels] = max(into.get(labels, value), value)
+
+    def render(self, values: Optional[dict] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        items = sorted((self.snapshot() if values is None else values).items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {value:g}')
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def _with_label(base: str, name: str, value: str) -> str:
+    extra = f'{name}="{value}"'
+    return '{' + extra + '}' if not base else base[:-1] + ',' + extra + '}'
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Flask request latency by route',
+    ('method', 'route', 'status'),
+)
+UPSTREAM_CALLS = Counter(
+    'upstream_calls_total',
+    'Calls made to upstream services',
+    ('service', 'operation', 'outcome'),
+)
+UPSTREAM_DURATION = Histogram(
+    'upstream_call_duration_seconds',
+    'Latency of upstream calls',
+    ('service', 'operation'),
+)
+
+BREAKER_STATE = Gauge(
+    'circuit_breaker_state',
+    'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ('breaker',),
+)
+BREAKER_TRANSITIONS = Counter(
+    'circuit_breaker_transitions_total',
+    'Circuit breaker state changes',
+    ('breaker', 'state'),
+)
+BREAKER_REJECTIONS = Counter(
+    'circuit_breaker_rejections_total',
+    'Calls refused because the circuit was open',
+    ('breaker',),
+)
+LLM_OUTCOMES = Counter(
+    'llm_feature_outcomes_total',
+    'LLM-backed feature calls answered by the LLM ("llm") or by the deterministic fallback (the reason)',
+    ('operation', 'outcome'),
+)
+LLM_HEDGES = Counter(
+    'llm_hedged_requests_total',
+    'Hedged OpenRouter requests by which attempt answered first',
+    ('winner',),
+)
+
+RATE_LIMITED = Counter(
+    'rate_limited_requests_total',
+    'Requests refused with 429 by route class and the limit hit',
+    ('route_class', 'scope'),
+)
+
+REGISTRY = [
+    REQUEST_DURATION, UPSTREAM_CALLS, UPSTREAM_DURATION,
+    BREAKER_STATE, BREAKER_TRANSITIONS, BREAKER_REJECTIONS, LLM_OUTCOMES, LLM_HEDGES,
+    RATE_LIMITED,
+]
+
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '').strip()
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f'metrics-{pid}.json')
+
+
+def flush():
+    """Write this process's values to METRICS_MULTIPROC_DIR."""
+    data = {
+        metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+        for metric in REGISTRY
+    }
+    path = _snapshot_path(os.getpid())
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(data, fh)
+    os.replace(path + '.tmp', path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {str(e)}")
+
+
+def start_flusher():
+    """Start this process's snapshot writer; a no-op after the first call
+    in a process, and without METRICS_MULTIPROC_DIR."""
+    global _flusher_pid
+    if not METRICS_MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+        atexit.register(flush)
+        _flusher_pid = os.getpid()
+
+
+def _merged_snapshots() -> Dict[str, dict]:
+    merged = {metric.name: {} for metric in REGISTRY}
+    # Processes rewrite their file every flush; older gauge values are
+    # from processes that have exited
+    live_since = time.time() - 3 * METRICS_FLUSH_SECONDS
+    for name in os.listdir(METRICS_MULTIPROC_DIR):
+        if not (name.startswith('metrics-') and name.endswith('.json')):
+            continue
+        path = os.path.join(METRICS_MULTIPROC_DIR, name)
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+            live = os.path.getmtime(path) >= live_since
+        except (OSError, ValueError):
+            continue
+        for metric in REGISTRY:
+            if isinstance(metric, Gauge) and not live:
+                continue
+            for labels, value in data.get(metric.name, []):
+                metric.merge(merged[metric.name], tuple(labels), value)
+    return merged
+
+
+def render_prometheus() -> str:
+    merged = None
+    if METRICS_MULTIPROC_DIR:
+        flush()
+        merged = _merged_snapshots()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(None if merged is None else merged[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTrace:
+    """Upstream calls made while serving one request."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.calls: List[Tuple[str, str, float]] = []
+        self.queries: List[Tuple[str, list]] = []
+        self._lock = threading.Lock()
+
+    def record(self, service: str, operation: str, duration: float):
+        with self._lock:
+            self.calls.append((service, operation, duration))
+
+    def record_query(self, shape: str, call_site: list):
+        with self._lock:
+            self.queries.append((shape, call_site))
+
+    def totals(self) -> Dict[str, Tuple[int, float]]:
+        totals: Dict[str, Tuple[int, float]] = {}
+        with self._lock:
+            calls = list(self.calls)
+        for service, _operation, duration in calls:
+            count, total = totals.get(service, (0, 0.0))
+            totals[service] = (count + 1, total + duration)
+        return totals
+
+
+def start_trace(route: str) -> RequestTrace:
+    trace = _current_trace.get()
+    if trace is None:
+        trace = RequestTrace(route)
+        _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def end_trace():
+    _current_trace.set(None)
+
+
+def record_upstream(service: str, operation: str, duration: float, ok: bool = True):
+    UPSTREAM_CALLS.inc((service, operation, 'ok' if ok else 'error'))
+    UPSTREAM_DURATION.observe((service, operation), duration)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(service, operation, duration)
+
+
+def add_call_hook(hook):
+    """Register a callable run before every instrumented Supabase call."""
+    _call_hooks.append(hook)
+
+
+def _run_call_hooks(operation: str, builder):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    for hook in _call_hooks:
+        hook(trace, operation, builder)
+
+
+def timed_upstream(service: str, operation: str):
+    """Decorator that records a function call as an upstream call.
+
+    Returns the function untouched when metrics are disabled.
+    """
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                ok = False
+                try:
+                    result = await fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    record_upstream(service, operation, time.perf_counter() - started, ok)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                record_upstream(service, operation, time.perf_counter() - started, ok)
+        return wrapper
+    return decorator
+
+
+class _BuilderProxy:
+    """Wraps a postgrest request builder so that execute() is timed."""
+
+    def __init__(self, builder, operation: str):
+        self._builder = builder
+        self._operation = operation
+
+    def execute(self, *args, **kwargs):
+        if _call_hooks:
+            _run_call_hooks(self._operation, self._builder)
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = self._builder.execute(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            record_upstream('supabase', self._operation, time.perf_counter() - started, ok)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return _BuilderProxy(result, self._operation)
+            return result
+        return chained
+
+
+class _AuthProxy:
+    def __init__(self, auth):
+        self._auth = auth
+
+    def __getattr__(self, name):
+        attr = getattr(self._auth, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if _call_hooks:
+                _run_call_hooks(f'auth:{name}', None)
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = attr(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                record_upstream('supabase', f'auth:{name}', time.perf_counter() - started, ok)
+        return call
+
+
+class InstrumentedClient:
+    """Drop-in wrapper around a supabase Client that records every call."""
+
+    def __init__(self, client):
+        self._client = client
+        self.auth = _AuthProxy(client.auth)
+
+    def table(self, table_name: str):
+        return _BuilderProxy(self._client.table(table_name), f'table:{table_name}')
+
+    def from_(self, table_name: str):
+        return self.table(table_name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs):
+        return _BuilderProxy(self._client.rpc(fn, params or {}, *args, **kwargs), f'rpc:{fn}')
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    return InstrumentedClient(client)
+
+
+async def _timed_call(awaitable, operation: str):
+    started = time.perf_counter()
+    ok = False
+    try:
+        result = await awaitable
+        ok = True
+        return result
+    finally:
+        record_upstream('supabase', operation, time.perf_counter() - started, ok)
+
+
+class _AsyncBuilderProxy(_BuilderProxy):
+    """_BuilderProxy for the async client's builders. The hooks run when
+    execute() is called, so the query audit sees the view's frames even
+    when the call is then gathered into a task of its own."""
+
+    def execute(self, *args, **kwargs):
+        if _call_hooks:
+            _run_call_hooks(self._operation, self._builder)
+        return _timed_call(self._builder.execute(*args, **kwargs), self._operation)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return _AsyncBuilderProxy(result, self._operation)
+            return result
+        return chained
+
+
+class _AsyncAuthProxy(_AuthProxy):
+    def __getattr__(self, name):
+        attr = getattr(self._auth, name)
+        if not inspect.iscoroutinefunction(attr):
+            return super().__getattr__(name)
+
+        def call(*args, **kwargs):
+            if _call_hooks:
+                _run_call_hooks(f'auth:{name}', None)
+            return _timed_call(attr(*args, **kwargs), f'auth:{name}')
+        return call
+
+
+class AsyncInstrumentedClient(InstrumentedClient):
+    """InstrumentedClient for a supabase AsyncClient."""
+
+    def __init__(self, client):
+        self._client = client
+        self.auth = _AsyncAuthProxy(client.auth)
+
+    def table(self, table_name: str):
+        return _AsyncBuilderProxy(self._client.table(table_name), f'table:{table_name}')
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs):
+        return _AsyncBuilderProxy(self._client.rpc(fn, params or {}, *args, **kwargs), f'rpc:{fn}')
+
+
+def instrument_async_client(client):
+    return AsyncInstrumentedClient(client)
@@ -0,0 +1,40 @@
+"""
+Notification retention (see migrations/017_add_notification_coalescing.sql).
+
+Read notifications older than NOTIFICATION_RETENTION_READ_DAYS, and any
+older than NOTIFICATION_RETENTION_UNREAD_DAYS (0 keeps unread ones), are
+removed in batches by the purge_notifications RPC, or moved to
+notifications_archive with archive=True. Run it daily:
+
+    flask --app run notifications purge
+"""
+import os
+from typing import Dict, Optional
+
+from app.supabase_client import supabase
+
+NOTIFICATION_RETENTION_READ_DAYS = int(os.getenv('NOTIFICATION_RETENTION_READ_DAYS', '30'))
+NOTIFICATION_RETENTION_UNREAD_DAYS = int(os.getenv('NOTIFICATION_RETENTION_UNREAD_DAYS', '180'))
+NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv('NOTIFICATION_PURGE_BATCH_SIZE', '1000'))
+
+
+def purge(read_days: int = NOTIFICATION_RETENTION_READ_DAYS,
+          unread_days: Optional[int] = NOTIFICATION_RETENTION_UNREAD_DAYS,
+          batch_size: int = NOTIFICATION_PURGE_BATCH_SIZE,
+          archive: bool = False, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Purge notifications past retention one batch (one short transaction)
+    at a time until none are left, or after max_batches."""
+    purged = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = supabase.rpc('purge_notifications', {
+            'p_read_older_than': f'{read_days} days',
+            'p_unread_older_than': f'{unread_days} days' if unread_days else None,
+            'p_batch_size': batch_size,
+            'p_archive': archive,
+        }).execute().data or 0
+        purged += count
+        batches += 1
+        print(f"{'Archived' if archive else 'Purged'} {purged} notifications")
+        if count < batch_size:
+            break
+    return {'purged': purged, 'batches': batches}
@@ -1,9 +1,30 @@
 import json
 import os
+import threading
+import time
 import urllib.error
 import urllib.request
-
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Iterator, Optional
+
+from app.services import deadline
+from app.services.circuit_breaker import CircuitOpen, breaker_from_env
+from app.services.metrics import LLM_HEDGES, LLM_OUTCOMES, METRICS_ENABLED, record_upstream, timed_upstream
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+OPENROUTER_API_URL = f"{OPENROUTER_BASE_URL}/chat/completions"
+# Longest a chat completion may take; the request deadline can shorten it
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "20"))
+# Send a second identical request when the first hasn't answered after this
+# many seconds and use whichever answers first (0 disables hedging)
+OPENROUTER_HEDGE_AFTER = float(os.getenv("OPENROUTER_HEDGE_AFTER", "0"))
+
+# Opens after OPENROUTER_BREAKER_FAILURES consecutive failed or slow calls
+chat_breaker = breaker_from_env("openrouter_chat", "OPENROUTER")
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
 INDUSTRY_OPTIONS = [
     "Software Engineering",
     "Data Science",
@@ -75,7 +96,7 @@ def _build_prompt(query: str) -> str:
     )
 
 
-def _post_openrouter(payload: dict, api_key: str, app_url: str, app_name: str) -> dict:
+def _openrouter_request(payload: dict, api_key: str, app_url: str, app_name: str) -> urllib.request.Request:
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -85,15 +106,17 @@ def _post_openrouter(payload: dict, api_key: str, app_url: str, app_name: str) -
     if app_name:
         headers["X-Title"] = app_name
 
-    req = urllib.request.Request(
+    return urllib.request.Request(
         OPENROUTER_API_URL,
         data=json.dumps(payload).encode("utf-8"),
         headers=headers,
         method="POST",
     )
 
+
+def _send(req: urllib.request.Request, timeout: float) -> dict:
     try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
             body = resp.read().decode("utf-8")
     except urllib.error.HTTPError as exc:
         error_body = exc.read().decode("utf-8") if exc.fp else ""
@@ -104,6 +127,128 @@ def _post_openrouter(payload: dict, api_key: str, app_url: str, app_name: str) -
     return json.loads(body)
 
 
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    # Separate from the shared upstream pool, where nested submits run inline
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("OPENROUTER_HEDGE_POOL_SIZE", "8")),
+                    thread_name_prefix="openrouter-hedge",
+                )
+    return _hedge_executor
+
+
+def _send_hedged(req: urllib.request.Request, timeout: float) -> dict:
+    """_send, plus a duplicate request if the first is slower than
+    OPENROUTER_HEDGE_AFTER. The first successful answer wins."""
+    executor = _get_hedge_executor()
+    started = time.monotonic()
+    primary = executor.submit(copy_context().run, _send, req, timeout)
+    done, _ = wait([primary], timeout=OPENROUTER_HEDGE_AFTER)
+    if done:
+        return primary.result()
+
+    hedge = executor.submit(copy_context().run, _send, req, timeout - (time.monotonic() - started))
+    attempts = {primary: "primary", hedge: "hedge"}
+    pending = set(attempts)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(timeout - (time.monotonic() - started), 0),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"OpenRouter did not answer within {timeout:.1f}s")
+        for future in done:
+            if future.exception() is None:
+                LLM_HEDGES.inc((attempts[future],))
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+@timed_upstream("openrouter", "chat_completions")
+def _post_openrouter(payload: dict, api_key: str, app_url: str, app_name: str) -> dict:
+    """Chat completion bounded by the request deadline. Raises CircuitOpen
+    without calling out while the provider is failing."""
+    timeout = deadline.remaining(OPENROUTER_TIMEOUT)
+    req = _openrouter_request(payload, api_key, app_url, app_name)
+    if 0 < OPENROUTER_HEDGE_AFTER < timeout:
+        return chat_breaker.call(_send_hedged, req, timeout)
+    return chat_breaker.call(_send, req, timeout)
+
+
+def _stream_openrouter(payload: dict, api_key: str, app_url: str, app_name: str) -> Iterator[str]:
+    """Run a streamed chat completion and yield content deltas as they
+    arrive. The breaker judges the call by its time to the first delta."""
+    timeout = deadline.remaining(OPENROUTER_TIMEOUT)
+    req = _openrouter_request({**payload, "stream": True}, api_key, app_url, app_name)
+    chat_breaker.before_call()
+    started = time.perf_counter()
+    settled = ok = False
+    try:
+        try:
+            resp = urllib.request.urlopen(req, timeout=timeout)
+        except urllib.error.HTTPError as exc:
+            error_body = exc.read().decode("utf-8") if exc.fp else ""
+            raise RuntimeError(f"OpenRouter HTTP {exc.code}: {error_body}") from exc
+        except urllib.error.URLError as exc:
+            raise RuntimeError(f"OpenRouter request failed: {exc}") from exc
+
+        with resp:
+            for raw in resp:
+                line = raw.decode("utf-8").strip()
+                # Skip blank lines and keep-alive comments
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise RuntimeError(f"OpenRouter stream error: {chunk['error']}")
+                delta = (
+                    chunk.get("choices", [{}])[0]
+                    .get("delta", {})
+                    .get("content")
+                )
+                if delta:
+                    if not settled:
+                        settled = True
+                        chat_breaker.record_success(time.perf_counter() - started)
+                    yield delta
+        ok = True
+    finally:
+        if not settled:
+            # Failed, or abandoned before any content arrived
+            if ok:
+                chat_breaker.record_success(time.perf_counter() - started)
+            else:
+                chat_breaker.record_failure()
+        if METRICS_ENABLED:
+            record_upstream("openrouter", "chat_completions_stream", time.perf_counter() - started, ok)
+
+
+def _record_outcome(operation: str, error: Optional[Exception] = None):
+    """Count an LLM-backed call as answered by the LLM, or by the fallback
+    with the reason taken from `error`."""
+    if error is None:
+        outcome = "llm"
+    elif isinstance(error, CircuitOpen):
+        outcome = "circuit_open"
+    elif isinstance(error, TimeoutError) or isinstance(error.__cause__, TimeoutError) \
+            or isinstance(getattr(error.__cause__, "reason", None), TimeoutError):
+        outcome = "timeout"
+    elif isinstance(error, ValueError):
+        outcome = "invalid_response"
+    else:
+        outcome = "error"
+    LLM_OUTCOMES.inc((operation, outcome))
+    if error is not None:
+        print(f"{operation} falling back ({outcome}): {str(error)}")
+    return outcome
+
+
 def _extract_json(content: str) -> dict:
     try:
         return json.loads(content)
@@ -170,7 +315,11 @@ def parse_search_query(query: str) -> dict:
     }
     if os.getenv("OPENROUTER_JSON_MODE", "").strip() == "1":
         payload["response_format"] = {"type": "json_object"}
-    data = _post_openrouter(payload, api_key, app_url, app_name)
+    try:
+        data = _post_openrouter(payload, api_key, app_url, app_name)
+    except Exception as e:
+        _record_outcome("parse_search_query", e)
+        return _fallback_parse(query)
     content = (
         data.get("choices", [{}])[0]
         .get("message", {})
@@ -180,10 +329,13 @@ def parse_search_query(query: str) -> dict:
     if not isinstance(content, str):
         content = json.dumps(content)
     if not content.strip():
+        _record_outcome("parse_search_query", ValueError("Empty OpenRouter response"))
         return _fallback_parse(query)
 
     try:
-        return _extract_json(content)
+        parsed = _extract_json(content)
+        _record_outcome("parse_search_query")
+        return parsed
     except json.JSONDecodeError:
         repair_payload = {
             "model": model,
@@ -202,20 +354,24 @@ def parse_search_query(query: str) -> dict:
             "temperature": 0,
             "max_tokens": 300,
         }
-        repair_data = _post_openrouter(repair_payload, api_key, app_url, app_name)
-        repair_content = (
-            repair_data.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "")
-        )
-        if not isinstance(repair_content, str):
-            repair_content = json.dumps(repair_content)
-        if not repair_content.strip():
-            return _fallback_parse(query)
         try:
-            return _extract_json(repair_content)
-        except json.JSONDecodeError:
+            # Only made if the first call left enough of the request's budget
+            repair_data = _post_openrouter(repair_payload, api_key, app_url, app_name)
+            repair_content = (
+                repair_data.get("choices", [{}])[0]
+                .get("message", {})
+                .get("content", "")
+            )
+            if not isinstance(repair_content, str):
+                repair_content = json.dumps(repair_content)
+            if not repair_content.strip():
+                raise ValueError("Empty OpenRouter response")
+            parsed = _extract_json(repair_content)
+        except Exception as e:
+            _record_outcome("parse_search_query", e)
             return _fallback_parse(query)
+        _record_outcome("parse_search_query")
+        return parsed
 
 
 def _prepare_profile_summary(profile: dict) -> dict:
@@ -253,6 +409,40 @@ def _score_profile(user_profile: dict, candidate: dict) -> int:
     return score
 
 
+def rank_candidates(user_profile: dict, candidates: list[dict]) -> list[dict]:
+    """Candidates ordered by the rule-based match score, best first."""
+    return sorted(candidates, key=lambda p: _score_profile(user_profile, p), reverse=True)
+
+
+def _basic_reason(user_profile: dict, candidate: dict) -> str:
+    """A specific reason built from shared attributes, used without the LLM."""
+    reasons = []
+    if user_profile.get('current_school') and candidate.get('current_school'):
+        if user_profile['current_school'].lower() == candidate['current_school'].lower():
+            reasons.append(f"You both study at {candidate['current_school']}")
+
+    user_ind = (user_profile.get('custom_industry') or user_profile.get('industry') or '').strip()
+    cand_ind = (candidate.get('custom_industry') or candidate.get('industry') or '').strip()
+    if user_ind and cand_ind and user_ind.lower() == cand_ind.lower():
+        reasons.append(f"You're both in {cand_ind}")
+
+    user_skills = set([s.lower() for s in (user_profile.get('skills') or [])])
+    cand_skills = set([s.lower() for s in (candidate.get('skills') or [])])
+    common_skills = user_skills.intersection(cand_skills)
+    if common_skills:
+        skill_list = list(common_skills)[:2]
+        reasons.append(f"You both have skills in {' and '.join(skill_list)}")
+
+    return ". ".join(reasons) if reasons else "Has a compatible professional profile"
+
+
+def _basic_recommendations(user_profile: dict, candidates: list[dict], limit: int) -> list[dict]:
+    return [
+        {"id": c["id"], "reason": _basic_reason(user_profile, c)}
+        for c in rank_candidates(user_profile, candidates)[:limit]
+    ]
+
+
 def recommend_profile_ids(user_profile: dict, candidates: list[dict]) -> list[str]:
     api_key = os.getenv("OPENROUTER_API_KEY")
     model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
@@ -264,7 +454,7 @@ def recommend_profile_ids(user_profile: dict, candidates: list[dict]) -> list[st
         return []
 
     if not api_key:
-        return [c["id"] for c in sorted(candidates, key=lambda p: _score_profile(user_profile, p), reverse=True)]
+        return [c["id"] for c in rank_candidates(user_profile, candidates)]
 
     user_summary = _prepare_profile_summary(user_profile)
     candidate_summaries = [_prepare_profile_summary(c) for c in candidates]
@@ -309,59 +499,17 @@ def recommend_profile_ids(user_profile: dict, candidates: list[dict]) -> list[st
             raise ValueError("Invalid ranked_ids")
         valid = {c["id"] for c in candidates}
         filtered = [rid for rid in ranked_ids if rid in valid]
-        if filtered:
-            return filtered
-    except Exception:
-        pass
+        if not filtered:
+            raise ValueError("No valid ranked_ids")
+        _record_outcome("recommend_profile_ids")
+        return filtered
+    except Exception as e:
+        _record_outcome("recommend_profile_ids", e)
 
-    return [c["id"] for c in sorted(candidates, key=lambda p: _score_profile(user_profile, p), reverse=True)]
+    return [c["id"] for c in rank_candidates(user_profile, candidates)]
 
 
-def recommend_profiles_with_reasons(user_profile: dict, candidates: list[dict], limit: int = 5) -> list[dict]:
-    """Generate profile recommendations with explanations using LLM.
-    
-    Returns list of dicts with 'id' and 'reason' keys.
-    """
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
-    app_url = os.getenv("OPENROUTER_APP_URL", "")
-    app_name = os.getenv("OPENROUTER_APP_NAME", "Aurelia")
-
-    # Limit candidates to reasonable number for LLM context
-    candidates = candidates[:30]
-    if not candidates:
-        return []
-
-    # Fallback to simple scoring if no API key
-    if not api_key:
-        sorted_candidates = sorted(candidates, key=lambda p: _score_profile(user_profile, p), reverse=True)
-        results = []
-        for c in sorted_candidates[:limit]:
-            # Generate a basic specific reason
-            reasons = []
-            if user_profile.get('current_school') and c.get('current_school'):
-                if user_profile['current_school'].lower() == c['current_school'].lower():
-                    reasons.append(f"You both study at {c['current_school']}")
-            
-            user_ind = (user_profile.get('custom_industry') or user_profile.get('industry') or '').strip()
-            cand_ind = (c.get('custom_industry') or c.get('industry') or '').strip()
-            if user_ind and cand_ind and user_ind.lower() == cand_ind.lower():
-                reasons.append(f"You're both in {cand_ind}")
-            
-            user_skills = set([s.lower() for s in (user_profile.get('skills') or [])])
-            cand_skills = set([s.lower() for s in (c.get('skills') or [])])
-            common_skills = user_skills.intersection(cand_skills)
-            if common_skills:
-                skill_list = list(common_skills)[:2]
-                reasons.append(f"You both have skills in {' and '.join(skill_list)}")
-            
-            reason_text = ". ".join(reasons) if reasons else "Has a compatible professional profile"
-            results.append({
-                "id": c["id"],
-                "reason": reason_text
-            })
-        return results
-
+def _recommendation_payload(user_profile: dict, candidates: list[dict], limit: int, model: str) -> dict:
     user_summary = _prepare_profile_summary(user_profile)
     candidate_summaries = [_prepare_profile_summary(c) for c in candidates]
 
@@ -395,6 +543,29 @@ def recommend_profiles_with_reasons(user_profile: dict, candidates: list[dict],
     }
     if os.getenv("OPENROUTER_JSON_MODE", "").strip() == "1":
         payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def recommend_profiles_with_reasons(user_profile: dict, candidates: list[dict], limit: int = 5) -> list[dict]:
+    """Generate profile recommendations with explanations using LLM.
+    
+    Returns list of dicts with 'id' and 'reason' keys.
+    """
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
+    app_url = os.getenv("OPENROUTER_APP_URL", "")
+    app_name = os.getenv("OPENROUTER_APP_NAME", "Aurelia")
+
+    # Limit candidates to reasonable number for LLM context
+    candidates = candidates[:30]
+    if not candidates:
+        return []
+
+    # Fallback to simple scoring if no API key
+    if not api_key:
+        return _basic_recommendations(user_profile, candidates, limit)
+
+    payload = _recommendation_payload(user_profile, candidates, limit, model)
 
     try:
         data = _post_openrouter(payload, api_key, app_url, app_name)
@@ -424,39 +595,80 @@ def recommend_profiles_with_reasons(user_profile: dict, candidates: list[dict],
                     "reason": rec["reason"]
                 })
         
-        if filtered_recs:
-            return filtered_recs[:limit]
+        if not filtered_recs:
+            raise ValueError("No valid recommendations")
+        _record_outcome("recommend_profiles_with_reasons")
+        return filtered_recs[:limit]
             
     except Exception as e:
-        print(f"LLM recommendation error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        if _record_outcome("recommend_profiles_with_reasons", e) == "error":
+            import traceback
+            traceback.print_exc()
 
     # Fallback to simple scoring
-    sorted_candidates = sorted(candidates, key=lambda p: _score_profile(user_profile, p), reverse=True)
-    results = []
-    for c in sorted_candidates[:limit]:
-        # Generate a basic specific reason
-        reasons = []
-        if user_profile.get('current_school') and c.get('current_school'):
-            if user_profile['current_school'].lower() == c['current_school'].lower():
-                reasons.append(f"You both study at {c['current_school']}")
-        
-        user_ind = (user_profile.get('custom_industry') or user_profile.get('industry') or '').strip()
-        cand_ind = (c.get('custom_industry') or c.get('industry') or '').strip()
-        if user_ind and cand_ind and user_ind.lower() == cand_ind.lower():
-            reasons.append(f"You're both in {cand_ind}")
-        
-        user_skills = set([s.lower() for s in (user_profile.get('skills') or [])])
-        cand_skills = set([s.lower() for s in (c.get('skills') or [])])
-        common_skills = user_skills.intersection(cand_skills)
-        if common_skills:
-            skill_list = list(common_skills)[:2]
-            reasons.append(f"You both have skills in {' and '.join(skill_list)}")
-        
-        reason_text = ". ".join(reasons) if reasons else "Has a compatible professional profile"
-        results.append({
-            "id": c["id"],
-            "reason": reason_text
-        })
-    return results
+    return _basic_recommendations(user_profile, candidates, limit)
+
+
+class _RecommendationStreamParser:
+    """Pulls complete {"id", "reason"} objects out of a
+    {"recommendations": [...]} document while it is still being written."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None
+        self.done = False
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text: str) -> list[dict]:
+        self.buffer += text
+        items = []
+        if self.pos is None:
+            key = self.buffer.find('"recommendations"')
+            bracket = self.buffer.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return items
+            self.pos = bracket + 1
+        while not self.done:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos >= len(self.buffer):
+                break
+            if self.buffer[self.pos] == "]":
+                self.done = True
+                break
+            try:
+                item, self.pos = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The object isn't complete yet
+                break
+            if isinstance(item, dict):
+                items.append(item)
+        return items
+
+
+def stream_recommendation_reasons(user_profile: dict, profiles: list[dict]) -> Iterator[dict]:
+    """Yield {'id', 'reason'} for each of the already chosen `profiles` as
+    soon as the LLM has written its reason. Profiles it skips, or all of
+    them if the call fails, get the rule-based reason at the end."""
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
+    app_url = os.getenv("OPENROUTER_APP_URL", "")
+    app_name = os.getenv("OPENROUTER_APP_NAME", "Aurelia")
+
+    pending = {p["id"]: p for p in profiles}
+    if api_key and profiles:
+        payload = _recommendation_payload(user_profile, profiles, len(profiles), model)
+        parser = _RecommendationStreamParser()
+        try:
+            for delta in _stream_openrouter(payload, api_key, app_url, app_name):
+                for rec in parser.feed(delta):
+                    profile_id, reason = rec.get("id"), rec.get("reason")
+                    if profile_id in pending and isinstance(reason, str) and reason.strip():
+                        del pending[profile_id]
+                        yield {"id": profile_id, "reason": reason}
+            _record_outcome("stream_recommendation_reasons")
+        except Exception as e:
+            _record_outcome("stream_recommendation_reasons", e)
+
+    for profile_id, profile in pending.items():
+        yield {"id": profile_id, "reason": _basic_reason(user_profile, profile)}
@@ -0,0 +1,103 @@
+"""
+Central registry of the columns each route sends to clients.
+
+Routes select one of the named projections instead of '*', so large
+internal columns (the 1536-float `embedding` vectors) never leave the
+server. Clients can narrow a response further with ?fields=a,b,c.
+"""
+from typing import Iterable, List, Optional
+
+from flask import request
+
+# Columns that must never be returned to a client
+PRIVATE_COLUMNS = {
+    'embedding', 'embedding_half', 'embedding_next', 'embedding_half_next',
+    'embedding_retired', 'embedding_half_retired',
+}
+
+PROJECTIONS = {
+    'profile_card': (
+        'id', 'full_name', 'location', 'industry', 'custom_industry',
+        'current_school', 'career_status', 'skills', 'bio', 'profile_picture_url',
+    ),
+    'profile_full': (
+        'id', 'email', 'full_name', 'phone', 'location', 'industry', 'custom_industry',
+        'current_school', 'career_status', 'bio', 'skills', 'linkedin_url', 'github_url',
+        'portfolio_url', 'profile_picture_url', 'resume_filename', 'resume_filepath',
+        'resume_uploaded_at', 'created_at', 'updated_at',
+    ),
+    'profile_author': ('full_name', 'profile_picture_url'),
+    'insight_card': (
+        'id', 'user_id', 'title', 'content', 'link_url', 'link_title',
+        'created_at', 'updated_at',
+    ),
+}
+
+# Every column a client may ask for through ?fields=, per resource
+RESOURCE_COLUMNS = {
+    'profile': set(PROJECTIONS['profile_full']),
+    'insight': set(PROJECTIONS['insight_card']),
+}
+
+
+class ProjectionError(ValueError):
+    """Raised when a client asks for a column it may not see."""
+
+
+def requested_fields(resource: str) -> Optional[List[str]]:
+    """Parse ?fields= for the given resource, or None when not supplied."""
+    raw = request.args.get('fields', '').strip()
+    if not raw:
+        return None
+
+    allowed = RESOURCE_COLUMNS[resource]
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name in PRIVATE_COLUMNS or name not in allowed:
+            raise ProjectionError(f"Unknown or restricted field '{name}'")
+        if name not in fields:
+            fields.append(name)
+    if 'id' in allowed and 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def select_columns(projection: str, fields: Optional[Iterable[str]] = None,
+                   keep_projection: bool = False) -> str:
+    """Build a PostgREST select string.
+
+    With fields, only those columns are selected unless keep_projection is
+    set (for routes that filter or score on projection columns in Python
+    and trim afterwards with trim_fields).
+    """
+    columns = list(PROJECTIONS[projection])
+    if fields:
+        if keep_projection:
+            columns += [f for f in fields if f not in columns]
+        else:
+            columns = list(fields)
+    return ','.join(c for c in columns if c not in PRIVATE_COLUMNS)
+
+
+def trim_fields(rows, resource: str, fields: Optional[List[str]]):
+    """Drop resource columns the client didn't ask for. Computed keys
+    such as likes_count or _similarity are kept."""
+    if not fields:
+        return rows
+    dropped = RESOURCE_COLUMNS[resource] - set(fields)
+    for row in rows if isinstance(rows, list) else [rows]:
+        for column in dropped:
+            row.pop(column, None)
+    return rows
+
+
+def strip_private(rows):
+    """Remove private columns from rows returned by inserts/updates/RPCs."""
+    for row in rows if isinstance(rows, list) else [rows]:
+        if isinstance(row, dict):
+            for column in PRIVATE_COLUMNS:
+                row.pop(column, None)
+    return rows
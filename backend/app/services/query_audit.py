@@ -0,0 +1,132 @@
+"""
+Development/test helper that records every Supabase call made during a
+request, flags repeated identical-shape queries (N+1 patterns) and
+enforces per-route query budgets.
+
+Configuration:
+    QUERY_AUDIT=1               record and log violations
+    QUERY_AUDIT_STRICT=1        also fail the request with a 500
+    QUERY_BUDGET_DEFAULT=10     budget for routes without an override
+    QUERY_BUDGETS=messages.get_conversations=4,insights.search_insights=5
+    QUERY_REPEAT_THRESHOLD=3    identical shapes before a query is flagged
+"""
+import os
+import traceback
+from collections import Counter as _Counter
+from typing import Dict, List, Optional
+
+from app.services.metrics import add_call_hook
+
+QUERY_AUDIT_STRICT = os.getenv('QUERY_AUDIT_STRICT', '').strip() == '1'
+QUERY_AUDIT_ENABLED = QUERY_AUDIT_STRICT or os.getenv('QUERY_AUDIT', '').strip() == '1'
+
+# Query-string keys whose values define the shape rather than a bound parameter
+_SHAPE_KEYS = {'select', 'order', 'on_conflict', 'columns'}
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IGNORED_FILES = {
+    os.path.join(_APP_DIR, 'services', 'metrics.py'),
+    os.path.join(_APP_DIR, 'services', 'query_audit.py'),
+    os.path.join(_APP_DIR, 'services', 'aio.py'),
+}
+
+
+def _parse_budgets(raw: str) -> Dict[str, int]:
+    budgets = {}
+    for item in raw.split(','):
+        if '=' not in item:
+            continue
+        endpoint, value = item.split('=', 1)
+        try:
+            budgets[endpoint.strip()] = int(value)
+        except ValueError:
+            print(f"Ignoring invalid query budget: {item}")
+    return budgets
+
+
+DEFAULT_BUDGET = int(os.getenv('QUERY_BUDGET_DEFAULT', '10'))
+ROUTE_BUDGETS = _parse_budgets(os.getenv('QUERY_BUDGETS', ''))
+REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '3'))
+
+
+def query_shape(operation: str, builder) -> str:
+    """Normalise a request builder into a shape with bound values removed.
+
+    ``profiles?select=full_name&id=eq.<uuid>`` becomes
+    ``GET /profiles?id=eq.?&select=full_name``.
+    """
+    if builder is None:
+        return operation.upper()
+
+    parts = []
+    for key, value in builder.params.multi_items():
+        if key in _SHAPE_KEYS:
+            parts.append(f'{key}={value}')
+        elif key in ('limit', 'offset'):
+            parts.append(f'{key}=?')
+        else:
+            operator = value.split('.', 1)[0] if '.' in value else value
+            parts.append(f'{key}={operator}.?')
+    query = '&'.join(sorted(parts))
+    return f'{builder.http_method} {builder.path}' + (f'?{query}' if query else '')
+
+
+def _call_site(limit: int = 3) -> List[str]:
+    """Summarise the innermost application frames that issued a query."""
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        if not frame.filename.startswith(_APP_DIR) or frame.filename in _IGNORED_FILES:
+            continue
+        relative = os.path.relpath(frame.filename, _APP_DIR)
+        frames.append(f'{relative}:{frame.lineno} in {frame.name}')
+        if len(frames) >= limit:
+            break
+    return frames
+
+
+def _record(trace, operation, builder):
+    trace.record_query(query_shape(operation, builder), _call_site())
+
+
+def budget_for(endpoint: Optional[str]) -> int:
+    return ROUTE_BUDGETS.get(endpoint or '', DEFAULT_BUDGET)
+
+
+def audit(trace, endpoint: Optional[str]) -> Optional[dict]:
+    """Return a violation report for the request, or None if it is clean."""
+    queries = list(trace.queries)
+    budget = budget_for(endpoint)
+    counts = _Counter(shape for shape, _ in queries)
+
+    repeated = []
+    for shape, count in counts.most_common():
+        if count < REPEAT_THRESHOLD:
+            break
+        call_site = next(site for s, site in queries if s == shape)
+        repeated.append({'shape': shape, 'count': count, 'call_site': call_site})
+
+    if not repeated and len(queries) <= budget:
+        return None
+
+    return {
+        'endpoint': endpoint,
+        'query_count': len(queries),
+        'budget': budget,
+        'over_budget': len(queries) > budget,
+        'repeated_queries': repeated,
+    }
+
+
+def log_violation(report: dict):
+    print(
+        f"Query audit: {report['endpoint']} issued {report['query_count']} "
+        f"Supabase calls (budget {report['budget']})"
+    )
+    for item in report['repeated_queries']:
+        print(f"  N+1 suspect x{item['count']}: {item['shape']}")
+        for frame in item['call_site']:
+            print(f"    at {frame}")
+
+
+if QUERY_AUDIT_ENABLED:
+    add_call_hook(_record)
@@ -0,0 +1,215 @@
+"""
+Admission control for routes that make paid LLM/embedding calls or scan
+whole tables.
+
+Each route class has a rule, overridable per class through the environment
+(RATE_LIMIT_SEARCH, RATE_LIMIT_RECOMMENDATIONS, RATE_LIMIT_REINDEX):
+
+    RATE_LIMIT_SEARCH="user=30/min,global=600/min,concurrency=8"
+
+`user` and `global` are token buckets holding that many requests and
+refilling over the period (sec, min or hour); `concurrency` caps requests
+of the class in flight at once. Leaving a part out removes that limit.
+
+RATE_LIMIT_BACKEND=memory (the default) keeps state per process, so each
+worker enforces the limits on its own. RATE_LIMIT_BACKEND=postgres shares
+it between workers through the rate_limit_admit RPC (see
+migrations/014_add_rate_limits.sql). If the shared backend errors,
+requests are let through rather than failed.
+"""
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.services.deadline import REQUEST_DEADLINE
+from app.services.metrics import RATE_LIMITED
+from app.supabase_client import supabase
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1').strip() == '1'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').strip().lower()
+# Slots of requests that never released them (crashed workers) expire
+# after this many seconds in the shared backend
+RATE_LIMIT_SLOT_TTL = float(os.getenv('RATE_LIMIT_SLOT_TTL', str(REQUEST_DEADLINE + 30)))
+# Retry-After sent when a concurrency cap is full
+CONCURRENCY_RETRY_AFTER = 1.0
+
+DEFAULT_RULES = {
+    'search': 'user=30/min,global=600/min,concurrency=8',
+    'recommendations': 'user=10/min,global=300/min,concurrency=4',
+    # Whole-table re-embeds
+    'reindex': 'user=2/hour,global=4/hour,concurrency=1',
+}
+
+PERIODS = {'sec': 1.0, 'min': 60.0, 'hour': 3600.0}
+
+
+class Bucket(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+
+class Rule(NamedTuple):
+    route_class: str
+    user: Optional[Bucket]
+    global_: Optional[Bucket]
+    concurrency: Optional[int]
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0
+    scope: Optional[str] = None
+
+
+def _parse_bucket(value: str) -> Bucket:
+    count, _, period = value.partition('/')
+    seconds = PERIODS.get(period.strip() or 'sec')
+    if seconds is None:
+        raise ValueError(f"Unknown rate limit period '{period}'")
+    capacity = float(count)
+    if capacity <= 0:
+        raise ValueError(f"Invalid rate limit '{value}'")
+    return Bucket(capacity, capacity / seconds)
+
+
+def parse_rule(route_class: str, spec: str) -> Rule:
+    """Parse 'user=30/min,global=600/min,concurrency=8' into a Rule."""
+    parts = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, _, value = part.partition('=')
+        parts[name.strip()] = value.strip()
+    unknown = set(parts) - {'user', 'global', 'concurrency'}
+    if unknown:
+        raise ValueError(f"Unknown rate limit setting(s) {', '.join(sorted(unknown))}")
+    return Rule(
+        route_class,
+        _parse_bucket(parts['user']) if parts.get('user') else None,
+        _parse_bucket(parts['global']) if parts.get('global') else None,
+        int(parts['concurrency']) if parts.get('concurrency') else None,
+    )
+
+
+RULES: Dict[str, Rule] = {
+    route_class: parse_rule(route_class, os.getenv(f'RATE_LIMIT_{route_class.upper()}', spec))
+    for route_class, spec in DEFAULT_RULES.items()
+}
+
+
+def _bucket_keys(rule: Rule, user_id: str):
+    """(scope, key, bucket) for each bucket of the rule."""
+    buckets = []
+    if rule.user:
+        buckets.append(('user', f'{rule.route_class}:user:{user_id}', rule.user))
+    if rule.global_:
+        buckets.append(('global', f'{rule.route_class}:global', rule.global_))
+    return buckets
+
+
+class MemoryBackend:
+    """Buckets and slot counts in this process."""
+
+    # Buckets idle long enough to have refilled are dropped past this size
+    PRUNE_AT = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._slots: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: str, bucket: Bucket, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (bucket.capacity, now))
+        return min(bucket.capacity, tokens + (now - updated) * bucket.refill_per_second)
+
+    def _prune(self, now: float):
+        # Caller holds the lock. A missing bucket reads as full, so any
+        # bucket idle for an hour (the longest period) can go.
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if now - updated < PERIODS['hour']
+        }
+
+    def admit(self, rule: Rule, user_id: str, holder: Optional[str]) -> Decision:
+        now = time.monotonic()
+        buckets = _bucket_keys(rule, user_id)
+        with self._lock:
+            if rule.concurrency and self._slots.get(rule.route_class, 0) >= rule.concurrency:
+                return Decision(False, CONCURRENCY_RETRY_AFTER, 'concurrency')
+
+            # Only take tokens once every bucket has one
+            levels = [(scope, key, bucket, self._tokens(key, bucket, now)) for scope, key, bucket in buckets]
+            waits = [((1 - tokens) / bucket.refill_per_second, scope)
+                     for scope, _, bucket, tokens in levels if tokens < 1]
+            if waits:
+                wait, scope = max(waits)
+                return Decision(False, wait, scope)
+
+            for _, key, _, tokens in levels:
+                self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.PRUNE_AT:
+                self._prune(now)
+            if rule.concurrency:
+                self._slots[rule.route_class] = self._slots.get(rule.route_class, 0) + 1
+        return Decision(True)
+
+    def release(self, rule: Rule, holder: Optional[str]):
+        if not rule.concurrency:
+            return
+        with self._lock:
+            self._slots[rule.route_class] = max(self._slots.get(rule.route_class, 0) - 1, 0)
+
+
+class PostgresBackend:
+    """Buckets and slots shared by every worker, one RPC per admission."""
+
+    def admit(self, rule: Rule, user_id: str, holder: Optional[str]) -> Decision:
+        try:
+            result = supabase.rpc('rate_limit_admit', {
+                'p_buckets': [
+                    {'key': key, 'scope': scope, 'capacity': bucket.capacity,
+                     'refill': bucket.refill_per_second}
+                    for scope, key, bucket in _bucket_keys(rule, user_id)
+                ],
+                'p_slot_key': rule.route_class if rule.concurrency else None,
+                'p_slot_limit': rule.concurrency,
+                'p_holder': holder,
+                'p_slot_ttl': RATE_LIMIT_SLOT_TTL,
+            }).execute().data or {}
+        except Exception as e:
+            print(f"Rate limit backend error, admitting request: {str(e)}")
+            return Decision(True)
+        if result.get('allowed', True):
+            return Decision(True)
+        return Decision(False, float(result.get('retry_after') or 1), result.get('scope'))
+
+    def release(self, rule: Rule, holder: Optional[str]):
+        if not rule.concurrency or not holder:
+            return
+        try:
+            supabase.rpc('rate_limit_release', {
+                'p_slot_key': rule.route_class,
+                'p_holder': holder,
+            }).execute()
+        except Exception as e:
+            print(f"Rate limit backend error releasing slot: {str(e)}")
+
+
+BACKENDS = {'memory': MemoryBackend, 'postgres': PostgresBackend}
+
+if RATE_LIMIT_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{RATE_LIMIT_BACKEND}'")
+backend = BACKENDS[RATE_LIMIT_BACKEND]()
+
+
+def admit(route_class: str, user_id: str, holder: Optional[str]) -> Decision:
+    rule = RULES[route_class]
+    decision = backend.admit(rule, user_id, holder)
+    if not decision.allowed:
+        RATE_LIMITED.inc((route_class, decision.scope or 'unknown'))
+    return decision
+
+
+def release(route_class: str, holder: Optional[str]):
+    backend.release(RULES[route_class], holder)
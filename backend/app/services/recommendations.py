@@ -0,0 +1,414 @@
+"""
+Precomputed profile recommendations (see migrations/013_add_recommendation_cache.sql).
+
+Ranking candidates and writing reasons takes an LLM call of several seconds,
+so results are computed ahead of time by `flask recommendations precompute`
+and read back from recommendation_cache. A cached row goes stale when it is
+older than RECOMMENDATION_CACHE_TTL seconds or has been invalidated: the
+user edited their profile, followed or unfollowed someone, or a profile
+joined their industry. In stale-while-revalidate mode (the default) a stale
+row is still served, minus anyone the user now follows, while a refresh runs
+on the shared pool; otherwise it is recomputed before responding.
+
+stream_events serves the same recommendations as server-sent events, so a
+cache miss shows profiles immediately and fills in reasons as they arrive.
+"""
+import json
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.services import deadline
+from app.services.concurrency import gather, submit
+from app.services.openrouter_nlp import (
+    rank_candidates,
+    recommend_profiles_with_reasons,
+    stream_recommendation_reasons,
+)
+from app.services.projections import select_columns
+from app.services.vector_index import get_index as get_vector_index
+from app.supabase_client import supabase
+
+# Nearest profiles handed to the recommender when the vector index is enabled
+RECOMMENDATION_CANDIDATES = int(os.getenv('RECOMMENDATION_CANDIDATES', '30'))
+RECOMMENDATION_CACHE_ENABLED = os.getenv('RECOMMENDATION_CACHE', '1').strip() == '1'
+RECOMMENDATION_CACHE_TTL = float(os.getenv('RECOMMENDATION_CACHE_TTL', str(24 * 3600)))
+# Recommendations computed per user, so any limit up to this is a cache hit
+RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', '5'))
+RECOMMENDATION_STALE_WHILE_REVALIDATE = os.getenv('RECOMMENDATION_STALE_WHILE_REVALIDATE', '1').strip() == '1'
+# Bump the suffix when the recommendation prompt changes
+PROMPT_VERSION = '1'
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def cache_version() -> str:
+    """Stamp of what produced a row; rows with another stamp are misses."""
+    if not os.environ.get('OPENROUTER_API_KEY'):
+        return f'random:{PROMPT_VERSION}'
+    return f"{os.getenv('OPENROUTER_MODEL', 'openai/gpt-oss-20b:free')}:{PROMPT_VERSION}"
+
+
+def segment_of(profile: Optional[dict]) -> str:
+    """The industry a profile's cached recommendations are keyed on."""
+    if not profile:
+        return ''
+    return (profile.get('custom_industry') or profile.get('industry') or '').strip().lower()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _is_fresh(row: dict) -> bool:
+    computed_at = _parse_time(row.get('computed_at'))
+    invalidated_at = _parse_time(row.get('invalidated_at'))
+    if computed_at is None or _now() - computed_at > timedelta(seconds=RECOMMENDATION_CACHE_TTL):
+        return False
+    return invalidated_at is None or invalidated_at < computed_at
+
+
+def _candidates(user_id: str) -> Optional[tuple]:
+    """(user profile, candidate profile cards not yet followed), or None if
+    the user has no profile."""
+    profile_columns = select_columns('profile_card')
+
+    def fetch_user():
+        return (
+            supabase.table('profiles')
+            .select(profile_columns)
+            .eq('id', user_id)
+            .single()
+            .execute()
+        )
+
+    def fetch_follows():
+        # Get list of users the current user is already following
+        return (
+            supabase.table('follows')
+            .select('following_id')
+            .eq('follower_id', user_id)
+            .execute()
+        )
+
+    index = get_vector_index()
+    user_vector = index.vector(user_id) if index else None
+    if user_vector is not None:
+        # Candidates are the nearest profiles in the in-process index
+        # rather than every profile in the table
+        user_resp, follows_resp = gather(fetch_user, fetch_follows)
+        if not user_resp.data:
+            return None
+        following_ids = {f['following_id'] for f in (follows_resp.data or [])}
+        nearest = index.search(
+            user_vector,
+            k=RECOMMENDATION_CANDIDATES,
+            exclude=following_ids | {user_id},
+        )[0]
+        nearest_ids = [profile_id for profile_id, _ in nearest]
+        candidates = []
+        if nearest_ids:
+            rows = (
+                supabase.table('profiles')
+                .select(profile_columns)
+                .in_('id', nearest_ids)
+                .execute()
+            ).data or []
+            rank = {profile_id: i for i, profile_id in enumerate(nearest_ids)}
+            candidates = sorted(rows, key=lambda c: rank[c['id']])
+    else:
+        # User profile, follows and candidates don't depend on each other
+        user_resp, follows_resp, candidates_resp = gather(
+            fetch_user,
+            fetch_follows,
+            lambda: (
+                supabase.table('profiles')
+                .select(profile_columns)
+                .neq('id', user_id)
+                .execute()
+            ),
+        )
+        if not user_resp.data:
+            return None
+        following_ids = {f['following_id'] for f in (follows_resp.data or [])}
+        candidates = candidates_resp.data or []
+
+    # Filter out profiles the user is already following
+    return user_resp.data, [c for c in candidates if c['id'] not in following_ids]
+
+
+def compute(user_id: str, limit: int) -> Optional[tuple]:
+    """(user profile, ranked profile cards with a recommendation_reason),
+    or None if the user has no profile. Always calls the recommender."""
+    found = _candidates(user_id)
+    if found is None:
+        return None
+    user_profile, candidates = found
+
+    if not candidates:
+        return user_profile, []
+
+    # Use LLM to get recommendations with reasons
+    # If OpenRouter API key is missing, return simple random recommendations
+    if not os.environ.get('OPENROUTER_API_KEY'):
+        print("Warning: OPENROUTER_API_KEY not set, returning random recommendations")
+        result = random.sample(candidates, min(limit, len(candidates)))
+        for profile in result:
+            profile['recommendation_reason'] = "Recommended based on your profile"
+        return user_profile, result
+
+    recommendations_with_reasons = recommend_profiles_with_reasons(
+        user_profile,
+        candidates,
+        limit
+    )
+
+    # Map recommendations back to full profile data
+    candidate_map = {c['id']: c for c in candidates}
+    result = []
+    for rec in recommendations_with_reasons:
+        profile_id = rec['id']
+        if profile_id in candidate_map:
+            profile_data = candidate_map[profile_id]
+            profile_data['recommendation_reason'] = rec['reason']
+            result.append(profile_data)
+    return user_profile, result
+
+
+def _store(user_id: str, user_profile: dict, size: int, result: List[dict], started_at: datetime):
+    try:
+        # computed_at is when the inputs were read, so an invalidation that
+        # lands mid-computation still marks the row stale. invalidated_at is
+        # left out so it isn't reset.
+        supabase.table('recommendation_cache').upsert({
+            'user_id': user_id,
+            'version': cache_version(),
+            'segment': segment_of(user_profile),
+            'size': size,
+            'recommendations': [
+                {'id': p['id'], 'reason': p['recommendation_reason']} for p in result
+            ],
+            'computed_at': started_at.isoformat(),
+        }, on_conflict='user_id').execute()
+    except Exception as e:
+        print(f"Error caching recommendations for {user_id}: {str(e)}")
+
+
+def refresh(user_id: str, limit: int = RECOMMENDATION_CACHE_SIZE) -> Optional[List[dict]]:
+    """Recompute a user's recommendations and store them. None if the user
+    has no profile."""
+    size = max(limit, RECOMMENDATION_CACHE_SIZE)
+    started_at = _now()
+    computed = compute(user_id, size)
+    if computed is None:
+        return None
+    user_profile, result = computed
+    if RECOMMENDATION_CACHE_ENABLED:
+        _store(user_id, user_profile, size, result, started_at)
+    return result
+
+
+def _refresh_in_background(user_id: str):
+    with _refreshing_lock:
+        if user_id in _refreshing:
+            return
+        _refreshing.add(user_id)
+
+    def run():
+        try:
+            # Runs after the response is sent, outside the request's deadline
+            with deadline.budget(None):
+                refresh(user_id)
+        except Exception as e:
+            print(f"Background recommendation refresh failed for {user_id}: {str(e)}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(user_id)
+
+    submit(run)
+
+
+def _cached_cards(user_id: str, recommendations: List[dict], check_follows: bool) -> List[dict]:
+    """Current profile cards for cached {id, reason} pairs, in order.
+    Profiles deleted since are dropped, as are profiles the user followed
+    since when the row is stale."""
+    ids = [rec['id'] for rec in recommendations]
+    if not ids:
+        return []
+    calls = [
+        lambda: supabase.table('profiles').select(select_columns('profile_card')).in_('id', ids).execute()
+    ]
+    if check_follows:
+        calls.append(
+            lambda: supabase.table('follows').select('following_id')
+            .eq('follower_id', user_id).in_('following_id', ids).execute()
+        )
+    responses = gather(*calls)
+    followed = {f['following_id'] for f in (responses[1].data or [])} if check_follows else set()
+    cards = {card['id']: card for card in responses[0].data or []}
+    result = []
+    for rec in recommendations:
+        card = cards.get(rec['id'])
+        if card and rec['id'] not in followed:
+            result.append({**card, 'recommendation_reason': rec['reason']})
+    return result
+
+
+def _servable_cards(user_id: str, limit: int) -> Optional[List[dict]]:
+    """Cards from the user's cached row if it can be served, refreshing it
+    in the background when stale; None on a miss."""
+    try:
+        rows = (
+            supabase.table('recommendation_cache')
+            .select('version, size, recommendations, computed_at, invalidated_at')
+            .eq('user_id', user_id)
+            .execute()
+        ).data or []
+    except Exception as e:
+        print(f"Error reading recommendation cache: {str(e)}")
+        return None
+
+    row = rows[0] if rows else None
+    if not row or row['version'] != cache_version() or row['size'] < limit:
+        return None
+    fresh = _is_fresh(row)
+    if not fresh and not RECOMMENDATION_STALE_WHILE_REVALIDATE:
+        return None
+    if not fresh:
+        _refresh_in_background(user_id)
+    return _cached_cards(user_id, row['recommendations'][:limit], check_follows=not fresh)
+
+
+def get_recommendations(user_id: str, limit: int) -> Optional[List[dict]]:
+    """Recommended profile cards for a user, from the cache when possible.
+    None if the user has no profile."""
+    if not RECOMMENDATION_CACHE_ENABLED:
+        computed = compute(user_id, limit)
+        return computed[1] if computed else None
+
+    cards = _servable_cards(user_id, limit)
+    if cards is not None:
+        return cards
+
+    result = refresh(user_id, limit)
+    return result[:limit] if result is not None else None
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(user_id: str, limit: int) -> Optional[Iterator[str]]:
+    """Server-sent events for the recommendations card, or None if the user
+    has no profile.
+
+    A servable cached row is sent as one `profiles` event. Otherwise the
+    rule-based top `limit` candidates are sent right away without reasons,
+    followed by one `reason` event ({id, reason}) per profile as the LLM
+    writes them, and the result is cached. `done` ends the stream.
+    """
+    if RECOMMENDATION_CACHE_ENABLED:
+        cards = _servable_cards(user_id, limit)
+        if cards is not None:
+            return iter([_sse('profiles', cards), _sse('done', {'cached': True})])
+
+    started_at = _now()
+    found = _candidates(user_id)
+    if found is None:
+        return None
+    user_profile, candidates = found
+    ranked = rank_candidates(user_profile, candidates)[:limit]
+
+    def events():
+        yield _sse('profiles', [{**p, 'recommendation_reason': None} for p in ranked])
+        result = []
+        for rec in stream_recommendation_reasons(user_profile, ranked):
+            yield _sse('reason', rec)
+            result.append({'id': rec['id'], 'recommendation_reason': rec['reason']})
+        yield _sse('done', {'cached': False})
+        if RECOMMENDATION_CACHE_ENABLED:
+            order = {p['id']: i for i, p in enumerate(ranked)}
+            result.sort(key=lambda p: order[p['id']])
+            _store(user_id, user_profile, limit, result, started_at)
+
+    return events()
+
+
+def invalidate(user_ids: Iterable[str] = (), segment: Optional[str] = None):
+    """Mark cached recommendations stale for the given users and for every
+    user in the given segment (see segment_of)."""
+    if not RECOMMENDATION_CACHE_ENABLED:
+        return
+    user_ids = [user_id for user_id in user_ids if user_id]
+    stamp = {'invalidated_at': _now().isoformat()}
+    calls = []
+    if user_ids:
+        calls.append(lambda: supabase.table('recommendation_cache').update(stamp).in_('user_id', user_ids).execute())
+    if segment is not None:
+        calls.append(lambda: supabase.table('recommendation_cache').update(stamp).eq('segment', segment).execute())
+    try:
+        gather(*calls)
+    except Exception as e:
+        print(f"Error invalidating recommendations: {str(e)}")
+
+
+def _profile_id_pages(page_size: int = 1000):
+    cursor = None
+    while True:
+        query = supabase.table('profiles').select('id').order('id').limit(page_size)
+        if cursor:
+            query = query.gt('id', cursor)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        cursor = rows[-1]['id']
+        yield [row['id'] for row in rows]
+
+
+def _fresh_user_ids(user_ids: List[str]) -> set:
+    rows = (
+        supabase.table('recommendation_cache')
+        .select('user_id, version, size, computed_at, invalidated_at')
+        .in_('user_id', user_ids)
+        .execute()
+    ).data or []
+    return {
+        row['user_id'] for row in rows
+        if row['version'] == cache_version() and row['size'] >= RECOMMENDATION_CACHE_SIZE and _is_fresh(row)
+    }
+
+
+def precompute(user_ids: Optional[List[str]] = None, limit: int = RECOMMENDATION_CACHE_SIZE,
+               workers: int = 4, stale_only: bool = False) -> Dict[str, int]:
+    """Compute and store recommendations for the given users, or everyone.
+    Users are processed `workers` at a time."""
+    pages = [list(user_ids)] if user_ids else _profile_id_pages()
+    computed = skipped = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='recommendations') as pool:
+        for page in pages:
+            if stale_only:
+                fresh = _fresh_user_ids(page)
+                skipped += len(fresh)
+                page = [user_id for user_id in page if user_id not in fresh]
+            futures = [(user_id, pool.submit(refresh, user_id, limit)) for user_id in page]
+            for user_id, future in futures:
+                try:
+                    if future.result() is None:
+                        skipped += 1
+                    else:
+                        computed += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Error precomputing recommendations for {user_id}: {str(e)}")
+            print(f"Precomputed recommendations for {computed} users ({skipped} skipped, {failed} failed)")
+    return {'computed': computed, 'skipped': skipped, 'failed': failed}
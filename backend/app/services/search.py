@@ -0,0 +1,182 @@
+"""
+Search helpers: hybrid lexical + semantic ranking and profile filters.
+
+The ranking happens in Postgres (see migrations/008_add_hybrid_search.sql):
+full-text matches on the generated search_vector columns and nearest
+neighbours on the embedding columns are merged with reciprocal rank fusion.
+Partial-match and fuzzy filters rely on the trigram indexes from
+migrations/009_add_trigram_indexes.sql. When the in-process vector index is
+enabled, the vector half of profile ranking is computed locally. With
+per-request field weights it comes from search_profiles_weighted
+(migrations/012_add_profile_field_embeddings.sql).
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from app.supabase_client import supabase
+from app.services import aio
+from app.services.field_embeddings import weighted_profile_matches
+from app.services.vector_index import get_index as get_vector_index
+
+# Share of the fused score given to the vector ranking (0 = lexical only)
+SEARCH_SEMANTIC_WEIGHT = float(os.getenv('SEARCH_SEMANTIC_WEIGHT', '0.5'))
+SEARCH_MATCH_THRESHOLD = float(os.getenv('SEARCH_MATCH_THRESHOLD', '0.2'))
+SEARCH_RRF_K = int(os.getenv('SEARCH_RRF_K', '60'))
+# Approximate (halfvec) candidates re-ranked exactly per semantic search
+SEARCH_CANDIDATE_COUNT = int(os.getenv('SEARCH_CANDIDATE_COUNT', '200'))
+# Minimum trigram similarity for fuzzy school matching
+FUZZY_SCHOOL_THRESHOLD = float(os.getenv('FUZZY_SCHOOL_THRESHOLD', '0.3'))
+FUZZY_SCHOOL_MAX_MATCHES = int(os.getenv('FUZZY_SCHOOL_MAX_MATCHES', '500'))
+
+_RPCS = {
+    'profiles': 'hybrid_search_profiles',
+    'insights': 'hybrid_search_insights',
+}
+
+
+def semantic_weight(raw: Optional[str]) -> float:
+    """Parse a per-request weight override, clamped to [0, 1]."""
+    if raw is None or raw == '':
+        return SEARCH_SEMANTIC_WEIGHT
+    try:
+        value = float(raw)
+    except ValueError:
+        return SEARCH_SEMANTIC_WEIGHT
+    return min(max(value, 0.0), 1.0)
+
+
+def like_pattern(value: str, partial: bool = True) -> str:
+    """ILIKE pattern for a user-supplied value with wildcards escaped.
+    Partial patterns ('%x%') are served by the trigram indexes."""
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%' if partial else escaped
+
+
+def array_literal(values: List[str]) -> str:
+    """Postgres array literal with each element quoted, for ov/cs filters
+    on values containing spaces or commas (e.g. 'Machine Learning')."""
+    quoted = (
+        '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for value in values
+    )
+    return '{' + ','.join(quoted) + '}'
+
+
+def similarity_threshold(raw: Optional[str]) -> float:
+    """Parse a per-request fuzzy-match threshold, clamped to [0, 1]."""
+    try:
+        value = float(raw) if raw else FUZZY_SCHOOL_THRESHOLD
+    except ValueError:
+        return FUZZY_SCHOOL_THRESHOLD
+    return min(max(value, 0.0), 1.0)
+
+
+def fuzzy_school_profiles(school: str, columns: str, threshold: Optional[float] = None,
+                          industry: str = '', location: str = '', career_status: str = '',
+                          skills: Optional[List[str]] = None) -> List[dict]:
+    """Profiles whose current_school is similar to `school`, e.g. a
+    misspelling like 'Virgina Tech', that also match the other search
+    filters. Rows carry the requested columns plus 'similarity', best
+    match first."""
+    result = supabase.rpc(
+        'search_profiles_by_school_fuzzy',
+        {
+            'school_query': school,
+            'min_similarity': FUZZY_SCHOOL_THRESHOLD if threshold is None else threshold,
+            'match_count': FUZZY_SCHOOL_MAX_MATCHES,
+            'industry_pattern': like_pattern(industry, partial=False) if industry else None,
+            'location_pattern': like_pattern(location) if location else None,
+            'career_status_filter': career_status or None,
+            'skills_filter': skills or None,
+        }
+    ).select(columns, 'similarity').execute()
+    return result.data or []
+
+
+def hybrid_search(resource: str, query: str, query_embedding: Optional[List[float]] = None,
+                  match_count: int = 50, weight: Optional[float] = None,
+                  field_weights: Optional[Dict[str, float]] = None) -> Dict[str, dict]:
+    """Rank rows of `resource` for `query`.
+
+    Returns {id: {'score', 'similarity', 'lexical_rank'}} in rank order.
+    Without an embedding the ranking is purely lexical. field_weights
+    (profiles only) weighs the per-field similarities instead of using the
+    stored combined embedding.
+    """
+    weight = SEARCH_SEMANTIC_WEIGHT if weight is None else weight
+    if query_embedding is None:
+        weight = 0.0
+    elif resource == 'profiles' and field_weights:
+        semantic = weighted_profile_matches(query_embedding, field_weights,
+                                            match_count * 2, SEARCH_MATCH_THRESHOLD)
+        return _fuse(semantic, query, match_count, weight)
+    elif resource == 'profiles':
+        index = get_vector_index()
+        if index is not None:
+            semantic = index.search(query_embedding, k=match_count * 2,
+                                    min_similarity=SEARCH_MATCH_THRESHOLD)[0]
+            return _fuse(semantic, query, match_count, weight)
+
+    result = supabase.rpc(_RPCS[resource], _hybrid_params(query, query_embedding, match_count, weight)).execute()
+    return _ranking(result.data)
+
+
+async def ahybrid_search(resource: str, query: str, query_embedding: Optional[List[float]] = None,
+                         match_count: int = 50, weight: Optional[float] = None) -> Dict[str, dict]:
+    """hybrid_search for async views. Insights rank through the RPC on the
+    async client; profiles may use the in-process vector index, so they
+    take the sync path off the event loop."""
+    if resource == 'profiles':
+        return await asyncio.to_thread(hybrid_search, resource, query, query_embedding, match_count, weight)
+    weight = SEARCH_SEMANTIC_WEIGHT if weight is None else weight
+    if query_embedding is None:
+        weight = 0.0
+    client = await aio.supabase()
+    result = await client.rpc(_RPCS[resource], _hybrid_params(query, query_embedding, match_count, weight)).execute()
+    return _ranking(result.data)
+
+
+def _hybrid_params(query: str, query_embedding: Optional[List[float]], match_count: int, weight: float) -> dict:
+    return {
+        'query_text': query,
+        'query_embedding': query_embedding,
+        'match_count': match_count,
+        'semantic_weight': weight,
+        'match_threshold': SEARCH_MATCH_THRESHOLD,
+        'rrf_k': SEARCH_RRF_K,
+        'candidate_count': SEARCH_CANDIDATE_COUNT,
+    }
+
+
+def _ranking(rows) -> Dict[str, dict]:
+    return {
+        row['id']: {
+            'score': row.get('score') or 0,
+            'similarity': row.get('similarity') or 0,
+            'lexical_rank': row.get('lexical_rank') or 0,
+        }
+        for row in rows or []
+    }
+
+
+def _fuse(semantic: List[tuple], query: str, match_count: int, weight: float) -> Dict[str, dict]:
+    """Same fusion as the hybrid RPC, for a vector ranking computed outside
+    it ([(profile id, similarity)], best first); only the lexical ranking
+    comes from Postgres."""
+    lexical = hybrid_search('profiles', query, None, match_count=match_count * 2)
+
+    fused = {}
+    for rank, (profile_id, similarity) in enumerate(semantic, start=1):
+        fused[profile_id] = {
+            'score': weight / (SEARCH_RRF_K + rank),
+            'similarity': similarity,
+            'lexical_rank': 0,
+        }
+    for rank, (profile_id, row) in enumerate(lexical.items(), start=1):
+        item = fused.setdefault(profile_id, {'score': 0.0, 'similarity': 0, 'lexical_rank': 0})
+        item['lexical_rank'] = row['lexical_rank']
+        item['score'] += (1 - weight) / (SEARCH_RRF_K + rank)
+
+    ranked = sorted(fused.items(), key=lambda item: item[1]['score'], reverse=True)
+    return dict(ranked[:match_count])
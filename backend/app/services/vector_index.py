@@ -0,0 +1,449 @@
+"""
+Optional in-process vector index over profile embeddings.
+
+Profile ids and embeddings live in a memory-mapped file as one contiguous
+float16/float32 matrix of unit vectors, so nearest-neighbour lookups are a
+NumPy matrix product instead of a search_profiles_semantic round trip.
+Workers on the same host map the same file and share its pages.
+
+One worker at a time (guarded by a file lock) refreshes the file
+incrementally from profiles.updated_at; the others remap when the metadata
+changes. Rows are updated in place and the matrix is only copied when it
+outgrows its capacity. Deleted profiles are zeroed by discard() and dropped
+for good by the periodic full rebuild.
+
+The file is tagged with the active embedding model and dimensions; after a
+re-index cutover the index is rebuilt from the new vectors.
+
+Enable with VECTOR_INDEX_ENABLED=true; requires numpy.
+"""
+import fcntl
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from app.services.embedding_config import EmbeddingConfig, get_active_config
+from app.supabase_client import supabase
+
+VECTOR_INDEX_ENABLED = os.getenv('VECTOR_INDEX_ENABLED', 'false').lower() == 'true'
+VECTOR_INDEX_DIR = os.getenv(
+    'VECTOR_INDEX_DIR', os.path.join(tempfile.gettempdir(), 'profile-vector-index')
+)
+VECTOR_INDEX_DTYPE = os.getenv('VECTOR_INDEX_DTYPE', 'float16')
+VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv('VECTOR_INDEX_REFRESH_SECONDS', '60'))
+VECTOR_INDEX_REBUILD_SECONDS = float(os.getenv('VECTOR_INDEX_REBUILD_SECONDS', '21600'))
+VECTOR_INDEX_PAGE_SIZE = int(os.getenv('VECTOR_INDEX_PAGE_SIZE', '1000'))
+# Rows converted to float32 per matrix product; bounds temporary memory
+VECTOR_INDEX_CHUNK_ROWS = int(os.getenv('VECTOR_INDEX_CHUNK_ROWS', '8192'))
+
+FILTER_COLUMNS = ('industry', 'career_status')
+_MIN_CAPACITY = 1024
+
+
+def _parse_vector(value) -> Optional[List[float]]:
+    # PostgREST returns pgvector columns as '[0.1,0.2,...]'
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value
+
+
+class _Mapping:
+    """One mapped generation of the index file plus its lookup tables."""
+
+    def __init__(self, meta: dict, matrix):
+        self.meta = meta
+        self.matrix = matrix
+        self.row_of = {profile_id: row for row, profile_id in enumerate(meta['ids'])}
+        self.codes = {
+            column: np.asarray(meta['codes'][column], dtype=np.uint16)
+            for column in FILTER_COLUMNS
+        }
+        self.masks: Dict[Tuple[str, str], 'np.ndarray'] = {}
+
+    def mask(self, column: str, value: str):
+        """Boolean filter bitmap for column == value, built once per mapping."""
+        key = (column, value)
+        mask = self.masks.get(key)
+        if mask is None:
+            vocabulary = self.meta['vocab'][column]
+            if value in vocabulary:
+                mask = self.codes[column] == vocabulary.index(value)
+            else:
+                mask = np.zeros(self.meta['count'], dtype=bool)
+            self.masks[key] = mask
+        return mask
+
+
+class VectorIndex:
+    def __init__(self, config: EmbeddingConfig, directory: str = VECTOR_INDEX_DIR,
+                 dtype: str = VECTOR_INDEX_DTYPE):
+        self.directory = directory
+        self.dtype = dtype
+        self.model = config.model
+        self.dimensions = config.dimensions
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.lock_path = os.path.join(directory, 'lock')
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_refresh_attempt = 0.0
+        self._meta_mtime = None
+        # Deleted profiles hidden from this worker until their rows are zeroed
+        self._discarded = set()
+        # Swapped as a whole on reload so queries never mix two generations
+        self._mapping: Optional[_Mapping] = None
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    @property
+    def ready(self) -> bool:
+        return self._mapping is not None
+
+    def __len__(self) -> int:
+        return self._mapping.meta['count'] if self._mapping else 0
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f'vectors-{generation}.bin')
+
+    def reload_if_changed(self):
+        """Map the file again if another worker (or this one) rewrote it."""
+        try:
+            mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        with self._lock:
+            if mtime == self._meta_mtime:
+                return
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if not self._matches(meta):
+                print('Vector index on disk has a different model/shape/dtype; rebuilding')
+                self._last_refresh_attempt = 0.0
+                return
+            matrix = np.memmap(
+                self._vectors_path(meta['generation']), dtype=meta['dtype'], mode='r',
+                shape=(meta['capacity'], meta['dimensions']),
+            )
+            self._mapping = _Mapping(meta, matrix)
+            self._meta_mtime = mtime
+
+    def vector(self, profile_id: str):
+        """The stored unit vector for a profile, or None."""
+        mapping = self._mapping
+        row = mapping.row_of.get(profile_id) if mapping else None
+        if row is None or profile_id in self._discarded:
+            return None
+        vector = np.asarray(mapping.matrix[row], dtype=np.float32)
+        return vector if vector.any() else None
+
+    def search(self, queries, k: int = 20, industry: Optional[str] = None,
+               career_status: Optional[str] = None, exclude: Iterable[str] = (),
+               min_similarity: float = 0.0) -> List[List[Tuple[str, float]]]:
+        """Top-k (profile id, cosine similarity) for each query vector.
+
+        queries may be one vector or a batch; the batch is scored with one
+        matrix product per chunk of rows.
+        """
+        mapping = self._mapping
+        if mapping is None:
+            return []
+        matrix, meta = mapping.matrix, mapping.meta
+        count = meta['count']
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, VECTOR_INDEX_CHUNK_ROWS):
+            end = min(start + VECTOR_INDEX_CHUNK_ROWS, count)
+            scores[start:end] = np.asarray(matrix[start:end], dtype=np.float32) @ queries.T
+
+        allowed = np.ones(count, dtype=bool)
+        if industry:
+            allowed &= mapping.mask('industry', industry)
+        if career_status:
+            allowed &= mapping.mask('career_status', career_status)
+        for profile_id in itertools.chain(exclude, list(self._discarded)):
+            row = mapping.row_of.get(profile_id)
+            if row is not None:
+                allowed[row] = False
+        scores[~allowed] = -np.inf
+
+        k = min(k, count)
+        results = []
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        ids = meta['ids']
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            results.append([
+                (ids[row], float(column[row]))
+                for row in top
+                if column[row] > min_similarity
+            ])
+        return results
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def maybe_refresh(self):
+        """Start a background refresh if the refresh interval has passed."""
+        now = time.monotonic()
+        if self._refreshing or now - self._last_refresh_attempt < VECTOR_INDEX_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._last_refresh_attempt = now
+        threading.Thread(target=self._refresh_in_background, name='vector-index-refresh',
+                         daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Vector index refresh failed: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    def refresh(self, full: bool = False) -> int:
+        """Pull profiles changed since the last refresh into the file.
+
+        Returns the number of rows written, or -1 if another worker holds
+        the lock (it will publish the result for everyone).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return -1
+            try:
+                meta = self._read_meta()
+                stale_path = None
+                if meta and time.time() - meta['built_at'] > VECTOR_INDEX_REBUILD_SECONDS:
+                    full = True
+                rebuilding = full or not meta
+                if rebuilding:
+                    if meta:
+                        stale_path = self._vectors_path(meta['generation'])
+                    meta = self._empty_meta(generation=(meta['generation'] + 1) if meta else 1)
+                else:
+                    self._zero_discarded(meta)
+                # Each page is written as it arrives so a full rebuild never
+                # holds the whole table in memory. Incremental pages are
+                # published (and the watermark advanced) one by one; a rebuild
+                # is only published once complete.
+                written = 0
+                for page in self._changed_pages(meta['watermark']):
+                    written += self._apply(meta, page, publish=not rebuilding)
+                if rebuilding:
+                    self._zero_discarded(meta, publish=False)
+                    self._write_meta(meta)
+                if stale_path and os.path.exists(stale_path):
+                    os.remove(stale_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self.reload_if_changed()
+        return written
+
+    def discard(self, profile_id: str):
+        """Stop returning a deleted profile.
+
+        Called from the delete request, so it never waits for the file lock:
+        the profile is hidden in this worker at once, and its row is zeroed
+        now if the lock is free or by this worker's next refresh otherwise.
+        """
+        self._discarded.add(profile_id)
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                meta = self._read_meta()
+                if meta:
+                    self._zero_discarded(meta)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _zero_discarded(self, meta: dict, publish: bool = True):
+        """Zero the rows of discarded profiles; call with the file lock held."""
+        pending = [profile_id for profile_id in list(self._discarded) if profile_id in meta['ids']]
+        if pending and meta['capacity']:
+            matrix = np.memmap(
+                self._vectors_path(meta['generation']), dtype=meta['dtype'], mode='r+',
+                shape=(meta['capacity'], meta['dimensions']),
+            )
+            for profile_id in pending:
+                matrix[meta['ids'].index(profile_id)] = 0
+            matrix.flush()
+            del matrix
+            if publish:
+                # Bumps the metadata so other workers remap promptly
+                self._write_meta(meta)
+        self._discarded.difference_update(pending)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not self._matches(meta):
+            return None
+        return meta
+
+    def _matches(self, meta: dict) -> bool:
+        return (meta.get('model') == self.model and meta['dimensions'] == self.dimensions
+                and meta['dtype'] == self.dtype)
+
+    def _empty_meta(self, generation: int) -> dict:
+        return {
+            'model': self.model,
+            'dimensions': self.dimensions,
+            'dtype': self.dtype,
+            'generation': generation,
+            'capacity': 0,
+            'count': 0,
+            'watermark': None,
+            'built_at': time.time(),
+            'ids': [],
+            'codes': {column: [] for column in FILTER_COLUMNS},
+            'vocab': {column: [] for column in FILTER_COLUMNS},
+        }
+
+    def _changed_pages(self, watermark: Optional[str]) -> Iterator[List[dict]]:
+        offset = 0
+        while True:
+            query = supabase.table('profiles').select(
+                'id, industry, career_status, embedding, updated_at'
+            )
+            if watermark:
+                # gte re-reads rows sharing the boundary timestamp; writes are idempotent
+                query = query.gte('updated_at', watermark)
+            page = (
+                query.order('updated_at').order('id')
+                .range(offset, offset + VECTOR_INDEX_PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            if page:
+                yield page
+            if len(page) < VECTOR_INDEX_PAGE_SIZE:
+                return
+            offset += VECTOR_INDEX_PAGE_SIZE
+
+    def _apply(self, meta: dict, rows: Sequence[dict], publish: bool = True) -> int:
+        ids = meta['ids']
+        row_of = {profile_id: row for row, profile_id in enumerate(ids)}
+        new_ids = [r['id'] for r in rows if r['id'] not in row_of]
+        needed = meta['count'] + len(set(new_ids))
+        previous_path = self._vectors_path(meta['generation']) if meta['capacity'] else None
+
+        if needed > meta['capacity'] or not meta['capacity']:
+            # Grow into a new file; readers keep their old mapping until they remap
+            capacity = max(_MIN_CAPACITY, needed * 2)
+            generation = meta['generation'] + (1 if meta['capacity'] else 0)
+            matrix = np.memmap(self._vectors_path(generation), dtype=self.dtype, mode='w+',
+                               shape=(capacity, self.dimensions))
+            if previous_path:
+                old = np.memmap(previous_path, dtype=self.dtype, mode='r',
+                                shape=(meta['capacity'], self.dimensions))
+                matrix[:meta['count']] = old[:meta['count']]
+                del old
+            meta['capacity'] = capacity
+            meta['generation'] = generation
+        else:
+            previous_path = None
+            matrix = np.memmap(self._vectors_path(meta['generation']), dtype=self.dtype,
+                               mode='r+', shape=(meta['capacity'], self.dimensions))
+
+        written = 0
+        for record in rows:
+            vector = _parse_vector(record.get('embedding'))
+            row = row_of.get(record['id'])
+            if row is None:
+                row = len(ids)
+                ids.append(record['id'])
+                row_of[record['id']] = row
+                for column in FILTER_COLUMNS:
+                    meta['codes'][column].append(0)
+            for column in FILTER_COLUMNS:
+                vocabulary = meta['vocab'][column]
+                value = record.get(column) or ''
+                if value not in vocabulary:
+                    vocabulary.append(value)
+                meta['codes'][column][row] = vocabulary.index(value)
+            if vector is None or len(vector) != self.dimensions:
+                matrix[row] = 0
+            else:
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                matrix[row] = vector / norm if norm else 0
+            written += 1
+            if record.get('updated_at') and (meta['watermark'] is None
+                                             or record['updated_at'] > meta['watermark']):
+                meta['watermark'] = record['updated_at']
+
+        matrix.flush()
+        del matrix
+        meta['count'] = len(ids)
+        if publish:
+            self._write_meta(meta)
+        if previous_path and previous_path != self._vectors_path(meta['generation']):
+            os.remove(previous_path)
+        return written
+
+    def _write_meta(self, meta: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='meta-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp_path, self.meta_path)
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+if VECTOR_INDEX_ENABLED and np is None:
+    print("Warning: VECTOR_INDEX_ENABLED is set but numpy is not installed; vector index disabled")
+
+
+def get_index(wait: bool = False) -> Optional[VectorIndex]:
+    """The shared index if enabled and loaded, else None (callers fall back
+    to the Postgres RPCs). Also schedules background refreshes; with wait,
+    an index that isn't loaded yet is built before returning."""
+    global _index
+    if not VECTOR_INDEX_ENABLED or np is None:
+        return None
+    config = get_active_config()
+    if _index is None or (_index.model, _index.dimensions) != (config.model, config.dimensions):
+        with _index_lock:
+            if _index is None or (_index.model, _index.dimensions) != (config.model, config.dimensions):
+                _index = VectorIndex(config)
+    _index.reload_if_changed()
+    if wait and not _index.ready:
+        _index.refresh()
+    _index.maybe_refresh()
+    return _index if _index.ready else None
@@ -1,6 +1,8 @@
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from app.services.metrics import METRICS_ENABLED, instrument_client
+from app.services.query_audit import QUERY_AUDIT_ENABLED
 
 # Only load .env in development (Vercel sets env vars directly)
 if os.getenv('VERCEL') != '1':
@@ -20,6 +22,10 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 try:
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
     print("Supabase client initialized successfully")
+    if METRICS_ENABLED or QUERY_AUDIT_ENABLED:
+        # Record every PostgREST/auth call for Server-Timing, /api/metrics
+        # and the development query audit
+        supabase = instrument_client(supabase)
 except Exception as e:
     print(f"ERROR: Failed to initialize Supabase client: {str(e)}")
     raise
@@ -0,0 +1,150 @@
+"""
+Recall and latency of the two-stage (halfvec candidates + exact re-rank)
+semantic search against the current search_*_semantic RPCs.
+
+Query vectors are embeddings already stored in the table, so no embedding
+API calls are made. Recall@k is the share of the current RPC's top-k that
+the re-ranked RPC also returns. The fake has no ANN index, so only a real
+database gives meaningful latencies; against the fake this checks recall.
+
+    cd backend
+    # against the database configured in .env (SUPABASE_URL etc.)
+    python -m benchmarks.compare_semantic_search --queries 100 --candidates 50 100 200 400
+    # against the offline fake
+    python -m benchmarks.compare_semantic_search --fake 5000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+RPCS = {
+    'profiles': ('search_profiles_semantic', 'search_profiles_semantic_reranked'),
+    'insights': ('search_insights_semantic', 'search_insights_semantic_reranked'),
+}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def sample_queries(supabase, table: str, count: int, seed: int) -> List[str]:
+    total = supabase.table(table).select('id', count='exact').limit(1).execute().count or 0
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count and total:
+        offset = rng.randrange(max(total - 50, 1))
+        rows = (
+            supabase.table(table).select('embedding')
+            .not_.is_('embedding', 'null')
+            .range(offset, offset + 49)
+            .execute()
+        ).data or []
+        queries.extend(r['embedding'] for r in rows[:count - len(queries)])
+        if not rows:
+            break
+    return queries
+
+
+def timed_rpc(supabase, fn: str, params: dict):
+    started = time.perf_counter()
+    rows = supabase.rpc(fn, params).execute().data or []
+    return (time.perf_counter() - started) * 1000, [r['id'] for r in rows]
+
+
+def compare(supabase, table: str, queries: List[str], k: int, threshold: float,
+            candidate_counts: List[int]) -> Dict[str, dict]:
+    baseline_fn, reranked_fn = RPCS[table]
+    base = {'latency': [], 'ids': []}
+    for query in queries:
+        latency, ids = timed_rpc(supabase, baseline_fn, {
+            'query_embedding': query, 'match_threshold': threshold, 'match_count': k,
+        })
+        base['latency'].append(latency)
+        base['ids'].append(ids)
+
+    results = {baseline_fn: {
+        'candidates': None,
+        'p50_ms': statistics.median(base['latency']),
+        'p95_ms': _percentile(base['latency'], 95),
+        'recall_mean': 1.0,
+        'recall_min': 1.0,
+    }}
+    for candidates in candidate_counts:
+        latencies, recalls = [], []
+        for query, expected in zip(queries, base['ids']):
+            latency, ids = timed_rpc(supabase, reranked_fn, {
+                'query_embedding': query, 'match_threshold': threshold, 'match_count': k,
+                'candidate_count': candidates,
+            })
+            latencies.append(latency)
+            if expected:
+                recalls.append(len(set(ids) & set(expected)) / len(expected))
+        results[f'{reranked_fn}@{candidates}'] = {
+            'candidates': candidates,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': _percentile(latencies, 95),
+            'recall_mean': statistics.mean(recalls) if recalls else None,
+            'recall_min': min(recalls) if recalls else None,
+        }
+    return results
+
+
+def _print_table(results: Dict[str, dict], k: int):
+    print(f"{'rpc':48} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{k}':>10} {'min':>6}")
+    print('-' * 84)
+    for name, row in results.items():
+        recall = '-' if row['recall_mean'] is None else f"{row['recall_mean']:.3f}"
+        worst = '-' if row['recall_min'] is None else f"{row['recall_min']:.2f}"
+        print(f"{name:48} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {recall:>10} {worst:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', choices=sorted(RPCS), default='profiles')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--threshold', type=float, default=0.0)
+    parser.add_argument('--candidates', type=int, nargs='+', default=[50, 100, 200, 400])
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--fake', type=int, metavar='SCALE',
+                        help='run against the offline fake seeded with SCALE profiles')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    upstreams = None
+    if args.fake:
+        from benchmarks.harness import FakeUpstreams
+        upstreams = FakeUpstreams(args.fake, db_latency_ms=0)
+        upstreams.__enter__()
+        upstreams.apply_env(with_llm=False)
+    try:
+        from app.supabase_client import supabase
+        queries = sample_queries(supabase, args.table, args.queries, args.seed)
+        if not queries:
+            print(f'No {args.table} rows with embeddings to query with', file=sys.stderr)
+            return None
+        results = compare(supabase, args.table, queries, args.k, args.threshold, args.candidates)
+    finally:
+        if upstreams:
+            upstreams.__exit__(None, None, None)
+
+    _print_table(results, args.k)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'config': vars(args), 'results': results}, fh, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Stand-in for the OpenRouter embeddings and chat completions endpoints with
+configurable latency. Responses are deterministic so runs are comparable.
+"""
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import List
+
+from benchmarks.fake_supabase import Stats
+from benchmarks.seed import pool_index_for_text
+
+# Characters of content per streamed chunk
+STREAM_CHUNK = 24
+_ID_PATTERN = re.compile(r'"id":\s*"([0-9a-f-]{36})"')
+
+
+def _completion(content: str, model: str) -> dict:
+    return {
+        'id': 'bench-completion',
+        'object': 'chat.completion',
+        'model': model,
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+    }
+
+
+def chat_content(prompt: str, limit_hint: int = 5) -> str:
+    ids = []
+    for match in _ID_PATTERN.findall(prompt):
+        if match not in ids:
+            ids.append(match)
+    # The first id in recommendation prompts belongs to the requesting user
+    candidates = ids[1:]
+    if '"recommendations"' in prompt:
+        match = re.search(r'Select the top (\d+)', prompt)
+        limit = int(match.group(1)) if match else limit_hint
+        return json.dumps({'recommendations': [
+            {'id': cid, 'reason': 'You both work in the same industry and share skills in Python.'}
+            for cid in candidates[:limit]
+        ]})
+    if 'ranked_ids' in prompt:
+        return json.dumps({'ranked_ids': candidates})
+    return json.dumps({'text_query': '', 'industry': '', 'location': '', 'school': '',
+                       'career_status': '', 'skills': []})
+
+
+def make_handler(vectors: List[List[float]], stats: Stats, embedding_latency: float, chat_latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: dict, kind: str):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (e.g. its deadline passed)
+                return
+            stats.hit(kind, len(body))
+
+        def _stream(self, content: str, model: str, latency: float):
+            """Send content as a streamed completion: the first token after a
+            tenth of the latency, the rest spread over the remainder."""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            pieces = [content[i:i + STREAM_CHUNK] for i in range(0, len(content), STREAM_CHUNK)]
+            time.sleep(latency * 0.1)
+            sent = 0
+            for piece in pieces:
+                chunk = {'id': 'bench-completion', 'object': 'chat.completion.chunk', 'model': model,
+                         'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                line = f'data: {json.dumps(chunk)}\n\n'.encode('utf-8')
+                self.wfile.write(line)
+                self.wfile.flush()
+                sent += len(line)
+                time.sleep(latency * 0.9 / max(len(pieces), 1))
+            self.wfile.write(b'data: [DONE]\n\n')
+            stats.hit('chat', sent)
+
+        def do_GET(self):
+            if self.path == '/__bench/stats':
+                body = json.dumps(stats.snapshot()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self._send(404, {'error': 'not found'}, 'error')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if self.path.endswith('/embeddings'):
+                time.sleep(embedding_latency)
+                inputs = payload.get('input')
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                dimensions = payload.get('dimensions')
+                data = []
+                for index, text in enumerate(inputs):
+                    vector = vectors[pool_index_for_text(str(text))]
+                    if dimensions:
+                        vector = vector[:int(dimensions)]
+                    data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+                return self._send(200, {'object': 'list', 'data': data,
+                                        'model': payload.get('model')}, 'embeddings')
+            if self.path.endswith('/chat/completions'):
+                prompt = '\n'.join(m.get('content', '') for m in payload.get('messages', []))
+                content = chat_content(prompt)
+                if payload.get('stream'):
+                    return self._stream(content, payload.get('model', ''), chat_latency)
+                time.sleep(chat_latency)
+                return self._send(200, _completion(content, payload.get('model', '')), 'chat')
+            self._send(404, {'error': 'not found'}, 'error')
+
+    return Handler
@@ -0,0 +1,631 @@
+"""
+In-memory stand-in for the parts of PostgREST and GoTrue the backend uses.
+
+Supports the query-string dialect emitted by postgrest-py (select with
+embedded resources, eq/neq/in/is/ilike/ov/cs/or filters, order, limit,
+offset, exact counts, single-object responses), inserts/updates/deletes
+with return=representation, a registry of RPC functions mirroring the
+SQL migrations, and the GoTrue endpoints used by the auth routes.
+"""
+import functools
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.payload = {'code': code, 'message': message, 'details': None, 'hint': None}
+
+
+# Unique constraints from the migrations, used for conflict detection/upserts
+UNIQUE_KEYS = {
+    'profiles': [('id',), ('email',)],
+    'follows': [('follower_id', 'following_id')],
+    'insight_likes': [('insight_id', 'user_id')],
+    'conversations': [('user1_id', 'user2_id')],
+    'field_embeddings': [('text_hash', 'embedding_config_id')],
+    'profile_field_embeddings': [('profile_id', 'field')],
+    'recommendation_cache': [('user_id',)],
+    'conversation_reads': [('conversation_id', 'user_id')],
+}
+
+# Columns filled in by the database when omitted
+DEFAULTS = {
+    'notifications': {'read': False, 'related_profile_id': None, 'group_key': None, 'event_count': 1,
+                      'actor_ids': [], 'first_event_at': None},
+    'messages': {'is_read': False},
+    'conversations': {'last_message_id': None, 'last_message_at': None},
+    'profiles': {'skills': [], 'embedding': None, 'embedding_config_id': None},
+    'insights': {'embedding': None, 'embedding_config_id': None, 'link_url': None, 'link_title': None},
+    'recommendation_cache': {'invalidated_at': None},
+    'embedding_jobs': {
+        'status': 'pending', 'chunk_size': 100, 'cursor_id': None, 'exhausted': False, 'total': None,
+        'processed': 0, 'failed': 0, 'created_by': None, 'started_at': None, 'finished_at': None,
+    },
+}
+
+# Foreign key columns resolvable through embedded selects
+FOREIGN_TABLES = {
+    'follower_id': 'users',
+    'following_id': 'users',
+    'user_id': 'users',
+    'related_user_id': 'users',
+    'sender_id': 'users',
+}
+
+
+class Table:
+    def __init__(self, name: str, rows: Optional[List[dict]] = None):
+        self.name = name
+        self.rows: List[dict] = rows or []
+        self._indexes: Dict[str, Dict] = {}
+
+    def invalidate(self):
+        self._indexes = {}
+
+    def index(self, column: str) -> Dict:
+        idx = self._indexes.get(column)
+        if idx is None:
+            idx = {}
+            for row in self.rows:
+                value = row.get(column)
+                if isinstance(value, (list, dict)):
+                    continue
+                idx.setdefault(value, []).append(row)
+            self._indexes[column] = idx
+        return idx
+
+
+class Store:
+    """Tables plus row-level hooks that mirror the SQL triggers."""
+
+    def __init__(self):
+        self.tables: Dict[str, Table] = {}
+        self.vectors: Dict[int, List[float]] = {}
+        self.lock = threading.RLock()
+        self.after_insert: Dict[str, List[Callable]] = {}
+        self.rpcs: Dict[str, Callable] = {}
+
+    def table(self, name: str) -> Table:
+        table = self.tables.get(name)
+        if table is None:
+            table = Table(name)
+            self.tables[name] = table
+        return table
+
+    def on_insert(self, table: str, hook: Callable):
+        self.after_insert.setdefault(table, []).append(hook)
+
+    def insert(self, table_name: str, row: dict, upsert_on: Optional[tuple] = None) -> dict:
+        table = self.table(table_name)
+        for column, default in DEFAULTS.get(table_name, {}).items():
+            row.setdefault(column, default)
+        row.setdefault('id', str(uuid.uuid4()))
+        row.setdefault('created_at', now_iso())
+        if table_name in ('profiles', 'conversations', 'messages', 'insights', 'embedding_jobs'):
+            row.setdefault('updated_at', row['created_at'])
+        store_vector(self, row)
+
+        for key in UNIQUE_KEYS.get(table_name, []) + [('id',)]:
+            values = tuple(row.get(c) for c in key)
+            existing = [r for r in table.index(key[0]).get(values[0], [])
+                        if tuple(r.get(c) for c in key) == values]
+            if existing:
+                if upsert_on and tuple(upsert_on) == key:
+                    existing[0].update(row)
+                    table.invalidate()
+                    return existing[0]
+                raise PostgrestError(
+                    409, '23505',
+                    f'duplicate key value violates unique constraint on {table_name}({", ".join(key)})',
+                )
+
+        table.rows.append(row)
+        table.invalidate()
+        for hook in self.after_insert.get(table_name, []):
+            hook(self, row)
+        return row
+
+    def rpc(self, name: str, handler: Callable):
+        self.rpcs[name] = handler
+
+
+def store_vector(store: Store, row: dict):
+    """Keep vectors written by the app searchable by the fake RPCs."""
+    embedding = row.get('embedding')
+    if isinstance(embedding, list):
+        row['_vec'] = _normalise(embedding)
+        row['embedding'] = json.dumps(embedding, separators=(',', ':'))
+        row.pop('_emb', None)
+
+
+def _normalise(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def row_vector(store: Store, row: dict) -> Optional[List[float]]:
+    if row.get('_emb') is not None:
+        return store.vectors[row['_emb']]
+    return row.get('_vec')
+
+
+def cosine_similarities(store: Store, rows: List[dict], query: List[float]) -> List[tuple]:
+    """Return (similarity, row) for rows that have a vector.
+
+    Seeded rows share a pool of vectors, so similarity is computed once per
+    pool entry rather than once per row.
+    """
+    query = _normalise(query)
+    pool_cache: Dict[int, float] = {}
+    results = []
+    for row in rows:
+        pool_id = row.get('_emb')
+        if pool_id is not None:
+            if pool_id not in pool_cache:
+                pool_cache[pool_id] = sum(a * b for a, b in zip(store.vectors[pool_id], query))
+            results.append((pool_cache[pool_id], row))
+        elif row.get('_vec') is not None:
+            results.append((sum(a * b for a, b in zip(row['_vec'], query)), row))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Query-string parsing
+# ---------------------------------------------------------------------------
+
+def _split_top_level(value: str, sep: str = ',') -> List[str]:
+    parts, depth, current, quoted = [], 0, [], False
+    for ch in value:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in '({':
+            depth += 1
+        elif not quoted and ch in ')}':
+            depth -= 1
+        if ch == sep and depth == 0 and not quoted:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append(''.join(current).strip())
+    return [p for p in parts if p]
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_set(operand: str) -> frozenset:
+    # Filters are evaluated once per row, so parse each operand only once
+    return frozenset(_parse_list(operand))
+
+
+def _parse_list(operand: str) -> List[str]:
+    inner = operand.strip()[1:-1]
+    return [item.strip().strip('"') for item in _split_top_level(inner)] if inner else []
+
+
+def _coerce(operand: str, sample):
+    if operand == 'null':
+        return None
+    if isinstance(sample, bool):
+        return operand == 'true'
+    if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+        try:
+            return float(operand)
+        except ValueError:
+            return operand
+    return operand
+
+
+def like_match(pattern: str, value, case_insensitive: bool) -> bool:
+    if value is None:
+        return False
+    parts, escaped = [], False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in '%*':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    regex = '^' + ''.join(parts) + '$'
+    flags = re.IGNORECASE if case_insensitive else 0
+    return re.match(regex, str(value), flags | re.DOTALL) is not None
+
+
+def _compare(op: str, value, operand: str) -> bool:
+    if op == 'is':
+        if operand == 'null':
+            return value is None
+        return value is (operand == 'true')
+    if op in ('in',):
+        return value is not None and str(value) in _parse_set(operand)
+    if op in ('ov', 'cs', 'cd'):
+        options = _parse_set(operand)
+        current = set(value or [])
+        if op == 'ov':
+            return bool(current & options)
+        if op == 'cs':
+            return options <= current
+        return current <= options
+    if op == 'like':
+        return like_match(operand, value, False)
+    if op == 'ilike':
+        return like_match(operand, value, True)
+    if value is None:
+        return False
+    target = _coerce(operand, value)
+    if isinstance(value, bool) or target is None:
+        return (value == target) if op == 'eq' else (value != target) if op == 'neq' else False
+    if isinstance(target, float):
+        value = float(value)
+    else:
+        value = str(value)
+    if op == 'eq':
+        return value == target
+    if op == 'neq':
+        return value != target
+    if op == 'gt':
+        return value > target
+    if op == 'gte':
+        return value >= target
+    if op == 'lt':
+        return value < target
+    if op == 'lte':
+        return value <= target
+    raise PostgrestError(400, 'PGRST100', f'unsupported operator {op}')
+
+
+def _parse_condition(column: str, expression: str):
+    negate = False
+    if expression.startswith('not.'):
+        negate = True
+        expression = expression[4:]
+    op, _, operand = expression.partition('.')
+    return column, op, operand, negate
+
+
+def _or_predicate(expression: str):
+    conditions = []
+    for part in _split_top_level(expression.strip()[1:-1]):
+        column, _, rest = part.partition('.')
+        conditions.append(_parse_condition(column, rest))
+
+    def predicate(row):
+        return any(_compare(op, row.get(col), operand) != negate
+                   for col, op, operand, negate in conditions)
+    return predicate
+
+
+class Query:
+    RESERVED = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+    def __init__(self, params: List[tuple]):
+        self.select = '*'
+        self.order: List[tuple] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+        self.on_conflict: Optional[tuple] = None
+        self.conditions = []
+        self.predicates = []
+        for key, value in params:
+            if key == 'select':
+                self.select = value
+            elif key == 'order':
+                for part in value.split(','):
+                    pieces = part.split('.')
+                    self.order.append((pieces[0], 'desc' in pieces[1:], 'nullsfirst' in pieces[1:]))
+            elif key == 'limit':
+                self.limit = int(value)
+            elif key == 'offset':
+                self.offset = int(value)
+            elif key == 'on_conflict':
+                self.on_conflict = tuple(c.strip() for c in value.split(','))
+            elif key == 'columns' or '.' in key:
+                continue
+            elif key == 'or':
+                self.predicates.append(_or_predicate(value))
+            else:
+                self.conditions.append(_parse_condition(key, value))
+
+    def matching(self, table: Table) -> List[dict]:
+        candidates = table.rows
+        for column, op, operand, negate in self.conditions:
+            if op == 'eq' and not negate and column in ('id', 'user_id', 'follower_id', 'following_id',
+                                                        'insight_id', 'conversation_id', 'user1_id',
+                                                        'user2_id', 'email', 'profile_id'):
+                candidates = table.index(column).get(operand, [])
+                break
+        rows = []
+        for row in candidates:
+            if all(_compare(op, row.get(col), operand) != negate
+                   for col, op, operand, negate in self.conditions) and \
+                    all(p(row) for p in self.predicates):
+                rows.append(row)
+        return rows
+
+    def apply_order(self, rows: List[dict]) -> List[dict]:
+        for column, desc, nulls_first in reversed(self.order):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: r[column], reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    def page(self, rows: List[dict]) -> List[dict]:
+        end = None if self.limit is None else self.offset + self.limit
+        return rows[self.offset:end]
+
+
+def project(store: Store, row: dict, select: str) -> dict:
+    items = _split_top_level(select)
+    result = {}
+    for item in items:
+        if '(' in item:
+            name, _, inner = item.partition('(')
+            inner = inner[:-1]
+            alias, _, target = name.partition(':')
+            if not target:
+                target = alias
+            result[alias.strip()] = _embed(store, row, target.strip(), inner)
+        elif item == '*':
+            for key, value in row.items():
+                if not key.startswith('_'):
+                    result[key] = value
+        else:
+            alias, _, column = item.partition(':')
+            column = column or alias
+            result[alias.strip()] = row.get(column.strip())
+    return result
+
+
+def _embed(store: Store, row: dict, target: str, inner: str):
+    if '!' in target:
+        # profiles!follows_follower_id_fkey -> profiles joined on follower_id
+        table_name, _, fk = target.partition('!')
+        column = fk.replace(f'{_table_prefix(fk)}_', '', 1).replace('_fkey', '')
+        related = store.table(table_name).index('id').get(row.get(column), [])
+        return [project(store, r, inner) for r in related]
+    if target in FOREIGN_TABLES:
+        related = store.table(FOREIGN_TABLES[target]).index('id').get(row.get(target), [])
+        return project(store, related[0], inner) if related else None
+    related = store.table(target).index('id').get(row.get(f'{target[:-1]}_id'), [])
+    return project(store, related[0], inner) if related else None
+
+
+def _table_prefix(fk: str) -> str:
+    return fk.split('_', 1)[0]
+
+
+# ---------------------------------------------------------------------------
+# HTTP handler
+# ---------------------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.bytes_out = 0
+
+    def hit(self, kind: str, size: int = 0):
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            self.bytes_out += size
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {'counts': dict(self.counts), 'bytes_out': self.bytes_out}
+
+
+def make_handler(store: Store, stats: Stats, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload=None, headers: Optional[dict] = None, kind: str = None):
+            body = b'' if payload is None else json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+            if kind:
+                stats.hit(kind, len(body))
+
+        def _body(self):
+            return json.loads(self._raw_body) if self._raw_body else None
+
+        def _dispatch(self):
+            # Always drain the body so keep-alive connections stay in sync
+            length = int(self.headers.get('Content-Length') or 0)
+            self._raw_body = self.rfile.read(length) if length else b''
+            url = urlsplit(self.path)
+            params = parse_qsl(url.query, keep_blank_values=True)
+            path = url.path
+            try:
+                if path.startswith('/__bench/'):
+                    return self._bench(path)
+                if latency:
+                    time.sleep(latency)
+                if path.startswith('/auth/v1/'):
+                    return self._auth(path[len('/auth/v1/'):], dict(params))
+                if path.startswith('/rest/v1/rpc/'):
+                    return self._rpc(path[len('/rest/v1/rpc/'):], params)
+                if path.startswith('/rest/v1/'):
+                    return self._rest(path[len('/rest/v1/'):], params)
+                self._send(404, {'message': 'not found'})
+            except PostgrestError as exc:
+                self._send(exc.status, exc.payload, kind='error')
+
+        do_GET = do_POST = do_PATCH = do_DELETE = do_HEAD = do_PUT = _dispatch
+
+        # -- PostgREST ------------------------------------------------------
+        def _rest(self, table_name: str, params: List[tuple]):
+            query = Query(params)
+            prefer = self.headers.get('Prefer', '')
+            single = 'vnd.pgrst.object' in (self.headers.get('Accept') or '')
+            with store.lock:
+                table = store.table(table_name)
+                if self.command in ('GET', 'HEAD'):
+                    rows = query.apply_order(query.matching(table))
+                    total = len(rows)
+                    page = query.page(rows)
+                    data = [project(store, r, query.select) for r in page]
+                elif self.command == 'POST':
+                    body = self._body()
+                    records = body if isinstance(body, list) else [body]
+                    upsert_on = None
+                    if 'resolution=merge-duplicates' in prefer:
+                        upsert_on = query.on_conflict or ('id',)
+                    written = [store.insert(table_name, dict(r), upsert_on) for r in records]
+                    data = [project(store, r, query.select) for r in written]
+                    total = len(data)
+                elif self.command == 'PATCH':
+                    body = self._body() or {}
+                    rows = query.matching(table)
+                    for row in rows:
+                        row.update(body)
+                        store_vector(store, row)
+                        if 'updated_at' in row and 'updated_at' not in body:
+                            row['updated_at'] = now_iso()
+                    table.invalidate()
+                    data = [project(store, r, query.select) for r in rows]
+                    total = len(data)
+                elif self.command == 'DELETE':
+                    rows = query.matching(table)
+                    doomed = {id(r) for r in rows}
+                    table.rows = [r for r in table.rows if id(r) not in doomed]
+                    table.invalidate()
+                    data = [project(store, r, query.select) for r in rows]
+                    total = len(data)
+                else:
+                    raise PostgrestError(405, 'PGRST000', 'method not allowed')
+
+            headers = {}
+            if 'count=' in prefer:
+                headers['Content-Range'] = f'0-{max(len(data) - 1, 0)}/{total}' if data else f'*/{total}'
+            if single:
+                if len(data) != 1:
+                    raise PostgrestError(
+                        406, 'PGRST116',
+                        f'JSON object requested, multiple (or no) rows returned ({len(data)})',
+                    )
+                data = data[0]
+            status = 201 if self.command == 'POST' else 200
+            self._send(status, data, headers, kind='rest')
+
+        def _rpc(self, name: str, params: List[tuple]):
+            handler = store.rpcs.get(name)
+            if handler is None:
+                raise PostgrestError(404, 'PGRST202', f'Could not find the function public.{name}')
+            args = self._body() or {}
+            with store.lock:
+                result = handler(store, args)
+            query = Query(params)
+            if isinstance(result, list):
+                result = query.page(query.apply_order(result))
+                if query.select != '*':
+                    result = [project(store, row, query.select) for row in result]
+            self._send(200, result, kind='rpc')
+
+        # -- GoTrue ---------------------------------------------------------
+        def _auth(self, endpoint: str, params: dict):
+            if endpoint == 'user':
+                token = (self.headers.get('Authorization') or '').split(' ')[-1]
+                user = _user_for_token(store, token)
+                if user is None:
+                    return self._send(401, {'msg': 'invalid JWT'}, kind='auth')
+                return self._send(200, user, kind='auth')
+            if endpoint == 'signup':
+                body = self._body() or {}
+                with store.lock:
+                    user = _new_user(store, body.get('email'), (body.get('data') or {}))
+                return self._send(200, user, kind='auth')
+            if endpoint == 'token':
+                body = self._body() or {}
+                with store.lock:
+                    matches = store.table('users').index('email').get(body.get('email'), [])
+                if not matches:
+                    return self._send(400, {'msg': 'Invalid login credentials'}, kind='auth')
+                user = _user_payload(matches[0])
+                return self._send(200, {
+                    'access_token': token_for(user['id']),
+                    'refresh_token': 'bench-refresh',
+                    'expires_in': 3600,
+                    'token_type': 'bearer',
+                    'user': user,
+                }, kind='auth')
+            if endpoint == 'logout':
+                return self._send(204, kind='auth')
+            self._send(404, {'msg': 'not found'}, kind='auth')
+
+        def _bench(self, path: str):
+            if path == '/__bench/stats':
+                return self._send(200, stats.snapshot())
+            if path == '/__bench/sample':
+                with store.lock:
+                    return self._send(200, store.sample)
+            self._send(404, {'message': 'not found'})
+
+    return Handler
+
+
+TOKEN_PREFIX = 'bench-token-'
+
+
+def token_for(user_id: str) -> str:
+    return f'{TOKEN_PREFIX}{user_id}'
+
+
+def _user_payload(row: dict) -> dict:
+    return {
+        'id': row['id'],
+        'aud': 'authenticated',
+        'role': 'authenticated',
+        'email': row.get('email'),
+        'app_metadata': {'provider': 'email'},
+        'user_metadata': row.get('user_metadata') or {},
+        'created_at': row.get('created_at') or now_iso(),
+    }
+
+
+def _user_for_token(store: Store, token: str) -> Optional[dict]:
+    if not token.startswith(TOKEN_PREFIX):
+        return None
+    user_id = token[len(TOKEN_PREFIX):]
+    with store.lock:
+        rows = store.table('users').index('id').get(user_id, [])
+        if not rows:
+            # Benchmarks may mint tokens for brand-new users
+            rows = [store.insert('users', {'id': user_id, 'email': f'{user_id}@bench.local'})]
+    return _user_payload(rows[0])
+
+
+def _new_user(store: Store, email: str, metadata: dict) -> dict:
+    row = store.insert('users', {'email': email, 'user_metadata': metadata})
+    return _user_payload(row)
@@ -0,0 +1,113 @@
+"""
+Boots the fake Supabase and OpenRouter servers in a child process so their
+CPU time and memory don't pollute measurements of the Flask app.
+"""
+import json
+import multiprocessing
+import os
+import urllib.request
+from http.server import ThreadingHTTPServer
+from threading import Thread
+
+# Any JWT-shaped string satisfies supabase-py's key validation
+FAKE_SERVICE_KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark'
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when a burst of
+    # concurrent upstream calls opens many at once; real upstreams don't
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def _serve(conn, scale, dim, db_latency, embedding_latency, chat_latency):
+    from benchmarks import fake_openrouter, fake_supabase
+    from benchmarks.seed import seed_store
+
+    store = fake_supabase.Store()
+    seed_store(store, scale, dim)
+
+    supabase_stats = fake_supabase.Stats()
+    openrouter_stats = fake_supabase.Stats()
+    supabase_server = _Server(
+        ('127.0.0.1', 0), fake_supabase.make_handler(store, supabase_stats, db_latency))
+    openrouter_server = _Server(
+        ('127.0.0.1', 0),
+        fake_openrouter.make_handler(
+            [store.vectors[i] for i in sorted(store.vectors)],
+            openrouter_stats, embedding_latency, chat_latency,
+        ))
+    for server in (supabase_server, openrouter_server):
+        Thread(target=server.serve_forever, daemon=True).start()
+
+    conn.send((supabase_server.server_address[1], openrouter_server.server_address[1]))
+    conn.recv()  # block until the parent asks us to stop
+
+
+class FakeUpstreams:
+    """Context manager running seeded fake upstreams in a subprocess."""
+
+    def __init__(self, scale=1000, dim=1536, db_latency_ms=3.0,
+                 embedding_latency_ms=80.0, chat_latency_ms=1500.0):
+        self.scale = scale
+        self.dim = dim
+        self.latencies = (db_latency_ms / 1000, embedding_latency_ms / 1000, chat_latency_ms / 1000)
+        self.supabase_url = None
+        self.openrouter_url = None
+
+    def __enter__(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_serve, args=(child_conn, self.scale, self.dim, *self.latencies), daemon=True)
+        self._process.start()
+        supabase_port, openrouter_port = self._conn.recv()
+        self.supabase_url = f'http://127.0.0.1:{supabase_port}'
+        self.openrouter_url = f'http://127.0.0.1:{openrouter_port}/api/v1'
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._conn.send('stop')
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def env(self, with_llm: bool = True) -> dict:
+        env = {
+            'SUPABASE_URL': self.supabase_url,
+            'SUPABASE_SERVICE_KEY': FAKE_SERVICE_KEY,
+            'OPENROUTER_BASE_URL': self.openrouter_url,
+            'EMBEDDING_DIMENSIONS': str(self.dim),
+            'VERCEL': '1',  # skip loading a developer's backend/.env
+            # Scenarios repeat one user's requests far past the per-user limits
+            'RATE_LIMIT_ENABLED': os.environ.get('RATE_LIMIT_ENABLED', '0'),
+        }
+        if with_llm:
+            env['OPENROUTER_API_KEY'] = 'bench-openrouter-key'
+        return env
+
+    def apply_env(self, with_llm: bool = True):
+        os.environ.update(self.env(with_llm))
+        if not with_llm:
+            os.environ.pop('OPENROUTER_API_KEY', None)
+
+    def _get(self, url: str) -> dict:
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            return json.loads(resp.read())
+
+    def sample(self) -> dict:
+        return self._get(f'{self.supabase_url}/__bench/sample')
+
+    def stats(self) -> dict:
+        supabase = self._get(f'{self.supabase_url}/__bench/stats')
+        openrouter = self._get(self.openrouter_url.rsplit('/api/v1', 1)[0] + '/__bench/stats')
+        counts = dict(supabase['counts'])
+        counts.update(openrouter['counts'])
+        return {
+            'counts': counts,
+            'bytes_from_supabase': supabase['bytes_out'],
+            'bytes_from_openrouter': openrouter['bytes_out'],
+        }
@@ -0,0 +1,195 @@
+"""
+Load benchmark: the development server (`python run.py`) against gunicorn
+with gunicorn.conf.py, both serving the app over HTTP against the seeded
+fake upstreams.
+
+Each server is started as a subprocess and driven by --concurrency client
+threads on keep-alive connections for --duration seconds, cycling through
+a mix of authenticated read routes and an unknown path (the error path).
+Reports throughput, latency percentiles and non-2xx responses per server.
+
+    cd backend
+    python -m benchmarks.load --scale 1000 --concurrency 32 --duration 15
+    python -m benchmarks.load --servers gunicorn --workers 4 --threads 16
+
+The client shares the machine with the server, so compare servers within
+one run rather than absolute numbers across machines.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_supabase import token_for  # noqa: E402
+from benchmarks.harness import FakeUpstreams  # noqa: E402
+from benchmarks.run import _percentile  # noqa: E402
+
+ROUTES = [
+    '/api/health',
+    '/api/profile',
+    '/api/notifications/?limit=10',
+    '/api/insights/feed',
+    '/api/messages/unread-count',
+    '/api/no-such-route',
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _command(server: str) -> List[str]:
+    if server == 'dev':
+        return [sys.executable, 'run.py']
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app']
+
+
+def _start(server: str, port: int, env: dict, args) -> subprocess.Popen:
+    env = dict(env, PORT=str(port))
+    if server == 'gunicorn':
+        env.update(GUNICORN_WORKERS=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    else:
+        env['FLASK_DEBUG'] = '1' if args.dev_debug else '0'
+    process = subprocess.Popen(
+        _command(server), cwd=BACKEND_DIR, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=2):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f'{server} server exited with {process.returncode}')
+            time.sleep(0.2)
+    _stop(process)
+    raise RuntimeError(f'{server} server did not start')
+
+
+def _stop(process: subprocess.Popen):
+    # The dev server's reloader runs the app in a child; stop the whole group
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _drive(port: int, headers: dict, duration: float, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    failures = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset: int):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine, codes, i = [], {}, offset
+        while time.monotonic() < stop_at:
+            path = ROUTES[i % len(ROUTES)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                with lock:
+                    failures[0] += 1
+                continue
+            mine.append((time.perf_counter() - started) * 1000)
+            codes[response.status] = codes.get(response.status, 0) + 1
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 50), 1),
+        'p95_ms': round(_percentile(latencies, 95), 1),
+        'p99_ms': round(_percentile(latencies, 99), 1),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'connection_errors': failures[0],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000, help='number of seeded profiles')
+    parser.add_argument('--dim', type=int, default=256, help='embedding dimensions')
+    parser.add_argument('--db-latency-ms', type=float, default=3.0)
+    parser.add_argument('--servers', nargs='+', choices=['dev', 'gunicorn'], default=['dev', 'gunicorn'])
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per server')
+    parser.add_argument('--warmup', type=float, default=2.0, help='untimed seconds per server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--dev-debug', action=argparse.BooleanOptionalAction, default=True,
+                        help='run the dev server with the debugger and reloader, as run.py does')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    print(f'Seeding fake upstreams with {args.scale} profiles...', file=sys.stderr)
+    results = {}
+    with FakeUpstreams(args.scale, args.dim, args.db_latency_ms) as upstreams:
+        env = dict(os.environ, **upstreams.env(with_llm=False))
+        env.pop('OPENROUTER_API_KEY', None)
+        user_id = upstreams.sample()['profile_ids'][0]
+        headers = {'Authorization': f'Bearer {token_for(user_id)}'}
+
+        for server in args.servers:
+            print(f'  {server}', file=sys.stderr)
+            port = _free_port()
+            process = _start(server, port, env, args)
+            try:
+                _drive(port, headers, args.warmup, args.concurrency)
+                results[server] = _drive(port, headers, args.duration, args.concurrency)
+            finally:
+                _stop(process)
+
+    header = f"{'server':10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  statuses"
+    print(header)
+    print('-' * len(header))
+    for server, r in results.items():
+        print(f"{server:10} {r['requests_per_second']:9.1f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+              f"{r['p99_ms']:9.1f} {r['connection_errors']:7}  {r['statuses']}")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'json'},
+                       'servers': results}, fh, indent=2)
+        print(f'Wrote {args.json}', file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    main()
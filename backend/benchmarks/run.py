@@ -0,0 +1,408 @@
+"""
+Offline benchmark for every backend route.
+
+Boots create_app() against local fake PostgREST/GoTrue and OpenRouter
+servers seeded with synthetic data, drives each route through the Flask
+test client and reports p50/p95 latency, upstream calls per request,
+response size and peak Python allocations.
+
+    cd backend
+    python -m benchmarks.run --scale 1000 --iterations 20 --json bench.json
+    python -m benchmarks.run --scale 10000 --routes profile.search --compare bench.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_supabase import token_for  # noqa: E402
+from benchmarks.harness import FakeUpstreams  # noqa: E402
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[dict, dict], str]
+    body: Optional[Callable[[dict, dict], dict]] = None
+    # Untimed preparation; returns extra values available to path/body
+    setup: Optional[Callable[[object, dict, int], dict]] = None
+    user: Callable[[dict, dict], Optional[str]] = lambda ctx, extra: ctx['me']
+    expected: tuple = (200, 201)
+    tags: List[str] = field(default_factory=list)
+
+
+def _auth(user_id: Optional[str]) -> dict:
+    return {'Authorization': f'Bearer {token_for(user_id)}'} if user_id else {}
+
+
+def _fresh_user(client, ctx, i) -> dict:
+    return {'user': str(uuid.uuid4())}
+
+
+def _new_profile_body(ctx, extra) -> dict:
+    return {
+        'email': f"{extra['user']}@bench.local",
+        'full_name': 'Benchmark Newcomer',
+        'location': 'Blacksburg, VA',
+        'industry': 'Software Engineering',
+        'current_school': 'Virginia Tech',
+        'career_status': 'student',
+        'bio': 'Benchmark profile created by the offline harness.',
+        'skills': ['Python', 'React'],
+    }
+
+
+def _create_profile(client, ctx, i) -> dict:
+    extra = _fresh_user(client, ctx, i)
+    client.post('/api/profile', json=_new_profile_body(ctx, extra), headers=_auth(extra['user']))
+    return extra
+
+
+def _ensure_unfollowed(client, ctx, i) -> dict:
+    client.delete(f"/api/follows/unfollow/{ctx['other']}", headers=_auth(ctx['me']))
+    return {}
+
+
+def _ensure_followed(client, ctx, i) -> dict:
+    client.post(f"/api/follows/follow/{ctx['other']}", headers=_auth(ctx['me']))
+    return {}
+
+
+def _ensure_unliked(client, ctx, i) -> dict:
+    client.delete(f"/api/insights/{ctx['insight']}/unlike", headers=_auth(ctx['me']))
+    return {}
+
+
+def _ensure_liked(client, ctx, i) -> dict:
+    client.post(f"/api/insights/{ctx['insight']}/like", headers=_auth(ctx['me']))
+    return {}
+
+
+def _create_insight(client, ctx, i) -> dict:
+    resp = client.post('/api/insights', json={'title': f'Bench insight {i}', 'content': 'Setup content'},
+                       headers=_auth(ctx['me']))
+    return {'insight': resp.get_json()['id']}
+
+
+def _drop_recommendations(client, ctx, i) -> dict:
+    from app.supabase_client import supabase
+    supabase.table('recommendation_cache').delete().eq('user_id', ctx['me']).execute()
+    return {}
+
+
+def _invalidate_recommendations(client, ctx, i) -> dict:
+    from app.services import recommendations
+    client.get('/api/profile/recommendations?limit=3', headers=_auth(ctx['me']))
+    recommendations.invalidate([ctx['me']])
+    return {}
+
+
+def _start_embedding_job(client, ctx, i) -> dict:
+    from app.services import embedding_jobs
+    job, _ = embedding_jobs.start_job('insights', 'missing')
+    return {'job': job['id']}
+
+
+def _create_notification(client, ctx, i) -> dict:
+    # Sending a message triggers a notification for the other participant
+    client.post(f"/api/messages/conversations/{ctx['conversation']}/messages",
+                json={'content': f'setup {i}'}, headers=_auth(ctx['conversation_peer']))
+    resp = client.get('/api/notifications/?limit=1', headers=_auth(ctx['conversation_user']))
+    return {'notification': resp.get_json()['notifications'][0]['id']}
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario('health', 'GET', lambda c, e: '/api/health', user=lambda c, e: None),
+    Scenario('auth.signup', 'POST', lambda c, e: '/api/auth/signup',
+             body=lambda c, e: {'email': f'{uuid.uuid4()}@bench.local', 'password': 'pw123456',
+                                'full_name': 'Signup Bench'},
+             user=lambda c, e: None),
+    Scenario('auth.signin', 'POST', lambda c, e: '/api/auth/signin',
+             body=lambda c, e: {'email': 'user0@bench.local', 'password': 'pw123456'},
+             user=lambda c, e: None),
+    Scenario('auth.user', 'GET', lambda c, e: '/api/auth/user'),
+    Scenario('auth.signout', 'POST', lambda c, e: '/api/auth/signout', user=lambda c, e: None),
+
+    Scenario('profile.get', 'GET', lambda c, e: '/api/profile'),
+    Scenario('profile.get_by_id', 'GET', lambda c, e: f"/api/profile/{c['other']}"),
+    Scenario('profile.create', 'POST', lambda c, e: '/api/profile', body=_new_profile_body,
+             setup=_fresh_user, user=lambda c, e: e['user']),
+    Scenario('profile.update', 'PUT', lambda c, e: '/api/profile',
+             body=lambda c, e: {'bio': f'Updated bio {uuid.uuid4()}'}),
+    Scenario('profile.delete', 'DELETE', lambda c, e: '/api/profile',
+             setup=_create_profile, user=lambda c, e: e['user']),
+    Scenario('profile.search', 'GET', lambda c, e: '/api/profile/search?q=robotics+engineer'),
+    Scenario('profile.search_field_weights', 'GET',
+             lambda c, e: '/api/profile/search?q=robotics+engineer&field_weights=location:0,skills:3'),
+    Scenario('profile.search_filters', 'GET',
+             lambda c, e: '/api/profile/search?industry=Data+Science&location=seattle'),
+    Scenario('profile.search_fuzzy_school', 'GET',
+             lambda c, e: '/api/profile/search?school=Virgina+Tek&fuzzy_school=true'),
+    Scenario('profile.search_fuzzy_school_filters', 'GET',
+             lambda c, e: '/api/profile/search?school=Virgina+Tek&fuzzy_school=true'
+                          '&industry=Robotics&skills=Python&skills=Rust&fields=full_name'),
+    Scenario('profile.recommendations', 'GET', lambda c, e: '/api/profile/recommendations?limit=3'),
+    Scenario('profile.recommendations_miss', 'GET', lambda c, e: '/api/profile/recommendations?limit=3',
+             setup=_drop_recommendations),
+    Scenario('profile.recommendations_stream', 'GET',
+             lambda c, e: '/api/profile/recommendations/stream?limit=3', setup=_drop_recommendations),
+    Scenario('profile.recommendations_stale', 'GET', lambda c, e: '/api/profile/recommendations?limit=3',
+             setup=_invalidate_recommendations),
+    Scenario('profile.similar', 'GET', lambda c, e: f"/api/profile/{c['other']}/similar?limit=10"),
+    Scenario('profile.embeddings_missing', 'POST',
+             lambda c, e: '/api/profile/embeddings/generate?force=false', tags=['slow']),
+    Scenario('embeddings.job_status', 'GET', lambda c, e: f"/api/embeddings/jobs/{e['job']}",
+             setup=_start_embedding_job),
+
+    Scenario('follows.follow', 'POST', lambda c, e: f"/api/follows/follow/{c['other']}",
+             setup=_ensure_unfollowed),
+    Scenario('follows.unfollow', 'DELETE', lambda c, e: f"/api/follows/unfollow/{c['other']}",
+             setup=_ensure_followed),
+    Scenario('follows.followers', 'GET', lambda c, e: f"/api/follows/followers/{c['me']}"),
+    Scenario('follows.following', 'GET', lambda c, e: f"/api/follows/following/{c['me']}"),
+    Scenario('follows.is_following', 'GET', lambda c, e: f"/api/follows/is-following/{c['other']}"),
+    Scenario('follows.stats', 'GET', lambda c, e: f"/api/follows/stats/{c['me']}"),
+
+    Scenario('notifications.list', 'GET', lambda c, e: '/api/notifications/?limit=10',
+             user=lambda c, e: c['conversation_user']),
+    Scenario('notifications.unread_count', 'GET', lambda c, e: '/api/notifications/unread-count',
+             user=lambda c, e: c['conversation_user']),
+    Scenario('notifications.mark_read', 'POST', lambda c, e: '/api/notifications/mark-read',
+             body=lambda c, e: {'ids': [e['notification']]},
+             setup=_create_notification, user=lambda c, e: c['conversation_user']),
+    Scenario('notifications.delete', 'DELETE',
+             lambda c, e: f"/api/notifications/{e['notification']}",
+             setup=_create_notification, user=lambda c, e: c['conversation_user']),
+    Scenario('notifications.clear_all', 'DELETE', lambda c, e: '/api/notifications/clear-all',
+             setup=_fresh_user, user=lambda c, e: e['user']),
+
+    Scenario('messages.conversations', 'GET', lambda c, e: '/api/messages/conversations',
+             user=lambda c, e: c['conversation_user']),
+    Scenario('messages.get_or_create', 'GET',
+             lambda c, e: f"/api/messages/conversations/{c['conversation_peer']}",
+             user=lambda c, e: c['conversation_user']),
+    Scenario('messages.list', 'GET',
+             lambda c, e: f"/api/messages/conversations/{c['conversation']}/messages",
+             user=lambda c, e: c['conversation_user']),
+    Scenario('messages.send', 'POST',
+             lambda c, e: f"/api/messages/conversations/{c['conversation']}/messages",
+             body=lambda c, e: {'content': 'Benchmark message'},
+             user=lambda c, e: c['conversation_user']),
+    Scenario('messages.mark_read', 'POST',
+             lambda c, e: f"/api/messages/conversations/{c['conversation']}/mark-read",
+             user=lambda c, e: c['conversation_user']),
+    Scenario('messages.unread_count', 'GET', lambda c, e: '/api/messages/unread-count',
+             user=lambda c, e: c['conversation_user']),
+
+    Scenario('insights.feed', 'GET', lambda c, e: '/api/insights/feed'),
+    Scenario('insights.create', 'POST', lambda c, e: '/api/insights',
+             body=lambda c, e: {'title': 'Benchmark insight', 'content': 'Measured offline.'}),
+    Scenario('insights.get', 'GET', lambda c, e: f"/api/insights/{c['insight']}"),
+    Scenario('insights.update', 'PUT', lambda c, e: f"/api/insights/{e['insight']}",
+             body=lambda c, e: {'title': 'Edited insight'}, setup=_create_insight),
+    Scenario('insights.delete', 'DELETE', lambda c, e: f"/api/insights/{e['insight']}",
+             setup=_create_insight),
+    Scenario('insights.by_user', 'GET', lambda c, e: f"/api/users/{c['other']}/insights"),
+    Scenario('insights.like', 'POST', lambda c, e: f"/api/insights/{c['insight']}/like",
+             setup=_ensure_unliked),
+    Scenario('insights.unlike', 'DELETE', lambda c, e: f"/api/insights/{c['insight']}/unlike",
+             setup=_ensure_liked),
+    Scenario('insights.search', 'GET', lambda c, e: '/api/insights/search?q=robotics', tags=['slow']),
+    Scenario('insights.embeddings_missing', 'POST',
+             lambda c, e: '/api/insights/embeddings/generate?force=false', tags=['slow']),
+
+    # The dashboard's notifications, feed and recommendations in one request
+    Scenario('batch.dashboard', 'POST', lambda c, e: '/api/batch', body=lambda c, e: {'requests': [
+        {'id': 'notifications', 'path': '/api/notifications/', 'query': {'limit': 10}},
+        {'id': 'feed', 'path': '/api/insights/feed'},
+        {'id': 'recommendations', 'path': '/api/profile/recommendations', 'query': {'limit': 3}},
+    ]}),
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _count_delta(before: dict, after: dict) -> Dict[str, int]:
+    keys = set(before['counts']) | set(after['counts'])
+    return {k: after['counts'].get(k, 0) - before['counts'].get(k, 0) for k in keys
+            if after['counts'].get(k, 0) - before['counts'].get(k, 0)}
+
+
+def _call(client, scenario: Scenario, ctx: dict, extra: dict):
+    kwargs = {'headers': _auth(scenario.user(ctx, extra))}
+    if scenario.body:
+        kwargs['json'] = scenario.body(ctx, extra)
+    return client.open(scenario.path(ctx, extra), method=scenario.method, **kwargs)
+
+
+def run_scenario(client, upstreams: FakeUpstreams, scenario: Scenario, ctx: dict,
+                 iterations: int, warmup: int, track_memory: bool) -> dict:
+    latencies = []
+    upstream_totals: Dict[str, int] = {}
+    statuses: Dict[int, int] = {}
+    response_bytes = 0
+    upstream_bytes = 0
+
+    for i in range(warmup + iterations):
+        extra = scenario.setup(client, ctx, i) if scenario.setup else {}
+        before = upstreams.stats()
+        started = time.perf_counter()
+        response = _call(client, scenario, ctx, extra)
+        # Streamed responses only run as their body is read
+        body = response.get_data()
+        response.close()
+        elapsed = time.perf_counter() - started
+        after = upstreams.stats()
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        response_bytes += len(body)
+        upstream_bytes += (after['bytes_from_supabase'] - before['bytes_from_supabase'])
+        for kind, count in _count_delta(before, after).items():
+            upstream_totals[kind] = upstream_totals.get(kind, 0) + count
+
+    result = {
+        'iterations': iterations,
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'upstream_calls_per_request': {
+            k: round(v / iterations, 2) for k, v in sorted(upstream_totals.items())
+        },
+        'response_bytes': int(response_bytes / iterations) if iterations else 0,
+        'supabase_bytes_per_request': int(upstream_bytes / iterations) if iterations else 0,
+    }
+
+    if track_memory:
+        extra = scenario.setup(client, ctx, warmup + iterations) if scenario.setup else {}
+        tracemalloc.start()
+        _call(client, scenario, ctx, extra)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_alloc_kb'] = round(peak / 1024, 1)
+
+    unexpected = [s for s in statuses if s not in scenario.expected]
+    if unexpected:
+        result['unexpected_statuses'] = unexpected
+    return result
+
+
+def _context(sample: dict) -> dict:
+    pair = sample['conversation_pairs'][0]
+    return {
+        'me': sample['profile_ids'][0],
+        'other': sample['profile_ids'][1],
+        'insight': sample['insight_ids'][1],
+        'conversation': sample['conversation_ids'][0],
+        'conversation_user': pair[0],
+        'conversation_peer': pair[1],
+    }
+
+
+def _print_table(results: Dict[str, dict], baseline: Optional[dict]):
+    header = f"{'route':32} {'p50 ms':>9} {'p95 ms':>9} {'calls':>7} {'resp KB':>9} {'peak KB':>9}"
+    if baseline:
+        header += f" {'p95 Δ':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        calls = sum(r['upstream_calls_per_request'].values())
+        line = (f"{name:32} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {calls:7.1f} "
+                f"{r['response_bytes'] / 1024:9.1f} {r.get('peak_alloc_kb', 0):9.1f}")
+        if baseline and name in baseline.get('routes', {}):
+            old = baseline['routes'][name]['p95_ms'] or 1e-9
+            line += f" {(r['p95_ms'] - old) / old * 100:+7.0f}%"
+        if r.get('unexpected_statuses'):
+            line += f"  statuses={r['statuses']}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000, help='number of seeded profiles')
+    parser.add_argument('--dim', type=int, default=1536, help='embedding dimensions')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--routes', nargs='*', help='route name prefixes to run (default: all)')
+    parser.add_argument('--skip-slow', action='store_true', help='skip full-table routes')
+    parser.add_argument('--db-latency-ms', type=float, default=3.0)
+    parser.add_argument('--embedding-latency-ms', type=float, default=80.0)
+    parser.add_argument('--chat-latency-ms', type=float, default=1500.0)
+    parser.add_argument('--no-llm', action='store_true', help='run without OPENROUTER_API_KEY')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc pass')
+    parser.add_argument('--vector-index', choices=['float16', 'float32'],
+                        help='enable the in-process vector index with this dtype')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS
+                 if (not args.routes or any(s.name.startswith(p) for p in args.routes))
+                 and not (args.skip_slow and 'slow' in s.tags)]
+
+    print(f'Seeding fake upstreams with {args.scale} profiles...', file=sys.stderr)
+    with FakeUpstreams(args.scale, args.dim, args.db_latency_ms,
+                       args.embedding_latency_ms, args.chat_latency_ms) as upstreams:
+        upstreams.apply_env(with_llm=not args.no_llm)
+        if args.vector_index:
+            os.environ.update({
+                'VECTOR_INDEX_ENABLED': 'true',
+                'VECTOR_INDEX_DTYPE': args.vector_index,
+                'VECTOR_INDEX_DIR': tempfile.mkdtemp(prefix='bench-vector-index-'),
+            })
+        from app import create_app
+
+        app = create_app()
+        if args.vector_index:
+            from app.services.vector_index import get_index
+            index = get_index(wait=True)
+            print(f'Vector index holds {len(index)} profiles', file=sys.stderr)
+        client = app.test_client()
+        ctx = _context(upstreams.sample())
+
+        results = {}
+        for scenario in scenarios:
+            print(f'  {scenario.name}', file=sys.stderr)
+            results[scenario.name] = run_scenario(
+                client, upstreams, scenario, ctx, args.iterations, args.warmup, not args.no_memory)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')},
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'routes': results,
+        'process': {'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss},
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    _print_table(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        print(f'Wrote {args.json}', file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1000 @@
+"""
+Synthetic data for the offline benchmark, plus fake implementations of the
+SQL triggers and RPC functions defined in backend/migrations.
+"""
+import hashlib
+import json
+import random
+import re
+import struct
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from benchmarks.fake_supabase import PostgrestError, Store, like_match, cosine_similarities, now_iso, store_vector
+
+INDUSTRIES = [
+    'Software Engineering', 'Data Science', 'Manufacturing', 'Mechanical Engineering',
+    'Electrical Engineering', 'Chemical Engineering', 'Biotechnology', 'Robotics',
+    'Aerospace', 'Research & Development', 'Quality Assurance', 'Other',
+]
+CAREER_STATUSES = ['in_industry', 'seeking_opportunities', 'student', 'career_break']
+CITIES = [
+    'Seattle, WA', 'Blacksburg, VA', 'Austin, TX', 'Boston, MA', 'San Francisco, CA',
+    'New York, NY', 'Atlanta, GA', 'Denver, CO', 'Chicago, IL', 'Raleigh, NC',
+    'Pittsburgh, PA', 'Portland, OR', 'Richmond, VA', 'Washington, DC', 'Madison, WI',
+]
+SCHOOLS = [
+    'Virginia Tech', 'University of Virginia', 'MIT', 'Stanford University',
+    'Georgia Tech', 'Carnegie Mellon University', 'University of Washington',
+    'UC Berkeley', 'Purdue University', 'University of Texas at Austin', None,
+]
+SKILLS = [
+    'Python', 'React', 'TypeScript', 'SQL', 'Machine Learning', 'CAD', 'MATLAB',
+    'C++', 'Rust', 'Data Analysis', 'PCB Design', 'Robotics', 'Statistics',
+    'Project Management', 'Go', 'Kubernetes', 'Embedded Systems', 'Biology',
+]
+WORDS = (
+    'engineer building reliable systems passionate about mentoring women in stem '
+    'research prototypes manufacturing lines data pipelines analytics robotics '
+    'sustainability aerospace healthcare startups open source community leadership'
+).split()
+
+# Relative sizes of the other tables for a given number of profiles
+FOLLOWS_PER_PROFILE = 5
+INSIGHTS_PER_PROFILE = 1
+LIKES_PER_INSIGHT = 3
+CONVERSATIONS_PER_PROFILE = 0.5
+MESSAGES_PER_CONVERSATION = 10
+
+EMBEDDING_MODEL = 'openai/text-embedding-3-small'
+
+VECTOR_POOL_SIZE = 256
+VECTOR_TOPICS = 16
+
+
+def vector_pool(dim: int, seed: int = 7) -> List[List[float]]:
+    """Unit vectors grouped around a few topics.
+
+    Vectors in the same topic have cosine similarity around 0.6, so a
+    query matches roughly 1/VECTOR_TOPICS of the rows, like a real corpus.
+    """
+    rng = random.Random(seed)
+    centers = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(VECTOR_TOPICS)]
+    pool = []
+    for i in range(VECTOR_POOL_SIZE):
+        center = centers[i % VECTOR_TOPICS]
+        vector = [c + 0.8 * rng.gauss(0, 1) for c in center]
+        norm = sum(v * v for v in vector) ** 0.5
+        pool.append([v / norm for v in vector])
+    return pool
+
+
+def pool_index_for_text(text: str) -> int:
+    """Map text to a pool vector so identical queries hit identical rows."""
+    return sum(text.encode('utf-8')) % VECTOR_POOL_SIZE
+
+
+def _timestamp(rng: random.Random, days: int = 365) -> str:
+    moment = datetime.now(timezone.utc) - timedelta(seconds=rng.randint(0, days * 86400))
+    return moment.isoformat()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _backfill_read_cursors(store: Store, conversation_id: str, pair) -> None:
+    # As migration 019 does from is_read: just before each participant's
+    # oldest unread message, or at their newest received one
+    sent = store.table('messages').rows
+    for user_id in pair:
+        received = [m for m in sent[-MESSAGES_PER_CONVERSATION:]
+                    if m['conversation_id'] == conversation_id and m['sender_id'] != user_id]
+        if not received:
+            continue
+        unread = [datetime.fromisoformat(m['created_at']) for m in received if not m['is_read']]
+        last_read = (min(unread) - timedelta(microseconds=1) if unread
+                     else max(datetime.fromisoformat(m['created_at']) for m in received))
+        store.table('conversation_reads').rows.append({
+            'conversation_id': conversation_id, 'user_id': user_id,
+            'last_read_at': last_read.isoformat(), 'last_read_message_id': None,
+            'updated_at': last_read.isoformat(),
+        })
+
+
+def seed_store(store: Store, scale: int, dim: int = 1536, seed: int = 42,
+               missing_embeddings: float = 0.01) -> dict:
+    rng = random.Random(seed)
+    pool = vector_pool(dim)
+    store.vectors = dict(enumerate(pool))
+    store.table('embedding_configs').rows.append({
+        'id': 1, 'model': EMBEDDING_MODEL, 'dimensions': dim, 'status': 'active',
+        'created_at': now_iso(), 'activated_at': now_iso(),
+    })
+    pool_strings = [json.dumps([round(v, 6) for v in vec], separators=(',', ':')) for vec in pool]
+
+    users = store.table('users')
+    profiles = store.table('profiles')
+    profile_ids = []
+    for i in range(scale):
+        profile_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        created = _timestamp(rng)
+        email = f'user{i}@bench.local'
+        users.rows.append({'id': profile_id, 'email': email, 'created_at': created})
+        row = {
+            'id': profile_id,
+            'email': email,
+            'full_name': f'Bench User {i}',
+            'phone': None,
+            'location': rng.choice(CITIES),
+            'industry': rng.choice(INDUSTRIES),
+            'custom_industry': None,
+            'current_school': rng.choice(SCHOOLS),
+            'career_status': rng.choice(CAREER_STATUSES),
+            'bio': _sentence(rng, 30),
+            'skills': rng.sample(SKILLS, 3),
+            'linkedin_url': f'https://linkedin.com/in/bench{i}',
+            'github_url': None,
+            'portfolio_url': None,
+            'profile_picture_url': f'https://cdn.bench.local/{i}.png',
+            'resume_filename': None,
+            'resume_filepath': None,
+            'resume_uploaded_at': None,
+            'looking_for': [],
+            'created_at': created,
+            'updated_at': created,
+        }
+        if rng.random() >= missing_embeddings:
+            pool_id = rng.randrange(VECTOR_POOL_SIZE)
+            row['_emb'] = pool_id
+            row['embedding'] = pool_strings[pool_id]
+            row['embedding_config_id'] = 1
+        else:
+            row['embedding'] = None
+            row['embedding_config_id'] = None
+        profiles.rows.append(row)
+        profile_ids.append(profile_id)
+
+    seed_field_embeddings(store, profiles.rows, pool_strings)
+
+    follows = store.table('follows')
+    for follower in profile_ids:
+        for following in rng.sample(profile_ids, min(FOLLOWS_PER_PROFILE + 1, scale)):
+            if following == follower:
+                continue
+            follows.rows.append({
+                'id': str(uuid.uuid4()), 'follower_id': follower, 'following_id': following,
+                'created_at': _timestamp(rng),
+            })
+
+    insights = store.table('insights')
+    insight_ids = []
+    for author in profile_ids:
+        for _ in range(INSIGHTS_PER_PROFILE):
+            insight_id = str(uuid.uuid4())
+            created = _timestamp(rng)
+            row = {
+                'id': insight_id, 'user_id': author,
+                'title': _sentence(rng, 6), 'content': _sentence(rng, 60),
+                'link_url': None, 'link_title': None,
+                'created_at': created, 'updated_at': created,
+            }
+            if rng.random() >= missing_embeddings:
+                pool_id = rng.randrange(VECTOR_POOL_SIZE)
+                row['_emb'] = pool_id
+                row['embedding'] = pool_strings[pool_id]
+                row['embedding_config_id'] = 1
+            else:
+                row['embedding'] = None
+                row['embedding_config_id'] = None
+            insights.rows.append(row)
+            insight_ids.append(insight_id)
+
+    likes = store.table('insight_likes')
+    for insight_id in insight_ids:
+        for liker in rng.sample(profile_ids, min(LIKES_PER_INSIGHT, scale)):
+            likes.rows.append({
+                'id': str(uuid.uuid4()), 'insight_id': insight_id, 'user_id': liker,
+                'created_at': _timestamp(rng),
+            })
+
+    conversations = store.table('conversations')
+    messages = store.table('messages')
+    notifications = store.table('notifications')
+    seen_pairs = set()
+    conversation_ids = []
+    for _ in range(int(scale * CONVERSATIONS_PER_PROFILE)):
+        a, b = rng.sample(profile_ids, 2)
+        pair = (min(a, b), max(a, b))
+        if pair in seen_pairs:
+            continue
+        seen_pairs.add(pair)
+        conversation_id = str(uuid.uuid4())
+        created = _timestamp(rng)
+        conversation = {
+            'id': conversation_id, 'user1_id': pair[0], 'user2_id': pair[1],
+            'created_at': created, 'updated_at': created,
+            'last_message_id': None, 'last_message_at': None,
+        }
+        conversations.rows.append(conversation)
+        conversation_ids.append(conversation_id)
+        age = (datetime.now(timezone.utc) - datetime.fromisoformat(created)).total_seconds()
+        for _ in range(MESSAGES_PER_CONVERSATION):
+            sender = rng.choice(pair)
+            # Messages come after the conversation was created
+            sent = (datetime.now(timezone.utc) - timedelta(seconds=rng.uniform(0, age))).isoformat()
+            messages.rows.append({
+                'id': str(uuid.uuid4()), 'conversation_id': conversation_id,
+                'sender_id': sender, 'content': _sentence(rng, 12),
+                'is_read': rng.random() < 0.7, 'created_at': sent, 'updated_at': sent,
+            })
+            if conversation['last_message_at'] is None or \
+                    datetime.fromisoformat(sent) >= datetime.fromisoformat(conversation['last_message_at']):
+                conversation.update(last_message_id=messages.rows[-1]['id'], last_message_at=sent)
+            recipient = pair[1] if sender == pair[0] else pair[0]
+            notifications.rows.append({
+                'id': str(uuid.uuid4()), 'user_id': recipient, 'type': 'message',
+                'message': 'Someone sent you a message', 'related_user_id': sender,
+                'related_profile_id': None, 'read': rng.random() < 0.5, 'created_at': sent,
+                'group_key': f'message:{sender}', 'event_count': 1, 'actor_ids': [sender],
+                'first_event_at': sent,
+            })
+        _backfill_read_cursors(store, conversation_id, pair)
+
+    for table in store.tables.values():
+        table.invalidate()
+
+    register_triggers(store)
+    register_rpcs(store)
+
+    # Users with plenty of follows/conversations make representative callers
+    store.sample = {
+        'profile_ids': profile_ids[:50],
+        'insight_ids': insight_ids[:50],
+        'conversation_ids': conversation_ids[:50],
+        'conversation_pairs': [
+            [c['user1_id'], c['user2_id']] for c in conversations.rows[:50]
+        ],
+    }
+    return store.sample
+
+
+PROFILE_FIELDS = ('location', 'industry', 'school', 'skills', 'bio')
+
+
+def profile_field_texts(profile: dict) -> dict:
+    """Mirror of app.services.field_embeddings.field_texts."""
+    texts = {}
+    if profile.get('location'):
+        texts['location'] = f"Location: {profile['location']}"
+    industry = profile.get('custom_industry') or profile.get('industry')
+    if industry:
+        texts['industry'] = f"Industry: {industry}"
+    if profile.get('current_school'):
+        texts['school'] = f"School: {profile['current_school']}"
+    if profile.get('skills'):
+        texts['skills'] = f"Skills: {', '.join(profile['skills'])}"
+    if profile.get('bio'):
+        texts['bio'] = f"Bio: {profile['bio']}"
+    return texts
+
+
+def field_text_hash(field: str, text: str) -> str:
+    return hashlib.sha256(f'{field}\n{text.strip()}'.encode('utf-8')).hexdigest()
+
+
+def seed_field_embeddings(store: Store, profiles: List[dict], pool_strings: List[str]):
+    """Field rows for the seeded profiles, with the vectors the fake
+    embeddings endpoint would return for the same texts."""
+    cache = store.table('field_embeddings')
+    fields = store.table('profile_field_embeddings')
+    seen = set()
+    for profile in profiles:
+        for field, text in profile_field_texts(profile).items():
+            digest = field_text_hash(field, text)
+            if digest not in seen:
+                seen.add(digest)
+                pool_id = pool_index_for_text(text)
+                cache.rows.append({
+                    'text_hash': digest, 'embedding_config_id': 1, 'field': field,
+                    '_emb': pool_id, 'embedding': pool_strings[pool_id], 'created_at': now_iso(),
+                })
+            fields.rows.append({
+                'profile_id': profile['id'], 'field': field, 'text_hash': digest,
+                'updated_at': profile['updated_at'],
+            })
+
+
+def _weighted(store: Store, args: dict):
+    query = args.get('query_embedding')
+    if not query:
+        return []
+    if isinstance(query, str):
+        query = json.loads(query)
+    weights = {field: float((args.get('field_weights') or {}).get(field, 1.0)) for field in PROFILE_FIELDS}
+    threshold = float(args.get('match_threshold', 0.2))
+    count = int(args.get('match_count', 50))
+    active = [c['id'] for c in store.table('embedding_configs').rows if c['status'] == 'active']
+    # Only values some profile uses for a weighted field are scored
+    live = {r['text_hash'] for r in store.table('profile_field_embeddings').rows
+            if weights.get(r['field'], 0) > 0}
+    cache_rows = [r for r in store.table('field_embeddings').rows
+                  if r['embedding_config_id'] in active and r['text_hash'] in live]
+    similarity_of = {r['text_hash']: s for s, r in cosine_similarities(store, cache_rows, query)}
+
+    totals = {}
+    for row in store.table('profile_field_embeddings').rows:
+        weight = weights.get(row['field'], 0)
+        similarity = similarity_of.get(row['text_hash'])
+        if weight <= 0 or similarity is None:
+            continue
+        item = totals.setdefault(row['profile_id'], [0.0, 0.0, {}])
+        item[0] += weight * similarity
+        item[1] += weight
+        item[2][row['field']] = round(similarity, 4)
+    results = [
+        {'id': profile_id, 'similarity': score / weight_sum, 'field_similarities': per_field}
+        for profile_id, (score, weight_sum, per_field) in totals.items()
+        if score / weight_sum > threshold
+    ]
+    results.sort(key=lambda item: item['similarity'], reverse=True)
+    return results[:count]
+
+
+def _prune_field_embeddings(store: Store, args: dict):
+    now = datetime.now(timezone.utc)
+    age = _interval_seconds(args.get('p_older_than', '1 day'))
+    batch_size = int(args.get('p_batch_size', 5000))
+    retired = {c['id'] for c in store.table('embedding_configs').rows if c['status'] == 'retired'}
+    live = {r['text_hash'] for r in store.table('profile_field_embeddings').rows}
+
+    def due(row):
+        created_at = row.get('created_at')
+        old = created_at is None or (now - datetime.fromisoformat(created_at)).total_seconds() > age
+        return old and (row['embedding_config_id'] in retired or row['text_hash'] not in live)
+
+    cache = store.table('field_embeddings')
+    batch = {id(row) for row in list(filter(due, cache.rows))[:batch_size]}
+    cache.rows = [row for row in cache.rows if id(row) not in batch]
+    cache.invalidate()
+    return len(batch)
+
+
+def notification_text(kind: str, actor_name: str, events: int, actors: int) -> str:
+    if kind == 'message':
+        return f'{actor_name} sent you a message' if events == 1 else f'{actor_name} sent you {events} messages'
+    if kind == 'follow':
+        if actors == 1:
+            return f'{actor_name} started following you'
+        others = actors - 1
+        return f"{actor_name} and {others} other{'s' if others > 1 else ''} followed you"
+    return f'{actor_name} {kind}'
+
+
+def add_notification(store: Store, user_id: str, kind: str, group_key: str, actor_id: str,
+                     actor_name: Optional[str], window: timedelta) -> dict:
+    """Mirror of the add_notification SQL function (migration 017)."""
+    actor_name = actor_name or 'Someone'
+    since = datetime.now(timezone.utc) - window
+    open_rows = [
+        n for n in store.table('notifications').index('user_id').get(user_id, [])
+        if n.get('group_key') == group_key and not n.get('read')
+        and datetime.fromisoformat(n['first_event_at']) > since
+    ]
+    if not open_rows:
+        return store.insert('notifications', {
+            'user_id': user_id, 'type': kind, 'message': notification_text(kind, actor_name, 1, 1),
+            'related_user_id': actor_id, 'group_key': group_key, 'actor_ids': [actor_id],
+            'first_event_at': now_iso(),
+        })
+    row = max(open_rows, key=lambda n: n['first_event_at'])
+    if actor_id not in row['actor_ids']:
+        row['actor_ids'] = row['actor_ids'] + [actor_id]
+    row['event_count'] += 1
+    row.update(related_user_id=actor_id, created_at=now_iso(),
+               message=notification_text(kind, actor_name, row['event_count'], len(row['actor_ids'])))
+    store.table('notifications').invalidate()
+    return row
+
+
+def register_triggers(store: Store):
+    def message_inserted(store: Store, row: dict):
+        conversation = store.table('conversations').index('id').get(row['conversation_id'], [])
+        if not conversation:
+            return
+        conversation = conversation[0]
+        conversation.update(updated_at=now_iso(), last_message_id=row['id'], last_message_at=row['created_at'])
+        receiver = conversation['user2_id'] if conversation['user1_id'] == row['sender_id'] \
+            else conversation['user1_id']
+        sender = store.table('profiles').index('id').get(row['sender_id'], [])
+        add_notification(store, receiver, 'message', f"message:{row['sender_id']}", row['sender_id'],
+                         sender[0]['full_name'] if sender else None, timedelta(hours=1))
+
+    store.on_insert('messages', message_inserted)
+
+
+def _semantic(table_name: str, columns: List[str]):
+    def handler(store: Store, args: dict):
+        query = args.get('query_embedding')
+        if isinstance(query, str):
+            query = json.loads(query)
+        threshold = float(args.get('match_threshold', 0.5))
+        count = int(args.get('match_count', 20))
+        scored = cosine_similarities(store, store.table(table_name).rows, query)
+        scored = [(s, r) for s, r in scored if s > threshold]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        results = []
+        for similarity, row in scored[:count]:
+            item = {c: row.get(c) for c in columns}
+            item['similarity'] = similarity
+            results.append(item)
+        return results
+    return handler
+
+
+def _half(vector: List[float]) -> List[float]:
+    return list(struct.unpack(f'{len(vector)}e', struct.pack(f'{len(vector)}e', *vector)))
+
+
+def _semantic_reranked(table_name: str, columns: List[str]):
+    """Two-stage search like the *_semantic_reranked RPCs: candidates ranked
+    on float16-rounded vectors, then exact cosine re-ranking."""
+    def handler(store: Store, args: dict):
+        query = args.get('query_embedding')
+        if isinstance(query, str):
+            query = json.loads(query)
+        count = int(args.get('match_count', 20))
+        candidate_count = max(int(args.get('candidate_count', 200)), count)
+        if not hasattr(store, 'half_vectors'):
+            store.half_vectors = {i: _half(v) for i, v in store.vectors.items()}
+        half_query = _half(query)
+        approx = {}
+        for row in store.table(table_name).rows:
+            pool_id = row.get('_emb')
+            if pool_id is not None:
+                vector = store.half_vectors[pool_id]
+            elif row.get('_vec') is not None:
+                vector = _half(row['_vec'])
+            else:
+                continue
+            approx[row['id']] = sum(a * b for a, b in zip(vector, half_query))
+        candidates = set(sorted(approx, key=approx.get, reverse=True)[:candidate_count])
+        threshold = float(args.get('match_threshold', 0.5))
+        rows = [r for r in store.table(table_name).rows if r['id'] in candidates]
+        scored = [(s, r) for s, r in cosine_similarities(store, rows, query) if s > threshold]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        results = []
+        for similarity, row in scored[:count]:
+            item = {c: row.get(c) for c in columns}
+            item['similarity'] = similarity
+            results.append(item)
+        return results
+    return handler
+
+
+def _hybrid(table_name: str, text_of):
+    """Reciprocal rank fusion of a token-overlap ranking (standing in for
+    ts_rank_cd) and the cosine ranking, like the hybrid_search_* RPCs."""
+    def handler(store: Store, args: dict):
+        rows = store.table(table_name).rows
+        count = int(args.get('match_count', 50))
+        weight = float(args.get('semantic_weight', 0.5))
+        threshold = float(args.get('match_threshold', 0.2))
+        k = int(args.get('rrf_k', 60))
+
+        terms = set(str(args.get('query_text') or '').lower().split())
+        lexical = []
+        for row in rows:
+            words = text_of(row).lower().split()
+            hits = sum(1 for word in words if word.strip('.,') in terms)
+            if hits:
+                lexical.append((hits / len(words), row['id']))
+        lexical.sort(key=lambda item: item[0], reverse=True)
+        lexical = lexical[:count * 2]
+
+        semantic = []
+        query = args.get('query_embedding')
+        if query:
+            if isinstance(query, str):
+                query = json.loads(query)
+            semantic = [(s, r['id']) for s, r in cosine_similarities(store, rows, query) if s > threshold]
+            semantic.sort(key=lambda item: item[0], reverse=True)
+            semantic = semantic[:count * 2]
+
+        fused = {}
+        for rank, (similarity, row_id) in enumerate(semantic, start=1):
+            fused[row_id] = {'id': row_id, 'similarity': similarity, 'lexical_rank': None,
+                             'score': weight / (k + rank)}
+        for rank, (lexical_rank, row_id) in enumerate(lexical, start=1):
+            item = fused.setdefault(row_id, {'id': row_id, 'similarity': None, 'score': 0.0})
+            item['lexical_rank'] = lexical_rank
+            item['score'] += (1 - weight) / (k + rank)
+        return sorted(fused.values(), key=lambda item: item['score'], reverse=True)[:count]
+    return handler
+
+
+def _trigrams(text: str) -> set:
+    # Same shape as pg_trgm: lower-cased words padded with two leading
+    # spaces and one trailing space
+    grams = set()
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    left, right = _trigrams(a), _trigrams(b)
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+PROFILE_COLUMNS = [
+    'id', 'email', 'full_name', 'phone', 'location', 'industry', 'custom_industry',
+    'current_school', 'career_status', 'bio', 'skills', 'linkedin_url', 'github_url',
+    'portfolio_url', 'profile_picture_url', 'resume_filename', 'resume_filepath',
+    'resume_uploaded_at', 'created_at', 'updated_at',
+]
+
+
+def _school_fuzzy(store: Store, args: dict):
+    query = str(args.get('school_query') or '')
+    threshold = float(args.get('min_similarity', 0.3))
+    count = int(args.get('match_count', 500))
+    industry = args.get('industry_pattern')
+    location = args.get('location_pattern')
+    career_status = args.get('career_status_filter')
+    skills = set(args.get('skills_filter') or [])
+    scores = {}
+    results = []
+    for row in store.table('profiles').rows:
+        school = row.get('current_school')
+        if not school:
+            continue
+        if school not in scores:
+            scores[school] = trigram_similarity(school, query)
+        if scores[school] < threshold:
+            continue
+        if (industry and not like_match(industry, row.get('industry'), True)) or \
+                (location and not like_match(location, row.get('location'), True)) or \
+                (career_status and row.get('career_status') != career_status) or \
+                (skills and not skills & set(row.get('skills') or [])):
+            continue
+        item = {c: row.get(c) for c in PROFILE_COLUMNS}
+        item['similarity'] = scores[school]
+        results.append(item)
+    results.sort(key=lambda item: item['similarity'], reverse=True)
+    return results[:count]
+
+
+EMBEDDING_TABLES = ('profiles', 'insights')
+
+
+def _start_embedding_reindex(store: Store, args: dict):
+    configs = store.table('embedding_configs')
+    if any(c['status'] == 'backfilling' for c in configs.rows):
+        raise PostgrestError(400, 'P0001', 'An embedding re-index is already in progress')
+    config = store.insert('embedding_configs', {
+        'id': max((c['id'] for c in configs.rows), default=0) + 1,
+        'model': args['p_model'], 'dimensions': int(args['p_dimensions']),
+        'status': 'backfilling', 'activated_at': None,
+    })
+    for table_name in EMBEDDING_TABLES:
+        table = store.table(table_name)
+        for row in table.rows:
+            row['embedding_next'] = None
+            row['embedding_next_config_id'] = None
+        table.invalidate()
+    return config['id']
+
+
+def _write_embedding_next(store: Store, args: dict):
+    table = store.table(args['p_table'])
+    by_id = table.index('id')
+    written = 0
+    for item in args.get('p_rows') or []:
+        for row in by_id.get(item['id'], []):
+            embedding = item.get('embedding')
+            row['embedding_next'] = json.loads(embedding) if embedding else None
+            row['embedding_next_config_id'] = args['p_config_id']
+            written += 1
+    return written
+
+
+def _embedding_reindex_progress(store: Store, args: dict):
+    config_id = args.get('p_config_id')
+    return [{
+        'table_name': table_name,
+        'total': len(store.table(table_name).rows),
+        'remaining': sum(1 for row in store.table(table_name).rows
+                         if row.get('embedding_next_config_id') != config_id),
+    } for table_name in EMBEDDING_TABLES]
+
+
+def _activate_embedding_config(store: Store, args: dict):
+    config_id = args.get('p_config_id')
+    if any(row['remaining'] for row in _embedding_reindex_progress(store, args)):
+        raise PostgrestError(400, 'P0001', f'Embedding config {config_id} still has rows to backfill')
+    for table_name in EMBEDDING_TABLES:
+        table = store.table(table_name)
+        for row in table.rows:
+            row['embedding_retired'] = row.get('embedding')
+            row.pop('_emb', None)
+            row.pop('_vec', None)
+            row['embedding'] = row.pop('embedding_next', None)
+            row['embedding_config_id'] = row.pop('embedding_next_config_id', None)
+            store_vector(store, row)
+        table.invalidate()
+    for config in store.table('embedding_configs').rows:
+        if config['status'] == 'active':
+            config['status'] = 'retired'
+        elif config['id'] == config_id:
+            config['status'] = 'active'
+            config['activated_at'] = now_iso()
+    store.table('embedding_configs').invalidate()
+    return None
+
+
+def _retire_embedding_columns(store: Store, args: dict):
+    for table_name in EMBEDDING_TABLES:
+        for row in store.table(table_name).rows:
+            row.pop('embedding_retired', None)
+    return None
+
+
+def _first(store: Store, table_name: str, **match) -> Optional[dict]:
+    column, value = next(iter(match.items()))
+    for row in store.table(table_name).index(column).get(value, []):
+        if all(row.get(c) == v for c, v in match.items()):
+            return row
+    return None
+
+
+def _follow_user(store: Store, args: dict):
+    follower, following = args['p_follower_id'], args['p_following_id']
+    follow = _first(store, 'follows', follower_id=follower, following_id=following)
+    created = follow is None
+    if created:
+        follow = store.insert('follows', {'follower_id': follower, 'following_id': following})
+        profile = _first(store, 'profiles', id=follower)
+        add_notification(store, following, 'follow', 'follow', follower,
+                         (profile or {}).get('full_name'), timedelta(days=1))
+    follows = store.table('follows')
+    return {
+        'followed': created,
+        'follow': dict(follow),
+        'follower_count': len(follows.index('following_id').get(following, [])),
+        'following_count': len(follows.index('follower_id').get(follower, [])),
+    }
+
+
+def _like_insight(store: Store, args: dict):
+    insight, user = args['p_insight_id'], args['p_user_id']
+    created = _first(store, 'insight_likes', insight_id=insight, user_id=user) is None
+    if created:
+        store.insert('insight_likes', {'insight_id': insight, 'user_id': user})
+    return {'liked': created,
+            'likes_count': len(store.table('insight_likes').index('insight_id').get(insight, []))}
+
+
+def _insight_like_counts(store: Store, args: dict):
+    likes = store.table('insight_likes').index('insight_id')
+    return [{'insight_id': insight_id, 'likes_count': len(likes[insight_id])}
+            for insight_id in args.get('p_insight_ids') or [] if likes.get(insight_id)]
+
+
+def _unlike_insight(store: Store, args: dict):
+    insight, user = args['p_insight_id'], args['p_user_id']
+    likes = store.table('insight_likes')
+    before = len(likes.rows)
+    likes.rows = [r for r in likes.rows if not (r['insight_id'] == insight and r['user_id'] == user)]
+    likes.invalidate()
+    return {'unliked': len(likes.rows) < before,
+            'likes_count': len(likes.index('insight_id').get(insight, []))}
+
+
+def _get_or_create_conversation(store: Store, args: dict):
+    other = _first(store, 'profiles', id=args['p_other_id'])
+    if other is None:
+        return None
+    user1, user2 = sorted((args['p_user_id'], args['p_other_id']))
+    conversation = _first(store, 'conversations', user1_id=user1, user2_id=user2)
+    created = conversation is None
+    if created:
+        conversation = store.insert('conversations', {'user1_id': user1, 'user2_id': user2})
+    return {
+        'conversation': {k: v for k, v in conversation.items() if not k.startswith('_')},
+        'created': created,
+        'other_user': {c: other.get(c) for c in ('id', 'full_name', 'profile_picture_url')},
+    }
+
+
+def _interval_seconds(value) -> Optional[float]:
+    if not value:
+        return None
+    count, unit = str(value).split()
+    return float(count) * {'day': 86400, 'hour': 3600, 'minute': 60, 'second': 1}[unit.rstrip('s')]
+
+
+def _purge_notifications(store: Store, args: dict):
+    now = datetime.now(timezone.utc)
+    read_age = _interval_seconds(args.get('p_read_older_than', '30 days'))
+    unread_age = _interval_seconds(args.get('p_unread_older_than', '180 days'))
+    batch_size = int(args.get('p_batch_size', 1000))
+
+    def due(row):
+        age = (now - datetime.fromisoformat(row['created_at'])).total_seconds()
+        return (row.get('read') and age > read_age) or (unread_age is not None and age > unread_age)
+
+    notifications = store.table('notifications')
+    batch = {row['id'] for row in sorted(filter(due, notifications.rows),
+                                         key=lambda row: row['created_at'])[:batch_size]}
+    if args.get('p_archive'):
+        store.table('notifications_archive').rows.extend(
+            dict(row, archived_at=now_iso()) for row in notifications.rows if row['id'] in batch)
+    notifications.rows = [row for row in notifications.rows if row['id'] not in batch]
+    notifications.invalidate()
+    return len(batch)
+
+
+def _unread(store: Store, user_id: str) -> list:
+    return [n for n in store.table('notifications').index('user_id').get(user_id, []) if not n.get('read')]
+
+
+def _notification_unread_count(store: Store, args: dict):
+    # The SQL reads a trigger-maintained counter; counting here is equivalent
+    return len(_unread(store, args['p_user_id']))
+
+
+def _mark_notifications_read(store: Store, args: dict):
+    ids = set(args['p_ids']) if args.get('p_ids') is not None else None
+    up_to = datetime.fromisoformat(args['p_up_to'].replace('Z', '+00:00')) if args.get('p_up_to') else None
+    updated = 0
+    for row in _unread(store, args['p_user_id']):
+        if (ids is None or row['id'] in ids) and \
+                (up_to is None or datetime.fromisoformat(row['created_at']) <= up_to):
+            row['read'] = True
+            updated += 1
+    store.table('notifications').invalidate()
+    return {'updated': updated, 'unread_count': len(_unread(store, args['p_user_id']))}
+
+
+def _read_cursor(store: Store, conversation_id: str, user_id: str) -> Optional[dict]:
+    return _first(store, 'conversation_reads', conversation_id=conversation_id, user_id=user_id)
+
+
+def _mark_conversation_read(store: Store, args: dict):
+    conversation_id, user_id = args['p_conversation_id'], args['p_user_id']
+    cursor = _read_cursor(store, conversation_id, user_id)
+    previous = cursor['last_read_at'] if cursor else None
+    received = [m for m in store.table('messages').index('conversation_id').get(conversation_id, [])
+                if m['sender_id'] != user_id]
+    latest = max(received, key=lambda m: datetime.fromisoformat(m['created_at']), default=None)
+
+    current = previous
+    if latest and (previous is None or
+                   datetime.fromisoformat(latest['created_at']) > datetime.fromisoformat(previous)):
+        fields = {'last_read_at': latest['created_at'], 'last_read_message_id': latest['id'],
+                  'updated_at': now_iso()}
+        if cursor:
+            cursor.update(fields)
+        else:
+            store.insert('conversation_reads', dict(fields, conversation_id=conversation_id, user_id=user_id))
+        current = latest['created_at']
+
+    conversation = _first(store, 'conversations', id=conversation_id) or {}
+    other_id = conversation.get('user2_id') if conversation.get('user1_id') == user_id else conversation.get('user1_id')
+    other = _read_cursor(store, conversation_id, other_id) if other_id else None
+    return {
+        'last_read_at': current,
+        'previous_read_at': previous,
+        'other_last_read_at': other['last_read_at'] if other else None,
+    }
+
+
+def _conversation_unread_counts(store: Store, args: dict):
+    user_id = args['p_user_id']
+    conversations = store.table('conversations')
+    messages = store.table('messages').index('conversation_id')
+    counts = []
+    for conversation in conversations.index('user1_id').get(user_id, []) + \
+            conversations.index('user2_id').get(user_id, []):
+        cursor = _read_cursor(store, conversation['id'], user_id)
+        last_read = datetime.fromisoformat(cursor['last_read_at']) if cursor else None
+        unread = sum(1 for m in messages.get(conversation['id'], [])
+                     if m['sender_id'] != user_id and
+                     (last_read is None or datetime.fromisoformat(m['created_at']) > last_read))
+        if unread:
+            counts.append({'conversation_id': conversation['id'], 'unread_count': unread})
+    return counts
+
+
+def _create_message_partitions(store: Store, args: dict):
+    # The fake messages table isn't partitioned
+    return 0
+
+
+def _detach_message_partitions(store: Store, args: dict):
+    # Drops the messages of the months a detach would take out of the table
+    months = int(str(args.get('p_older_than', '24 months')).split()[0])
+    now = datetime.now(timezone.utc)
+    year, month = divmod(now.year * 12 + now.month - 1 - months, 12)
+    cutoff = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    messages = store.table('messages')
+    old = [m for m in messages.rows if datetime.fromisoformat(m['created_at']) < cutoff]
+    messages.rows = [m for m in messages.rows if datetime.fromisoformat(m['created_at']) >= cutoff]
+    messages.invalidate()
+    return sorted({'messages_p' + m['created_at'][:7].replace('-', '') for m in old})
+
+
+def _write_embeddings(store: Store, args: dict):
+    table = store.table(args['p_table'])
+    by_id = table.index('id')
+    written = 0
+    for item in args.get('p_rows') or []:
+        if not item.get('embedding'):
+            continue
+        for row in by_id.get(item['id'], []):
+            row['embedding'] = json.loads(item['embedding'])
+            row['embedding_config_id'] = args['p_config_id']
+            row['updated_at'] = now_iso()
+            store_vector(store, row)
+            written += 1
+    return written
+
+
+def _claim_embedding_job_chunk(store: Store, args: dict):
+    jobs = store.table('embedding_jobs').index('id').get(args['p_job_id'], [])
+    if not jobs or jobs[0]['status'] not in ('pending', 'running'):
+        return []
+    job = jobs[0]
+    now = time.time()
+    lease = now + float(args.get('p_lease_seconds', 120))
+    chunks = [c for c in store.table('embedding_job_chunks').rows if c['job_id'] == job['id']]
+
+    abandoned = [c for c in chunks if c['status'] == 'claimed' and c['lease_expires_at'] < now]
+    if abandoned:
+        chunk = min(abandoned, key=lambda c: c['id'])
+        chunk.update(worker=args['p_worker'], lease_expires_at=lease, attempts=chunk['attempts'] + 1)
+        return [{'chunk_id': chunk['id'], 'after_id': chunk['lower_id'], 'through_id': chunk['upper_id']}]
+
+    if not job['exhausted']:
+        ids = sorted(
+            row['id'] for row in store.table(job['table_name']).rows
+            if (job['cursor_id'] is None or row['id'] > job['cursor_id'])
+            and (job['mode'] != 'missing' or row.get('embedding') is None)
+        )[:job['chunk_size']]
+        if ids:
+            chunk = store.insert('embedding_job_chunks', {
+                'id': max((c['id'] for c in store.table('embedding_job_chunks').rows), default=0) + 1,
+                'job_id': job['id'], 'lower_id': job['cursor_id'], 'upper_id': ids[-1],
+                'status': 'claimed', 'worker': args['p_worker'], 'lease_expires_at': lease,
+                'attempts': 1, 'processed': 0, 'failed': 0, 'finished_at': None,
+            })
+            job.update(cursor_id=ids[-1], status='running', updated_at=now_iso())
+            job['started_at'] = job['started_at'] or job['updated_at']
+            return [{'chunk_id': chunk['id'], 'after_id': chunk['lower_id'], 'through_id': chunk['upper_id']}]
+        job.update(exhausted=True, updated_at=now_iso())
+
+    if not any(c['status'] == 'claimed' for c in chunks):
+        job.update(status='completed', finished_at=now_iso(), updated_at=now_iso())
+        job['started_at'] = job['started_at'] or job['updated_at']
+    store.table('embedding_jobs').invalidate()
+    return []
+
+
+def _complete_embedding_job_chunk(store: Store, args: dict):
+    for chunk in store.table('embedding_job_chunks').index('id').get(args['p_chunk_id'], []):
+        if chunk['worker'] != args['p_worker'] or chunk['status'] != 'claimed':
+            continue
+        chunk.update(status='done', processed=args['p_processed'], failed=args['p_failed'],
+                     finished_at=now_iso())
+        for job in store.table('embedding_jobs').index('id').get(chunk['job_id'], []):
+            job['processed'] += args['p_processed']
+            job['failed'] += args['p_failed']
+            job['updated_at'] = now_iso()
+    store.table('embedding_job_chunks').invalidate()
+    return None
+
+
+def _release_embedding_job_chunk(store: Store, args: dict):
+    for chunk in store.table('embedding_job_chunks').index('id').get(args['p_chunk_id'], []):
+        if chunk['worker'] == args['p_worker'] and chunk['status'] == 'claimed':
+            chunk['lease_expires_at'] = time.time() - 1
+    return None
+
+
+def _rate_limit_admit(store: Store, args: dict):
+    now = time.time()
+    slot_key, slot_limit = args.get('p_slot_key'), args.get('p_slot_limit')
+    slots = store.table('rate_limit_slots')
+    if slot_key and slot_limit:
+        slots.rows = [s for s in slots.rows if s['key'] != slot_key or s['expires_at'] >= now]
+        slots.invalidate()
+        if sum(1 for s in slots.rows if s['key'] == slot_key) >= slot_limit:
+            return {'allowed': False, 'retry_after': 1, 'scope': 'concurrency'}
+
+    buckets = store.table('rate_limit_buckets').index('key')
+    levels, wait, wait_scope = [], 0.0, None
+    for b in args.get('p_buckets') or []:
+        existing = buckets.get(b['key'])
+        if existing:
+            row = existing[0]
+            row['tokens'] = min(b['capacity'], row['tokens'] + (now - row['updated_at']) * b['refill'])
+            row['updated_at'] = now
+        else:
+            row = store.insert('rate_limit_buckets', {'key': b['key'], 'tokens': b['capacity'], 'updated_at': now})
+        levels.append(row)
+        if row['tokens'] < 1 and (1 - row['tokens']) / b['refill'] > wait:
+            wait, wait_scope = (1 - row['tokens']) / b['refill'], b['scope']
+    if wait > 0:
+        return {'allowed': False, 'retry_after': wait, 'scope': wait_scope}
+    for row in levels:
+        row['tokens'] -= 1
+    if slot_key and slot_limit:
+        store.insert('rate_limit_slots', {'key': slot_key, 'holder': args.get('p_holder'),
+                                          'expires_at': now + float(args.get('p_slot_ttl') or 60)})
+    return {'allowed': True, 'retry_after': 0, 'scope': None}
+
+
+def _rate_limit_release(store: Store, args: dict):
+    slots = store.table('rate_limit_slots')
+    slots.rows = [s for s in slots.rows
+                  if not (s['key'] == args.get('p_slot_key') and s['holder'] == args.get('p_holder'))]
+    slots.invalidate()
+    return None
+
+
+def register_rpcs(store: Store):
+    store.rpc('search_profiles_semantic', _semantic('profiles', [
+        'id', 'full_name', 'email', 'bio', 'location', 'industry', 'custom_industry',
+        'current_school', 'career_status', 'skills', 'profile_picture_url',
+    ]))
+    store.rpc('search_insights_semantic', _semantic('insights', [
+        'id', 'user_id', 'title', 'content', 'link_url', 'link_title', 'created_at', 'updated_at',
+    ]))
+    store.rpc('search_profiles_semantic_reranked', _semantic_reranked('profiles', [
+        'id', 'full_name', 'email', 'bio', 'location', 'industry', 'custom_industry',
+        'current_school', 'career_status', 'skills', 'profile_picture_url',
+    ]))
+    store.rpc('search_insights_semantic_reranked', _semantic_reranked('insights', [
+        'id', 'user_id', 'title', 'content', 'link_url', 'link_title', 'created_at', 'updated_at',
+    ]))
+    store.rpc('hybrid_search_profiles', _hybrid('profiles', lambda row: ' '.join(
+        str(row.get(c) or '') for c in ('full_name', 'industry', 'custom_industry', 'current_school', 'bio')
+    ) + ' ' + ' '.join(row.get('skills') or [])))
+    store.rpc('hybrid_search_insights', _hybrid('insights', lambda row: ' '.join(
+        str(row.get(c) or '') for c in ('title', 'content'))))
+    store.rpc('search_profiles_by_school_fuzzy', _school_fuzzy)
+    store.rpc('search_profiles_weighted', _weighted)
+    store.rpc('start_embedding_reindex', _start_embedding_reindex)
+    store.rpc('write_embedding_next', _write_embedding_next)
+    store.rpc('embedding_reindex_progress', _embedding_reindex_progress)
+    store.rpc('activate_embedding_config', _activate_embedding_config)
+    store.rpc('retire_embedding_columns', _retire_embedding_columns)
+    store.rpc('follow_user', _follow_user)
+    store.rpc('purge_notifications', _purge_notifications)
+    store.rpc('prune_field_embeddings', _prune_field_embeddings)
+    store.rpc('notification_unread_count', _notification_unread_count)
+    store.rpc('mark_notifications_read', _mark_notifications_read)
+    store.rpc('like_insight', _like_insight)
+    store.rpc('unlike_insight', _unlike_insight)
+    store.rpc('insight_like_counts', _insight_like_counts)
+    store.rpc('get_or_create_conversation', _get_or_create_conversation)
+    store.rpc('mark_conversation_read', _mark_conversation_read)
+    store.rpc('conversation_unread_counts', _conversation_unread_counts)
+    store.rpc('create_message_partitions', _create_message_partitions)
+    store.rpc('detach_message_partitions', _detach_message_partitions)
+    store.rpc('write_embeddings', _write_embeddings)
+    store.rpc('claim_embedding_job_chunk', _claim_embedding_job_chunk)
+    store.rpc('complete_embedding_job_chunk', _complete_embedding_job_chunk)
+    store.rpc('release_embedding_job_chunk', _release_embedding_job_chunk)
+    store.rpc('rate_limit_admit', _rate_limit_admit)
+    store.rpc('rate_limit_release', _rate_limit_release)
+    store.rpc('get_follower_count', lambda store, args: len(
+        store.table('follows').index('following_id').get(args.get('profile_user_id'), [])))
+    store.rpc('get_following_count', lambda store, args: len(
+        store.table('follows').index('follower_id').get(args.get('profile_user_id'), [])))
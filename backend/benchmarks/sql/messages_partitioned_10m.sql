@@ -0,0 +1,142 @@
+-- The message queries at 10M messages, unpartitioned vs monthly partitions.
+--
+-- Run against a scratch Postgres database (not production):
+--   psql "$DATABASE_URL" -f benchmarks/sql/messages_partitioned_10m.sql
+--
+-- Builds bench.messages_flat (the 004 layout) and bench.messages (the 020
+-- layout: monthly partitions over two years) with the same 10M rows across
+-- 200k conversations, then runs the queries the message routes make on
+-- both: a conversation's first page bounded by its start, its last message
+-- bounded by last_message_at, the newest received message after a read
+-- cursor, and detaching a month versus deleting it. Compare the
+-- "Subplans Removed" / partitions scanned, buffers and timings. Loading
+-- takes several minutes.
+
+\timing on
+
+DROP SCHEMA IF EXISTS bench CASCADE;
+CREATE SCHEMA bench;
+
+CREATE TABLE bench.conversations (
+  id int PRIMARY KEY,
+  user1_id int NOT NULL,
+  user2_id int NOT NULL,
+  created_at timestamptz NOT NULL,
+  last_message_at timestamptz
+);
+
+-- Conversations start anywhere in the last two years
+INSERT INTO bench.conversations (id, user1_id, user2_id, created_at)
+SELECT n, n % 50000, 50000 + n % 50000, now() - (random() * interval '730 days')
+FROM generate_series(1, 200000) AS n;
+
+CREATE TABLE bench.messages_flat (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  conversation_id int NOT NULL,
+  sender_id int NOT NULL,
+  content text NOT NULL,
+  created_at timestamptz NOT NULL
+);
+
+-- 50 messages per conversation, each after the conversation began
+INSERT INTO bench.messages_flat (conversation_id, sender_id, content, created_at)
+SELECT c.id,
+       CASE WHEN random() < 0.5 THEN c.user1_id ELSE c.user2_id END,
+       'Bench message ' || n,
+       c.created_at + random() * (now() - c.created_at)
+FROM bench.conversations c, generate_series(1, 50) AS n;
+
+CREATE INDEX ON bench.messages_flat (conversation_id, created_at DESC);
+CREATE INDEX ON bench.messages_flat (created_at DESC);
+
+CREATE TABLE bench.messages (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  conversation_id int NOT NULL,
+  sender_id int NOT NULL,
+  content text NOT NULL,
+  created_at timestamptz NOT NULL,
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE bench.messages_default PARTITION OF bench.messages DEFAULT;
+
+DO $$
+DECLARE
+  month_start date := date_trunc('month', now() - interval '730 days')::date;
+BEGIN
+  WHILE month_start <= date_trunc('month', now() + interval '3 months')::date LOOP
+    EXECUTE format(
+      'CREATE TABLE bench.%I PARTITION OF bench.messages FOR VALUES FROM (%L) TO (%L)',
+      'messages_p' || to_char(month_start, 'YYYYMM'), month_start, (month_start + interval '1 month')::date
+    );
+    month_start := (month_start + interval '1 month')::date;
+  END LOOP;
+END;
+$$;
+
+INSERT INTO bench.messages SELECT * FROM bench.messages_flat;
+CREATE INDEX ON bench.messages (conversation_id, created_at DESC);
+
+UPDATE bench.conversations c
+SET last_message_at = m.last_at
+FROM (SELECT conversation_id, max(created_at) AS last_at FROM bench.messages_flat GROUP BY conversation_id) m
+WHERE m.conversation_id = c.id;
+
+ANALYZE bench.conversations;
+ANALYZE bench.messages_flat;
+ANALYZE bench.messages;
+
+-- A conversation from a year ago, and the same plans for each layout
+SELECT id AS conv, created_at AS started, last_message_at AS last_at, user1_id AS reader
+FROM bench.conversations
+WHERE created_at BETWEEN now() - interval '370 days' AND now() - interval '360 days'
+LIMIT 1 \gset
+
+\echo '--- First page of a conversation (get_messages) ---'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT * FROM bench.messages_flat
+WHERE conversation_id = :conv
+ORDER BY created_at LIMIT 50;
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT * FROM bench.messages
+WHERE conversation_id = :conv AND created_at >= :'started'
+ORDER BY created_at LIMIT 50;
+
+\echo '--- Last message of a conversation (conversation list) ---'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT * FROM bench.messages_flat
+WHERE conversation_id = :conv
+ORDER BY created_at DESC LIMIT 1;
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT * FROM bench.messages
+WHERE conversation_id = :conv AND created_at >= :'last_at'
+ORDER BY created_at DESC LIMIT 1;
+
+\echo '--- Newest received message after a read cursor a week back (mark_conversation_read) ---'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, created_at FROM bench.messages_flat
+WHERE conversation_id = :conv AND sender_id <> :reader
+ORDER BY created_at DESC LIMIT 1;
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, created_at FROM bench.messages
+WHERE conversation_id = :conv AND sender_id <> :reader
+  AND created_at >= now() - interval '7 days'
+ORDER BY created_at DESC LIMIT 1;
+
+\echo '--- Retiring the oldest month: DELETE vs DETACH ---'
+SELECT date_trunc('month', now() - interval '730 days') AS old_month \gset
+
+BEGIN;
+DELETE FROM bench.messages_flat
+WHERE created_at >= :'old_month' AND created_at < :'old_month'::timestamptz + interval '1 month';
+ROLLBACK;
+
+SELECT 'messages_p' || to_char(:'old_month'::timestamptz, 'YYYYMM') AS old_partition \gset
+BEGIN;
+ALTER TABLE bench.messages DETACH PARTITION bench.:"old_partition";
+ROLLBACK;
+
+DROP SCHEMA bench CASCADE;
@@ -0,0 +1,72 @@
+-- Index use for the profile search filters at 100k profiles.
+--
+-- Run against a scratch Postgres database (not production):
+--   psql "$DATABASE_URL" -f benchmarks/sql/profile_filters_100k.sql
+--
+-- Builds bench.profiles with 100k synthetic rows, runs the partial-match and
+-- fuzzy school filters with only the original btree index, then again with
+-- the trigram indexes from migrations/009_add_trigram_indexes.sql.
+-- Compare the plan nodes (Seq Scan vs Bitmap Index Scan) and timings.
+
+\timing on
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DROP SCHEMA IF EXISTS bench CASCADE;
+CREATE SCHEMA bench;
+
+CREATE TABLE bench.profiles (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  full_name text,
+  location text,
+  industry text,
+  current_school text,
+  career_status text,
+  skills text[]
+);
+
+INSERT INTO bench.profiles (full_name, location, industry, current_school, career_status, skills)
+SELECT
+  'Bench User ' || n,
+  (ARRAY['Seattle, WA', 'Blacksburg, VA', 'Austin, TX', 'Boston, MA', 'San Francisco, CA',
+         'New York, NY', 'Atlanta, GA', 'Denver, CO', 'Chicago, IL', 'Raleigh, NC'])[1 + n % 10]
+    || CASE WHEN n % 7 = 0 THEN ' metro area' ELSE '' END,
+  (ARRAY['Software Engineering', 'Data Science', 'Robotics', 'Aerospace', 'Biotechnology'])[1 + n % 5],
+  -- Many distinct school names so selective filters actually pay off
+  (ARRAY['Virginia Tech', 'University of Virginia', 'Georgia Tech', 'Carnegie Mellon University',
+         'Purdue University', 'Stanford University'])[1 + n % 6]
+    || CASE WHEN n % 50 = 0 THEN '' ELSE ' Campus ' || (n % 2000) END,
+  (ARRAY['in_industry', 'seeking_opportunities', 'student', 'career_break'])[1 + n % 4],
+  ARRAY['Python', 'SQL']
+FROM generate_series(1, 100000) AS n;
+
+CREATE INDEX ON bench.profiles (location);  -- same shape as idx_profiles_location
+ANALYZE bench.profiles;
+
+\echo '--- Without trigram indexes ---'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM bench.profiles WHERE location ILIKE '%metro%';
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM bench.profiles WHERE current_school ILIKE '%campus 1234%';
+
+SELECT set_config('pg_trgm.similarity_threshold', '0.3', false);
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, similarity(current_school, 'Virgina Tek') FROM bench.profiles
+WHERE current_school % 'Virgina Tek';
+
+CREATE INDEX ON bench.profiles USING gin (location gin_trgm_ops);
+CREATE INDEX ON bench.profiles USING gin (current_school gin_trgm_ops);
+ANALYZE bench.profiles;
+
+\echo '--- With trigram indexes ---'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM bench.profiles WHERE location ILIKE '%metro%';
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id FROM bench.profiles WHERE current_school ILIKE '%campus 1234%';
+
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT id, similarity(current_school, 'Virgina Tek') FROM bench.profiles
+WHERE current_school % 'Virgina Tek';
+
+DROP SCHEMA bench CASCADE;
@@ -0,0 +1,63 @@
+"""
+Production server settings, read by `gunicorn -c gunicorn.conf.py run:app`
+from backend/.
+
+Threaded workers suit the app: requests spend most of their time waiting
+on Supabase and OpenRouter. Everything is tuned from the environment:
+
+    GUNICORN_WORKERS       worker processes (default: CPU count)
+    GUNICORN_THREADS       request threads per worker (default 8)
+    GUNICORN_WORKER_CLASS  gthread, or e.g. gevent where installed
+    GUNICORN_KEEPALIVE     seconds to hold idle keep-alive connections (default 5;
+                           set it above the load balancer's idle timeout)
+    GUNICORN_TIMEOUT       seconds before a stuck worker is restarted (default 30,
+                           above REQUEST_DEADLINE)
+    GUNICORN_MAX_REQUESTS  recycle workers after this many requests (0 = never)
+    GUNICORN_PRELOAD       1 (default) to import the app once in the master
+    PORT                   listen port (default 5001)
+    METRICS_MULTIPROC_DIR  where workers share their metrics so /api/metrics
+                           reports all of them (default: a directory per port
+                           under the temp dir; cleared at startup)
+
+With preload the app, the Supabase client and module-level caches are
+built once before forking and shared copy-on-write by the workers. Thread
+pools are created lazily, so no worker inherits dead threads.
+"""
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = timeout
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = '-'
+errorlog = '-'
+
+# Set before the app loads so a developer's .env can't switch debug mode on
+os.environ.setdefault('FLASK_DEBUG', '0')
+# Each worker has its own metrics registry; they are merged through files
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(
+    tempfile.gettempdir(), f"app-metrics-{os.getenv('PORT', '5001')}"))
+
+
+def on_starting(server):
+    # Counters from a previous run's workers would otherwise be added in
+    for path in glob.glob(os.path.join(os.environ['METRICS_MULTIPROC_DIR'], 'metrics-*.json*')):
+        os.remove(path)
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the preloaded objects out of the collector's reach so its
+        # passes don't write to (and un-share) their pages in every worker
+        gc.freeze()
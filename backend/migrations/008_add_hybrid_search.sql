@@ -0,0 +1,138 @@
+-- Full-text search columns and hybrid (lexical + semantic) search RPCs
+
+-- array_to_string is only STABLE, so wrap it for use in generated columns
+CREATE OR REPLACE FUNCTION immutable_array_to_string(arr text[], sep text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT array_to_string(arr, sep)
+$$;
+
+-- Names weigh the most, then skills/industry/school, then free-text bio
+ALTER TABLE profiles
+  ADD COLUMN IF NOT EXISTS search_vector tsvector
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(full_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(immutable_array_to_string(skills, ' '), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(industry, '') || ' ' || coalesce(custom_industry, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(current_school, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(bio, '')), 'C')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS profiles_search_vector_idx ON profiles USING gin (search_vector);
+
+ALTER TABLE insights
+  ADD COLUMN IF NOT EXISTS search_vector tsvector
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS insights_search_vector_idx ON insights USING gin (search_vector);
+
+-- Reciprocal rank fusion of a full-text ranking and a vector ranking.
+-- score = semantic_weight / (rrf_k + semantic_rank)
+--       + (1 - semantic_weight) / (rrf_k + lexical_rank)
+-- A NULL query_embedding gives a purely lexical search.
+CREATE OR REPLACE FUNCTION hybrid_search_profiles(
+  query_text text,
+  query_embedding vector(1536) DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH lexical AS (
+    SELECT
+      p.id,
+      ts_rank_cd(p.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(p.search_vector, q.query) DESC) AS rank
+    FROM profiles p, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE p.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      p.id,
+      1 - (p.embedding <=> query_embedding) AS similarity,
+      row_number() OVER (ORDER BY p.embedding <=> query_embedding) AS rank
+    FROM profiles p
+    WHERE query_embedding IS NOT NULL
+      AND p.embedding IS NOT NULL
+      AND 1 - (p.embedding <=> query_embedding) > match_threshold
+    ORDER BY p.embedding <=> query_embedding
+    LIMIT match_count * 2
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION hybrid_search_insights(
+  query_text text,
+  query_embedding vector(1536) DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH lexical AS (
+    SELECT
+      i.id,
+      ts_rank_cd(i.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(i.search_vector, q.query) DESC) AS rank
+    FROM insights i, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE i.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      i.id,
+      1 - (i.embedding <=> query_embedding) AS similarity,
+      row_number() OVER (ORDER BY i.embedding <=> query_embedding) AS rank
+    FROM insights i
+    WHERE query_embedding IS NOT NULL
+      AND i.embedding IS NOT NULL
+      AND 1 - (i.embedding <=> query_embedding) > match_threshold
+    ORDER BY i.embedding <=> query_embedding
+    LIMIT match_count * 2
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
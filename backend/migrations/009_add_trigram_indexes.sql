@@ -0,0 +1,86 @@
+-- Trigram indexes so partial-match location/school filters (ILIKE '%x%')
+-- and fuzzy school matching can use an index instead of a sequential scan
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_profiles_location_trgm ON profiles
+USING gin (location gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_profiles_current_school_trgm ON profiles
+USING gin (current_school gin_trgm_ops);
+
+-- Profiles whose school is similar to a (possibly misspelled) school name
+-- and that pass the other search filters. The filters are applied here,
+-- before match_count, rather than by the caller through a list of ids.
+-- The % operator is what the trigram index serves; its cut-off comes from
+-- pg_trgm.similarity_threshold, set here for this transaction only.
+DROP FUNCTION IF EXISTS search_profiles_by_school_fuzzy(text, float, int);
+CREATE OR REPLACE FUNCTION search_profiles_by_school_fuzzy(
+  school_query text,
+  min_similarity float DEFAULT 0.3,
+  match_count int DEFAULT 500,
+  industry_pattern text DEFAULT NULL,
+  location_pattern text DEFAULT NULL,
+  career_status_filter text DEFAULT NULL,
+  skills_filter text[] DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  email text,
+  full_name text,
+  phone text,
+  location text,
+  industry text,
+  custom_industry text,
+  current_school text,
+  career_status text,
+  bio text,
+  skills text[],
+  linkedin_url text,
+  github_url text,
+  portfolio_url text,
+  profile_picture_url text,
+  resume_filename text,
+  resume_filepath text,
+  resume_uploaded_at timestamptz,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('pg_trgm.similarity_threshold', min_similarity::text, true);
+
+  RETURN QUERY
+  SELECT
+    p.id,
+    p.email,
+    p.full_name,
+    p.phone,
+    p.location,
+    p.industry,
+    p.custom_industry,
+    p.current_school,
+    p.career_status,
+    p.bio,
+    p.skills,
+    p.linkedin_url,
+    p.github_url,
+    p.portfolio_url,
+    p.profile_picture_url,
+    p.resume_filename,
+    p.resume_filepath,
+    p.resume_uploaded_at,
+    p.created_at,
+    p.updated_at,
+    similarity(p.current_school, school_query)::float AS similarity
+  FROM profiles p
+  WHERE p.current_school % school_query
+    AND (industry_pattern IS NULL OR p.industry ILIKE industry_pattern)
+    AND (location_pattern IS NULL OR p.location ILIKE location_pattern)
+    AND (career_status_filter IS NULL OR p.career_status = career_status_filter)
+    AND (skills_filter IS NULL OR p.skills && skills_filter)
+  ORDER BY 21 DESC
+  LIMIT match_count;
+END;
+$$;
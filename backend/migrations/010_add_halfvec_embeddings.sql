@@ -0,0 +1,325 @@
+-- Compact embedding storage: half-precision copies of the embeddings with an
+-- HNSW index, and two-stage search (approximate candidates on halfvec, exact
+-- re-ranking on the full-precision vector). Requires pgvector >= 0.7.
+--
+-- Transition plan:
+--   1. Apply this migration. The triggers below dual-write embedding_half
+--      whenever embedding is written, so the app keeps writing `embedding`.
+--   2. Existing rows are backfilled at the bottom of this file. On large
+--      tables, run SELECT backfill_embedding_half() in a loop outside the
+--      migration instead, so each batch commits on its own.
+--   3. Compare recall/latency with benchmarks/compare_semantic_search.py.
+--   4. Once searches only use the *_reranked functions, the ivfflat indexes
+--      on the float32 columns can be dropped to reclaim their memory.
+
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS embedding_half halfvec(1536);
+ALTER TABLE insights ADD COLUMN IF NOT EXISTS embedding_half halfvec(1536);
+
+CREATE OR REPLACE FUNCTION sync_embedding_half()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.embedding_half = NEW.embedding::halfvec(1536);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS profiles_embedding_half_sync ON profiles;
+CREATE TRIGGER profiles_embedding_half_sync
+    BEFORE INSERT OR UPDATE OF embedding ON profiles
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_embedding_half();
+
+DROP TRIGGER IF EXISTS insights_embedding_half_sync ON insights;
+CREATE TRIGGER insights_embedding_half_sync
+    BEFORE INSERT OR UPDATE OF embedding ON insights
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_embedding_half();
+
+CREATE INDEX IF NOT EXISTS profiles_embedding_half_idx ON profiles
+USING hnsw (embedding_half halfvec_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS insights_embedding_half_idx ON insights
+USING hnsw (embedding_half halfvec_cosine_ops);
+
+-- Two-stage semantic search. Same result columns as search_profiles_semantic.
+-- plpgsql (and not STABLE) because it sets hnsw.ef_search for the transaction.
+CREATE OR REPLACE FUNCTION search_profiles_semantic_reranked(
+  query_embedding vector(1536),
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 20,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  full_name text,
+  email text,
+  bio text,
+  location text,
+  industry text,
+  custom_industry text,
+  current_school text,
+  career_status text,
+  skills text[],
+  profile_picture_url text,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- An HNSW scan returns at most ef_search rows, so widen it to the number
+  -- of candidates wanted (pgvector caps it at 1000)
+  PERFORM set_config(
+    'hnsw.ef_search', least(greatest(candidate_count, match_count), 1000)::text, true
+  );
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT p.id
+    FROM profiles p
+    WHERE query_embedding IS NOT NULL
+      AND p.embedding_half IS NOT NULL
+    ORDER BY p.embedding_half <=> query_embedding::halfvec(1536)
+    LIMIT greatest(candidate_count, match_count)
+  )
+  SELECT
+    p.id,
+    p.full_name,
+    p.email,
+    p.bio,
+    p.location,
+    p.industry,
+    p.custom_industry,
+    p.current_school,
+    p.career_status,
+    p.skills,
+    p.profile_picture_url,
+    1 - (p.embedding <=> query_embedding) AS similarity
+  FROM candidates c
+  JOIN profiles p ON p.id = c.id
+  WHERE 1 - (p.embedding <=> query_embedding) > match_threshold
+  ORDER BY p.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_insights_semantic_reranked(
+  query_embedding vector(1536),
+  match_threshold float DEFAULT 0.3,
+  match_count int DEFAULT 50,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  title text,
+  content text,
+  link_url text,
+  link_title text,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- An HNSW scan returns at most ef_search rows, so widen it to the number
+  -- of candidates wanted (pgvector caps it at 1000)
+  PERFORM set_config(
+    'hnsw.ef_search', least(greatest(candidate_count, match_count), 1000)::text, true
+  );
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT i.id
+    FROM insights i
+    WHERE query_embedding IS NOT NULL
+      AND i.embedding_half IS NOT NULL
+    ORDER BY i.embedding_half <=> query_embedding::halfvec(1536)
+    LIMIT greatest(candidate_count, match_count)
+  )
+  SELECT
+    i.id,
+    i.user_id,
+    i.title,
+    i.content,
+    i.link_url,
+    i.link_title,
+    i.created_at,
+    i.updated_at,
+    1 - (i.embedding <=> query_embedding) AS similarity
+  FROM candidates c
+  JOIN insights i ON i.id = c.id
+  WHERE 1 - (i.embedding <=> query_embedding) > match_threshold
+  ORDER BY i.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+-- The hybrid search RPCs take their vector ranking from the two-stage search
+DROP FUNCTION IF EXISTS hybrid_search_profiles(text, vector, int, float, float, int);
+CREATE OR REPLACE FUNCTION hybrid_search_profiles(
+  query_text text,
+  query_embedding vector(1536) DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+AS $$
+  WITH lexical AS (
+    SELECT
+      p.id,
+      ts_rank_cd(p.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(p.search_vector, q.query) DESC) AS rank
+    FROM profiles p, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE p.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      r.id,
+      r.similarity,
+      row_number() OVER (ORDER BY r.similarity DESC) AS rank
+    FROM search_profiles_semantic_reranked(
+      query_embedding, match_threshold, match_count * 2, candidate_count
+    ) r
+    WHERE query_embedding IS NOT NULL
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
+
+DROP FUNCTION IF EXISTS hybrid_search_insights(text, vector, int, float, float, int);
+CREATE OR REPLACE FUNCTION hybrid_search_insights(
+  query_text text,
+  query_embedding vector(1536) DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+AS $$
+  WITH lexical AS (
+    SELECT
+      i.id,
+      ts_rank_cd(i.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(i.search_vector, q.query) DESC) AS rank
+    FROM insights i, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE i.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      r.id,
+      r.similarity,
+      row_number() OVER (ORDER BY r.similarity DESC) AS rank
+    FROM search_insights_semantic_reranked(
+      query_embedding, match_threshold, match_count * 2, candidate_count
+    ) r
+    WHERE query_embedding IS NOT NULL
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
+
+-- Backfilling embedding_half must not look like a profile/insight edit, so
+-- the updated_at triggers skip rows while app.preserve_updated_at is set
+-- for the transaction.
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.preserve_updated_at', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_insights_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.preserve_updated_at', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fills embedding_half for up to batch_size rows per table; returns how many
+-- rows it wrote, so callers repeat it until it returns 0.
+CREATE OR REPLACE FUNCTION backfill_embedding_half(batch_size int DEFAULT 5000)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  profile_rows int;
+  insight_rows int;
+BEGIN
+  PERFORM set_config('app.preserve_updated_at', 'on', true);
+
+  UPDATE profiles SET embedding_half = embedding::halfvec(1536)
+  WHERE id IN (
+    SELECT id FROM profiles
+    WHERE embedding IS NOT NULL AND embedding_half IS NULL
+    LIMIT batch_size
+  );
+  GET DIAGNOSTICS profile_rows = ROW_COUNT;
+
+  UPDATE insights SET embedding_half = embedding::halfvec(1536)
+  WHERE id IN (
+    SELECT id FROM insights
+    WHERE embedding IS NOT NULL AND embedding_half IS NULL
+    LIMIT batch_size
+  );
+  GET DIAGNOSTICS insight_rows = ROW_COUNT;
+
+  PERFORM set_config('app.preserve_updated_at', 'off', true);
+  RETURN profile_rows + insight_rows;
+END;
+$$;
+
+-- Backfill every existing row; rows left without embedding_half would drop
+-- out of the re-ranked (and therefore hybrid) search.
+DO $$
+BEGIN
+  LOOP
+    EXIT WHEN backfill_embedding_half() = 0;
+  END LOOP;
+END;
+$$;
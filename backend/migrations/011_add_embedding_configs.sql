@@ -0,0 +1,533 @@
+-- Configurable embedding model/dimensions with per-row tags and online
+-- re-indexing through shadow columns.
+--
+-- Re-index flow (driven by app/services/embedding_reindex.py):
+--   1. start_embedding_reindex(model, dimensions) registers a 'backfilling'
+--      config and adds embedding_next / embedding_half_next /
+--      embedding_next_config_id shadow columns (with an HNSW index) to
+--      profiles and insights. The app dual-writes them while it exists.
+--   2. The job backfills every row, tagging it with embedding_next_config_id.
+--   3. activate_embedding_config(id) swaps the shadow columns in with
+--      renames inside one transaction, so searches move to the new model
+--      atomically. The old columns are kept as *_retired until
+--      retire_embedding_columns() drops them.
+
+CREATE TABLE IF NOT EXISTS embedding_configs (
+    id SERIAL PRIMARY KEY,
+    model TEXT NOT NULL,
+    dimensions INT NOT NULL CHECK (dimensions > 0 AND dimensions <= 4000),
+    status TEXT NOT NULL DEFAULT 'backfilling' CHECK (status IN ('backfilling', 'active', 'retired')),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    activated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS embedding_configs_one_active
+ON embedding_configs (status) WHERE status = 'active';
+CREATE UNIQUE INDEX IF NOT EXISTS embedding_configs_one_backfilling
+ON embedding_configs (status) WHERE status = 'backfilling';
+
+ALTER TABLE embedding_configs ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO embedding_configs (model, dimensions, status, activated_at)
+SELECT 'openai/text-embedding-3-small', 1536, 'active', NOW()
+WHERE NOT EXISTS (SELECT 1 FROM embedding_configs);
+
+-- Which config produced each row's embedding
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS embedding_config_id INT REFERENCES embedding_configs(id);
+ALTER TABLE insights ADD COLUMN IF NOT EXISTS embedding_config_id INT REFERENCES embedding_configs(id);
+
+-- Tagging rows is not an edit, so keep updated_at (see migration 010)
+DO $$
+BEGIN
+  PERFORM set_config('app.preserve_updated_at', 'on', true);
+  UPDATE profiles SET embedding_config_id = (SELECT id FROM embedding_configs WHERE status = 'active')
+  WHERE embedding IS NOT NULL AND embedding_config_id IS NULL;
+  UPDATE insights SET embedding_config_id = (SELECT id FROM embedding_configs WHERE status = 'active')
+  WHERE embedding IS NOT NULL AND embedding_config_id IS NULL;
+  PERFORM set_config('app.preserve_updated_at', 'off', true);
+END;
+$$;
+
+-- Dimension-agnostic half-precision sync (the column type enforces the size)
+CREATE OR REPLACE FUNCTION sync_embedding_half()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.embedding_half = NEW.embedding::halfvec;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_embedding_half_next()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.embedding_half_next = NEW.embedding_next::halfvec;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ---------------------------------------------------------------------------
+-- Search functions take untyped vectors so they keep working after a
+-- dimension change; pgvector still rejects mismatched sizes at query time.
+-- ---------------------------------------------------------------------------
+
+DROP FUNCTION IF EXISTS hybrid_search_profiles(text, vector, int, float, float, int, int);
+DROP FUNCTION IF EXISTS hybrid_search_insights(text, vector, int, float, float, int, int);
+DROP FUNCTION IF EXISTS search_profiles_semantic_reranked(vector, float, int, int);
+DROP FUNCTION IF EXISTS search_insights_semantic_reranked(vector, float, int, int);
+DROP FUNCTION IF EXISTS search_profiles_semantic(vector, float, int);
+DROP FUNCTION IF EXISTS search_insights_semantic(vector, float, int);
+
+CREATE OR REPLACE FUNCTION search_profiles_semantic(
+  query_embedding vector,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 20
+)
+RETURNS TABLE (
+  id uuid,
+  full_name text,
+  email text,
+  bio text,
+  location text,
+  industry text,
+  custom_industry text,
+  current_school text,
+  career_status text,
+  skills text[],
+  profile_picture_url text,
+  similarity float
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    p.id,
+    p.full_name,
+    p.email,
+    p.bio,
+    p.location,
+    p.industry,
+    p.custom_industry,
+    p.current_school,
+    p.career_status,
+    p.skills,
+    p.profile_picture_url,
+    1 - (p.embedding <=> query_embedding) AS similarity
+  FROM profiles p
+  WHERE p.embedding IS NOT NULL
+    AND 1 - (p.embedding <=> query_embedding) > match_threshold
+  ORDER BY p.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION search_insights_semantic(
+  query_embedding vector,
+  match_threshold float DEFAULT 0.3,
+  match_count int DEFAULT 50
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  title text,
+  content text,
+  link_url text,
+  link_title text,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    i.id,
+    i.user_id,
+    i.title,
+    i.content,
+    i.link_url,
+    i.link_title,
+    i.created_at,
+    i.updated_at,
+    1 - (i.embedding <=> query_embedding) AS similarity
+  FROM insights i
+  WHERE i.embedding IS NOT NULL
+    AND 1 - (i.embedding <=> query_embedding) > match_threshold
+  ORDER BY i.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION search_profiles_semantic_reranked(
+  query_embedding vector,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 20,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  full_name text,
+  email text,
+  bio text,
+  location text,
+  industry text,
+  custom_industry text,
+  current_school text,
+  career_status text,
+  skills text[],
+  profile_picture_url text,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config(
+    'hnsw.ef_search', least(greatest(candidate_count, match_count), 1000)::text, true
+  );
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT p.id
+    FROM profiles p
+    WHERE query_embedding IS NOT NULL
+      AND p.embedding_half IS NOT NULL
+    ORDER BY p.embedding_half <=> query_embedding::halfvec
+    LIMIT greatest(candidate_count, match_count)
+  )
+  SELECT
+    p.id,
+    p.full_name,
+    p.email,
+    p.bio,
+    p.location,
+    p.industry,
+    p.custom_industry,
+    p.current_school,
+    p.career_status,
+    p.skills,
+    p.profile_picture_url,
+    1 - (p.embedding <=> query_embedding) AS similarity
+  FROM candidates c
+  JOIN profiles p ON p.id = c.id
+  WHERE 1 - (p.embedding <=> query_embedding) > match_threshold
+  ORDER BY p.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_insights_semantic_reranked(
+  query_embedding vector,
+  match_threshold float DEFAULT 0.3,
+  match_count int DEFAULT 50,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  title text,
+  content text,
+  link_url text,
+  link_title text,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config(
+    'hnsw.ef_search', least(greatest(candidate_count, match_count), 1000)::text, true
+  );
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT i.id
+    FROM insights i
+    WHERE query_embedding IS NOT NULL
+      AND i.embedding_half IS NOT NULL
+    ORDER BY i.embedding_half <=> query_embedding::halfvec
+    LIMIT greatest(candidate_count, match_count)
+  )
+  SELECT
+    i.id,
+    i.user_id,
+    i.title,
+    i.content,
+    i.link_url,
+    i.link_title,
+    i.created_at,
+    i.updated_at,
+    1 - (i.embedding <=> query_embedding) AS similarity
+  FROM candidates c
+  JOIN insights i ON i.id = c.id
+  WHERE 1 - (i.embedding <=> query_embedding) > match_threshold
+  ORDER BY i.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION hybrid_search_profiles(
+  query_text text,
+  query_embedding vector DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+AS $$
+  WITH lexical AS (
+    SELECT
+      p.id,
+      ts_rank_cd(p.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(p.search_vector, q.query) DESC) AS rank
+    FROM profiles p, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE p.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      r.id,
+      r.similarity,
+      row_number() OVER (ORDER BY r.similarity DESC) AS rank
+    FROM search_profiles_semantic_reranked(
+      query_embedding, match_threshold, match_count * 2, candidate_count
+    ) r
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION hybrid_search_insights(
+  query_text text,
+  query_embedding vector DEFAULT NULL,
+  match_count int DEFAULT 50,
+  semantic_weight float DEFAULT 0.5,
+  match_threshold float DEFAULT 0.2,
+  rrf_k int DEFAULT 60,
+  candidate_count int DEFAULT 200
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  lexical_rank float,
+  score float
+)
+LANGUAGE sql
+AS $$
+  WITH lexical AS (
+    SELECT
+      i.id,
+      ts_rank_cd(i.search_vector, q.query) AS lexical_rank,
+      row_number() OVER (ORDER BY ts_rank_cd(i.search_vector, q.query) DESC) AS rank
+    FROM insights i, websearch_to_tsquery('english', query_text) AS q(query)
+    WHERE i.search_vector @@ q.query
+    ORDER BY lexical_rank DESC
+    LIMIT match_count * 2
+  ),
+  semantic AS (
+    SELECT
+      r.id,
+      r.similarity,
+      row_number() OVER (ORDER BY r.similarity DESC) AS rank
+    FROM search_insights_semantic_reranked(
+      query_embedding, match_threshold, match_count * 2, candidate_count
+    ) r
+  )
+  SELECT
+    coalesce(s.id, l.id) AS id,
+    s.similarity,
+    l.lexical_rank,
+    coalesce(semantic_weight / (rrf_k + s.rank), 0.0) +
+    coalesce((1 - semantic_weight) / (rrf_k + l.rank), 0.0) AS score
+  FROM semantic s
+  FULL OUTER JOIN lexical l ON s.id = l.id
+  ORDER BY score DESC
+  LIMIT match_count;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Re-index lifecycle
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION start_embedding_reindex(p_model text, p_dimensions int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  config_id int;
+  tbl text;
+BEGIN
+  IF EXISTS (SELECT 1 FROM embedding_configs WHERE status = 'backfilling') THEN
+    RAISE EXCEPTION 'An embedding re-index is already in progress';
+  END IF;
+
+  INSERT INTO embedding_configs (model, dimensions, status)
+  VALUES (p_model, p_dimensions, 'backfilling')
+  RETURNING id INTO config_id;
+
+  FOREACH tbl IN ARRAY ARRAY['profiles', 'insights'] LOOP
+    EXECUTE format(
+      'ALTER TABLE %I DROP COLUMN IF EXISTS embedding_next, '
+      'DROP COLUMN IF EXISTS embedding_half_next, '
+      'DROP COLUMN IF EXISTS embedding_next_config_id', tbl);
+    EXECUTE format(
+      'ALTER TABLE %I ADD COLUMN embedding_next vector(%s), '
+      'ADD COLUMN embedding_half_next halfvec(%s), '
+      'ADD COLUMN embedding_next_config_id int REFERENCES embedding_configs(id)',
+      tbl, p_dimensions, p_dimensions);
+    -- Built while the column is empty, then maintained as the backfill writes
+    EXECUTE format(
+      'CREATE INDEX %I ON %I USING hnsw (embedding_half_next halfvec_cosine_ops)',
+      tbl || '_embedding_half_next_idx', tbl);
+    EXECUTE format(
+      'CREATE TRIGGER %I BEFORE INSERT OR UPDATE OF embedding_next ON %I '
+      'FOR EACH ROW EXECUTE FUNCTION sync_embedding_half_next()',
+      tbl || '_embedding_half_next_sync', tbl);
+  END LOOP;
+
+  NOTIFY pgrst, 'reload schema';
+  RETURN config_id;
+END;
+$$;
+
+-- Writes one backfill batch of shadow vectors. p_rows is a JSON array of
+-- {"id", "embedding"} objects; updated_at is left alone.
+CREATE OR REPLACE FUNCTION write_embedding_next(p_table text, p_config_id int, p_rows jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  written int;
+BEGIN
+  IF p_table NOT IN ('profiles', 'insights') THEN
+    RAISE EXCEPTION 'Unknown embedding table %', p_table;
+  END IF;
+  PERFORM set_config('app.preserve_updated_at', 'on', true);
+  EXECUTE format(
+    'UPDATE %I t SET embedding_next = r.embedding::vector, embedding_next_config_id = $1 '
+    'FROM jsonb_to_recordset($2) AS r(id uuid, embedding text) WHERE t.id = r.id', p_table)
+  USING p_config_id, p_rows;
+  GET DIAGNOSTICS written = ROW_COUNT;
+  PERFORM set_config('app.preserve_updated_at', 'off', true);
+  RETURN written;
+END;
+$$;
+
+-- Rows not yet tagged with the backfilling config, per table
+CREATE OR REPLACE FUNCTION embedding_reindex_progress(p_config_id int)
+RETURNS TABLE (table_name text, total bigint, remaining bigint)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  tbl text;
+BEGIN
+  FOREACH tbl IN ARRAY ARRAY['profiles', 'insights'] LOOP
+    table_name := tbl;
+    EXECUTE format(
+      'SELECT count(*), count(*) FILTER (WHERE embedding_next_config_id IS DISTINCT FROM %s) FROM %I',
+      p_config_id, tbl)
+    INTO total, remaining;
+    RETURN NEXT;
+  END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION activate_embedding_config(p_config_id int)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  tbl text;
+  pending bigint;
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM embedding_configs WHERE id = p_config_id AND status = 'backfilling'
+  ) THEN
+    RAISE EXCEPTION 'Embedding config % is not being backfilled', p_config_id;
+  END IF;
+
+  -- Block writers so no row can change between the check and the swap
+  LOCK TABLE profiles, insights IN SHARE ROW EXCLUSIVE MODE;
+
+  FOREACH tbl IN ARRAY ARRAY['profiles', 'insights'] LOOP
+    EXECUTE format(
+      'SELECT count(*) FROM %I WHERE embedding_next_config_id IS DISTINCT FROM %s',
+      tbl, p_config_id)
+    INTO pending;
+    IF pending > 0 THEN
+      RAISE EXCEPTION '% rows in % are not re-indexed yet', pending, tbl;
+    END IF;
+  END LOOP;
+
+  FOREACH tbl IN ARRAY ARRAY['profiles', 'insights'] LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_embedding_half_sync', tbl);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_embedding_half_next_sync', tbl);
+    EXECUTE format(
+      'ALTER TABLE %I DROP COLUMN IF EXISTS embedding_retired, '
+      'DROP COLUMN IF EXISTS embedding_half_retired, '
+      'DROP COLUMN IF EXISTS embedding_config_id_retired', tbl);
+
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding TO embedding_retired', tbl);
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding_half TO embedding_half_retired', tbl);
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding_config_id TO embedding_config_id_retired', tbl);
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding_next TO embedding', tbl);
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding_half_next TO embedding_half', tbl);
+    EXECUTE format('ALTER TABLE %I RENAME COLUMN embedding_next_config_id TO embedding_config_id', tbl);
+
+    EXECUTE format('ALTER INDEX IF EXISTS %I RENAME TO %I',
+                   tbl || '_embedding_half_idx', tbl || '_embedding_half_retired_idx');
+    EXECUTE format('ALTER INDEX IF EXISTS %I RENAME TO %I',
+                   tbl || '_embedding_half_next_idx', tbl || '_embedding_half_idx');
+
+    EXECUTE format(
+      'CREATE TRIGGER %I BEFORE INSERT OR UPDATE OF embedding ON %I '
+      'FOR EACH ROW EXECUTE FUNCTION sync_embedding_half()',
+      tbl || '_embedding_half_sync', tbl);
+  END LOOP;
+
+  -- UPDATE OF column lists stay bound to the renamed-away column; re-point
+  DROP TRIGGER IF EXISTS profiles_embedding_updated_at ON profiles;
+  CREATE TRIGGER profiles_embedding_updated_at
+      BEFORE UPDATE OF embedding ON profiles
+      FOR EACH ROW
+      EXECUTE FUNCTION update_profile_updated_at();
+
+  UPDATE embedding_configs SET status = 'retired' WHERE status = 'active';
+  UPDATE embedding_configs SET status = 'active', activated_at = NOW() WHERE id = p_config_id;
+
+  NOTIFY pgrst, 'reload schema';
+END;
+$$;
+
+-- Drop the columns left behind by the last cutover once it is confirmed good
+CREATE OR REPLACE FUNCTION retire_embedding_columns()
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  tbl text;
+BEGIN
+  FOREACH tbl IN ARRAY ARRAY['profiles', 'insights'] LOOP
+    EXECUTE format(
+      'ALTER TABLE %I DROP COLUMN IF EXISTS embedding_retired, '
+      'DROP COLUMN IF EXISTS embedding_half_retired, '
+      'DROP COLUMN IF EXISTS embedding_config_id_retired', tbl);
+  END LOOP;
+  NOTIFY pgrst, 'reload schema';
+END;
+$$;
@@ -0,0 +1,82 @@
+-- Field-level profile embeddings. Location, industry, school, skills and
+-- bio are embedded separately instead of as one blob that repeats fields to
+-- weight them.
+--
+-- field_embeddings caches one vector per distinct field text (keyed by a
+-- hash of field + text) and embedding config, so profiles sharing a value
+-- such as 'Seattle, WA' share a vector, and editing one field re-embeds
+-- only that field. profile_field_embeddings maps each profile's fields to
+-- those hashes and is independent of the embedding model.
+--
+-- profiles.embedding stays as the weighted mean of the field vectors
+-- (computed by the app), so the existing search functions keep working;
+-- search_profiles_weighted applies per-request weights instead.
+--
+-- Existing profiles get their field rows from
+-- POST /api/profile/embeddings/generate?force=true.
+
+CREATE TABLE IF NOT EXISTS field_embeddings (
+    text_hash TEXT NOT NULL,
+    embedding_config_id INT NOT NULL REFERENCES embedding_configs(id) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    -- Untyped so configs with different dimensions can coexist during a re-index
+    embedding vector NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (text_hash, embedding_config_id)
+);
+
+CREATE TABLE IF NOT EXISTS profile_field_embeddings (
+    profile_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    field TEXT NOT NULL CHECK (field IN ('location', 'industry', 'school', 'skills', 'bio')),
+    text_hash TEXT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (profile_id, field)
+);
+
+CREATE INDEX IF NOT EXISTS idx_profile_field_embeddings_text_hash
+ON profile_field_embeddings(text_hash);
+
+ALTER TABLE field_embeddings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE profile_field_embeddings ENABLE ROW LEVEL SECURITY;
+
+-- Profiles ranked by the weighted mean of their per-field similarities.
+-- field_weights maps field names to weights (missing fields weigh 1, 0
+-- ignores a field); each profile is normalised by the weights of the fields
+-- it has, so an empty school doesn't count against it. Each distinct field
+-- value is compared with the query once, however many profiles share it.
+CREATE OR REPLACE FUNCTION search_profiles_weighted(
+  query_embedding vector,
+  field_weights jsonb DEFAULT '{}'::jsonb,
+  match_threshold float DEFAULT 0.2,
+  match_count int DEFAULT 50
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  field_similarities jsonb
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH weights AS (
+    SELECT f.field, coalesce((field_weights ->> f.field)::float, 1.0) AS weight
+    FROM unnest(ARRAY['location', 'industry', 'school', 'skills', 'bio']) AS f(field)
+  ),
+  scored AS (
+    SELECT fe.text_hash, 1 - (fe.embedding <=> query_embedding) AS field_similarity
+    FROM field_embeddings fe
+    JOIN embedding_configs c ON c.id = fe.embedding_config_id AND c.status = 'active'
+    WHERE query_embedding IS NOT NULL
+  )
+  SELECT
+    pf.profile_id,
+    sum(w.weight * s.field_similarity) / sum(w.weight),
+    jsonb_object_agg(pf.field, round(s.field_similarity::numeric, 4))
+  FROM profile_field_embeddings pf
+  JOIN weights w ON w.field = pf.field AND w.weight > 0
+  JOIN scored s ON s.text_hash = pf.text_hash
+  GROUP BY pf.profile_id
+  HAVING sum(w.weight * s.field_similarity) / sum(w.weight) > match_threshold
+  ORDER BY 2 DESC
+  LIMIT match_count;
+$$;
@@ -0,0 +1,27 @@
+-- Precomputed profile recommendations (see app/services/recommendations.py).
+--
+-- One row per user with the ranked {id, reason} pairs last computed for
+-- them. `version` stamps the model/prompt that produced them, so changing
+-- either makes every row a miss. Rows are invalidated rather than deleted
+-- (invalidated_at later than computed_at) so they can still be served
+-- while a background refresh runs. `segment` is the user's industry at
+-- compute time; a profile joining that industry invalidates its rows.
+--
+-- Fill it with: flask --app run recommendations precompute
+
+CREATE TABLE IF NOT EXISTS recommendation_cache (
+    user_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+    version TEXT NOT NULL,
+    segment TEXT NOT NULL DEFAULT '',
+    -- How many recommendations were asked for; smaller limits reuse the row
+    size INT NOT NULL,
+    recommendations JSONB NOT NULL DEFAULT '[]'::jsonb,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    invalidated_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_recommendation_cache_segment
+ON recommendation_cache(segment);
+
+-- Only the backend (service role) reads and writes the cache
+ALTER TABLE recommendation_cache ENABLE ROW LEVEL SECURITY;
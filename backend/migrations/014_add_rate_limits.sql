@@ -0,0 +1,97 @@
+-- Shared state for RATE_LIMIT_BACKEND=postgres (see app/services/rate_limit.py).
+--
+-- Token buckets and in-flight request slots live in unlogged tables: they
+-- are rewritten on every admitted request and losing them in a crash only
+-- resets the limits.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_slots (
+    key TEXT NOT NULL,
+    holder UUID NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (key, holder)
+);
+
+-- Only the backend (service role) uses these
+ALTER TABLE rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE rate_limit_slots ENABLE ROW LEVEL SECURITY;
+
+-- Admit one request: take a token from every bucket in p_buckets
+-- ([{key, scope, capacity, refill}], refill in tokens per second) and, with
+-- p_slot_key, a slot of at most p_slot_limit in flight. Nothing is taken
+-- unless everything is available. Returns {allowed, retry_after, scope}.
+CREATE OR REPLACE FUNCTION rate_limit_admit(
+  p_buckets jsonb,
+  p_slot_key text DEFAULT NULL,
+  p_slot_limit int DEFAULT NULL,
+  p_holder uuid DEFAULT NULL,
+  p_slot_ttl float DEFAULT 60
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  b record;
+  now_ts timestamptz := clock_timestamp();
+  level float;
+  wait float := 0;
+  wait_scope text;
+  held int;
+BEGIN
+  IF p_slot_key IS NOT NULL AND p_slot_limit IS NOT NULL THEN
+    -- Serialise admissions per slot key so the count can't be overrun
+    PERFORM pg_advisory_xact_lock(hashtext('rate_limit_slots:' || p_slot_key));
+    DELETE FROM rate_limit_slots WHERE key = p_slot_key AND expires_at < now_ts;
+    SELECT count(*) INTO held FROM rate_limit_slots WHERE key = p_slot_key;
+    IF held >= p_slot_limit THEN
+      RETURN jsonb_build_object('allowed', false, 'retry_after', 1, 'scope', 'concurrency');
+    END IF;
+  END IF;
+
+  -- Refill (and lock, in key order) every bucket first
+  FOR b IN
+    SELECT * FROM jsonb_to_recordset(p_buckets) AS x(key text, scope text, capacity float, refill float)
+    ORDER BY key
+  LOOP
+    INSERT INTO rate_limit_buckets AS r (key, tokens, updated_at)
+    VALUES (b.key, b.capacity, now_ts)
+    ON CONFLICT (key) DO UPDATE
+      SET tokens = least(b.capacity, r.tokens + extract(epoch FROM now_ts - r.updated_at) * b.refill),
+          updated_at = now_ts
+    RETURNING tokens INTO level;
+    IF level < 1 AND (1 - level) / b.refill > wait THEN
+      wait := (1 - level) / b.refill;
+      wait_scope := b.scope;
+    END IF;
+  END LOOP;
+
+  IF wait > 0 THEN
+    RETURN jsonb_build_object('allowed', false, 'retry_after', wait, 'scope', wait_scope);
+  END IF;
+
+  UPDATE rate_limit_buckets r
+  SET tokens = r.tokens - 1
+  FROM jsonb_to_recordset(p_buckets) AS x(key text)
+  WHERE r.key = x.key;
+
+  IF p_slot_key IS NOT NULL AND p_slot_limit IS NOT NULL THEN
+    INSERT INTO rate_limit_slots (key, holder, expires_at)
+    VALUES (p_slot_key, p_holder, now_ts + make_interval(secs => p_slot_ttl))
+    ON CONFLICT (key, holder) DO UPDATE SET expires_at = EXCLUDED.expires_at;
+  END IF;
+
+  RETURN jsonb_build_object('allowed', true, 'retry_after', 0, 'scope', NULL);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION rate_limit_release(p_slot_key text, p_holder uuid)
+RETURNS void
+LANGUAGE sql
+AS $$
+  DELETE FROM rate_limit_slots WHERE key = p_slot_key AND holder = p_holder;
+$$;
@@ -0,0 +1,188 @@
+-- Resumable re-embedding jobs (see app/services/embedding_jobs.py).
+--
+-- A job walks one table in id order, handing out chunks of chunk_size rows
+-- to workers. cursor_id is the end of the last chunk handed out, so an
+-- interrupted job resumes from there instead of from the start; chunks a
+-- worker claimed but never completed are handed out again once their lease
+-- expires. Several workers can run the same job at once.
+--
+-- Run jobs with: flask --app run embeddings reindex
+
+CREATE TABLE IF NOT EXISTS embedding_jobs (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    table_name TEXT NOT NULL CHECK (table_name IN ('profiles', 'insights')),
+    -- 'all' re-embeds every row, 'missing' only rows without an embedding
+    mode TEXT NOT NULL CHECK (mode IN ('all', 'missing')),
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'completed', 'cancelled')),
+    chunk_size INT NOT NULL DEFAULT 100,
+    cursor_id UUID,
+    -- Set once every row has been handed out in a chunk
+    exhausted BOOLEAN NOT NULL DEFAULT FALSE,
+    total INT,
+    processed INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    created_by UUID,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- One unfinished job per table; starting another resumes it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_embedding_jobs_active
+ON embedding_jobs(table_name) WHERE status IN ('pending', 'running');
+
+CREATE TABLE IF NOT EXISTS embedding_job_chunks (
+    id BIGSERIAL PRIMARY KEY,
+    job_id UUID NOT NULL REFERENCES embedding_jobs(id) ON DELETE CASCADE,
+    -- Rows with lower_id < id <= upper_id; lower_id is NULL for the first chunk
+    lower_id UUID,
+    upper_id UUID NOT NULL,
+    status TEXT NOT NULL DEFAULT 'claimed' CHECK (status IN ('claimed', 'done')),
+    worker UUID NOT NULL,
+    lease_expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    attempts INT NOT NULL DEFAULT 1,
+    processed INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_job_chunks_open
+ON embedding_job_chunks(job_id, lease_expires_at) WHERE status = 'claimed';
+
+ALTER TABLE embedding_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE embedding_job_chunks ENABLE ROW LEVEL SECURITY;
+
+-- Hand the next chunk of a job to p_worker: an abandoned chunk if there is
+-- one, otherwise the next chunk_size rows after the cursor. Returns no row
+-- when nothing is left to hand out, and marks the job completed once every
+-- chunk is done.
+CREATE OR REPLACE FUNCTION claim_embedding_job_chunk(
+  p_job_id uuid,
+  p_worker uuid,
+  p_lease_seconds int DEFAULT 120
+)
+RETURNS TABLE (chunk_id bigint, after_id uuid, through_id uuid)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  job embedding_jobs%ROWTYPE;
+  next_upper uuid;
+  lease timestamptz := now() + make_interval(secs => p_lease_seconds);
+BEGIN
+  -- Serialises claims for the job
+  SELECT * INTO job FROM embedding_jobs WHERE id = p_job_id FOR UPDATE;
+  IF NOT FOUND OR job.status NOT IN ('pending', 'running') THEN
+    RETURN;
+  END IF;
+
+  UPDATE embedding_job_chunks c
+  SET worker = p_worker, lease_expires_at = lease, attempts = c.attempts + 1
+  WHERE c.id = (
+    SELECT o.id FROM embedding_job_chunks o
+    WHERE o.job_id = p_job_id AND o.status = 'claimed' AND o.lease_expires_at < now()
+    ORDER BY o.id
+    LIMIT 1
+  )
+  RETURNING c.id, c.lower_id, c.upper_id INTO chunk_id, after_id, through_id;
+  IF FOUND THEN
+    RETURN NEXT;
+    RETURN;
+  END IF;
+
+  IF NOT job.exhausted THEN
+    EXECUTE format(
+      'SELECT max(id) FROM (SELECT id FROM %I WHERE ($1 IS NULL OR id > $1) %s ORDER BY id LIMIT $2) s',
+      job.table_name,
+      CASE WHEN job.mode = 'missing' THEN 'AND embedding IS NULL' ELSE '' END)
+    INTO next_upper
+    USING job.cursor_id, job.chunk_size;
+
+    IF next_upper IS NOT NULL THEN
+      UPDATE embedding_jobs
+      SET cursor_id = next_upper, status = 'running',
+          started_at = coalesce(started_at, now()), updated_at = now()
+      WHERE id = p_job_id;
+
+      INSERT INTO embedding_job_chunks (job_id, lower_id, upper_id, worker, lease_expires_at)
+      VALUES (p_job_id, job.cursor_id, next_upper, p_worker, lease)
+      RETURNING id, lower_id, upper_id INTO chunk_id, after_id, through_id;
+      RETURN NEXT;
+      RETURN;
+    END IF;
+
+    UPDATE embedding_jobs SET exhausted = TRUE, updated_at = now() WHERE id = p_job_id;
+  END IF;
+
+  IF NOT EXISTS (
+    SELECT 1 FROM embedding_job_chunks WHERE job_id = p_job_id AND status = 'claimed'
+  ) THEN
+    UPDATE embedding_jobs
+    SET status = 'completed', started_at = coalesce(started_at, now()),
+        finished_at = now(), updated_at = now()
+    WHERE id = p_job_id;
+  END IF;
+END;
+$$;
+
+-- Record a finished chunk. Ignored if the chunk's lease passed to another
+-- worker in the meantime, so rows are counted once.
+CREATE OR REPLACE FUNCTION complete_embedding_job_chunk(
+  p_chunk_id bigint,
+  p_worker uuid,
+  p_processed int,
+  p_failed int
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  chunk_job uuid;
+BEGIN
+  UPDATE embedding_job_chunks
+  SET status = 'done', processed = p_processed, failed = p_failed, finished_at = now()
+  WHERE id = p_chunk_id AND worker = p_worker AND status = 'claimed'
+  RETURNING job_id INTO chunk_job;
+
+  IF chunk_job IS NOT NULL THEN
+    UPDATE embedding_jobs
+    SET processed = processed + p_processed, failed = failed + p_failed, updated_at = now()
+    WHERE id = chunk_job;
+  END IF;
+END;
+$$;
+
+-- Give a chunk back unfinished (e.g. the embeddings provider is down) so
+-- the next claim picks it up.
+CREATE OR REPLACE FUNCTION release_embedding_job_chunk(p_chunk_id bigint, p_worker uuid)
+RETURNS void
+LANGUAGE sql
+AS $$
+  UPDATE embedding_job_chunks
+  SET lease_expires_at = now() - interval '1 second'
+  WHERE id = p_chunk_id AND worker = p_worker AND status = 'claimed';
+$$;
+
+-- Write live embeddings for a batch of rows ({id, embedding} with the
+-- vector as JSON text). updated_at is bumped so vector index refreshes
+-- pick the rows up.
+CREATE OR REPLACE FUNCTION write_embeddings(p_table text, p_config_id int, p_rows jsonb)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  written int;
+BEGIN
+  IF p_table NOT IN ('profiles', 'insights') THEN
+    RAISE EXCEPTION 'Unknown embedding table %', p_table;
+  END IF;
+  EXECUTE format(
+    'UPDATE %I t SET embedding = r.embedding::vector, embedding_config_id = $1 '
+    'FROM jsonb_to_recordset($2) AS r(id uuid, embedding text) '
+    'WHERE t.id = r.id AND r.embedding IS NOT NULL', p_table)
+  USING p_config_id, p_rows;
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$;
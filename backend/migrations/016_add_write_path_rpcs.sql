@@ -0,0 +1,121 @@
+-- Single-call write paths for following, liking and opening conversations.
+--
+-- Each function does its write as an idempotent insert (ON CONFLICT DO
+-- NOTHING against the existing unique constraints), runs its side effects
+-- in the same transaction and returns the resulting state, so the routes
+-- make one round trip and concurrent requests can't create duplicates.
+
+-- Follow p_following_id and notify them. Returns {followed, follow,
+-- follower_count, following_count}; followed is false if the follow
+-- already existed, in which case no notification is sent.
+CREATE OR REPLACE FUNCTION follow_user(p_follower_id uuid, p_following_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  f follows%ROWTYPE;
+  created boolean;
+  follower_name text;
+BEGIN
+  INSERT INTO follows (follower_id, following_id)
+  VALUES (p_follower_id, p_following_id)
+  ON CONFLICT (follower_id, following_id) DO NOTHING
+  RETURNING * INTO f;
+  created := FOUND;
+
+  IF created THEN
+    SELECT full_name INTO follower_name FROM profiles WHERE id = p_follower_id;
+    INSERT INTO notifications (user_id, type, message, related_user_id)
+    VALUES (
+      p_following_id,
+      'follow',
+      coalesce(follower_name, 'Someone') || ' started following you',
+      p_follower_id
+    );
+  ELSE
+    SELECT * INTO f FROM follows
+    WHERE follower_id = p_follower_id AND following_id = p_following_id;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'followed', created,
+    'follow', to_jsonb(f),
+    'follower_count', (SELECT count(*) FROM follows WHERE following_id = p_following_id),
+    'following_count', (SELECT count(*) FROM follows WHERE follower_id = p_follower_id)
+  );
+END;
+$$;
+
+-- Like an insight. Returns {liked, likes_count}; liked is false if the
+-- user had already liked it.
+CREATE OR REPLACE FUNCTION like_insight(p_insight_id uuid, p_user_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  created boolean;
+BEGIN
+  INSERT INTO insight_likes (insight_id, user_id)
+  VALUES (p_insight_id, p_user_id)
+  ON CONFLICT (insight_id, user_id) DO NOTHING;
+  created := FOUND;
+
+  RETURN jsonb_build_object(
+    'liked', created,
+    'likes_count', (SELECT count(*) FROM insight_likes WHERE insight_id = p_insight_id)
+  );
+END;
+$$;
+
+-- Remove a like (a no-op if there was none). Returns {unliked, likes_count}.
+CREATE OR REPLACE FUNCTION unlike_insight(p_insight_id uuid, p_user_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  removed boolean;
+BEGIN
+  DELETE FROM insight_likes WHERE insight_id = p_insight_id AND user_id = p_user_id;
+  removed := FOUND;
+
+  RETURN jsonb_build_object(
+    'unliked', removed,
+    'likes_count', (SELECT count(*) FROM insight_likes WHERE insight_id = p_insight_id)
+  );
+END;
+$$;
+
+-- The conversation between two users, created if they don't have one yet.
+-- Returns {conversation, created, other_user: {id, full_name,
+-- profile_picture_url}}, or NULL (creating nothing) if p_other_id has no
+-- profile.
+CREATE OR REPLACE FUNCTION get_or_create_conversation(p_user_id uuid, p_other_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  c conversations%ROWTYPE;
+  created boolean;
+  other jsonb;
+BEGIN
+  SELECT jsonb_build_object('id', id, 'full_name', full_name, 'profile_picture_url', profile_picture_url)
+  INTO other
+  FROM profiles WHERE id = p_other_id;
+  IF other IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO conversations (user1_id, user2_id)
+  VALUES (least(p_user_id, p_other_id), greatest(p_user_id, p_other_id))
+  ON CONFLICT ON CONSTRAINT unique_conversation DO NOTHING
+  RETURNING * INTO c;
+  created := FOUND;
+
+  IF NOT created THEN
+    SELECT * INTO c FROM conversations
+    WHERE user1_id = least(p_user_id, p_other_id) AND user2_id = greatest(p_user_id, p_other_id);
+  END IF;
+
+  RETURN jsonb_build_object('conversation', to_jsonb(c), 'created', created, 'other_user', other);
+END;
+$$;
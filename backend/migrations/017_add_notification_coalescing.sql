@@ -0,0 +1,228 @@
+-- Coalesced notifications and retention.
+--
+-- Instead of one row per event, add_notification folds events into the
+-- recipient's open aggregate row for the same group_key: unread and
+-- started within the group's window. A chatty conversation becomes
+-- "X sent you 12 messages" and a burst of follows becomes "X and 5 others
+-- followed you". Updating the aggregate moves created_at to the latest
+-- event so it sorts back to the top of the list.
+--
+-- purge_notifications deletes (or archives) old read notifications, and
+-- unread ones past a longer age, in batches. Run it with
+-- `flask --app run notifications purge`, or schedule the batched procedure
+-- with pg_cron where it is available:
+--
+--   SELECT cron.schedule('purge-notifications', '17 3 * * *',
+--                        'CALL purge_notifications_batched()');
+
+ALTER TABLE notifications
+    ADD COLUMN IF NOT EXISTS group_key TEXT,
+    ADD COLUMN IF NOT EXISTS event_count INT NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS actor_ids UUID[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS first_event_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Finds a recipient's open aggregate for a group
+CREATE INDEX IF NOT EXISTS idx_notifications_open_group
+ON notifications(user_id, group_key, first_event_at DESC)
+WHERE NOT read AND group_key IS NOT NULL;
+
+-- Walks the oldest rows for purging
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at
+ON notifications(created_at);
+
+CREATE OR REPLACE FUNCTION notification_text(p_type text, p_actor_name text, p_events int, p_actors int)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN p_type = 'message' AND p_events = 1 THEN p_actor_name || ' sent you a message'
+    WHEN p_type = 'message' THEN p_actor_name || ' sent you ' || p_events || ' messages'
+    WHEN p_type = 'follow' AND p_actors = 1 THEN p_actor_name || ' started following you'
+    WHEN p_type = 'follow' AND p_actors = 2 THEN p_actor_name || ' and 1 other followed you'
+    WHEN p_type = 'follow' THEN p_actor_name || ' and ' || (p_actors - 1) || ' others followed you'
+    ELSE p_actor_name || ' ' || p_type
+  END;
+$$;
+
+-- Record an event for p_user_id, folding it into the open aggregate for
+-- p_group_key if one started within p_window. Returns the notification id.
+CREATE OR REPLACE FUNCTION add_notification(
+  p_user_id uuid,
+  p_type text,
+  p_group_key text,
+  p_actor_id uuid,
+  p_actor_name text,
+  p_window interval DEFAULT interval '1 hour'
+)
+RETURNS uuid
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  n notifications%ROWTYPE;
+  actors uuid[];
+  actor_name text := coalesce(nullif(p_actor_name, ''), 'Someone');
+  notification_id uuid;
+BEGIN
+  -- Serialise events for the same aggregate so two can't both open one
+  PERFORM pg_advisory_xact_lock(hashtext('notifications:' || p_user_id || ':' || p_group_key));
+
+  SELECT * INTO n FROM notifications
+  WHERE user_id = p_user_id AND group_key = p_group_key AND NOT read
+    AND first_event_at > now() - p_window
+  ORDER BY first_event_at DESC
+  LIMIT 1;
+
+  IF NOT FOUND THEN
+    INSERT INTO notifications (user_id, type, message, related_user_id, group_key, actor_ids)
+    VALUES (p_user_id, p_type, notification_text(p_type, actor_name, 1, 1), p_actor_id,
+            p_group_key, ARRAY[p_actor_id])
+    RETURNING id INTO notification_id;
+    RETURN notification_id;
+  END IF;
+
+  actors := CASE WHEN p_actor_id = ANY(n.actor_ids) THEN n.actor_ids ELSE n.actor_ids || p_actor_id END;
+  UPDATE notifications
+  SET event_count = n.event_count + 1,
+      actor_ids = actors,
+      related_user_id = p_actor_id,
+      message = notification_text(p_type, actor_name, n.event_count + 1, cardinality(actors)),
+      created_at = now()
+  WHERE id = n.id;
+  RETURN n.id;
+END;
+$$;
+
+-- Messages fold per sender
+CREATE OR REPLACE FUNCTION create_message_notification()
+RETURNS TRIGGER AS $$
+DECLARE
+    receiver_id UUID;
+    sender_name TEXT;
+BEGIN
+    -- Get the receiver ID (the other user in the conversation)
+    SELECT CASE
+        WHEN user1_id = NEW.sender_id THEN user2_id
+        ELSE user1_id
+    END INTO receiver_id
+    FROM conversations
+    WHERE id = NEW.conversation_id;
+
+    -- Get sender's name
+    SELECT full_name INTO sender_name
+    FROM profiles
+    WHERE id = NEW.sender_id;
+
+    PERFORM add_notification(
+        receiver_id, 'message', 'message:' || NEW.sender_id, NEW.sender_id, sender_name,
+        interval '1 hour'
+    );
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Follows fold across followers (see 016 for the rest of follow_user)
+CREATE OR REPLACE FUNCTION follow_user(p_follower_id uuid, p_following_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  f follows%ROWTYPE;
+  created boolean;
+  follower_name text;
+BEGIN
+  INSERT INTO follows (follower_id, following_id)
+  VALUES (p_follower_id, p_following_id)
+  ON CONFLICT (follower_id, following_id) DO NOTHING
+  RETURNING * INTO f;
+  created := FOUND;
+
+  IF created THEN
+    SELECT full_name INTO follower_name FROM profiles WHERE id = p_follower_id;
+    PERFORM add_notification(
+      p_following_id, 'follow', 'follow', p_follower_id, follower_name, interval '1 day'
+    );
+  ELSE
+    SELECT * INTO f FROM follows
+    WHERE follower_id = p_follower_id AND following_id = p_following_id;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'followed', created,
+    'follow', to_jsonb(f),
+    'follower_count', (SELECT count(*) FROM follows WHERE following_id = p_following_id),
+    'following_count', (SELECT count(*) FROM follows WHERE follower_id = p_follower_id)
+  );
+END;
+$$;
+
+-- Purged rows land here when archiving
+CREATE TABLE IF NOT EXISTS notifications_archive (LIKE notifications INCLUDING DEFAULTS);
+ALTER TABLE notifications_archive
+    ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE notifications_archive ENABLE ROW LEVEL SECURITY;
+
+-- Remove one batch of notifications that are read and older than
+-- p_read_older_than, or older than p_unread_older_than whatever their
+-- state (NULL keeps unread ones). Returns the number removed; call until
+-- it returns less than p_batch_size.
+CREATE OR REPLACE FUNCTION purge_notifications(
+  p_read_older_than interval DEFAULT interval '30 days',
+  p_unread_older_than interval DEFAULT interval '180 days',
+  p_batch_size int DEFAULT 1000,
+  p_archive boolean DEFAULT false
+)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  purged int;
+BEGIN
+  IF p_archive THEN
+    WITH batch AS (
+      SELECT id FROM notifications
+      WHERE (read AND created_at < now() - p_read_older_than)
+         OR (p_unread_older_than IS NOT NULL AND created_at < now() - p_unread_older_than)
+      ORDER BY created_at
+      LIMIT p_batch_size
+      FOR UPDATE SKIP LOCKED
+    ), moved AS (
+      DELETE FROM notifications n USING batch WHERE n.id = batch.id RETURNING n.*
+    )
+    INSERT INTO notifications_archive SELECT moved.*, now() FROM moved;
+  ELSE
+    WITH batch AS (
+      SELECT id FROM notifications
+      WHERE (read AND created_at < now() - p_read_older_than)
+         OR (p_unread_older_than IS NOT NULL AND created_at < now() - p_unread_older_than)
+      ORDER BY created_at
+      LIMIT p_batch_size
+      FOR UPDATE SKIP LOCKED
+    )
+    DELETE FROM notifications n USING batch WHERE n.id = batch.id;
+  END IF;
+  GET DIAGNOSTICS purged = ROW_COUNT;
+  RETURN purged;
+END;
+$$;
+
+-- Purge everything due, committing after each batch so locks stay short
+CREATE OR REPLACE PROCEDURE purge_notifications_batched(
+  p_read_older_than interval DEFAULT interval '30 days',
+  p_unread_older_than interval DEFAULT interval '180 days',
+  p_batch_size int DEFAULT 1000,
+  p_archive boolean DEFAULT false
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  purged int;
+BEGIN
+  LOOP
+    purged := purge_notifications(p_read_older_than, p_unread_older_than, p_batch_size, p_archive);
+    COMMIT;
+    EXIT WHEN purged < p_batch_size;
+  END LOOP;
+END;
+$$;
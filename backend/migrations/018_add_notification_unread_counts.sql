@@ -0,0 +1,108 @@
+-- Unread notification counts and bulk mark-read.
+--
+-- notification_unread_counts holds each user's number of unread
+-- notifications, kept current by statement-level triggers on
+-- notifications, so the badge count is a primary-key lookup and a bulk
+-- update touches each user's counter once.
+
+CREATE TABLE IF NOT EXISTS notification_unread_counts (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    unread INT NOT NULL DEFAULT 0
+);
+
+ALTER TABLE notification_unread_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own unread count"
+    ON notification_unread_counts FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Apply the change in unread rows made by one statement. Counters are
+-- locked in user_id order so concurrent bulk statements can't deadlock.
+CREATE OR REPLACE FUNCTION track_notification_unread_counts()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO notification_unread_counts AS c (user_id, unread)
+    SELECT user_id, count(*) FROM new_rows WHERE NOT coalesce(read, false)
+    GROUP BY user_id ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = c.unread + EXCLUDED.unread;
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO notification_unread_counts AS c (user_id, unread)
+    SELECT user_id, -count(*) FROM old_rows WHERE NOT coalesce(read, false)
+    GROUP BY user_id ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = greatest(c.unread + EXCLUDED.unread, 0);
+  ELSE
+    INSERT INTO notification_unread_counts AS c (user_id, unread)
+    SELECT user_id, sum(delta) FROM (
+      SELECT user_id, 1 AS delta FROM new_rows WHERE NOT coalesce(read, false)
+      UNION ALL
+      SELECT user_id, -1 FROM old_rows WHERE NOT coalesce(read, false)
+    ) d
+    GROUP BY user_id HAVING sum(delta) <> 0 ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET unread = greatest(c.unread + EXCLUDED.unread, 0);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_notification_unread_insert ON notifications;
+CREATE TRIGGER trigger_notification_unread_insert
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_notification_unread_counts();
+
+DROP TRIGGER IF EXISTS trigger_notification_unread_update ON notifications;
+CREATE TRIGGER trigger_notification_unread_update
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_notification_unread_counts();
+
+DROP TRIGGER IF EXISTS trigger_notification_unread_delete ON notifications;
+CREATE TRIGGER trigger_notification_unread_delete
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION track_notification_unread_counts();
+
+-- Counts for notifications that existed before the triggers
+INSERT INTO notification_unread_counts (user_id, unread)
+SELECT user_id, count(*) FROM notifications WHERE NOT coalesce(read, false) GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET unread = EXCLUDED.unread;
+
+CREATE OR REPLACE FUNCTION notification_unread_count(p_user_id uuid)
+RETURNS int
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT greatest(coalesce((SELECT unread FROM notification_unread_counts WHERE user_id = p_user_id), 0), 0);
+$$;
+
+-- Mark a user's notifications read in one statement: those in p_ids, or
+-- those created at or before p_up_to, or (both NULL) all of them.
+-- Returns {updated, unread_count}.
+CREATE OR REPLACE FUNCTION mark_notifications_read(
+  p_user_id uuid,
+  p_ids uuid[] DEFAULT NULL,
+  p_up_to timestamptz DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated int;
+BEGIN
+  UPDATE notifications
+  SET read = TRUE
+  WHERE user_id = p_user_id
+    AND NOT coalesce(read, false)
+    AND (p_ids IS NULL OR id = ANY(p_ids))
+    AND (p_up_to IS NULL OR created_at <= p_up_to);
+  GET DIAGNOSTICS updated = ROW_COUNT;
+
+  RETURN jsonb_build_object('updated', updated, 'unread_count', notification_unread_count(p_user_id));
+END;
+$$;
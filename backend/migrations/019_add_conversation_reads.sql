@@ -0,0 +1,116 @@
+-- Per-participant read cursors for conversations.
+--
+-- Instead of flipping messages.is_read on every message a participant has
+-- seen, each participant has one conversation_reads row holding the newest
+-- message they have read. A message is read once its created_at is at or
+-- before its recipient's last_read_at, so marking a conversation read is
+-- a single-row upsert (none at all when nothing new arrived) and unread
+-- counts are the messages after the cursor.
+--
+-- The API keeps returning is_read, derived from the cursors. The column
+-- itself is no longer written; drop it and idx_messages_unread once no
+-- deployed code reads it.
+
+CREATE TABLE IF NOT EXISTS conversation_reads (
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    last_read_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_read_message_id UUID,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (conversation_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_reads_user ON conversation_reads(user_id);
+
+-- Newest messages of a conversation, for cursors and unread counts
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+ON messages(conversation_id, created_at DESC);
+
+ALTER TABLE conversation_reads ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view read cursors in their conversations"
+    ON conversation_reads FOR SELECT
+    USING (
+        EXISTS (
+            SELECT 1 FROM conversations
+            WHERE conversations.id = conversation_reads.conversation_id
+            AND (conversations.user1_id = auth.uid() OR conversations.user2_id = auth.uid())
+        )
+    );
+
+-- Cursors from the existing is_read flags: just before a participant's
+-- oldest unread message, or at their newest received one
+INSERT INTO conversation_reads (conversation_id, user_id, last_read_at)
+SELECT c.id, p.user_id, coalesce(
+    (SELECT min(m.created_at) - interval '1 microsecond' FROM messages m
+     WHERE m.conversation_id = c.id AND m.sender_id <> p.user_id AND NOT coalesce(m.is_read, false)),
+    (SELECT max(m.created_at) FROM messages m
+     WHERE m.conversation_id = c.id AND m.sender_id <> p.user_id)
+)
+FROM conversations c
+CROSS JOIN LATERAL (VALUES (c.user1_id), (c.user2_id)) AS p(user_id)
+WHERE EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id AND m.sender_id <> p.user_id)
+ON CONFLICT (conversation_id, user_id) DO NOTHING;
+
+-- Move p_user_id's cursor to the newest message they received. Never moves
+-- it backwards and writes nothing when there is nothing new. Returns
+-- {last_read_at, previous_read_at, other_last_read_at}: the cursor after
+-- and before, and the other participant's cursor.
+CREATE OR REPLACE FUNCTION mark_conversation_read(p_conversation_id uuid, p_user_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  latest_id uuid;
+  latest_at timestamptz;
+  previous timestamptz;
+  current_read timestamptz;
+  other_read timestamptz;
+BEGIN
+  SELECT last_read_at INTO previous FROM conversation_reads
+  WHERE conversation_id = p_conversation_id AND user_id = p_user_id;
+
+  SELECT id, created_at INTO latest_id, latest_at FROM messages
+  WHERE conversation_id = p_conversation_id AND sender_id <> p_user_id
+  ORDER BY created_at DESC
+  LIMIT 1;
+
+  current_read := previous;
+  IF latest_at IS NOT NULL AND (previous IS NULL OR latest_at > previous) THEN
+    INSERT INTO conversation_reads AS r (conversation_id, user_id, last_read_at, last_read_message_id, updated_at)
+    VALUES (p_conversation_id, p_user_id, latest_at, latest_id, now())
+    ON CONFLICT (conversation_id, user_id) DO UPDATE
+      SET last_read_at = EXCLUDED.last_read_at,
+          last_read_message_id = EXCLUDED.last_read_message_id,
+          updated_at = now()
+      WHERE r.last_read_at < EXCLUDED.last_read_at;
+    current_read := greatest(previous, latest_at);
+  END IF;
+
+  SELECT last_read_at INTO other_read FROM conversation_reads
+  WHERE conversation_id = p_conversation_id AND user_id <> p_user_id;
+
+  RETURN jsonb_build_object(
+    'last_read_at', current_read,
+    'previous_read_at', previous,
+    'other_last_read_at', other_read
+  );
+END;
+$$;
+
+-- Unread messages per conversation of p_user_id (conversations with none
+-- are left out)
+CREATE OR REPLACE FUNCTION conversation_unread_counts(p_user_id uuid)
+RETURNS TABLE (conversation_id uuid, unread_count bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT c.id, count(m.id)
+  FROM conversations c
+  LEFT JOIN conversation_reads r ON r.conversation_id = c.id AND r.user_id = p_user_id
+  JOIN messages m ON m.conversation_id = c.id
+    AND m.sender_id <> p_user_id
+    AND (r.last_read_at IS NULL OR m.created_at > r.last_read_at)
+  WHERE c.user1_id = p_user_id OR c.user2_id = p_user_id
+  GROUP BY c.id;
+$$;
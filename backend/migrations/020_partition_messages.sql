@@ -0,0 +1,276 @@
+-- Monthly range partitioning of messages on created_at.
+--
+-- messages becomes a partitioned table with one partition per calendar
+-- month (messages_pYYYYMM) plus messages_default for anything outside the
+-- created months. Indexes are per partition, so they stay the size of a
+-- month, and old months leave the table with a metadata-only detach
+-- instead of a bulk DELETE and vacuum.
+--
+-- create_message_partitions keeps the coming months in place and
+-- detach_message_partitions detaches (and optionally archives) months past
+-- retention. Run both with `flask --app run messages partitions`, or
+-- schedule the procedure with pg_cron where it is available:
+--
+--   SELECT cron.schedule('message-partitions', '7 2 * * *',
+--                        'CALL maintain_message_partitions()');
+--
+-- Queries prune partitions when they bound created_at: conversations
+-- record their last message (last_message_at) for the conversation list,
+-- and nothing in a conversation predates the conversation itself.
+--
+-- The existing rows are copied in this migration, inside its transaction;
+-- on a large table run it during a maintenance window.
+
+-- Last message of each conversation, maintained by the insert trigger
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS last_message_id UUID,
+    ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITH TIME ZONE;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+
+-- The partition key has to be part of the primary key
+CREATE TABLE messages (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    sender_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+
+-- Create the monthly partitions from p_from's month through p_months_ahead
+-- months after the current one. Rows already in messages_default for a new
+-- month are moved into it. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION create_message_partitions(p_months_ahead int DEFAULT 3, p_from date DEFAULT NULL)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  month_start date := date_trunc('month', coalesce(p_from, now()))::date;
+  last_month date := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+  partition_name text;
+  created int := 0;
+BEGIN
+  WHILE month_start <= last_month LOOP
+    partition_name := 'messages_p' || to_char(month_start, 'YYYYMM');
+    IF to_regclass('public.' || partition_name) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I (LIKE messages INCLUDING DEFAULTS)', partition_name);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM messages_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        month_start, (month_start + interval '1 month')::date, partition_name
+      );
+      EXECUTE format(
+        'ALTER TABLE messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, (month_start + interval '1 month')::date
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + interval '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+-- Detach the monthly partitions that end before p_older_than ago. With
+-- p_archive_schema they are moved to that schema (created if needed) and
+-- kept; otherwise they are dropped. Returns the detached partition names.
+CREATE OR REPLACE FUNCTION detach_message_partitions(
+  p_older_than interval DEFAULT interval '24 months',
+  p_archive_schema text DEFAULT NULL
+)
+RETURNS text[]
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  cutoff date := date_trunc('month', now() - p_older_than)::date;
+  part record;
+  detached text[] := '{}';
+BEGIN
+  IF p_archive_schema IS NOT NULL THEN
+    EXECUTE format('CREATE SCHEMA IF NOT EXISTS %I', p_archive_schema);
+  END IF;
+
+  FOR part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.messages'::regclass
+      AND c.relname ~ '^messages_p[0-9]{6}$'
+      -- Each month ends where the next begins
+      AND (to_date(substring(c.relname FROM 11), 'YYYYMM') + interval '1 month')::date <= cutoff
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('ALTER TABLE messages DETACH PARTITION %I', part.relname);
+    IF p_archive_schema IS NOT NULL THEN
+      EXECUTE format('ALTER TABLE %I SET SCHEMA %I', part.relname, p_archive_schema);
+    ELSE
+      EXECUTE format('DROP TABLE %I', part.relname);
+    END IF;
+    detached := detached || part.relname::text;
+  END LOOP;
+  RETURN detached;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE maintain_message_partitions(
+  p_months_ahead int DEFAULT 3,
+  p_older_than interval DEFAULT interval '24 months',
+  p_archive_schema text DEFAULT 'archive'
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM create_message_partitions(p_months_ahead);
+  PERFORM detach_message_partitions(p_older_than, p_archive_schema);
+END;
+$$;
+
+-- Partitions for every month with messages, then the copy
+SELECT create_message_partitions(3, (SELECT min(created_at) FROM messages_unpartitioned)::date);
+
+INSERT INTO messages (id, conversation_id, sender_id, content, is_read, created_at, updated_at)
+SELECT id, conversation_id, sender_id, content, is_read, coalesce(created_at, now()), updated_at
+FROM messages_unpartitioned;
+
+UPDATE conversations c
+SET last_message_id = m.id, last_message_at = m.created_at
+FROM (
+    SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+    FROM messages
+    ORDER BY conversation_id, created_at DESC
+) m
+WHERE m.conversation_id = c.id;
+
+DROP TABLE messages_unpartitioned;
+
+-- Indexes are created on every partition, present and future
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id);
+
+ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view messages in their conversations"
+    ON messages FOR SELECT
+    USING (
+        EXISTS (
+            SELECT 1 FROM conversations
+            WHERE conversations.id = messages.conversation_id
+            AND (conversations.user1_id = auth.uid() OR conversations.user2_id = auth.uid())
+        )
+    );
+
+CREATE POLICY "Users can send messages in their conversations"
+    ON messages FOR INSERT
+    WITH CHECK (
+        auth.uid() = sender_id
+        AND EXISTS (
+            SELECT 1 FROM conversations
+            WHERE conversations.id = messages.conversation_id
+            AND (conversations.user1_id = auth.uid() OR conversations.user2_id = auth.uid())
+        )
+    );
+
+CREATE POLICY "Users can update messages in their conversations"
+    ON messages FOR UPDATE
+    USING (
+        EXISTS (
+            SELECT 1 FROM conversations
+            WHERE conversations.id = messages.conversation_id
+            AND (conversations.user1_id = auth.uid() OR conversations.user2_id = auth.uid())
+        )
+    );
+
+-- Row triggers on the partitioned table fire for whichever partition the
+-- row lands in
+CREATE OR REPLACE FUNCTION update_conversation_timestamp()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE conversations
+    SET updated_at = NOW(),
+        last_message_id = CASE WHEN last_message_at IS NULL OR last_message_at <= NEW.created_at
+                               THEN NEW.id ELSE last_message_id END,
+        last_message_at = greatest(last_message_at, NEW.created_at)
+    WHERE id = NEW.conversation_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_update_conversation_timestamp
+    AFTER INSERT ON messages
+    FOR EACH ROW
+    EXECUTE FUNCTION update_conversation_timestamp();
+
+CREATE TRIGGER trigger_create_message_notification
+    AFTER INSERT ON messages
+    FOR EACH ROW
+    EXECUTE FUNCTION create_message_notification();
+
+-- Read cursors and unread counts (019), bounded below so only the
+-- partitions after the cursor, or since the conversation began, are read
+CREATE OR REPLACE FUNCTION mark_conversation_read(p_conversation_id uuid, p_user_id uuid)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  latest_id uuid;
+  latest_at timestamptz;
+  previous timestamptz;
+  current_read timestamptz;
+  other_read timestamptz;
+  started timestamptz;
+BEGIN
+  SELECT last_read_at INTO previous FROM conversation_reads
+  WHERE conversation_id = p_conversation_id AND user_id = p_user_id;
+
+  SELECT created_at INTO started FROM conversations WHERE id = p_conversation_id;
+
+  SELECT id, created_at INTO latest_id, latest_at FROM messages
+  WHERE conversation_id = p_conversation_id AND sender_id <> p_user_id
+    AND created_at >= coalesce(previous, started, '-infinity')
+  ORDER BY created_at DESC
+  LIMIT 1;
+
+  current_read := previous;
+  IF latest_at IS NOT NULL AND (previous IS NULL OR latest_at > previous) THEN
+    INSERT INTO conversation_reads AS r (conversation_id, user_id, last_read_at, last_read_message_id, updated_at)
+    VALUES (p_conversation_id, p_user_id, latest_at, latest_id, now())
+    ON CONFLICT (conversation_id, user_id) DO UPDATE
+      SET last_read_at = EXCLUDED.last_read_at,
+          last_read_message_id = EXCLUDED.last_read_message_id,
+          updated_at = now()
+      WHERE r.last_read_at < EXCLUDED.last_read_at;
+    current_read := greatest(previous, latest_at);
+  END IF;
+
+  SELECT last_read_at INTO other_read FROM conversation_reads
+  WHERE conversation_id = p_conversation_id AND user_id <> p_user_id;
+
+  RETURN jsonb_build_object(
+    'last_read_at', current_read,
+    'previous_read_at', previous,
+    'other_last_read_at', other_read
+  );
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION conversation_unread_counts(p_user_id uuid)
+RETURNS TABLE (conversation_id uuid, unread_count bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT c.id, count(m.id)
+  FROM conversations c
+  LEFT JOIN conversation_reads r ON r.conversation_id = c.id AND r.user_id = p_user_id
+  JOIN messages m ON m.conversation_id = c.id
+    AND m.sender_id <> p_user_id
+    AND m.created_at >= coalesce(r.last_read_at, c.created_at, '-infinity')
+    AND (r.last_read_at IS NULL OR m.created_at > r.last_read_at)
+  WHERE (c.user1_id = p_user_id OR c.user2_id = p_user_id)
+    AND c.last_message_at > coalesce(r.last_read_at, '-infinity')
+  GROUP BY c.id;
+$$;
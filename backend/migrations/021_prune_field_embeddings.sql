@@ -0,0 +1,110 @@
+-- Bounded query-time field weighting and pruning of the field vector cache.
+--
+-- search_profiles_weighted (012) compared the query with every cached
+-- field vector, including values no profile has any more, so each search
+-- cost grew with everything ever embedded. It now scores only the hashes
+-- some profile currently maps a weighted field to: one comparison per
+-- distinct live field value.
+--
+-- prune_field_embeddings removes cached vectors no profile references (and
+-- those of retired embedding configs) in batches. Run it with
+-- `flask --app run embeddings prune-fields`, or schedule the procedure with
+-- pg_cron where it is available:
+--
+--   SELECT cron.schedule('prune-field-embeddings', '37 3 * * *',
+--                        'CALL prune_field_embeddings_batched()');
+
+CREATE OR REPLACE FUNCTION search_profiles_weighted(
+  query_embedding vector,
+  field_weights jsonb DEFAULT '{}'::jsonb,
+  match_threshold float DEFAULT 0.2,
+  match_count int DEFAULT 50
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float,
+  field_similarities jsonb
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH weights AS (
+    SELECT f.field, coalesce((field_weights ->> f.field)::float, 1.0) AS weight
+    FROM unnest(ARRAY['location', 'industry', 'school', 'skills', 'bio']) AS f(field)
+  ),
+  -- Field values in use for a field that counts in this query
+  live AS (
+    SELECT DISTINCT pf.text_hash
+    FROM profile_field_embeddings pf
+    JOIN weights w ON w.field = pf.field AND w.weight > 0
+  ),
+  scored AS (
+    SELECT fe.text_hash, 1 - (fe.embedding <=> query_embedding) AS field_similarity
+    FROM live
+    JOIN field_embeddings fe ON fe.text_hash = live.text_hash
+    JOIN embedding_configs c ON c.id = fe.embedding_config_id AND c.status = 'active'
+    WHERE query_embedding IS NOT NULL
+  )
+  SELECT
+    pf.profile_id,
+    sum(w.weight * s.field_similarity) / sum(w.weight),
+    jsonb_object_agg(pf.field, round(s.field_similarity::numeric, 4))
+  FROM profile_field_embeddings pf
+  JOIN weights w ON w.field = pf.field AND w.weight > 0
+  JOIN scored s ON s.text_hash = pf.text_hash
+  GROUP BY pf.profile_id
+  HAVING sum(w.weight * s.field_similarity) / sum(w.weight) > match_threshold
+  ORDER BY 2 DESC
+  LIMIT match_count;
+$$;
+
+-- Remove up to p_batch_size cached field vectors that no profile maps to,
+-- or that belong to a retired embedding config. Rows younger than
+-- p_older_than are kept: the app caches a new vector before it writes the
+-- profile's mapping to it. Returns the number removed; call until it
+-- returns less than p_batch_size.
+CREATE OR REPLACE FUNCTION prune_field_embeddings(
+  p_older_than interval DEFAULT interval '1 day',
+  p_batch_size int DEFAULT 5000
+)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  pruned int;
+BEGIN
+  WITH batch AS (
+    SELECT fe.text_hash, fe.embedding_config_id
+    FROM field_embeddings fe
+    JOIN embedding_configs c ON c.id = fe.embedding_config_id
+    WHERE fe.created_at < now() - p_older_than
+      AND (
+        c.status = 'retired'
+        OR NOT EXISTS (SELECT 1 FROM profile_field_embeddings pf WHERE pf.text_hash = fe.text_hash)
+      )
+    LIMIT p_batch_size
+  )
+  DELETE FROM field_embeddings fe
+  USING batch
+  WHERE fe.text_hash = batch.text_hash AND fe.embedding_config_id = batch.embedding_config_id;
+  GET DIAGNOSTICS pruned = ROW_COUNT;
+  RETURN pruned;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE prune_field_embeddings_batched(
+  p_older_than interval DEFAULT interval '1 day',
+  p_batch_size int DEFAULT 5000
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  pruned int;
+BEGIN
+  LOOP
+    pruned := prune_field_embeddings(p_older_than, p_batch_size);
+    COMMIT;
+    EXIT WHEN pruned < p_batch_size;
+  END LOOP;
+END;
+$$;
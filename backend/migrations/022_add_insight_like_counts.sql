@@ -0,0 +1,16 @@
+-- Like counts for a page of insights in one call. The insight lists used
+-- to count each insight's likes with its own request; selecting the like
+-- rows with in.(...) instead would be cut off at PostgREST's max-rows, so
+-- the counting stays in Postgres (idx_insight_likes_insight_id).
+-- Insights without likes are left out.
+
+CREATE OR REPLACE FUNCTION insight_like_counts(p_insight_ids uuid[])
+RETURNS TABLE (insight_id uuid, likes_count bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT l.insight_id, count(*)
+  FROM insight_likes l
+  WHERE l.insight_id = ANY(p_insight_ids)
+  GROUP BY l.insight_id;
+$$;
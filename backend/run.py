@@ -1,6 +1,10 @@
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # Flask's development server, with the debugger and reloader unless
+    # FLASK_DEBUG=0. In production serve `app` with gunicorn instead:
+    #   gunicorn -c gunicorn.conf.py run:app
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=int(os.getenv('PORT', '5001')))